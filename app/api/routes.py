@@ -1,20 +1,39 @@
 """
 提取API路由
 """
+import asyncio
 import logging
 import json
-from fastapi import APIRouter, HTTPException, status, Form, File, UploadFile, Request
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, status, Form, File, UploadFile, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
 
-from app.models import ExtractRequest, ExtractResponse, ErrorResponse, SchemaField
+from app.models import (
+    ExtractRequest,
+    ExtractResponse,
+    ErrorResponse,
+    SchemaRegisterResponse,
+    BulkJobRequest,
+    BulkJobResponse,
+    BulkItemResult,
+    BulkResultsResponse,
+    BulkExportRequest,
+    BulkExportResponse,
+    IngestRequest,
+    IngestRunResponse,
+    IngestResultsResponse,
+)
 from app.core import AppException
-from app.services import ExtractService
+from app.core.profiling import stage
+from app.core.response_metadata import collect_metadata
+from app.core.serialization import extract_response_body
+from app.services import BulkService, ExtractService, IngestService, PreprocessService, SchemaRegistry
 from app.utils.toon_utils import (
-    extract_toon_block,
-    toon_decode,
-    extract_schema_list,
+    decode_schema_table,
     schema_to_toon as build_schema_toon,
 )
+from app.utils.columnar import EXPORT_FORMATS
+from app.utils.compiled_schema import compile_schema
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +41,10 @@ router = APIRouter(tags=["extract"])
 
 # 创建服务实例
 extract_service = ExtractService()
+schema_registry = SchemaRegistry()
+bulk_service = BulkService()
+ingest_service = IngestService(extract_service)
+preprocess_service = PreprocessService(extract_service, schema_registry)
 
 
 @router.post(
@@ -37,11 +60,16 @@ extract_service = ExtractService()
 async def extract(
     source: str = Form(..., description="文件来源: 'minio' 或 'file'"),
     url: Optional[str] = Form(None, description="MinIO URL"),
-    schema_str: str = Form(..., alias="schema", description="Schema字段定义（JSON 或 TOON）"),
-    provider: str = Form("openai", description="LLM提供商: openai|azure|claude|gemini|custom"),
-    model: Optional[str] = Form(None, description="LLM模型名称（可选）"),
+    schema_str: Optional[str] = Form(None, alias="schema", description="Schema字段定义（JSON 或 TOON）"),
+    schema_id: Optional[str] = Form(None, description="已注册的 Schema ID（替代 schema）"),
+    schema_version: Optional[int] = Form(None, description="Schema 版本（默认最新）"),
+    provider: str = Form("openai", description="LLM提供商: openai|azure|claude|gemini|custom|auto"),
+    model: Optional[str] = Form(None, description="LLM模型名称（可选，auto 表示由模型路由选择）"),
+    output_format: Optional[str] = Form(None, description="LLM 输出格式: table|positional（可选）"),
+    max_cost: Optional[float] = Form(None, description="模型路由约束：单次调用最高预估成本（美元，可选）"),
+    latency_slo: Optional[float] = Form(None, description="模型路由约束：延迟 SLO（秒，可选）"),
     file: Optional[UploadFile] = File(None, description="上传的文件"),
-) -> ExtractResponse:
+) -> Response:
     """
     数据提取端点
     
@@ -49,9 +77,16 @@ async def extract(
     - **source**: 文件来源，"minio"或"file"（必需）
     - **url**: MinIO URL
     - **file**: 上传的文件
-    - **schema**: JSON 或 TOON 格式的 Schema 字段定义数组（必需）
-    - **provider**: LLM提供商，"openai"|"azure"|"claude"|"gemini"|"custom"（默认: openai）
-    - **model**: LLM模型名称（可选）
+    - **schema**: JSON 或 TOON 格式的 Schema 字段定义数组（与 schema_id 二选一）
+    - **schema_id**: 通过 POST /schemas 注册得到的 Schema ID
+    - **schema_version**: Schema 版本（可选，默认最新版本）
+    - **provider**: LLM提供商，"openai"|"azure"|"claude"|"gemini"|"custom"|"auto"（默认: openai）
+    - **model**: LLM模型名称（可选）；provider 或 model 为 "auto" 时按模型目录、能力需求、
+      预估成本与实时延迟/错误率选择模型，路由结果在响应的 metadata.route 中返回
+    - **output_format**: LLM 输出格式（可选）："table" 逐行输出 field,type,value；
+      "positional" 仅按 schema 顺序输出值，字段名与类型由服务端回填，输出 token 更少
+    - **max_cost**: 模型路由约束，单次调用最高预估成本（美元，可选）
+    - **latency_slo**: 模型路由约束，延迟 SLO（秒，可选）
     
     ### 返回
     包含提取数据的JSON响应
@@ -96,7 +131,8 @@ async def extract(
                 )
         
             # 如果上传了文件，读取其内容
-            file_bytes = await file.read()
+            with stage("read_upload"):
+                file_bytes = await file.read()
             upload_filename = file.filename
     
             # 尝试解码为文本，如果失败则保留原始字节
@@ -122,30 +158,20 @@ async def extract(
                     },
                 )
             upload_filename = ""
-            file_bytes = url
+            file_content = url
         else:
             raise ValueError("source 应为 file 或 minio")
 
-        # 解析 schema（优先 JSON，其次 TOON）
-        schema_fields: List[SchemaField]
-        parse_error_detail = None
-        try:
-            schema_list = json.loads(schema_str)
-            if not isinstance(schema_list, list):
-                raise ValueError("schema 必须是数组")
-            schema_fields = [SchemaField(**item) for item in schema_list]
-        except Exception as json_err:
-            parse_error_detail = str(json_err)
-            # 尝试 TOON
+        # 解析 schema：优先使用已注册的 schema_id，否则解析 JSON/TOON（复用编译缓存）
+        if schema_id:
+            with stage("schema"):
+                compiled_schema = (await schema_registry.get_async(schema_id, schema_version)).compiled
+        elif schema_str:
             try:
-                toon_text = extract_toon_block(schema_str)
-                parsed = toon_decode(toon_text)
-                schema_dicts = extract_schema_list(parsed)
-                if not schema_dicts:
-                    raise ValueError("无法从 TOON 中解析到字段定义列表")
-                schema_fields = [SchemaField(**item) for item in schema_dicts]
-            except Exception as toon_err:
-                logger.error(f"Schema 解析失败 - JSON: {parse_error_detail}; TOON: {toon_err}")
+                with stage("schema"):
+                    compiled_schema = compile_schema(schema_str)
+            except ValueError as schema_err:
+                logger.error(f"Schema 解析失败 - {schema_err}")
                 raise HTTPException(
                     status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                     detail={
@@ -153,27 +179,58 @@ async def extract(
                         "message": "Schema 格式无效，请提供 JSON 数组或 TOON 表格（values[N]{name,field,type,required}:）",
                     },
                 )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "code": "INVALID_INPUT",
+                    "message": "必须提供 schema 或 schema_id 参数",
+                },
+            )
+        
+        if output_format and output_format not in ("table", "positional"):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "code": "INVALID_INPUT",
+                    "message": f"不支持的输出格式: {output_format}",
+                },
+            )
+        
+        for name, value in (("max_cost", max_cost), ("latency_slo", latency_slo)):
+            if value is not None and value <= 0:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail={
+                        "code": "INVALID_INPUT",
+                        "message": f"{name} 必须大于 0",
+                    },
+                )
         
         # 创建请求对象
         request = ExtractRequest(
             source=source,  # type: ignore
             file=file_content,  # type: ignore
-            schema=schema_fields,
+            schema=compiled_schema.fields,
             provider=provider,  # type: ignore
             model=model,
             filename=upload_filename,
+            output_format=output_format,  # type: ignore
+            max_cost=max_cost,
+            latency_slo=latency_slo,
         )
         
-        # 调用服务执行提取
-        extracted_data = await extract_service.extract(request)
+        # 调用服务执行提取（同时收集模型路由等处理元数据）
+        with collect_metadata() as metadata:
+            data_json = await extract_service.extract_json(request)
         
-        # 返回成功响应
-        return ExtractResponse(
-            data=extracted_data,
-            code="200",
-            message="Success",
-        )
+        # 返回成功响应：提取值已在转换时校验，直接拼接序列化结果，不再经过响应模型
+        with stage("serialize"):
+            body = extract_response_body(data_json, metadata)
+        return Response(content=body, media_type="application/json")
         
+    except HTTPException:
+        raise
     except AppException as e:
         logger.warning(f"应用异常: {e.code} - {e.message}")
         raise HTTPException(
@@ -215,9 +272,7 @@ async def convert_schema_to_toon(
                 schema_list = json.loads(schema_str)
             except Exception:
                 # 也支持直接给 TOON，这里先解成 list 再重新规范化为 TOON
-                toon_text = extract_toon_block(schema_str)
-                parsed = toon_decode(toon_text)
-                schema_list = extract_schema_list(parsed)
+                schema_list = decode_schema_table(schema_str)
 
         # 如果不是表单，尝试 JSON Body
         if schema_list is None:
@@ -252,3 +307,323 @@ async def convert_schema_to_toon(
                 "message": f"Schema 转换失败: {e}",
             },
         )
+
+
+def _registered_response(registered) -> SchemaRegisterResponse:
+    return SchemaRegisterResponse(
+        schema_id=registered.schema_id,
+        version=registered.version,
+        name=registered.name,
+        hash=registered.compiled.canonical_hash,
+        fields=registered.compiled.fields,
+    )
+
+
+@router.post(
+    "/schemas",
+    response_model=SchemaRegisterResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "Schema 无效"},
+    },
+    summary="注册 Schema",
+    description=(
+        "注册 schema（JSON 数组或 TOON 表格）并返回 schema_id 与版本号。"
+        "指定已有 schema_id 且内容变化时生成新版本；内容不变时返回已有版本。"
+    ),
+)
+async def register_schema(
+    request: Request,
+    schema_str: Optional[str] = Form(None, alias="schema"),
+    schema_id: Optional[str] = Form(None),
+    name: Optional[str] = Form(None),
+) -> SchemaRegisterResponse:
+    try:
+        # 支持 JSON Body：{"schema": [...], "schema_id": "...", "name": "..."}
+        if schema_str is None:
+            try:
+                body = await request.json()
+            except Exception:
+                body = None
+            if isinstance(body, dict):
+                candidate = body.get("schema")
+                if isinstance(candidate, list):
+                    schema_str = json.dumps(candidate, ensure_ascii=False)
+                elif isinstance(candidate, str):
+                    schema_str = candidate
+                schema_id = schema_id or body.get("schema_id")
+                name = name or body.get("name")
+
+        if not schema_str:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={
+                    "code": "INVALID_SCHEMA",
+                    "message": "请提供 schema（表单字段或 JSON Body），JSON 数组或 TOON 表格均可",
+                },
+            )
+
+        registered = await asyncio.to_thread(schema_registry.register_text, schema_str, schema_id=schema_id, name=name)
+        return _registered_response(registered)
+
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+@router.get(
+    "/schemas/{schema_id}",
+    response_model=SchemaRegisterResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "Schema 不存在"},
+    },
+    summary="查询已注册的 Schema",
+)
+async def get_schema(schema_id: str, version: Optional[int] = None) -> SchemaRegisterResponse:
+    try:
+        return _registered_response(await schema_registry.get_async(schema_id, version))
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+async def _job_response(job) -> BulkJobResponse:
+    counts = await asyncio.to_thread(bulk_service.store.counts, job.job_id)
+    return BulkJobResponse(
+        job_id=job.job_id,
+        provider=job.provider,
+        model=job.model,
+        status=job.status,
+        batch_id=job.batch_id,
+        error=job.error,
+        counts=counts,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
+
+
+@router.post(
+    "/bulk/jobs",
+    response_model=BulkJobResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "请求无效或提供商不支持批量接口"},
+        404: {"model": ErrorResponse, "description": "Schema 不存在"},
+    },
+    summary="创建离线批量提取任务",
+    description=(
+        "将文档打包为提供商的批量任务（OpenAI/Azure 批量文件、Anthropic Message Batches）离线执行，"
+        "价格更低且不占用实时接口的配额。任务在后台提交与轮询，通过 /bulk/jobs/{job_id} 查询进度。"
+    ),
+)
+async def create_bulk_job(request: BulkJobRequest) -> BulkJobResponse:
+    try:
+        fields = request.fields
+        if not fields and request.schema_id:
+            fields = (await schema_registry.get_async(request.schema_id, request.schema_version)).compiled.fields
+        documents = [
+            (document.id or str(index), document.text)
+            for index, document in enumerate(request.documents)
+        ]
+        # 写入上万份文档的 SQLite 事务放到线程中
+        job = await asyncio.to_thread(
+            bulk_service.create_job, request.provider, request.model, fields or [], documents, request.output_format
+        )
+        bulk_service.start(job.job_id)
+        return await _job_response(job)
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+@router.get(
+    "/bulk/jobs/{job_id}",
+    response_model=BulkJobResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "任务不存在"},
+    },
+    summary="查询批量任务状态",
+)
+async def get_bulk_job(job_id: str) -> BulkJobResponse:
+    try:
+        return await _job_response(await asyncio.to_thread(bulk_service.store.get_job, job_id))
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+@router.get(
+    "/bulk/jobs/{job_id}/results",
+    response_model=BulkResultsResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "任务不存在"},
+    },
+    summary="查询批量任务结果",
+)
+async def get_bulk_results(job_id: str, offset: int = 0, limit: int = 1000) -> BulkResultsResponse:
+    try:
+        job = await asyncio.to_thread(bulk_service.store.get_job, job_id)
+        items = await asyncio.to_thread(
+            bulk_service.store.items, job_id, max(0, offset), min(max(1, limit), 10000)
+        )
+        return BulkResultsResponse(
+            job_id=job_id,
+            status=job.status,
+            items=[
+                BulkItemResult(id=item.document_id, status=item.status, data=item.values, error=item.error)
+                for item in items
+            ],
+        )
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+@router.get(
+    "/bulk/jobs/{job_id}/export",
+    responses={
+        200: {
+            "content": {content_type: {} for content_type, _ in EXPORT_FORMATS.values()},
+            "description": "每份文档一行、每个字段一列的表格",
+        },
+        400: {"model": ErrorResponse, "description": "格式不支持"},
+        404: {"model": ErrorResponse, "description": "任务不存在"},
+    },
+    summary="导出批量任务结果（列式）",
+    description=(
+        "以 Arrow IPC 流（arrow）、Parquet（parquet）或 TOON 表格（toon）流式导出任务结果："
+        "每份文档一行，前三列为 _id/_status/_error，其后每个 schema 字段一列，列类型由字段类型决定。"
+    ),
+)
+async def export_bulk_results(job_id: str, format: str = "arrow") -> StreamingResponse:
+    try:
+        chunks = await asyncio.to_thread(bulk_service.export, job_id, format)
+        content_type, extension = EXPORT_FORMATS[format]
+        return StreamingResponse(
+            chunks,
+            media_type=content_type,
+            headers={"Content-Disposition": f'attachment; filename="{job_id}{extension}"'},
+        )
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+@router.post(
+    "/bulk/jobs/{job_id}/export",
+    response_model=BulkExportResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "格式不支持"},
+        404: {"model": ErrorResponse, "description": "任务不存在"},
+        500: {"model": ErrorResponse, "description": "写入 MinIO 失败"},
+    },
+    summary="导出批量任务结果到 MinIO",
+    description="按指定格式（默认 Parquet）导出任务结果并写入 MinIO，返回写入的对象。",
+)
+async def export_bulk_results_to_minio(job_id: str, request: BulkExportRequest) -> BulkExportResponse:
+    try:
+        written = await bulk_service.export_to_minio(job_id, request.url, request.format)
+        return BulkExportResponse(job_id=job_id, format=request.format, **written)
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+def _ingest_response(run) -> IngestRunResponse:
+    return IngestRunResponse(
+        run_id=run.run_id,
+        name=run.name,
+        status=run.status,
+        error=run.error,
+        report=run.report,
+        created_at=run.created_at,
+        updated_at=run.updated_at,
+    )
+
+
+@router.post(
+    "/ingest/runs",
+    response_model=IngestRunResponse,
+    responses={
+        400: {"model": ErrorResponse, "description": "请求无效"},
+        404: {"model": ErrorResponse, "description": "Schema 不存在"},
+    },
+    summary="MinIO 前缀批量导入",
+    description=(
+        "列出存储桶前缀下的对象，按扩展名、大小与修改时间过滤后以有限并发逐个提取，"
+        "按对象名与 ETag 记录检查点：同名导入重跑时跳过已完成且未变化的对象。"
+        "导入在后台执行，通过 /ingest/runs/{run_id} 查询进度与汇总报告。"
+    ),
+)
+async def create_ingest_run(request: IngestRequest) -> IngestRunResponse:
+    try:
+        fields = request.fields
+        if not fields and request.schema_id:
+            fields = (await schema_registry.get_async(request.schema_id, request.schema_version)).compiled.fields
+        run = await asyncio.to_thread(ingest_service.create_run, request, fields or [])
+        ingest_service.start(run.run_id)
+        return _ingest_response(run)
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+@router.get(
+    "/ingest/runs/{run_id}",
+    response_model=IngestRunResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "导入任务不存在"},
+    },
+    summary="查询批量导入状态",
+)
+async def get_ingest_run(run_id: str) -> IngestRunResponse:
+    try:
+        return _ingest_response(await asyncio.to_thread(ingest_service.store.get_run, run_id))
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
+
+
+@router.get(
+    "/ingest/runs/{run_id}/results",
+    response_model=IngestResultsResponse,
+    responses={
+        404: {"model": ErrorResponse, "description": "导入任务不存在"},
+    },
+    summary="查询批量导入结果",
+)
+async def get_ingest_results(run_id: str, offset: int = 0, limit: int = 1000) -> IngestResultsResponse:
+    try:
+        run = await asyncio.to_thread(ingest_service.store.get_run, run_id)
+        objects = await asyncio.to_thread(
+            ingest_service.store.objects, run_id, offset=max(0, offset), limit=min(max(1, limit), 10000)
+        )
+        return IngestResultsResponse(
+            run_id=run_id,
+            status=run.status,
+            items=[
+                BulkItemResult(id=url, status=item_status, data=values, error=error)
+                for url, item_status, values, error in objects
+            ],
+        )
+    except AppException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"code": e.code, "message": e.message},
+        )
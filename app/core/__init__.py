@@ -7,7 +7,12 @@ from .exceptions import (
     MinIOException,
     FileProcessingException,
     LLMException,
+    CircuitOpenException,
+    ConcurrencyLimitException,
+    RateLimitException,
     ValidationException,
+    SchemaNotFoundException,
+    JobNotFoundException,
 )
 
 __all__ = [
@@ -16,5 +21,10 @@ __all__ = [
     "MinIOException",
     "FileProcessingException",
     "LLMException",
+    "CircuitOpenException",
+    "ConcurrencyLimitException",
+    "RateLimitException",
     "ValidationException",
+    "SchemaNotFoundException",
+    "JobNotFoundException",
 ]
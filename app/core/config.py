@@ -1,8 +1,10 @@
 """
 应用配置文件
 """
+import os
+import tempfile
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 
 class Settings(BaseSettings):
@@ -40,6 +42,106 @@ class Settings(BaseSettings):
     CUSTOM_API_KEY: Optional[str] = None
     CUSTOM_MODEL: str = "gpt-3.5-turbo"
     
+    # Prompt 布局（legacy|prefix_cache），prefix_cache 将 schema 等静态部分置于文档内容之前
+    PROMPT_LAYOUT: str = "legacy"
+    
+    # 响应修复：TOON 解析失败时本地修复，仍缺失的字段针对性重新询问模型
+    LLM_REPAIR_ENABLED: bool = True
+    LLM_REPAIR_REQUERY: bool = True
+    
+    # 输出格式（table|positional），positional 仅按 schema 顺序输出值以减少输出 token
+    LLM_OUTPUT_FORMAT: str = "table"
+    # 按提供商覆盖输出格式，如 {"claude": "positional"}
+    LLM_OUTPUT_FORMAT_OVERRIDES: Dict[str, str] = {}
+    
+    # 重试：限流/超时/5xx/连接失败按全抖动指数退避重试，遵循 Retry-After
+    LLM_RETRY_MAX_ATTEMPTS: int = 3  # 单次调用的最大尝试次数（含首次）
+    LLM_RETRY_BASE_DELAY: float = 0.5  # 退避基数（秒）
+    LLM_RETRY_MAX_DELAY: float = 8.0  # 单次退避上限（秒）
+    LLM_RETRY_BUDGET: int = 4  # 单个请求内所有调用共享的重试次数
+    LLM_REQUEST_TIMEOUT: float = 120.0  # 单个请求的截止时间（秒），0 表示不限
+    
+    # 对冲请求：首个请求超过延迟分位数未返回时发出备份请求，先得到有效结果者胜出
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0  # 触发对冲的延迟分位
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # 延迟样本不足时不对冲
+    LLM_HEDGE_BUDGET_PERCENT: float = 5.0  # 对冲请求占请求总数的上限（%）
+    # 按提供商指定对冲目标，如 {"openai": "azure"} 或 {"openai": "claude:claude-3-5-haiku-latest"}；
+    # 未配置时向同一提供商重发
+    LLM_HEDGE_BACKUPS: Dict[str, str] = {}
+    
+    # 规则预提取：调用 LLM 前按字段的 pattern / matcher 用正则识别高置信度字段，其余字段再交给 LLM
+    RULES_ENABLED: bool = True
+    RULES_INFER: bool = False  # 未声明规则的字段按类型与名称推断内置匹配器（身份证号、电话、日期等）
+    RULES_LABEL_WINDOW: int = 12  # 日期、金额等须紧跟字段名，二者之间最多间隔的字符数
+    
+    # 字段分组：宽 schema 按组（group 标签或大小）针对同一文档并发提取，文档内容作为共享前缀
+    LLM_FIELD_GROUP_SIZE: int = 0  # 每组最多字段数，0 表示仅按 group 标签分组
+    LLM_FIELD_GROUP_PARALLELISM: int = 4  # 同一请求内并发提取的组数
+    LLM_FIELD_GROUP_WARM_CACHE: bool = False  # 先单独提取第一组写入提供商缓存，再并发提取其余组
+    
+    # 微批处理：同一提供商、模型与 schema 的短文本请求在窗口内合并为一次调用
+    LLM_BATCH_ENABLED: bool = False
+    LLM_BATCH_WINDOW_MS: float = 20.0  # 收集窗口（毫秒）
+    LLM_BATCH_MAX_DOCS: int = 8  # 每批最多文档数，凑满立即发送
+    LLM_BATCH_MAX_CHARS: int = 2000  # 仅合并不超过该长度的文本文档（含图像的请求不合并）
+    
+    # 故障转移链：请求的提供商失败或熔断时依次尝试，如 {"azure": ["openai", "custom:qwen-plus"]}
+    LLM_FAILOVER_CHAINS: Dict[str, List[str]] = {}
+    
+    # 熔断器（按提供商+模型）：最近调用的失败率或慢调用率超过阈值时打开，短路到下一个提供商
+    LLM_CIRCUIT_ENABLED: bool = True
+    LLM_CIRCUIT_WINDOW: int = 20  # 统计最近多少次调用
+    LLM_CIRCUIT_MIN_REQUESTS: int = 5  # 少于该调用数不判定
+    LLM_CIRCUIT_FAILURE_RATE: float = 0.5
+    LLM_CIRCUIT_SLOW_CALL_SECONDS: float = 30.0
+    LLM_CIRCUIT_SLOW_CALL_RATE: float = 0.8
+    LLM_CIRCUIT_OPEN_SECONDS: float = 30.0  # 打开后多久进入半开状态
+    LLM_CIRCUIT_HALF_OPEN_PROBES: int = 1  # 半开状态放行的探测请求数
+    
+    # 自适应并发限制（按提供商+模型，AIMD）：成功时加性增大上限，限流/超时/延迟升高时乘性减小
+    LLM_LIMITER_ENABLED: bool = True
+    LLM_LIMITER_INITIAL: int = 16
+    LLM_LIMITER_MIN: int = 1
+    LLM_LIMITER_MAX: int = 256
+    LLM_LIMITER_BACKOFF_RATIO: float = 0.5  # 乘性减小的比例
+    LLM_LIMITER_LATENCY_TOLERANCE: float = 2.0  # 短期平均延迟超过长期平均的倍数视为拥塞
+    LLM_LIMITER_QUEUE_TIMEOUT: float = 30.0  # 排队超时（秒），同时受请求截止时间约束
+    
+    # 提供商配额（按提供商+模型/部署+密钥），如 {"azure": {"rpm": 300, "tpm": 60000}, "openai:gpt-4o": {"tpm": 30000}}
+    LLM_RATE_LIMITS: Dict[str, Dict[str, float]] = {}
+    LLM_RATE_LIMIT_BACKEND: str = "file"  # memory|file|redis
+    LLM_RATE_LIMIT_FILE: str = os.path.join(tempfile.gettempdir(), "llm-rate-limit.json")
+    LLM_RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    LLM_RATE_LIMIT_WINDOW: float = 10.0  # 计数窗口（秒），配额按窗口长度折算
+    LLM_RATE_LIMIT_MAX_WAIT: float = 30.0  # 等待配额的最长时间（秒），同时受请求截止时间约束
+    LLM_RATE_LIMIT_OUTPUT_TOKENS: int = 512  # 预估每次调用的输出 token 数
+    
+    # 模型路由（provider=auto / model=auto）
+    LLM_ROUTER_PROVIDERS: List[str] = []  # 参与路由的提供商，为空表示所有已配置的提供商
+    LLM_ROUTER_MODELS: Dict[str, List[str]] = {}  # 各提供商参与路由的模型白名单（custom 默认仅 CUSTOM_MODEL）
+    LLM_ROUTER_LATENCY_WEIGHT: float = 0.0001  # 每秒延迟折算的成本（美元）
+    LLM_ROUTER_DEFAULT_LATENCY: float = 10.0  # 无延迟样本时的假定延迟（秒）
+    LLM_ROUTER_LONG_CONTEXT_TOKENS: int = 32000  # 未声明 max_tokens 的模型超过该长度需 long_context 能力
+    
+    # 离线批量提取（提供商批量接口）
+    BULK_JOB_STORE_PATH: str = "data/bulk_jobs.db"  # 批量任务 SQLite 文件
+    BULK_POLL_INTERVAL: float = 60.0  # 轮询提供商批量任务状态的间隔（秒）
+    BULK_LEASE_SECONDS: float = 300.0  # 任务租约时长（秒），持有者失联超过该时长后由其他 worker 接管
+    BULK_MAX_DOCUMENTS: int = 50000  # 单个批量任务的文档数上限
+    BULK_BATCH_MAX_REQUESTS: int = 50000  # 单个提供商批量任务的请求数上限，超过时拆为多批提交
+    BULK_BATCH_MAX_BYTES: int = 190 * 1024 * 1024  # 单个提供商批量任务的输入大小上限（OpenAI 输入文件上限 200 MB）
+    BULK_RESUME_ON_STARTUP: bool = True  # 启动时继续未结束的批量任务
+    EXPORT_BATCH_ROWS: int = 10000  # 列式导出每批读取与编码的行数（Arrow record batch / Parquet row group）
+    
+    # MinIO 前缀批量导入（检查点按对象名 + ETag 记录，重跑时跳过已完成且未变化的对象）
+    INGEST_STORE_PATH: str = "data/ingest.db"  # 检查点 SQLite 文件
+    INGEST_CONCURRENCY: int = 4  # 同时处理的对象数
+    INGEST_LIST_PAGE_SIZE: int = 1000  # 每次列出的对象数
+    INGEST_LEASE_SECONDS: float = 300.0  # 运行租约时长（秒），执行进程退出超过该时长后运行标记为失败
+    INGEST_REPORT_DIR: str = "data/ingest_reports"  # 未指定 report_url 时汇总报告写入的目录
+    INGEST_REPORT_MAX_FAILURES: int = 100  # 汇总报告中列出的失败对象数上限
+    
     # MinIO配置
     MINIO_ENDPOINT: str = "localhost:9000"
     MINIO_ACCESS_KEY: Optional[str] = None
@@ -52,6 +154,62 @@ class Settings(BaseSettings):
         "pdf", "docx", "doc", "txt", "xlsx", "xls", "pptx", "ppt"
     ]
     
+    # 编译后 schema 的 LRU 缓存容量
+    SCHEMA_CACHE_SIZE: int = 256
+    # Schema 注册中心 SQLite 文件
+    SCHEMA_REGISTRY_PATH: str = "data/schemas.db"
+    # 未指定版本时"最新版本"的缓存时长（秒）：其他 worker 注册的新版本最多延迟这么久可见
+    SCHEMA_LATEST_TTL: float = 5.0
+    
+    # 预热配置（gunicorn preload 时在 master 中 fork 之前执行）
+    WARMUP_ENABLED: bool = True
+    WARMUP_PROVIDERS: List[str] = []  # 为空时仅预热 LLM_PROVIDER
+    WARMUP_FILE_TYPES: List[str] = ["txt", "pdf", "docx", "xlsx", "pptx"]
+    
+    # 请求级性能分析配置
+    PROFILE_ENABLED: bool = False  # 总开关，关闭时不做任何采样
+    PROFILE_ADMIN_TOKEN: Optional[str] = None  # 请求头 X-Profile-Token 需与之匹配
+    PROFILE_SAMPLE_RATE: float = 0.0  # 随机抽样比例（0~1）
+    PROFILE_INTERVAL_MS: float = 5.0  # 采样间隔（毫秒）
+    PROFILE_DIR: str = "/tmp/llm-doc-parser/profiles"
+    PROFILE_MAX_FILES: int = 50  # 最多保留的分析结果份数
+    
+    # 合并进行中的相同提取请求（文档内容 + schema + 提供商 + 模型相同）
+    COALESCE_ENABLED: bool = True
+    COALESCE_CROSS_WORKER: bool = False  # 通过认领文件在同一主机的 worker 间合并
+    COALESCE_DIR: str = os.path.join(tempfile.gettempdir(), "extract-coalesce")
+    COALESCE_CLAIM_TIMEOUT: float = 300.0  # 认领超过该时长（秒）视为失效
+    
+    # 解析缓存与结果缓存的存储：memory（每个 worker 一份）| file（CACHE_DIR 下，同一主机的 worker 共享）
+    CACHE_BACKEND: str = "file"
+    CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "extract-cache")
+    
+    # 提取结果缓存（与合并键相同：文档内容 + schema + 提供商 + 模型），缓存序列化后的 JSON 字节
+    RESULT_CACHE_ENABLED: bool = False
+    RESULT_CACHE_SIZE: int = 1024  # 最多缓存的结果份数
+    RESULT_CACHE_TTL: float = 600.0  # 缓存有效期（秒）
+    
+    # 文本解析缓存（文档内容哈希 + 扩展名 + 文件名），保存解析出的文本
+    PARSE_CACHE_ENABLED: bool = False
+    PARSE_CACHE_SIZE: int = 256  # 最多缓存的文档数
+    PARSE_CACHE_TTL: float = 3600.0  # 缓存有效期（秒）
+    
+    # 事件驱动预处理：收到新对象事件后提前下载、解析（可选按已注册 schema 提取），预热解析与结果缓存
+    PREPROCESS_ENABLED: bool = False
+    PREPROCESS_SOURCE: str = "minio"  # 事件来源：minio（存储桶通知）| queue（本地事件目录）
+    PREPROCESS_BUCKET: Optional[str] = None  # 订阅通知的存储桶（minio 来源）
+    PREPROCESS_PREFIX: str = ""  # 只处理此前缀下的对象
+    PREPROCESS_SUFFIXES: List[str] = []  # 只处理这些扩展名（如 ["pdf", "docx"]），为空时不限
+    PREPROCESS_QUEUE_DIR: str = "data/preprocess_events"  # 本地事件目录（queue 来源，每个文件一条 S3 通知 JSON）
+    PREPROCESS_POLL_INTERVAL: float = 1.0  # 本地事件目录轮询间隔（秒），也是其他 worker 尝试接管预处理的间隔
+    PREPROCESS_LOCK_PATH: str = "data/preprocess.lock"  # 文件锁，同一主机上只有持有者执行预处理
+    PREPROCESS_CONCURRENCY: int = 2  # 同时预处理的对象数
+    PREPROCESS_MAX_BACKLOG: int = 100  # 等待预处理的对象数上限，超出时丢弃通知（queue 来源暂停读取）
+    PREPROCESS_DEDUPE_SIZE: int = 10000  # 记录已处理 ETag 的对象数
+    PREPROCESS_SCHEMAS: List[str] = []  # 预提取使用的已注册 schema（"schema_id" 或 "schema_id:version"），需开启结果缓存
+    PREPROCESS_PROVIDER: str = "openai"  # 预提取使用的提供商（须与客户端请求一致才能命中结果缓存）
+    PREPROCESS_MODEL: Optional[str] = None  # 预提取使用的模型
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,84 @@
+"""
+请求级截止时间与重试预算
+
+一次 /extract 请求内的所有模型调用（含重试、修复后的重新询问）共享同一截止时间
+与重试次数预算，通过 ContextVar 在调用链中传递，无需逐层透传参数。
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_current_budget: ContextVar[Optional["RequestBudget"]] = ContextVar(
+    "request_budget", default=None
+)
+
+
+class RequestBudget:
+    """请求的截止时间（monotonic）与剩余重试次数"""
+
+    __slots__ = ("deadline", "retries_left")
+
+    def __init__(self, deadline: Optional[float], retries_left: Optional[int]):
+        self.deadline = deadline
+        self.retries_left = retries_left
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的秒数（无截止时间时为 None）"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def take_retry(self) -> bool:
+        """消耗一次重试预算，预算用尽时返回 False"""
+        if self.retries_left is None:
+            return True
+        if self.retries_left <= 0:
+            return False
+        self.retries_left -= 1
+        return True
+
+
+@contextmanager
+def request_budget(
+    timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+) -> Iterator[RequestBudget]:
+    """
+    设置当前请求的截止时间与重试预算
+
+    嵌套使用时截止时间取更早者，重试预算取更小者。
+
+    Args:
+        timeout: 超时时间（秒），为空或 <= 0 表示不限
+        retries: 重试次数预算，为空表示不限
+    """
+    outer = _current_budget.get()
+    deadline = time.monotonic() + timeout if timeout and timeout > 0 else None
+    if outer is not None:
+        if outer.deadline is not None:
+            deadline = outer.deadline if deadline is None else min(deadline, outer.deadline)
+        if outer.retries_left is not None:
+            retries = outer.retries_left if retries is None else min(retries, outer.retries_left)
+
+    budget = RequestBudget(deadline, retries)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def current_budget() -> Optional[RequestBudget]:
+    """当前请求的预算（未设置时为 None）"""
+    return _current_budget.get()
+
+
+def remaining_time() -> Optional[float]:
+    """当前请求距截止时间的秒数（未设置截止时间时为 None）"""
+    budget = _current_budget.get()
+    return budget.remaining() if budget is not None else None
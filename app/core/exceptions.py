@@ -30,7 +30,37 @@ class LLMException(AppException):
         super().__init__("LLM_ERROR", message, 500)
 
 
+class CircuitOpenException(LLMException):
+    """熔断器打开，调用被短路"""
+    def __init__(self, message: str):
+        AppException.__init__(self, "LLM_CIRCUIT_OPEN", message, 503)
+
+
+class ConcurrencyLimitException(LLMException):
+    """并发已达上限，排队超时"""
+    def __init__(self, message: str):
+        AppException.__init__(self, "LLM_CONCURRENCY_LIMIT", message, 503)
+
+
+class RateLimitException(LLMException):
+    """提供商配额（RPM/TPM）在可等待的时间内不足"""
+    def __init__(self, message: str):
+        AppException.__init__(self, "LLM_RATE_LIMITED", message, 429)
+
+
 class ValidationException(AppException):
     """验证异常"""
     def __init__(self, message: str):
         super().__init__("VALIDATION_ERROR", message, 400)
+
+
+class SchemaNotFoundException(AppException):
+    """Schema 不存在异常"""
+    def __init__(self, message: str):
+        super().__init__("SCHEMA_NOT_FOUND", message, 404)
+
+
+class JobNotFoundException(AppException):
+    """批量任务不存在异常"""
+    def __init__(self, message: str):
+        super().__init__("JOB_NOT_FOUND", message, 404)
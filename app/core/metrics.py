@@ -0,0 +1,123 @@
+"""
+进程内指标
+
+提供计数器、仪表与汇总（count/sum）三类指标，可导出为 Prometheus 文本格式。
+指标按进程统计，多 worker 部署时由采集端按实例聚合。
+"""
+import threading
+from typing import Dict, List, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器累加"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """设置仪表值"""
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """记录一次观测值（累计次数与总和）"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            stat = series.get(key)
+            if stat is None:
+                series[key] = [1, value]
+            else:
+                stat[0] += 1
+                stat[1] += value
+
+    def get(self, name: str, **labels) -> float:
+        """读取计数器或仪表的当前值（不存在时为 0）"""
+        key = _label_key(labels)
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name].get(key, 0)
+            if name in self._gauges:
+                return self._gauges[name].get(key, 0)
+            if name in self._summaries:
+                stat = self._summaries[name].get(key)
+                return stat[0] if stat else 0
+        return 0
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """以字典形式导出全部指标"""
+        with self._lock:
+            return {
+                "counters": {
+                    name: {_format_labels(k): v for k, v in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "gauges": {
+                    name: {_format_labels(k): v for k, v in series.items()}
+                    for name, series in self._gauges.items()
+                },
+                "summaries": {
+                    name: {
+                        _format_labels(k): {"count": v[0], "sum": v[1]}
+                        for k, v in series.items()
+                    }
+                    for name, series in self._summaries.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._summaries.items()):
+                lines.append(f"# TYPE {name} summary")
+                for key, (count, total) in series.items():
+                    labels = _format_labels(key)
+                    lines.append(f"{name}_count{labels} {count}")
+                    lines.append(f"{name}_sum{labels} {total}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """清空全部指标"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+metrics = MetricsRegistry()
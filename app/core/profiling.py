@@ -0,0 +1,238 @@
+"""
+按请求开启的采样性能分析
+
+通过管理员请求头或采样率对单个 /extract 请求启用采样分析器，
+将 speedscope 格式的火焰图与分阶段耗时汇总写入配置目录。
+未启用时仅有一次 ContextVar 读取的开销。
+"""
+import asyncio
+import hmac
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 请求头：携带管理员令牌即强制对本次请求进行分析
+PROFILE_HEADER = "X-Profile-Token"
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar(
+    "profile_session", default=None
+)
+
+
+class SamplingProfiler:
+    """基于 sys._current_frames 的采样分析器，在后台线程中周期性采集目标线程调用栈"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Dict[Tuple[Tuple[str, str, int], ...], int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            key = tuple(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+    def to_speedscope(self, name: str) -> dict:
+        """导出为 speedscope 的 sampled profile 格式"""
+        frames: List[dict] = []
+        frame_index: Dict[Tuple[str, str, int], int] = {}
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        unit_ms = self.interval * 1000
+
+        for stack, count in self.samples.items():
+            indices = []
+            for key in stack:
+                idx = frame_index.get(key)
+                if idx is None:
+                    idx = len(frames)
+                    frame_index[key] = idx
+                    frames.append({"name": key[0], "file": key[1], "line": key[2]})
+                indices.append(idx)
+            samples.append(indices)
+            weights.append(count * unit_ms)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "llm-doc-parser",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+
+class ProfileSession:
+    """单个请求的分析会话：采样分析器 + 分阶段计时"""
+
+    def __init__(self, label: str, interval: float):
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.label = label
+        self.stages: List[dict] = []
+        self._started = time.perf_counter()
+        self._elapsed = 0.0
+        self._profiler = SamplingProfiler(threading.get_ident(), interval)
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._profiler.start()
+
+    def stop(self) -> None:
+        self._elapsed = time.perf_counter() - self._started
+        self._profiler.stop()
+
+    def record_stage(self, name: str, started: float, duration: float) -> None:
+        self.stages.append({
+            "stage": name,
+            "start_ms": round((started - self._started) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        })
+
+    def summary(self) -> dict:
+        """分阶段耗时汇总"""
+        totals: Dict[str, float] = {}
+        for item in self.stages:
+            totals[item["stage"]] = totals.get(item["stage"], 0.0) + item["duration_ms"]
+        return {
+            "profile_id": self.profile_id,
+            "label": self.label,
+            "total_ms": round(self._elapsed * 1000, 3),
+            "samples": sum(self._profiler.samples.values()),
+            "stage_totals_ms": {k: round(v, 3) for k, v in totals.items()},
+            "stages": self.stages,
+        }
+
+    def write(self, directory: str, max_files: int) -> Path:
+        """写入 speedscope 文件与阶段汇总，并清理超出保留数量的旧文件"""
+        out_dir = Path(directory)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        profile_path = out_dir / f"{self.profile_id}.speedscope.json"
+        summary_path = out_dir / f"{self.profile_id}.stages.json"
+        profile_path.write_text(
+            json.dumps(self._profiler.to_speedscope(self.label)), encoding="utf-8"
+        )
+        summary_path.write_text(
+            json.dumps(self.summary(), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+        _enforce_retention(out_dir, max_files)
+        return profile_path
+
+
+def _enforce_retention(directory: Path, max_files: int) -> None:
+    """按修改时间仅保留最近 max_files 份分析结果"""
+    profiles = sorted(
+        directory.glob("*.speedscope.json"),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for stale in profiles[max(max_files, 0):]:
+        profile_id = stale.name[: -len(".speedscope.json")]
+        for path in (stale, directory / f"{profile_id}.stages.json"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        logger.debug(f"已清理过期分析文件: {profile_id}")
+
+
+def should_profile(headers) -> bool:
+    """
+    判断当前请求是否需要进行性能分析
+
+    Args:
+        headers: 请求头（支持 .get 的映射）
+
+    Returns:
+        是否开启分析
+    """
+    if not settings.PROFILE_ENABLED:
+        return False
+
+    token = headers.get(PROFILE_HEADER)
+    if token and settings.PROFILE_ADMIN_TOKEN:
+        return hmac.compare_digest(token, settings.PROFILE_ADMIN_TOKEN)
+
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def start_session(label: str) -> ProfileSession:
+    """创建并启动分析会话，绑定到当前上下文"""
+    session = ProfileSession(label, settings.PROFILE_INTERVAL_MS / 1000)
+    session.start()
+    _current_session.set(session)
+    return session
+
+
+async def finish_session(session: ProfileSession) -> Path:
+    """停止分析会话并在线程池中写入文件"""
+    session.stop()
+    if _current_session.get() is session:
+        _current_session.set(None)
+    path = await asyncio.to_thread(
+        session.write, settings.PROFILE_DIR, settings.PROFILE_MAX_FILES
+    )
+    logger.info(f"请求分析已写入: {path}")
+    return path
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    记录一个处理阶段的耗时；未开启分析时不做任何事
+
+    Args:
+        name: 阶段名称
+    """
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        session.record_stage(name, started, time.perf_counter() - started)
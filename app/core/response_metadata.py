@@ -0,0 +1,38 @@
+"""
+响应元数据
+
+请求处理链中的各环节（如模型路由）通过 ContextVar 写入需要返回给调用方的元数据，
+由路由层统一放入响应，无需逐层透传返回值。未在收集范围内时写入为空操作。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+_current_metadata: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "response_metadata", default=None
+)
+
+
+@contextmanager
+def collect_metadata() -> Iterator[Dict[str, Any]]:
+    """在当前上下文中收集响应元数据"""
+    metadata: Dict[str, Any] = {}
+    token = _current_metadata.set(metadata)
+    try:
+        yield metadata
+    finally:
+        _current_metadata.reset(token)
+
+
+def set_metadata(key: str, value: Any) -> None:
+    """写入一项响应元数据（不在收集范围内时忽略）"""
+    metadata = _current_metadata.get()
+    if metadata is not None:
+        metadata[key] = value
+
+
+def merge_metadata(items: Mapping[str, Any]) -> None:
+    """合并另一处收集的元数据（例如合并请求时由执行方收集的元数据）"""
+    metadata = _current_metadata.get()
+    if metadata is not None:
+        metadata.update(items)
@@ -0,0 +1,68 @@
+"""
+响应序列化
+
+提取结果中的值在字段转换时已按 schema 校验过一次（见 app.utils.converters），
+响应路径不再经过 Pydantic 响应模型的二次校验与 jsonable_encoder，而是直接将
+提取值序列化为 JSON 字节；data 部分可以整体缓存，命中时只需拼接外层响应。
+
+安装了 orjson 时使用 orjson，否则退回标准库 json（输出等价）。
+"""
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi.responses import JSONResponse
+
+from app.models import ExtractedValue
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """无法直接序列化的值（如 Decimal、集合）"""
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为紧凑的 UTF-8 JSON 字节"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # 超出 64 位的整数等 orjson 不支持的值，交给标准库处理
+            pass
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 dumps 渲染的 JSON 响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def values_json(values: Iterable[ExtractedValue]) -> bytes:
+    """将提取值列表序列化为 JSON 数组（与 ExtractedValue.model_dump 的结构一致）"""
+    return dumps([{"field": v.field, "type": v.type, "value": v.value} for v in values])
+
+
+def extract_response_body(
+    data_json: bytes,
+    metadata: Optional[Dict[str, Any]] = None,
+    code: str = "200",
+    message: str = "Success",
+) -> bytes:
+    """以已序列化的 data 拼接 ExtractResponse 的响应体"""
+    return b"".join((
+        b'{"data":', data_json,
+        b',"code":', dumps(code),
+        b',"message":', dumps(message),
+        b',"metadata":', dumps(metadata or None),
+        b"}",
+    ))
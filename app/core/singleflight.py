@@ -0,0 +1,214 @@
+"""
+合并进行中的相同请求（single-flight）
+
+同一键的并发调用只执行一次，其余调用等待同一结果：
+- 进程内：共享的计算在独立任务中执行，等待方通过 shield 等待，
+  等待方被取消不会取消共享的计算；
+- 跨 worker（可选）：通过认领文件协调，先创建 <key>.claim 的 worker 负责计算并把结果
+  写入 <key>.result，其他 worker 等认领文件消失后读取结果；认领方崩溃（进程不存在或
+  认领超时）时由等待方接管。
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 跨 worker 等待时轮询认领文件的间隔（秒）
+POLL_INTERVAL = 0.05
+# 结果文件的保留时间（秒），过期的由写入方顺带清理
+RESULT_RETENTION = 60.0
+
+
+class FileCoordinator:
+    """
+    基于认领文件的跨 worker 协调
+
+    Args:
+        directory: 认领与结果文件目录（同一主机的 worker 共享）
+        serialize: 结果 -> JSON 可序列化对象
+        deserialize: JSON 对象 -> 结果
+        claim_timeout: 认领超过该时长（秒）视为失效
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        serialize: Callable[[Any], Any],
+        deserialize: Callable[[Any], Any],
+        claim_timeout: float = 300.0,
+    ):
+        self.directory = directory
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.claim_timeout = claim_timeout
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _try_claim(self, claim_path: str) -> bool:
+        try:
+            fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{os.getpid()} {time.time()}")
+        return True
+
+    def _claim_is_stale(self, claim_path: str) -> bool:
+        try:
+            with open(claim_path) as f:
+                pid_text, claimed_at = f.read().split()
+            pid, claimed = int(pid_text), float(claimed_at)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            # 认领方可能尚未写完内容
+            try:
+                return time.time() - os.path.getmtime(claim_path) > self.claim_timeout
+            except OSError:
+                return False
+        if time.time() - claimed > self.claim_timeout:
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def _read_result(self, result_path: str, since: float) -> Optional[Any]:
+        """读取在 since 之后写入的结果（更早的结果不属于本次等待的计算）"""
+        try:
+            with open(result_path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("written_at", 0) < since:
+            return None
+        return payload.get("value")
+
+    def _write_result(self, result_path: str, value: Any) -> None:
+        tmp_path = f"{result_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"written_at": time.time(), "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, result_path)
+        if random.random() < 0.05:
+            self._sweep()
+
+    def _sweep(self) -> None:
+        cutoff = time.time() - RESULT_RETENTION
+        try:
+            for name in os.listdir(self.directory):
+                if name.endswith(".result"):
+                    path = os.path.join(self.directory, name)
+                    if os.path.getmtime(path) < cutoff:
+                        os.unlink(path)
+        except OSError:
+            pass
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        认领成功则执行 fn 并发布结果，否则等待认领方的结果
+
+        Returns:
+            （结果, 是否复用了其他 worker 的结果）
+        """
+        claim_path = self._path(key, "claim")
+        result_path = self._path(key, "result")
+        waiting_since = time.time()
+        while not self._try_claim(claim_path):
+            if self._claim_is_stale(claim_path):
+                logger.warning(f"认领文件已失效，接管计算: {claim_path}")
+                try:
+                    os.unlink(claim_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            await asyncio.sleep(POLL_INTERVAL)
+            if not os.path.exists(claim_path):
+                value = self._read_result(result_path, waiting_since)
+                if value is not None:
+                    return self.deserialize(value), True
+
+        try:
+            result = await fn()
+            self._write_result(result_path, self.serialize(result))
+            return result, False
+        finally:
+            try:
+                os.unlink(claim_path)
+            except FileNotFoundError:
+                pass
+
+
+class SingleFlight(Generic[T]):
+    """
+    合并同一键的并发调用
+
+    Args:
+        name: 名称（指标标签）
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, "asyncio.Task[Tuple[T, bool]]"] = {}
+
+    def inflight(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        coordinator: Optional[FileCoordinator] = None,
+    ) -> Tuple[T, bool]:
+        """
+        执行或等待同一键的调用
+
+        Args:
+            key: 合并键
+            fn: 实际计算
+            coordinator: 跨 worker 协调（可选）
+
+        Returns:
+            （结果, 是否为合并的调用）
+        """
+        task = self._calls.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            metrics.inc("singleflight_coalesced_total", flight=self.name, scope="local")
+            value, _ = await asyncio.shield(task)
+            return value, True
+
+        if coordinator is not None:
+            task = asyncio.ensure_future(coordinator.run(key, fn))
+        else:
+            task = asyncio.ensure_future(self._run(fn))
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+
+        value, shared = await asyncio.shield(task)
+        if shared:
+            metrics.inc("singleflight_coalesced_total", flight=self.name, scope="cross_worker")
+        return value, shared
+
+    @staticmethod
+    async def _run(fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        return await fn(), False
+
+    def _finish(self, key: str, task: "asyncio.Task") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有等待方都被取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,174 @@
+"""
+预加载与 fork 安全
+
+在 gunicorn master（preload_app）中于 fork 之前执行一次预热：导入并触达
+提供商 SDK、文档分区器与 OCR 引擎等只读重量级状态，随后冻结 GC，
+让各 worker 以写时复制方式共享这些内存页。fork 之后由注册的回调
+重建连接池等不可跨进程共享的资源。
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_after_fork_callbacks: List[Callable[[], None]] = []
+_warmed = False
+_ready = False
+_lock = threading.Lock()
+
+
+def register_after_fork(callback: Callable[[], None]) -> None:
+    """
+    注册 fork 之后在子进程中执行的回调（用于重建连接池、线程池等）
+
+    Args:
+        callback: 无参回调
+    """
+    _after_fork_callbacks.append(callback)
+
+
+def _run_after_fork() -> None:
+    """子进程中依次执行 fork 后回调，并重置就绪状态"""
+    global _ready, _lock
+    _lock = threading.Lock()
+    _ready = False
+    for callback in _after_fork_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"fork 后回调执行失败: {callback!r}: {str(e)}")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_run_after_fork)
+
+
+def _warm_providers() -> List[str]:
+    """导入需要预热的 LLM 提供商模块"""
+    from app.llm import LLMFactory
+
+    providers = settings.WARMUP_PROVIDERS or [settings.LLM_PROVIDER]
+    loaded = []
+    for provider in providers:
+        try:
+            LLMFactory.get_provider_class(provider)
+            loaded.append(provider)
+        except Exception as e:
+            logger.warning(f"预热提供商 {provider} 失败: {str(e)}")
+    return loaded
+
+
+def _warm_parsers() -> List[str]:
+    """导入文档分区器并用一段小文本触达分词等只读数据"""
+    from app.services import file_service
+
+    loaded = []
+    for extension in settings.WARMUP_FILE_TYPES:
+        import_path = file_service.PARTITIONERS.get(extension)
+        if not import_path:
+            continue
+        try:
+            file_service._load_partitioner(import_path)
+            loaded.append(extension)
+        except Exception as e:
+            logger.warning(f"预热 {extension} 分区器失败: {str(e)}")
+
+    try:
+        partition_text = file_service._load_partitioner(file_service.PARTITIONERS["txt"])
+        partition_text(text="预热文本。Warmup sentence for tokenizer data.")
+    except Exception as e:
+        logger.warning(f"分区器数据预热失败: {str(e)}")
+    return loaded
+
+
+def _warm_ocr() -> List[str]:
+    """导入 OCR 引擎并读取 tesseract 语言列表"""
+    from app.services import file_service
+
+    try:
+        from PIL import Image  # noqa: F401
+        file_service._get_magic()
+        engine = file_service._get_ocr_engine()
+        return list(engine.get_languages(config=""))
+    except Exception as e:
+        logger.warning(f"OCR 预热失败: {str(e)}")
+        return []
+
+
+def warmup() -> Dict[str, object]:
+    """
+    预热重量级只读状态（可重复调用，只执行一次）
+
+    Returns:
+        预热结果摘要
+    """
+    global _warmed
+    with _lock:
+        if _warmed:
+            return {"skipped": True}
+
+        started = time.perf_counter()
+        summary: Dict[str, object] = {
+            "providers": _warm_providers(),
+            "parsers": _warm_parsers(),
+            "ocr_languages": _warm_ocr(),
+        }
+
+        # 将预热产生的对象移入永久代，避免 worker 中 GC 扫描触发写时复制
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+
+        _warmed = True
+        summary["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"预热完成: {summary}")
+        return summary
+
+
+def is_warmed() -> bool:
+    """是否已完成预热（fork 出的 worker 继承 master 的预热状态）"""
+    return _warmed
+
+
+def mark_ready() -> None:
+    """标记当前进程已就绪"""
+    global _ready
+    _ready = True
+
+
+def is_ready() -> bool:
+    """当前进程是否已就绪"""
+    return _ready
+
+
+def memory_usage() -> Dict[str, int]:
+    """
+    读取当前进程的内存占用（KB），其中 pss 可用于衡量写时复制共享效果
+
+    Returns:
+        rss/pss/shared/private 等指标；非 Linux 平台返回空字典
+    """
+    fields = {
+        "Rss": "rss_kb",
+        "Pss": "pss_kb",
+        "Shared_Clean": "shared_clean_kb",
+        "Shared_Dirty": "shared_dirty_kb",
+        "Private_Clean": "private_clean_kb",
+        "Private_Dirty": "private_dirty_kb",
+    }
+    usage: Dict[str, int] = {}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = int(rest.split()[0])
+    except OSError:
+        pass
+    return usage
@@ -0,0 +1,88 @@
+"""
+MinIO 前缀批量导入（命令行）
+
+用法：
+    python -m app.ingest --bucket docs --prefix contracts/2024/ --ext pdf --ext docx \
+        --schema schema.toon --provider openai --model gpt-4o-mini --report-url reports/
+
+以同一 --name（缺省时由存储桶、前缀、schema 与模型生成）重跑时从检查点续做：
+ETag 未变且已成功的对象跳过，失败或内容已变化的对象重新处理。
+汇总报告输出到标准输出；列出对象失败时以非零状态退出。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from app.core import AppException
+from app.models import IngestRequest, SchemaField
+from app.services import ExtractService, IngestService, SchemaRegistry
+from app.services.ingest_store import RUN_FAILED
+from app.utils.compiled_schema import compile_schema
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="MinIO 前缀批量导入")
+    parser.add_argument("--bucket", required=True, help="存储桶")
+    parser.add_argument("--prefix", default="", help="对象名前缀")
+    parser.add_argument("--ext", action="append", dest="extensions", help="只处理的扩展名（可重复）")
+    parser.add_argument("--min-size", type=int, help="最小对象大小（字节）")
+    parser.add_argument("--max-size", type=int, help="最大对象大小（字节）")
+    parser.add_argument("--modified-after", type=datetime.fromisoformat, help="只处理此时间之后修改的对象")
+    parser.add_argument("--modified-before", type=datetime.fromisoformat, help="只处理此时间之前修改的对象")
+    schema = parser.add_mutually_exclusive_group(required=True)
+    schema.add_argument("--schema", help="schema 文件（JSON 数组或 TOON 表格）")
+    schema.add_argument("--schema-id", help="已注册的 schema ID")
+    parser.add_argument("--schema-version", type=int, help="已注册 schema 的版本（默认最新）")
+    parser.add_argument("--provider", default="openai", help="LLM 提供商")
+    parser.add_argument("--model", help="LLM 模型")
+    parser.add_argument("--output-format", choices=["table", "positional"], help="LLM 输出格式")
+    parser.add_argument("--concurrency", type=int, help="并发提取数（默认 INGEST_CONCURRENCY）")
+    parser.add_argument("--name", help="检查点名称（默认自动生成）")
+    parser.add_argument("--report-url", help="汇总报告写入的 MinIO 路径（以 / 结尾时追加 {run_id}.json）")
+    return parser.parse_args(argv)
+
+
+def _load_fields(args: argparse.Namespace) -> List[SchemaField]:
+    if args.schema:
+        with open(args.schema, "r", encoding="utf-8") as f:
+            return compile_schema(f.read()).fields
+    return SchemaRegistry().get(args.schema_id, args.schema_version).compiled.fields
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args = _parse_args(argv)
+    try:
+        fields = _load_fields(args)
+        request = IngestRequest(
+            bucket=args.bucket,
+            prefix=args.prefix,
+            extensions=args.extensions,
+            min_size=args.min_size,
+            max_size=args.max_size,
+            modified_after=args.modified_after,
+            modified_before=args.modified_before,
+            provider=args.provider,
+            model=args.model,
+            output_format=args.output_format,
+            concurrency=args.concurrency,
+            name=args.name,
+            report_url=args.report_url,
+        )
+        service = IngestService(ExtractService())
+        run = service.create_run(request, fields)
+        report = asyncio.run(service.run(run.run_id))
+    except (AppException, ValueError, OSError) as e:
+        message = e.message if isinstance(e, AppException) else str(e)
+        print(f"导入失败: {message}", file=sys.stderr)
+        return 2
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 1 if report["status"] == RUN_FAILED else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
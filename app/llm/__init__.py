@@ -2,7 +2,6 @@
 LLM模块初始化文件
 """
 from .base import BaseLLM
-from .openai_llm import OpenAILLM
 from .factory import LLMFactory
 
 __all__ = [
@@ -10,3 +9,11 @@ __all__ = [
     "OpenAILLM",
     "LLMFactory",
 ]
+
+
+def __getattr__(name):
+    # 具体提供商实现按需加载，避免导入本包时引入 openai SDK
+    if name == "OpenAILLM":
+        from .openai_llm import OpenAILLM
+        return OpenAILLM
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,16 +1,57 @@
 """
 LLM基础接口定义 - 支持多平台多模型
 """
+import asyncio
 import logging
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Awaitable
 from enum import Enum
 from pydantic import BaseModel
 
 from app.models import SchemaField, ExtractedValue
+from app.core import settings, LLMException, CircuitOpenException
+from app.core.metrics import metrics
+from app.core.response_metadata import set_metadata
+from app.utils.compiled_schema import CompiledSchema, compile_fields, partition_fields
+from app.utils.converters import ConvertedValues
+from app.utils.toon_utils import ToonDecodeError, decode_positional, decode_values_table
+from .repair import repair_values
+from .retry import ERROR_RATE_LIMIT, ERROR_TIMEOUT, RETRYABLE_ERRORS, call_with_retry, classify_error
+from .circuit import circuit_breakers
+from .ratelimit import IMAGE_TOKEN_ESTIMATE, credential_id, estimate_tokens, rate_limiter
+from .limiter import OUTCOME_DROPPED, OUTCOME_IGNORE, OUTCOME_SUCCESS, concurrency_limiters
+from .hedge import hedged_call
+from .batcher import micro_batcher
+from .stats import latency_stats, model_health
 
 logger = logging.getLogger(__name__)
 
+# Prompt 布局：legacy 为原有单段 Prompt；prefix_cache 将静态部分置于文档内容之前
+PROMPT_LAYOUT_LEGACY = "legacy"
+PROMPT_LAYOUT_PREFIX_CACHE = "prefix_cache"
+
+# 输出格式：table 为逐行 field,type,value；positional 仅按 schema 顺序输出值
+OUTPUT_FORMAT_TABLE = "table"
+OUTPUT_FORMAT_POSITIONAL = "positional"
+OUTPUT_FORMATS = (OUTPUT_FORMAT_TABLE, OUTPUT_FORMAT_POSITIONAL)
+
+# 各提供商共用的系统提示词；表头与列顺序因输出格式（table / positional / 合批）而异，
+# 由用户消息中的【输出格式要求】给出，这里不再固定
+SYSTEM_PROMPT = (
+    "你是一个专业的数据提取助手。请根据提供的 schema，从给定内容中提取字段，"
+    "并使用 TOON (Token-Oriented Object Notation) 格式返回结果。\n\n"
+    "重要要求：\n"
+    "1. 仅提取 schema 中定义的字段\n"
+    "2. 严格按照指定的字段类型进行类型转换\n"
+    "3. 必填字段找不到时返回 null\n"
+    "4. 日期/时间使用 ISO 8601 格式\n"
+    "5. 布尔值使用 true/false\n"
+    "6. 数值保持数值类型\n"
+    "7. 严格按照【输出格式要求】给出的 TOON 结构（表头、列顺序与行数）输出\n"
+    "8. 使用 2 空格缩进；不要添加任何额外文字，仅返回 TOON 内容\n"
+)
+
 
 class ModelCapability(str, Enum):
     """模型能力枚举"""
@@ -34,6 +75,50 @@ class ModelInfo(BaseModel):
     cost_per_1k_output: Optional[float] = None  # 输出成本
 
 
+class PromptParts:
+    """
+    拆分后的 Prompt
+
+    - system: 系统提示词
+    - static: 与文档无关、可被提供商缓存的前缀（legacy 布局下为空）
+    - dynamic: 随请求变化的部分（文档内容）
+    """
+
+    __slots__ = ("system", "static", "dynamic")
+
+    def __init__(self, system: str, static: str, dynamic: str):
+        self.system = system
+        self.static = static
+        self.dynamic = dynamic
+
+    @property
+    def text(self) -> str:
+        """合并为单段用户 Prompt（静态前缀在前）"""
+        if not self.static:
+            return self.dynamic
+        return f"{self.static}\n\n{self.dynamic}"
+
+
+class LLMCompletion:
+    """一次模型调用的结果：响应文本与 token 用量"""
+
+    __slots__ = ("text", "input_tokens", "output_tokens", "cached_tokens", "cache_write_tokens")
+
+    def __init__(
+        self,
+        text: str,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ):
+        self.text = text
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cached_tokens = cached_tokens
+        self.cache_write_tokens = cache_write_tokens
+
+
 class BaseLLM(ABC):
     """LLM基础接口 - 支持多平台多模型"""
     
@@ -50,6 +135,7 @@ class BaseLLM(ABC):
         image: Optional[bytes],
         schema: List[SchemaField],
         model: str,
+        output_format: Optional[str] = None,
     ) -> List[ExtractedValue]:
         """
         根据schema和内容提取数据
@@ -58,6 +144,7 @@ class BaseLLM(ABC):
             content: 文件内容
             schema: 数据schema
             model: 模型名称
+            output_format: 输出格式（table|positional），为空时按配置
             
         Returns:
             提取的数据列表
@@ -84,23 +171,513 @@ class BaseLLM(ABC):
         """
         pass
     
-    @abstractmethod
+    def _get_system_prompt(self) -> str:
+        """获取系统提示词（输出结构由各输出格式的 Prompt 给出）"""
+        return SYSTEM_PROMPT
+    
+    def _resolve_output_format(self, output_format: Optional[str] = None) -> str:
+        """确定输出格式：请求指定 > 提供商配置 > 全局默认"""
+        resolved = (
+            output_format
+            or settings.LLM_OUTPUT_FORMAT_OVERRIDES.get(self.provider_name)
+            or settings.LLM_OUTPUT_FORMAT
+        )
+        if resolved not in OUTPUT_FORMATS:
+            raise LLMException(f"不支持的输出格式: {resolved}")
+        return resolved
+    
+    def _build_prompt_parts(
+        self,
+        content: str,
+        schema: List[SchemaField],
+        image: Optional[bytes] = None,
+        output_format: str = OUTPUT_FORMAT_TABLE,
+        document_first: bool = False,
+    ) -> PromptParts:
+        """
+        按 PROMPT_LAYOUT 组装 Prompt
+        
+        prefix_cache 布局下 schema 与输出格式说明作为静态前缀放在文档内容之前，
+        相同 schema 的请求共享同一前缀，可命中提供商的 Prompt 缓存。
+        document_first 时（字段分组提取）反过来以文档内容为静态前缀，
+        同一文档的各组调用共享该前缀。
+        
+        Args:
+            content: 文件内容
+            schema: 数据schema
+            image: 图像内容（可选）
+            output_format: 输出格式（table|positional）
+            document_first: 文档内容作为静态前缀
+            
+        Returns:
+            拆分后的 Prompt
+        """
+        document = f"【待提取的文本内容】\n{content}"
+        if document_first:
+            return PromptParts(
+                self._get_system_prompt(),
+                document,
+                compile_fields(schema).static_prompt(output_format, document_first=True),
+            )
+        if settings.PROMPT_LAYOUT == PROMPT_LAYOUT_PREFIX_CACHE:
+            compiled = compile_fields(schema)
+            return PromptParts(
+                self._get_system_prompt(),
+                compiled.static_prompt(output_format),
+                document,
+            )
+        if output_format == OUTPUT_FORMAT_POSITIONAL:
+            static = compile_fields(schema).static_prompt(output_format)
+            return PromptParts(self._get_system_prompt(), "", f"{static}\n\n{document}")
+        return PromptParts(
+            self._get_system_prompt(),
+            "",
+            self._build_prompt(content, schema, image=image),
+        )
+    
+    async def _complete(
+        self,
+        parts: PromptParts,
+        image: Optional[bytes],
+        model: str,
+    ) -> LLMCompletion:
+        """
+        调用模型并返回原始响应文本与用量
+        
+        Args:
+            parts: 拆分后的 Prompt
+            image: 图像内容（可选）
+            model: 模型名称
+            
+        Returns:
+            调用结果
+        """
+        raise NotImplementedError
+    
+    async def _call_model(
+        self,
+        parts: PromptParts,
+        image: Optional[bytes],
+        model: str,
+    ) -> LLMCompletion:
+        """
+        按重试策略调用模型（可重试错误退避重试，受请求截止时间与重试预算约束）
+        
+        每次尝试前检查该提供商/模型的熔断器，打开时直接抛出 CircuitOpenException；
+        按 RPM/TPM 配额等待发送时机，等不到抛出 RateLimitException；
+        再向自适应并发限制器申请名额，排队超时抛出 ConcurrencyLimitException。
+        
+        Args:
+            parts: 拆分后的 Prompt
+            image: 图像内容（可选）
+            model: 模型名称
+            
+        Returns:
+            调用结果
+        """
+        breaker = circuit_breakers.get(self.provider_name, model) if settings.LLM_CIRCUIT_ENABLED else None
+        limiter = concurrency_limiters.get(self.provider_name, model) if settings.LLM_LIMITER_ENABLED else None
+        
+        # 仅配置了配额时才估算（需遍历整篇文档）
+        quota = rate_limiter.quota(self.provider_name, model)
+        estimated_tokens = self._estimate_tokens(parts, image) if quota else 0
+        
+        async def attempt() -> LLMCompletion:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenException(f"{self.provider_name}/{model} 熔断中，调用被短路")
+            acquired_at = None
+            reservation = None
+            try:
+                # 先等待配额再占用并发名额，避免等配额时占着名额
+                reservation = await rate_limiter.acquire(
+                    self.provider_name, model, self._credential_id(), estimated_tokens
+                )
+                if limiter is not None:
+                    acquired_at = await limiter.acquire(settings.LLM_LIMITER_QUEUE_TIMEOUT)
+            except BaseException:
+                if breaker is not None:
+                    breaker.on_abandon(0.0)
+                # 调用未发出，退还已计入窗口的请求数与 token 数
+                await rate_limiter.release(reservation)
+                raise
+            
+            started = time.perf_counter()
+            outcome = OUTCOME_IGNORE
+            try:
+                completion = await self._complete(parts, image, model)
+                outcome = OUTCOME_SUCCESS
+            except asyncio.CancelledError:
+                if breaker is not None:
+                    breaker.on_abandon(time.perf_counter() - started)
+                raise
+            except Exception as e:
+                kind = classify_error(e)[0]
+                if kind in (ERROR_RATE_LIMIT, ERROR_TIMEOUT):
+                    outcome = OUTCOME_DROPPED
+                if kind in RETRYABLE_ERRORS:
+                    model_health.record(self.provider_name, model, None, True)
+                if breaker is not None:
+                    if kind in RETRYABLE_ERRORS:
+                        breaker.on_failure()
+                    else:
+                        breaker.on_abandon(time.perf_counter() - started)
+                raise
+            finally:
+                if limiter is not None:
+                    limiter.release(acquired_at, outcome, time.perf_counter() - started)
+            elapsed = time.perf_counter() - started
+            await rate_limiter.settle(reservation, completion.input_tokens + completion.output_tokens)
+            if breaker is not None:
+                breaker.on_success(elapsed)
+            latency_stats.record(self.provider_name, model, elapsed)
+            model_health.record(self.provider_name, model, elapsed, False)
+            metrics.observe("llm_call_seconds", elapsed, provider=self.provider_name, model=model)
+            return completion
+        
+        return await call_with_retry(attempt, provider=self.provider_name)
+    
+    def _credential_id(self) -> str:
+        """API 密钥指纹（配额按密钥区分）"""
+        return credential_id(getattr(getattr(self, "client", None), "api_key", None))
+    
+    def _estimate_tokens(self, parts: PromptParts, image: Optional[bytes]) -> int:
+        """预估一次调用的 token 数（输入 + 预留输出）"""
+        tokens = estimate_tokens(parts.system) + estimate_tokens(parts.text)
+        if image:
+            tokens += IMAGE_TOKEN_ESTIMATE
+        return tokens + settings.LLM_RATE_LIMIT_OUTPUT_TOKENS
+    
+    async def _extract_once(
+        self,
+        content: str,
+        image: Optional[bytes],
+        schema: List[SchemaField],
+        model: str,
+        output_format: str,
+        document_first: bool = False,
+    ) -> List[ExtractedValue]:
+        """构建 Prompt -> 调用模型 -> 解析（含修复）"""
+        parts = self._build_prompt_parts(
+            content, schema, image=image, output_format=output_format, document_first=document_first
+        )
+        completion = await self._call_model(parts, image, model)
+        self._record_usage(model, completion)
+        return await self._parse_with_repair(
+            completion.text, content, image, schema, model, output_format=output_format
+        )
+    
+    def _hedge_backup(self, model: str) -> "Optional[Tuple[BaseLLM, str]]":
+        """
+        对冲请求的目标（提供商实例, 模型）
+        
+        LLM_HEDGE_BACKUPS 中配置了 "provider" 或 "provider:model" 时使用备用提供商，
+        否则向同一提供商再发一次。
+        """
+        spec = settings.LLM_HEDGE_BACKUPS.get(self.provider_name)
+        if not spec:
+            return self, model
+        
+        from .factory import LLMFactory
+        
+        backup_provider, _, backup_model = spec.partition(":")
+        try:
+            return LLMFactory.create(backup_provider), backup_model or model
+        except Exception as e:
+            logger.warning(f"无法创建对冲备用提供商 {spec}: {str(e)}，改为同一提供商")
+            return self, model
+    
+    async def _extract_values(
+        self,
+        content: str,
+        image: Optional[bytes],
+        schema: List[SchemaField],
+        model: str,
+        output_format: str,
+    ) -> List[ExtractedValue]:
+        """
+        执行一次提取；宽 schema（或带 group 标签的字段）划分为字段组并行提取
+        
+        Args:
+            content: 文件内容
+            image: 图像内容（可选）
+            schema: 数据schema
+            model: 模型名称
+            output_format: 输出格式
+            
+        Returns:
+            提取的数据列表（按 schema 字段顺序）
+        """
+        groups = partition_fields(schema, settings.LLM_FIELD_GROUP_SIZE)
+        if len(groups) > 1:
+            return await self._extract_groups(content, image, schema, groups, model, output_format)
+        return await self._extract_group(content, image, schema, model, output_format)
+    
+    async def _extract_group(
+        self,
+        content: str,
+        image: Optional[bytes],
+        schema: List[SchemaField],
+        model: str,
+        output_format: str,
+        document_first: bool = False,
+    ) -> List[ExtractedValue]:
+        """
+        提取一组字段；启用微批处理时短文本与其他请求合并调用；启用对冲时，
+        首个请求超过延迟分位数仍未返回则发出备份请求，取最先得到有效解析结果的一方
+        """
+        if not document_first and micro_batcher.eligible(content, image):
+            return await micro_batcher.submit(self, content, schema, model, output_format)
+        if not settings.LLM_HEDGE_ENABLED:
+            return await self._extract_once(content, image, schema, model, output_format, document_first)
+        
+        def backup() -> Awaitable[List[ExtractedValue]]:
+            llm, backup_model = self._hedge_backup(model)
+            return llm._extract_once(content, image, schema, backup_model, output_format, document_first)
+        
+        return await hedged_call(
+            lambda: self._extract_once(content, image, schema, model, output_format, document_first),
+            backup,
+            provider=self.provider_name,
+            model=model,
+        )
+    
+    async def _extract_groups(
+        self,
+        content: str,
+        image: Optional[bytes],
+        schema: List[SchemaField],
+        groups: List[Tuple[str, List[SchemaField]]],
+        model: str,
+        output_format: str,
+    ) -> List[ExtractedValue]:
+        """
+        各字段组针对同一文档并发提取（最多 LLM_FIELD_GROUP_PARALLELISM 个在途），
+        文档内容作为共享的静态前缀以命中提供商缓存；任一组失败时取消其余组并抛出。
+        LLM_FIELD_GROUP_WARM_CACHE 时先单独提取第一组写入缓存，再并发提取其余组。
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.LLM_FIELD_GROUP_PARALLELISM))
+        timings: List[Dict[str, Any]] = []
+        
+        async def run(name: str, fields: List[SchemaField]) -> List[ExtractedValue]:
+            async with semaphore:
+                started = time.perf_counter()
+                values = await self._extract_group(
+                    content, image, fields, model, output_format, document_first=True
+                )
+                elapsed = time.perf_counter() - started
+            metrics.observe("llm_field_group_seconds", elapsed, provider=self.provider_name, model=model)
+            timings.append({"group": name, "fields": len(fields), "seconds": round(elapsed, 3)})
+            logger.info(f"字段组 {name} 提取完成: {len(fields)} 个字段，{elapsed:.2f}s")
+            return values
+        
+        results: List[List[ExtractedValue]] = []
+        pending = list(groups)
+        if settings.LLM_FIELD_GROUP_WARM_CACHE:
+            results.append(await run(*pending.pop(0)))
+        tasks = [asyncio.ensure_future(run(name, fields)) for name, fields in pending]
+        try:
+            results.extend(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            set_metadata("field_groups", sorted(timings, key=lambda t: t["group"]))
+        
+        # 按 schema 字段顺序合并各组结果
+        merged = {value.field: value for values in results for value in values}
+        return [merged[f.field] for f in schema if f.field in merged]
+    
+    def _record_usage(self, model: str, completion: LLMCompletion) -> None:
+        """记录 token 用量（含缓存命中的输入 token）"""
+        labels = {"provider": self.provider_name, "model": model}
+        metrics.inc("llm_requests_total", **labels)
+        metrics.inc("llm_input_tokens_total", completion.input_tokens, **labels)
+        metrics.inc("llm_output_tokens_total", completion.output_tokens, **labels)
+        metrics.inc("llm_cached_input_tokens_total", completion.cached_tokens, **labels)
+        metrics.inc("llm_cache_write_tokens_total", completion.cache_write_tokens, **labels)
+        logger.info(
+            f"token 用量: 输入={completion.input_tokens}, 缓存命中={completion.cached_tokens}, "
+            f"缓存写入={completion.cache_write_tokens}, 输出={completion.output_tokens}"
+        )
+    
+    def _parse_values(
+        self,
+        response: str,
+        schema: List[SchemaField],
+        output_format: str = OUTPUT_FORMAT_TABLE,
+    ) -> ConvertedValues:
+        """
+        解码响应并按 schema 声明的类型一次性转换、校验各字段的值
+        
+        table 格式按行中的字段名对应 schema（忽略模型回显的类型），positional 格式按顺序回填。
+        
+        Raises:
+            LLMException: 无法解码，或位置格式值的个数与 schema 字段数不一致
+        """
+        compiled = compile_fields(schema)
+        if output_format == OUTPUT_FORMAT_POSITIONAL:
+            try:
+                values = decode_positional(response or "")
+            except ToonDecodeError as e:
+                logger.error(f"位置格式解析失败: {str(e)}")
+                raise LLMException(f"无法解析LLM的位置格式响应: {str(e)}")
+            if len(values) != len(compiled):
+                raise LLMException(f"位置格式响应包含 {len(values)} 个值，schema 共 {len(compiled)} 个字段")
+            converted = compiled.convert_rows(zip(compiled.field_names, values))
+        else:
+            try:
+                rows = decode_values_table(response or "")
+            except Exception as e:
+                logger.error(f"TOON 解析失败: {str(e)}")
+                raise LLMException(f"无法解析LLM的 TOON 响应: {str(e)}")
+            converted = compiled.convert_rows((row.get("field"), row.get("value")) for row in rows)
+            logger.info(f"成功解析{len(converted.values)}个字段 (TOON)")
+        
+        self._record_invalid(compiled, converted)
+        return converted
+    
+    def _record_invalid(self, compiled: CompiledSchema, converted: ConvertedValues) -> None:
+        """记录未通过类型校验的字段"""
+        for name in converted.invalid:
+            logger.warning(f"字段 {name} 的值未通过 {compiled.field_map[name].type} 类型校验")
+            metrics.inc(
+                "llm_invalid_values_total",
+                provider=self.provider_name,
+                type=compiled.field_map[name].type,
+            )
+    
+    def _parse_output(
+        self,
+        response: str,
+        schema: List[SchemaField],
+        output_format: str = OUTPUT_FORMAT_TABLE,
+    ) -> List[ExtractedValue]:
+        """按输出格式解析响应（不做修复，未通过校验的值保留原始文本）"""
+        return self._parse_values(response, schema, output_format).values
+    
     def _parse_response(
         self,
         response: str,
         schema: List[SchemaField],
     ) -> List[ExtractedValue]:
         """
-        解析LLM响应
+        解析LLM响应（TOON 表格 -> ExtractedValue）
         
         Args:
-            response: LLM响应文本
+            response: LLM响应文本（可能包含代码块）
             schema: 数据schema
             
         Returns:
             提取的数据列表
         """
-        pass
+        return self._parse_values(response, schema).values
+    
+    async def _parse_with_repair(
+        self,
+        response: str,
+        content: str,
+        image: Optional[bytes],
+        schema: List[SchemaField],
+        model: str,
+        output_format: str = OUTPUT_FORMAT_TABLE,
+    ) -> List[ExtractedValue]:
+        """
+        解析响应；解析失败时先本地修复，仅对修复后仍缺失或未通过类型校验的字段重新询问模型
+        
+        Args:
+            response: LLM 原始响应
+            content: 文件内容（重新询问时使用）
+            image: 图像内容（可选）
+            schema: 数据schema
+            model: 模型名称
+            output_format: 响应的输出格式
+            
+        Returns:
+            提取的数据列表（重新询问后仍未通过校验的字段保留原始文本）
+        """
+        error: Optional[LLMException] = None
+        missing: List[str] = []
+        try:
+            parsed = self._parse_values(response, schema, output_format)
+        except LLMException as e:
+            if not settings.LLM_REPAIR_ENABLED:
+                raise
+            error = e
+        else:
+            # 格式正确但漏掉部分字段的表格同样只重新询问漏掉的字段
+            returned = {value.field for value in parsed.values}
+            missing = [name for name in compile_fields(schema).field_names if name not in returned]
+            if not (parsed.invalid or missing) or not settings.LLM_REPAIR_ENABLED:
+                return parsed.values
+
+        if error is not None:
+            repaired = repair_values(response, compile_fields(schema))
+            for kind in repaired.kinds:
+                metrics.inc("llm_response_repairs_total", provider=self.provider_name, kind=kind)
+            parsed = self._parse_values(repaired.to_toon(), schema) if repaired.rows else ConvertedValues([], [])
+            missing = repaired.missing
+        return await self._requery_fields(parsed, missing, content, image, schema, model, error)
+    
+    async def _requery_fields(
+        self,
+        parsed: ConvertedValues,
+        missing: List[str],
+        content: str,
+        image: Optional[bytes],
+        schema: List[SchemaField],
+        model: str,
+        error: Optional[LLMException] = None,
+    ) -> List[ExtractedValue]:
+        """
+        对缺失或未通过类型校验的字段重新询问模型，按 schema 字段顺序合并
+        
+        Args:
+            parsed: 已解析的值（含未通过校验的字段名）
+            missing: 响应中缺失的字段名
+            content: 文件内容
+            image: 图像内容（可选）
+            schema: 数据schema
+            model: 模型名称
+            error: 原始响应的解析错误（没有可用字段时抛出）
+            
+        Returns:
+            提取的数据列表
+        """
+        compiled = compile_fields(schema)
+        values = parsed.values
+        retry_names = set(missing) | set(parsed.invalid)
+        if retry_names and settings.LLM_REPAIR_REQUERY:
+            retry_fields = [f for f in compiled.fields if f.field in retry_names]
+            # 针对性重新询问统一使用 table 格式，便于逐字段校验
+            logger.info(f"重新询问缺失或未通过校验的字段: {[f.field for f in retry_fields]}")
+            metrics.inc("llm_response_repairs_total", provider=self.provider_name, kind="requery")
+            completion = await self._call_model(
+                self._build_prompt_parts(content, retry_fields, image=image), image, model
+            )
+            self._record_usage(model, completion)
+            try:
+                retried = self._parse_values(completion.text, retry_fields)
+            except LLMException:
+                retry = repair_values(completion.text, compile_fields(retry_fields))
+                retried = self._parse_values(retry.to_toon(), retry_fields) if retry.rows else ConvertedValues([], [])
+            
+            # 缺失字段取重新询问的结果；已有值的字段仅在重新询问的值通过校验时替换
+            present = {v.field for v in values}
+            accepted = {
+                v.field: v for v in retried.values
+                if v.field not in present or v.field not in retried.invalid
+            }
+            # 按 schema 字段顺序合并
+            merged = {v.field: v for v in values}
+            merged.update(accepted)
+            values = [merged[f.field] for f in compiled.fields if f.field in merged]
+
+        if not values:
+            metrics.inc("llm_response_repairs_total", provider=self.provider_name, kind="failed")
+            raise error or LLMException("LLM 响应中没有可用的字段")
+        return values
     
     @abstractmethod
     def get_available_models(self) -> List[ModelInfo]:
@@ -121,36 +698,3 @@ class BaseLLM(ABC):
             连接状态
         """
         pass
-    
-    def _convert_value(self, value: Any, field_type: str) -> Any:
-        """
-        根据字段类型转换值
-        
-        Args:
-            value: 原始值
-            field_type: 字段类型
-            
-        Returns:
-            转换后的值
-        """
-        if value is None:
-            return None
-        
-        try:
-            if field_type == "int":
-                return int(value)
-            elif field_type == "float":
-                return float(value)
-            elif field_type == "boolean":
-                if isinstance(value, bool):
-                    return value
-                if isinstance(value, str):
-                    return value.lower() in ("true", "yes", "1")
-                return bool(value)
-            elif field_type in ("date", "datetime"):
-                return str(value)
-            else:  # text
-                return str(value)
-        except (ValueError, TypeError) as e:
-            logger.warning(f"类型转换失败: {value} -> {field_type}: {str(e)}")
-            return str(value)
@@ -0,0 +1,304 @@
+"""
+小文档微批处理
+
+身份证、小票、单段文本等短文档的提取中，系统提示词、schema 与网络往返等固定开销
+占了调用成本的大头。启用后（LLM_BATCH_ENABLED），同一提供商、模型、编译后 schema
+与输出格式的短文本请求在 LLM_BATCH_WINDOW_MS 毫秒内（或凑满 LLM_BATCH_MAX_DOCS 份）
+合并为一次调用：
+
+- Prompt 中各文档以 【文档 i】 分隔，要求按文档序号逐行输出 TOON 表格
+  `results[N]{doc,<字段...>}:`，值按 schema 顺序排列；
+- 响应按序号拆分给各等待方，字段名与类型由服务端回填；
+- 响应无法解析、缺少某份文档或列数不符时，相应文档退回单独调用；
+- 未通过类型校验的值与单独调用一样，由各等待方针对这些字段重新询问模型。
+
+没有同键请求在处理中时，新请求只等待本轮事件循环（同时到达的请求仍合为一批），
+不为可能到来的请求付出整个收集窗口的延迟；已有请求在处理中时才按窗口收集。
+
+合并调用在触发发送的请求的上下文（截止时间、重试预算）中执行；调用本身失败时错误传递给
+批内所有请求，由各自的故障转移处理。
+"""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.core import settings
+from app.core.metrics import metrics
+from app.core.response_metadata import set_metadata
+from app.models import ExtractedValue, SchemaField
+from app.utils.compiled_schema import (
+    DEFAULT_EXAMPLE_VALUE,
+    EXAMPLE_VALUES,
+    CompiledSchema,
+    compile_fields,
+)
+from app.utils.converters import ConvertedValues
+from app.utils.lru_cache import LRUCache
+from app.utils.toon_utils import ToonDecodeError, ToonTableDecoder
+
+if TYPE_CHECKING:
+    from .base import BaseLLM
+
+logger = logging.getLogger(__name__)
+
+# 批量提取的静态 Prompt 模板（各批次共享，可命中提供商的前缀缓存）
+BATCH_PROMPT_TEMPLATE = """请从随后给出的多份文本内容中分别提取信息，并按照指定的 schema 返回 TOON 数据。
+
+【Schema定义（TOON）】
+```toon
+{schema_toon}
+```
+
+【输出格式要求（TOON）】
+每份文档输出一行：第一列为文档序号，其余各列按 schema 中字段的先后顺序给出值：
+```toon
+{batch_example}
+```
+
+【特别说明】
+- 每份文档必须且只能输出一行，表格行数与文档份数一致
+- 各文档相互独立，不要把一份文档的信息填到另一份文档的行中
+- 值中包含逗号、引号或换行时用双引号包裹，并对引号转义
+- 如果内容中找不到相关信息，该位置输出null
+- 日期字段使用ISO 8601格式
+- 布尔值使用true/false
+- 数值保持数值类型
+- 仅返回 TOON 内容（如上结构），不要添加其他说明文字或代码块外文本。"""
+
+BatchKey = Tuple[str, str, str, str]
+
+_prompt_cache: LRUCache[str] = LRUCache(settings.SCHEMA_CACHE_SIZE)
+
+
+def batch_static_prompt(compiled: CompiledSchema) -> str:
+    """批量提取的静态 Prompt（schema + 输出格式 + 说明），按 schema 缓存"""
+    prompt = _prompt_cache.get(compiled.canonical_hash)
+    if prompt is None:
+        example = ",".join(EXAMPLE_VALUES.get(f.type, DEFAULT_EXAMPLE_VALUE) for f in compiled.fields)
+        prompt = BATCH_PROMPT_TEMPLATE.format(
+            schema_toon=compiled.schema_toon,
+            batch_example=(
+                f"results[2]{{doc,{','.join(compiled.field_names)}}}:\n"
+                f"  1,{example}\n"
+                f"  2,{example}"
+            ),
+        )
+        _prompt_cache.put(compiled.canonical_hash, prompt)
+    return prompt
+
+
+def batch_documents(contents: List[str]) -> str:
+    """按序号分隔的文档内容（Prompt 的动态部分）"""
+    sections = [f"【待提取的文本内容】共 {len(contents)} 份文档"]
+    for index, content in enumerate(contents, 1):
+        sections.append(f"【文档 {index}】\n{content}\n【文档 {index} 结束】")
+    return "\n\n".join(sections)
+
+
+def split_batch_response(response: str, count: int, field_count: int) -> Dict[int, List]:
+    """
+    按文档序号拆分批量响应
+
+    Args:
+        response: LLM 原始响应
+        count: 文档份数
+        field_count: schema 字段数
+
+    Returns:
+        文档序号（从 1 开始） -> 按 schema 顺序排列的原始值；
+        无法解析、序号越界、重复或列数不符的文档不在结果中
+    """
+    decoder = ToonTableDecoder(strict=False)
+    try:
+        decoder.feed(response or "")
+        decoder.close()
+    except ToonDecodeError as e:
+        logger.warning(f"批量响应解析失败: {str(e)}")
+        return {}
+    if decoder.fields is None or len(decoder.fields) != field_count + 1:
+        logger.warning(f"批量响应的列数与 schema 不符: {decoder.fields}")
+        return {}
+
+    results: Dict[int, List] = {}
+    duplicated = set()
+    for row in decoder.rows:
+        values = list(row.values())
+        try:
+            index = int(values[0])
+        except (TypeError, ValueError):
+            continue
+        if not 1 <= index <= count:
+            continue
+        if index in results:
+            duplicated.add(index)
+        results[index] = values[1:]
+    for index in duplicated:
+        del results[index]
+    return results
+
+
+class _Batch:
+    """收集中的一批请求"""
+
+    __slots__ = ("llm", "schema", "model", "output_format", "loop", "items", "timer", "size")
+
+    def __init__(self, llm: "BaseLLM", schema: List[SchemaField], model: str, output_format: str):
+        self.llm = llm
+        self.schema = schema
+        self.model = model
+        self.output_format = output_format
+        self.loop = asyncio.get_running_loop()
+        self.items: List[Tuple[str, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.size = 0
+
+
+class MicroBatcher:
+    """
+    按（提供商, 模型, schema, 输出格式）合并短文本提取请求
+
+    Args:
+        window_ms: 收集窗口（毫秒），默认取配置
+        max_docs: 每批最多文档数，默认取配置
+    """
+
+    def __init__(self, window_ms: Optional[float] = None, max_docs: Optional[int] = None):
+        self._window_ms = window_ms
+        self._max_docs = max_docs
+        self._pending: Dict[BatchKey, _Batch] = {}
+        # 各键处理中（收集、合并调用或单独调用中）的请求数
+        self._active: Dict[BatchKey, int] = {}
+
+    @property
+    def window(self) -> float:
+        window_ms = self._window_ms if self._window_ms is not None else settings.LLM_BATCH_WINDOW_MS
+        return max(0.0, window_ms) / 1000
+
+    @property
+    def max_docs(self) -> int:
+        return max(1, self._max_docs if self._max_docs is not None else settings.LLM_BATCH_MAX_DOCS)
+
+    @staticmethod
+    def eligible(content: str, image: Optional[bytes]) -> bool:
+        """是否参与合并：已启用、无图像且文本不超过 LLM_BATCH_MAX_CHARS"""
+        return (
+            settings.LLM_BATCH_ENABLED
+            and image is None
+            and len(content or "") <= settings.LLM_BATCH_MAX_CHARS
+        )
+
+    async def submit(
+        self,
+        llm: "BaseLLM",
+        content: str,
+        schema: List[SchemaField],
+        model: str,
+        output_format: str,
+    ) -> List[ExtractedValue]:
+        """
+        加入当前批次并等待本文档的结果；批量结果无效时退回单独调用
+
+        Args:
+            llm: 提供商实例
+            content: 文件内容
+            schema: 数据schema
+            model: 模型名称
+            output_format: 单独调用时的输出格式
+
+        Returns:
+            提取的数据列表
+        """
+        compiled = compile_fields(schema)
+        key: BatchKey = (llm.provider_name, model, compiled.canonical_hash, output_format)
+        self._active[key] = self._active.get(key, 0) + 1
+        try:
+            batch = self._pending.get(key)
+            if batch is None or batch.loop is not asyncio.get_running_loop():
+                batch = _Batch(llm, schema, model, output_format)
+                self._pending[key] = batch
+                # 没有其他同键请求在处理中时不等待整个窗口
+                window = self.window if self._active[key] > 1 else 0.0
+                batch.timer = batch.loop.call_later(window, self._flush, key, batch)
+
+            future: asyncio.Future = batch.loop.create_future()
+            batch.items.append((content, future))
+            if len(batch.items) >= self.max_docs:
+                self._flush(key, batch)
+
+            converted: Optional[ConvertedValues] = await future
+            if converted is None:
+                return await llm._extract_once(content, None, schema, model, output_format)
+            set_metadata("batch_size", batch.size)
+            if converted.invalid and settings.LLM_REPAIR_ENABLED:
+                # 与单独调用相同：仅对未通过校验的字段重新询问
+                return await llm._requery_fields(converted, [], content, None, schema, model)
+            return converted.values
+        finally:
+            self._active[key] -= 1
+            if not self._active[key]:
+                del self._active[key]
+
+    def _flush(self, key: BatchKey, batch: _Batch) -> None:
+        """结束收集并在后台执行合并调用"""
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+            batch.timer = None
+        items = [(content, future) for content, future in batch.items if not future.done()]
+        if not items:
+            return
+        if len(items) == 1:
+            # 窗口内只有一份文档：直接按单独调用处理
+            items[0][1].set_result(None)
+            return
+        batch.size = len(items)
+        batch.loop.create_task(self._run(batch, items))
+
+    async def _run(self, batch: _Batch, items: List[Tuple[str, asyncio.Future]]) -> None:
+        from .base import PromptParts
+
+        llm, model = batch.llm, batch.model
+        compiled = compile_fields(batch.schema)
+        labels = {"provider": llm.provider_name, "model": model}
+        metrics.inc("llm_batches_total", **labels)
+        metrics.observe("llm_batch_size", len(items), **labels)
+
+        parts = PromptParts(
+            llm._get_system_prompt(),
+            batch_static_prompt(compiled),
+            batch_documents([content for content, _ in items]),
+        )
+        try:
+            completion = await llm._call_model(parts, None, model)
+        except asyncio.CancelledError:
+            for _, future in items:
+                future.cancel()
+            raise
+        except Exception as e:
+            # 错误交给各等待方，由各自的故障转移处理
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        llm._record_usage(model, completion)
+
+        rows = split_batch_response(completion.text, len(items), len(compiled))
+        fallbacks = 0
+        for index, (_, future) in enumerate(items, 1):
+            if future.done():
+                continue
+            values = rows.get(index)
+            if values is None:
+                fallbacks += 1
+                future.set_result(None)
+                continue
+            converted = compiled.convert_rows(zip(compiled.field_names, values))
+            llm._record_invalid(compiled, converted)
+            future.set_result(converted)
+        if fallbacks:
+            logger.warning(f"批量响应中 {fallbacks}/{len(items)} 份文档无效，退回单独调用")
+            metrics.inc("llm_batch_fallbacks_total", fallbacks, **labels)
+
+
+micro_batcher = MicroBatcher()
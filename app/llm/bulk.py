@@ -0,0 +1,203 @@
+"""
+提供商批量接口（离线批处理）
+
+将提取 Prompt 打包为提供商的批量任务，按较低价格异步执行，不占用实时接口的配额：
+- OpenAI / Azure OpenAI：上传 JSONL 批量文件（purpose=batch）后创建 batch，
+  完成后从输出文件（及错误文件）读取各请求的结果；
+- Anthropic：Message Batches，结束后按 custom_id 读取各请求的结果。
+
+各请求以 custom_id 关联回任务中的文档，响应统一转换为 LLMCompletion，
+之后与实时调用走同一解析路径。
+"""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import ValidationException
+from .base import BaseLLM, LLMCompletion, PromptParts
+from .openai_chat import build_completion_params, parse_chat_completion
+
+logger = logging.getLogger(__name__)
+
+# 支持批量接口的提供商
+BATCH_PROVIDERS = ("openai", "azure", "claude")
+
+# 批量任务状态（与提供商无关）
+BATCH_RUNNING = "running"
+BATCH_ENDED = "ended"  # 已结束，可读取结果（可能只有部分请求成功）
+BATCH_FAILED = "failed"  # 整批失败（如输入文件校验失败），没有结果
+
+# 单个请求的结果：（调用结果, 错误信息），二者恰有一个不为空
+BatchItemResult = Tuple[Optional[LLMCompletion], Optional[str]]
+
+
+class BatchClient(ABC):
+    """
+    提供商批量接口
+
+    Args:
+        llm: 提供商实例（复用其客户端与 Prompt/响应转换）
+    """
+
+    def __init__(self, llm: BaseLLM):
+        self.llm = llm
+
+    @abstractmethod
+    def build_request(self, custom_id: str, parts: PromptParts, model: str) -> Dict[str, Any]:
+        """构建批量任务中的一个请求"""
+
+    @abstractmethod
+    async def submit(self, requests: List[Dict[str, Any]], metadata: Dict[str, str]) -> str:
+        """
+        提交批量任务
+
+        Returns:
+            提供商侧的批量任务 ID
+        """
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> Tuple[str, Optional[str]]:
+        """
+        查询批量任务状态
+
+        Returns:
+            （BATCH_RUNNING | BATCH_ENDED | BATCH_FAILED, 失败原因）
+        """
+
+    @abstractmethod
+    async def results(self, batch_id: str) -> Dict[str, BatchItemResult]:
+        """读取已结束批量任务的结果（custom_id -> 结果）"""
+
+
+class OpenAIBatchClient(BatchClient):
+    """
+    OpenAI / Azure OpenAI Batch API
+
+    Args:
+        llm: OpenAI 或 Azure OpenAI 提供商实例
+        endpoint: 批量请求的接口路径（Azure 为 /chat/completions）
+    """
+
+    _RUNNING = {"validating", "in_progress", "finalizing", "cancelling"}
+
+    def __init__(self, llm: BaseLLM, endpoint: str = "/v1/chat/completions"):
+        super().__init__(llm)
+        self.endpoint = endpoint
+        self.client: Any = getattr(llm, "client")
+
+    def build_request(self, custom_id: str, parts: PromptParts, model: str) -> Dict[str, Any]:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": self.endpoint,
+            "body": build_completion_params(parts, None, model),
+        }
+
+    async def submit(self, requests: List[Dict[str, Any]], metadata: Dict[str, str]) -> str:
+        # 输入文件可达上百 MB，编码放到线程中
+        data = await asyncio.to_thread(
+            lambda: "\n".join(json.dumps(r, ensure_ascii=False) for r in requests).encode("utf-8")
+        )
+        uploaded = await self.client.files.create(file=("batch.jsonl", data), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=self.endpoint,
+            completion_window="24h",
+            metadata=metadata,
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> Tuple[str, Optional[str]]:
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status in self._RUNNING:
+            return BATCH_RUNNING, None
+        if batch.status == "failed":
+            errors = getattr(batch, "errors", None)
+            messages = [e.message for e in (getattr(errors, "data", None) or []) if getattr(e, "message", None)]
+            return BATCH_FAILED, "; ".join(messages) or "批量任务失败"
+        # completed / expired / cancelled：已完成的请求仍有结果
+        return BATCH_ENDED, None
+
+    async def results(self, batch_id: str) -> Dict[str, BatchItemResult]:
+        batch = await self.client.batches.retrieve(batch_id)
+        results: Dict[str, BatchItemResult] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            # 每行一个请求的结果，逐行解码在线程中进行
+            results.update(await asyncio.to_thread(self._parse_result_file, content.text))
+        return results
+
+    @staticmethod
+    def _parse_result_file(text: str) -> Dict[str, BatchItemResult]:
+        from openai.types.chat import ChatCompletion
+
+        results: Dict[str, BatchItemResult] = {}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            custom_id = entry.get("custom_id")
+            response = entry.get("response") or {}
+            if response.get("status_code") == 200 and not entry.get("error"):
+                completion = parse_chat_completion(ChatCompletion.model_validate(response.get("body")))
+                results[custom_id] = (completion, None)
+            else:
+                error = entry.get("error") or (response.get("body") or {}).get("error") or response
+                results[custom_id] = (None, json.dumps(error, ensure_ascii=False))
+        return results
+
+
+class ClaudeBatchClient(BatchClient):
+    """Anthropic Message Batches API"""
+
+    def __init__(self, llm: BaseLLM):
+        super().__init__(llm)
+        self.client: Any = getattr(llm, "client")
+
+    def build_request(self, custom_id: str, parts: PromptParts, model: str) -> Dict[str, Any]:
+        return {"custom_id": custom_id, "params": getattr(self.llm, "_message_params")(parts, None, model)}
+
+    async def submit(self, requests: List[Dict[str, Any]], metadata: Dict[str, str]) -> str:
+        batch = await self.client.messages.batches.create(requests=requests)
+        return batch.id
+
+    async def status(self, batch_id: str) -> Tuple[str, Optional[str]]:
+        batch = await self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status == "ended":
+            return BATCH_ENDED, None
+        return BATCH_RUNNING, None
+
+    async def results(self, batch_id: str) -> Dict[str, BatchItemResult]:
+        parse_message = getattr(self.llm, "_parse_message")
+        results: Dict[str, BatchItemResult] = {}
+        async for entry in await self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                results[entry.custom_id] = (parse_message(result.message), None)
+            elif result.type == "errored":
+                results[entry.custom_id] = (None, str(getattr(result, "error", "errored")))
+            else:
+                # canceled / expired
+                results[entry.custom_id] = (None, result.type)
+        return results
+
+
+def create_batch_client(llm: BaseLLM) -> BatchClient:
+    """
+    创建提供商对应的批量接口
+
+    Raises:
+        ValidationException: 提供商不支持批量接口
+    """
+    provider = llm.provider_name
+    if provider == "openai":
+        return OpenAIBatchClient(llm)
+    if provider == "azure":
+        return OpenAIBatchClient(llm, endpoint="/chat/completions")
+    if provider == "claude":
+        return ClaudeBatchClient(llm)
+    raise ValidationException(f"提供商 {provider} 不支持批量接口")
@@ -0,0 +1,183 @@
+"""
+熔断器
+
+按（提供商, 模型）统计最近调用的失败率与慢调用率，超过阈值时打开熔断器，
+后续调用直接短路（由上层切换到故障转移链中的下一个提供商）；打开一段时间后
+进入半开状态，放行少量探测请求，成功则关闭，失败则重新打开。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_HALF_OPEN = "half_open"
+STATE_OPEN = "open"
+
+# 指标中的状态取值
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitBreaker:
+    """单个（提供商, 模型）的熔断器（线程安全）"""
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        window: Optional[int] = None,
+        min_requests: Optional[int] = None,
+        failure_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        half_open_probes: Optional[int] = None,
+    ):
+        self.provider = provider
+        self.model = model
+        self.min_requests = min_requests or settings.LLM_CIRCUIT_MIN_REQUESTS
+        self.failure_rate = failure_rate or settings.LLM_CIRCUIT_FAILURE_RATE
+        self.slow_call_seconds = slow_call_seconds or settings.LLM_CIRCUIT_SLOW_CALL_SECONDS
+        self.slow_call_rate = slow_call_rate or settings.LLM_CIRCUIT_SLOW_CALL_RATE
+        self.open_seconds = open_seconds or settings.LLM_CIRCUIT_OPEN_SECONDS
+        self.half_open_probes = half_open_probes or settings.LLM_CIRCUIT_HALF_OPEN_PROBES
+
+        # 最近的调用结果：（是否失败, 是否慢调用）
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window or settings.LLM_CIRCUIT_WINDOW)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _labels(self) -> Dict[str, str]:
+        return {"provider": self.provider, "model": self.model}
+
+    def _publish(self) -> None:
+        metrics.set_gauge("llm_circuit_state", STATE_VALUES[self._state], **self._labels())
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"熔断器 {self.provider}/{self.model}: {self._state} -> {state}")
+        self._state = state
+        self._probes = 0
+        if state == STATE_OPEN:
+            self._opened_at = time.monotonic()
+        elif state == STATE_CLOSED:
+            self._outcomes.clear()
+        metrics.inc("llm_circuit_transitions_total", state=state, **self._labels())
+        self._publish()
+
+    def _maybe_half_open(self) -> None:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(STATE_HALF_OPEN)
+
+    def allow(self) -> bool:
+        """是否放行本次调用（半开状态下仅放行有限的探测请求）"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+        metrics.inc("llm_circuit_rejections_total", **self._labels())
+        return False
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        if self._state == STATE_HALF_OPEN:
+            self._transition(STATE_OPEN if failed or slow else STATE_CLOSED)
+            return
+        if self._state == STATE_OPEN:
+            return
+
+        self._outcomes.append((failed, slow))
+        total = len(self._outcomes)
+        if total < self.min_requests:
+            return
+        failures = sum(1 for f, _ in self._outcomes if f)
+        slow_calls = sum(1 for _, s in self._outcomes if s)
+        if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+            self._transition(STATE_OPEN)
+
+    def on_success(self, seconds: float) -> None:
+        """记录一次成功调用（耗时超过阈值计为慢调用）"""
+        with self._lock:
+            self._record(False, seconds >= self.slow_call_seconds)
+
+    def on_failure(self) -> None:
+        """记录一次失败调用（仅限流、超时、5xx 等反映提供商健康度的错误）"""
+        with self._lock:
+            self._record(True, False)
+
+    def on_abandon(self, seconds: float) -> None:
+        """
+        调用未得出结论（被取消或请求本身有误）：释放半开探测名额；
+        若已超过慢调用阈值仍计为慢调用
+        """
+        with self._lock:
+            if seconds >= self.slow_call_seconds:
+                self._record(False, True)
+            elif self._state == STATE_HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            self._maybe_half_open()
+            total = len(self._outcomes)
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, s in self._outcomes if s)
+            return {
+                "provider": self.provider,
+                "model": self.model,
+                "state": self._state,
+                "calls": total,
+                "failure_rate": round(failures / total, 3) if total else 0.0,
+                "slow_call_rate": round(slow_calls / total, 3) if total else 0.0,
+            }
+
+
+class CircuitRegistry:
+    """熔断器注册表"""
+
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, model: str) -> CircuitBreaker:
+        key = (provider, model)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self._breakers[key] = CircuitBreaker(provider, model)
+        return breaker
+
+    def state(self, provider: str, model: str) -> str:
+        """熔断器状态（尚无熔断器时为 closed，不创建新的熔断器）"""
+        breaker = self._breakers.get((provider, model))
+        return breaker.state if breaker is not None else STATE_CLOSED
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        return [breaker.snapshot() for breaker in list(self._breakers.values())]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+circuit_breakers = CircuitRegistry()
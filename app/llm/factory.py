@@ -1,16 +1,15 @@
 """
 LLM工厂模式实现
+
+提供商以导入路径（"模块:类名"）注册，首次使用时才导入对应模块，
+避免在启动时加载所有提供商的 SDK。
 """
+import importlib
 import logging
-from typing import Dict, Type
+from typing import Dict, Optional, Type, Union
 
-from app.core import LLMException
+from app.core import settings, LLMException
 from .base import BaseLLM
-from .openai_llm import OpenAILLM
-from .azure_openai_llm import AzureOpenAILLM
-from .claude_llm import ClaudeLLM
-from .gemini_llm import GeminiLLM
-from .openai_compatible_llm import OpenAICompatibleLLM
 
 logger = logging.getLogger(__name__)
 
@@ -18,13 +17,13 @@ logger = logging.getLogger(__name__)
 class LLMFactory:
     """LLM工厂类 - 用于创建LLM实例"""
     
-    # 支持的LLM提供商
-    _providers: Dict[str, Type[BaseLLM]] = {
-        "openai": OpenAILLM,
-        "azure": AzureOpenAILLM,
-        "claude": ClaudeLLM,
-        "gemini": GeminiLLM,
-        "custom": OpenAICompatibleLLM,
+    # 支持的LLM提供商（导入路径或已加载的类）
+    _providers: Dict[str, Union[str, Type[BaseLLM]]] = {
+        "openai": "app.llm.openai_llm:OpenAILLM",
+        "azure": "app.llm.azure_openai_llm:AzureOpenAILLM",
+        "claude": "app.llm.claude_llm:ClaudeLLM",
+        "gemini": "app.llm.gemini_llm:GeminiLLM",
+        "custom": "app.llm.openai_compatible_llm:OpenAICompatibleLLM",
     }
     
     @classmethod
@@ -53,7 +52,7 @@ class LLMFactory:
         
         logger.info(f"创建{provider}提供商的LLM实例")
         
-        llm_class = cls._providers[provider]
+        llm_class = cls.get_provider_class(provider)
         
         # 如果是 custom 提供商，需要传递参数
         if provider == "custom":
@@ -68,15 +67,78 @@ class LLMFactory:
         return llm_class()
     
     @classmethod
-    def register(cls, provider: str, llm_class: Type[BaseLLM]) -> None:
+    def is_configured(cls, provider: str) -> bool:
+        """提供商是否已配置凭据（模型路由只在已配置的提供商中选择）"""
+        provider = provider.lower()
+        if provider == "openai":
+            return bool(settings.OPENAI_API_KEY)
+        if provider == "azure":
+            return bool(settings.AZURE_OPENAI_KEY and settings.AZURE_OPENAI_ENDPOINT)
+        if provider == "claude":
+            return bool(settings.ANTHROPIC_API_KEY)
+        if provider == "gemini":
+            return bool(settings.GOOGLE_API_KEY)
+        if provider == "custom":
+            return bool(settings.CUSTOM_BASE_URL)
+        return provider in cls._providers
+    
+    @classmethod
+    def default_model(cls, provider: str) -> Optional[str]:
+        """提供商的默认模型（Azure 为部署名）"""
+        return {
+            "openai": settings.OPENAI_MODEL,
+            "azure": settings.AZURE_OPENAI_DEPLOYMENT,
+            "claude": settings.CLAUDE_MODEL,
+            "gemini": settings.GEMINI_MODEL,
+            "custom": settings.CUSTOM_MODEL,
+        }.get(provider.lower())
+    
+    @classmethod
+    def get_provider_class(cls, provider: str) -> Type[BaseLLM]:
+        """
+        获取提供商对应的LLM类，首次调用时按导入路径加载
+        
+        Args:
+            provider: 提供商名称
+            
+        Returns:
+            LLM类
+            
+        Raises:
+            LLMException: 如果提供商不支持或模块加载失败
+        """
+        provider = provider.lower()
+        entry = cls._providers.get(provider)
+        if entry is None:
+            raise LLMException(f"不支持的LLM提供商: {provider}")
+        
+        if isinstance(entry, str):
+            module_path, _, class_name = entry.partition(":")
+            try:
+                module = importlib.import_module(module_path)
+                entry = getattr(module, class_name)
+            except (ImportError, AttributeError) as e:
+                raise LLMException(f"加载LLM提供商 {provider} 失败: {str(e)}")
+            if not issubclass(entry, BaseLLM):
+                raise LLMException(f"{entry} 必须继承自 BaseLLM")
+            cls._providers[provider] = entry
+            logger.info(f"已加载LLM提供商模块: {module_path}")
+        
+        return entry
+    
+    @classmethod
+    def register(cls, provider: str, llm_class: Union[str, Type[BaseLLM]]) -> None:
         """
         注册新的LLM提供商
         
         Args:
             provider: 提供商名称
-            llm_class: LLM类
+            llm_class: LLM类，或 "模块:类名" 形式的导入路径（首次使用时加载）
         """
-        if not issubclass(llm_class, BaseLLM):
+        if isinstance(llm_class, str):
+            if ":" not in llm_class:
+                raise ValueError(f"导入路径格式应为 '模块:类名': {llm_class}")
+        elif not issubclass(llm_class, BaseLLM):
             raise TypeError(f"{llm_class} 必须继承自 BaseLLM")
         
         cls._providers[provider.lower()] = llm_class
@@ -0,0 +1,119 @@
+"""
+对冲请求
+
+首个请求在该提供商/模型的延迟分位数（如 p95）内未返回时，再发出一个备份请求
+（同一提供商或配置的备用提供商），取最先得到有效解析结果的一方并取消另一方。
+对冲请求数受预算限制（占请求量的百分比），以控制额外成本。
+"""
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.core import settings
+from app.core.metrics import metrics
+from .stats import LatencyTracker, latency_stats
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 预算最多累积的对冲次数，避免长时间低流量后出现集中对冲
+MAX_BUDGET_TOKENS = 10.0
+
+
+class HedgeBudget:
+    """
+    对冲预算（令牌桶）
+
+    每个请求存入 percent/100 个令牌，每次对冲消耗 1 个，
+    长期来看对冲请求数不超过请求总数的 percent%。
+    """
+
+    def __init__(self, percent: Optional[float] = None):
+        self.percent = percent if percent is not None else settings.LLM_HEDGE_BUDGET_PERCENT
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def on_request(self) -> None:
+        with self._lock:
+            self._tokens = min(MAX_BUDGET_TOKENS, self._tokens + self.percent / 100)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+hedge_budget = HedgeBudget()
+
+
+async def _cancel(task: "asyncio.Task") -> None:
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+async def hedged_call(
+    primary: Callable[[], Awaitable[T]],
+    backup: Callable[[], Awaitable[T]],
+    provider: str,
+    model: str,
+    tracker: Optional[LatencyTracker] = None,
+    budget: Optional[HedgeBudget] = None,
+) -> T:
+    """
+    发起对冲调用
+
+    Args:
+        primary: 首个请求
+        backup: 备份请求
+        provider: 首个请求的提供商（延迟统计与指标标签）
+        model: 首个请求的模型
+        tracker: 延迟统计，默认全局
+        budget: 对冲预算，默认全局
+
+    Returns:
+        最先成功的一方的结果；两方都失败时抛出首个请求的异常
+    """
+    tracker = tracker or latency_stats
+    budget = budget or hedge_budget
+    budget.on_request()
+
+    delay = tracker.percentile(
+        provider, model, settings.LLM_HEDGE_PERCENTILE, min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+    )
+    if delay is None:
+        return await primary()
+
+    first = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    if not budget.try_acquire():
+        metrics.inc("llm_hedge_budget_exhausted_total", provider=provider)
+        return await first
+
+    logger.info(f"{provider}/{model} 超过 p{settings.LLM_HEDGE_PERCENTILE:g}（{delay:.2f}s）未返回，发出对冲请求")
+    metrics.inc("llm_hedge_requests_total", provider=provider, model=model)
+    second = asyncio.ensure_future(backup())
+    names = {first: "primary", second: "backup"}
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    metrics.inc("llm_hedge_wins_total", provider=provider, winner=names[task])
+                    return task.result()
+                logger.warning(f"对冲中的 {names[task]} 请求失败: {str(task.exception())}")
+        return first.result()
+    finally:
+        for task in (first, second):
+            if not task.done():
+                await _cancel(task)
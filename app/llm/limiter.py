@@ -0,0 +1,215 @@
+"""
+自适应并发限制（AIMD）
+
+按（提供商, 模型）限制同时在途的模型调用数：调用成功时加性增大上限（约每轮满载
+成功 +1），遇到限流、超时或延迟梯度（短期平均延迟明显高于长期平均）时乘性减小。
+超过上限的调用按 FIFO 排队等待，排队超时抛出 ConcurrencyLimitException，
+而不是继续向提供商发请求。
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core import settings, ConcurrencyLimitException
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 调用结果
+OUTCOME_SUCCESS = "success"
+OUTCOME_DROPPED = "dropped"  # 限流 / 超时，说明已超出提供商容量
+OUTCOME_IGNORE = "ignore"  # 与容量无关（请求错误、被取消等）
+
+# 延迟 EWMA 的平滑系数与判定前的最少样本数
+SHORT_RTT_ALPHA = 0.1
+LONG_RTT_ALPHA = 0.01
+RTT_WARMUP_SAMPLES = 10
+
+
+class AdaptiveLimiter:
+    """单个（提供商, 模型）的 AIMD 并发限制器（仅在事件循环线程内使用）"""
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        initial_limit: Optional[int] = None,
+        min_limit: Optional[int] = None,
+        max_limit: Optional[int] = None,
+        backoff_ratio: Optional[float] = None,
+        latency_tolerance: Optional[float] = None,
+    ):
+        self.provider = provider
+        self.model = model
+        self.min_limit = min_limit or settings.LLM_LIMITER_MIN
+        self.max_limit = max_limit or settings.LLM_LIMITER_MAX
+        self.backoff_ratio = backoff_ratio or settings.LLM_LIMITER_BACKOFF_RATIO
+        self.latency_tolerance = latency_tolerance or settings.LLM_LIMITER_LATENCY_TOLERANCE
+
+        initial = initial_limit or settings.LLM_LIMITER_INITIAL
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._short_rtt: Optional[float] = None
+        self._long_rtt: Optional[float] = None
+        self._samples = 0
+        # 上次减小上限的时间；此前发出的调用的拥塞信号不再重复减小
+        self._last_decrease = 0.0
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _labels(self) -> Dict[str, str]:
+        return {"provider": self.provider, "model": self.model}
+
+    def _publish(self) -> None:
+        labels = self._labels()
+        metrics.set_gauge("llm_concurrency_limit", self.limit, **labels)
+        metrics.set_gauge("llm_inflight_requests", self._inflight, **labels)
+        metrics.set_gauge("llm_queue_depth", len(self._waiters), **labels)
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        获取一个调用名额
+
+        Args:
+            timeout: 排队超时（秒），为空表示一直等待
+
+        Returns:
+            名额的获取时间，释放时传回
+
+        Raises:
+            ConcurrencyLimitException: 排队超时
+        """
+        if self._inflight < self.limit and not self._waiters:
+            self._inflight += 1
+            self._publish()
+            return time.monotonic()
+
+        if timeout is not None and timeout <= 0:
+            self._reject()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        queued_at = time.monotonic()
+        try:
+            if timeout is None:
+                await waiter
+            else:
+                await asyncio.wait_for(waiter, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # 名额已转交给本调用，交给下一个等待者
+                self._inflight -= 1
+                self._wake()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            self._publish()
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject()
+            raise
+
+        metrics.observe("llm_queue_wait_seconds", time.monotonic() - queued_at, **self._labels())
+        return time.monotonic()
+
+    def _reject(self) -> None:
+        metrics.inc("llm_limiter_rejections_total", **self._labels())
+        raise ConcurrencyLimitException(
+            f"{self.provider}/{self.model} 并发已达上限 {self.limit}，排队超时"
+        )
+
+    def _wake(self) -> None:
+        while self._waiters and self._inflight < self.limit:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._inflight += 1
+            waiter.set_result(None)
+
+    def release(self, acquired_at: float, outcome: str, seconds: Optional[float] = None) -> None:
+        """
+        释放名额并按调用结果调整上限
+
+        Args:
+            acquired_at: acquire 返回的获取时间
+            outcome: OUTCOME_SUCCESS / OUTCOME_DROPPED / OUTCOME_IGNORE
+            seconds: 调用耗时（成功时用于延迟梯度）
+        """
+        self._inflight -= 1
+        if outcome == OUTCOME_DROPPED:
+            self._decrease(acquired_at, "dropped")
+        elif outcome == OUTCOME_SUCCESS:
+            if seconds is not None and self._congested(seconds):
+                self._decrease(acquired_at, "latency")
+            elif (self._inflight + 1) * 2 >= self.limit:
+                # 仅在名额接近用满时增大，避免低负载时上限无意义地涨到最大
+                self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+        self._wake()
+        self._publish()
+
+    def _congested(self, seconds: float) -> bool:
+        """短期平均延迟超过长期平均的 latency_tolerance 倍视为提供商侧排队"""
+        if self._short_rtt is None:
+            self._short_rtt = self._long_rtt = seconds
+        else:
+            self._short_rtt += SHORT_RTT_ALPHA * (seconds - self._short_rtt)
+            self._long_rtt += LONG_RTT_ALPHA * (seconds - self._long_rtt)
+        self._samples += 1
+        return self._samples >= RTT_WARMUP_SAMPLES and self._short_rtt > self._long_rtt * self.latency_tolerance
+
+    def _decrease(self, acquired_at: float, reason: str) -> None:
+        if acquired_at < self._last_decrease:
+            return
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+        self._last_decrease = time.monotonic()
+        metrics.inc("llm_limiter_decreases_total", reason=reason, **self._labels())
+        logger.warning(f"{self.provider}/{self.model} 并发上限 {previous} -> {self.limit}（{reason}）")
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "limit": self.limit,
+            "inflight": self._inflight,
+            "queued": len(self._waiters),
+        }
+
+
+class LimiterRegistry:
+    """并发限制器注册表"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+
+    def get(self, provider: str, model: str) -> AdaptiveLimiter:
+        key = (provider, model)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = AdaptiveLimiter(provider, model)
+        return limiter
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        return [limiter.snapshot() for limiter in list(self._limiters.values())]
+
+    def reset(self) -> None:
+        self._limiters.clear()
+
+
+concurrency_limiters = LimiterRegistry()
@@ -0,0 +1,71 @@
+"""
+OpenAI Chat Completions 协议的公共构建与解析（OpenAI / Azure / OpenAI 兼容提供商共用）
+"""
+import base64
+from typing import Any, Dict, List, Optional
+
+from .base import PromptParts, LLMCompletion
+
+
+def image_data_url(image: bytes) -> str:
+    """将图像编码为 data URL"""
+    import magic
+    mime_type = magic.from_buffer(image, mime=True)
+    image_base64 = base64.b64encode(image).decode("utf-8")
+    return f"data:{mime_type};base64,{image_base64}"
+
+
+def build_messages(parts: PromptParts, image: Optional[bytes] = None) -> List[Dict[str, Any]]:
+    """
+    构建 messages
+
+    静态前缀与系统提示词合并在 system 消息中，保证相同 schema 的请求
+    拥有逐字节一致的前缀，以命中 OpenAI 的自动前缀缓存。
+    """
+    system = parts.system
+    if parts.static:
+        system = f"{system}\n\n{parts.static}"
+
+    if image:
+        user_content: Any = [
+            {"type": "text", "text": parts.dynamic},
+            {"type": "image_url", "image_url": {"url": image_data_url(image)}},
+        ]
+    else:
+        user_content = parts.dynamic
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def build_completion_params(
+    parts: PromptParts,
+    image: Optional[bytes],
+    model: str,
+    max_tokens: int = 4096,
+) -> Dict[str, Any]:
+    """Chat Completions 请求参数（实时调用与批量接口共用）"""
+    return {
+        "model": model,
+        "messages": build_messages(parts, image),
+        "temperature": 0,
+        "max_tokens": max_tokens,
+    }
+
+
+def parse_chat_completion(response: Any) -> LLMCompletion:
+    """从 Chat Completions 响应中提取文本与 token 用量"""
+    text = response.choices[0].message.content or ""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return LLMCompletion(text)
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    return LLMCompletion(
+        text,
+        input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        cached_tokens=(getattr(details, "cached_tokens", 0) or 0) if details else 0,
+    )
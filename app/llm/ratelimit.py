@@ -0,0 +1,381 @@
+"""
+按提供商配额（RPM / TPM）调度模型调用
+
+按（提供商, 模型/部署, API 密钥指纹）统计每个时间窗口内的请求数与预估 token 数，
+配额按窗口长度折算（如 TPM 60000、窗口 10 秒 -> 每窗口 10000 token）。当前窗口
+已满时预约之后的窗口并等待到窗口开始，从而主动保持在配额内，而不是等 429。
+
+计数保存在可替换的存储中：
+- memory: 进程内（单进程部署）
+- file: 文件锁保护的计数文件，同一主机的多个 worker 共享（建议放在 /dev/shm）
+- redis: Redis（RESP 协议，INCRBY + EXPIRE），多主机共享
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from app.core import settings, RateLimitException
+from app.core.deadline import remaining_time
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 预估图像输入的 token 数
+IMAGE_TOKEN_ESTIMATE = 1000
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数：非 ASCII 字符（中文等）约 1 token/字，ASCII 约 4 字符/token"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def credential_id(api_key: Optional[str]) -> str:
+    """API 密钥指纹（不在计数键中暴露密钥）"""
+    if not api_key:
+        return "-"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class CounterStore(ABC):
+    """带过期时间的原子计数器"""
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        """计数加 amount（可为负）并返回新值，键在 ttl 秒后过期"""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCounterStore(CounterStore):
+    """进程内计数"""
+
+    def __init__(self):
+        self._counters: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        now = time.time()
+        with self._lock:
+            value, expires = self._counters.get(key, (0, 0.0))
+            if expires <= now:
+                value = 0
+                # 顺带清理过期的键
+                for stale in [k for k, (_, e) in self._counters.items() if e <= now]:
+                    del self._counters[stale]
+            value += amount
+            self._counters[key] = (value, max(expires, now + ttl))
+            return value
+
+
+class FileCounterStore(CounterStore):
+    """
+    文件计数（fcntl 排他锁），同一主机上的所有 worker 共享
+
+    计数文件很小（仅保留未过期的窗口），读改写在锁内完成。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        # 文件锁可能被其他 worker 持有，读写放到线程中，不阻塞事件循环
+        return await asyncio.to_thread(self._incr, key, amount, ttl)
+
+    def _incr(self, key: str, amount: int, ttl: float) -> int:
+        now = time.time()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), "r+", encoding="utf-8") as f:
+                raw = f.read()
+                try:
+                    counters: Dict[str, List[float]] = json.loads(raw) if raw else {}
+                except ValueError:
+                    counters = {}
+                counters = {k: v for k, v in counters.items() if v[1] > now}
+                value, expires = counters.get(key, (0, 0.0))
+                value = int(value) + amount
+                counters[key] = [value, max(expires, now + ttl)]
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(counters, separators=(",", ":")))
+            return value
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class RedisCounterStore(CounterStore):
+    """
+    Redis 计数（最小 RESP 客户端，仅用 INCRBY / EXPIRE / AUTH / SELECT）
+
+    Args:
+        url: redis://[:password@]host[:port][/db]
+    """
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    def _encode(*args: Any) -> bytes:
+        out = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    async def _read_reply(self) -> Any:
+        assert self._reader is not None
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis 连接已关闭")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            raise RuntimeError(f"Redis 错误: {body.decode()}")
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8")
+        if prefix == b"*":
+            return [await self._read_reply() for _ in range(int(body))]
+        raise RuntimeError(f"无法识别的 Redis 响应: {line!r}")
+
+    async def _execute(self, *commands: Tuple[Any, ...]) -> List[Any]:
+        """以流水线方式发送多条命令并依次读取响应（调用方持有锁）"""
+        assert self._writer is not None
+        self._writer.write(b"".join(self._encode(*command) for command in commands))
+        await self._writer.drain()
+        return [await self._read_reply() for _ in commands]
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        commands = []
+        if self.password:
+            commands.append(("AUTH", self.password))
+        if self.db:
+            commands.append(("SELECT", self.db))
+        if commands:
+            await self._execute(*commands)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 连接与锁绑定事件循环
+            self._loop, self._lock, self._writer = loop, asyncio.Lock(), None
+        assert self._lock is not None
+        async with self._lock:
+            if self._writer is None:
+                await self._connect()
+            try:
+                value, _ = await self._execute(
+                    ("INCRBY", key, amount), ("EXPIRE", key, max(1, int(ttl + 0.5)))
+                )
+            except Exception:
+                await self.close()
+                raise
+            return int(value)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class Reservation:
+    """一次配额预约：计入的窗口与预估 token 数，调用结束后按实际用量修正，未发送时退还"""
+
+    __slots__ = ("counters", "token_key", "tokens", "wait")
+
+    def __init__(self, counters: List[Tuple[str, int]], token_key: Optional[str], tokens: int, wait: float):
+        self.counters = counters
+        self.token_key = token_key
+        self.tokens = tokens
+        self.wait = wait
+
+
+class RateLimiter:
+    """按配额调度调用（所有 worker 共享同一存储时即为全局配额）"""
+
+    def __init__(self, store: Optional[CounterStore] = None, window: Optional[float] = None):
+        self._store = store
+        self._window = window
+
+    @property
+    def window(self) -> float:
+        return self._window or settings.LLM_RATE_LIMIT_WINDOW
+
+    @property
+    def store(self) -> CounterStore:
+        if self._store is None:
+            self._store = create_store(settings.LLM_RATE_LIMIT_BACKEND)
+        return self._store
+
+    @staticmethod
+    def quota(provider: str, model: str) -> Optional[Dict[str, float]]:
+        """LLM_RATE_LIMITS 中 "provider:model" 优先于 "provider" 的配额"""
+        limits = settings.LLM_RATE_LIMITS
+        return limits.get(f"{provider}:{model}") or limits.get(provider)
+
+    async def acquire(
+        self,
+        provider: str,
+        model: str,
+        credential: str,
+        tokens: int,
+        max_wait: Optional[float] = None,
+    ) -> Optional[Reservation]:
+        """
+        预约配额并等待到可发送的时间
+
+        Args:
+            provider: 提供商名称
+            model: 模型或部署名称
+            credential: API 密钥指纹
+            tokens: 预估 token 数（输入 + 输出）
+            max_wait: 最长等待秒数，默认取配置与请求剩余时间的较小者
+
+        Returns:
+            预约（未配置配额时为 None）
+
+        Raises:
+            RateLimitException: 在最长等待时间内无可用配额
+        """
+        quota = self.quota(provider, model)
+        if not quota:
+            return None
+
+        if max_wait is None:
+            max_wait = settings.LLM_RATE_LIMIT_MAX_WAIT
+            remaining = remaining_time()
+            if remaining is not None:
+                max_wait = min(max_wait, remaining)
+
+        labels = {"provider": provider, "model": model}
+        try:
+            reservation = await self._reserve(f"{provider}:{model}:{credential}", quota, tokens, max_wait)
+        except Exception as e:
+            # 存储不可用时放行，不因限流组件故障阻断提取
+            metrics.inc("llm_rate_limit_backend_errors_total", **labels)
+            logger.warning(f"限流存储不可用，跳过配额检查: {str(e)}")
+            return None
+
+        if reservation is None:
+            metrics.inc("llm_rate_limit_rejections_total", **labels)
+            raise RateLimitException(f"{provider}/{model} 在 {max_wait:.1f}s 内无可用配额")
+
+        metrics.observe("llm_rate_limit_wait_seconds", reservation.wait, **labels)
+        if reservation.wait > 0:
+            logger.info(f"{provider}/{model} 配额已满，等待 {reservation.wait:.2f}s 后发送")
+            try:
+                await asyncio.sleep(reservation.wait)
+            except BaseException:
+                await self.release(reservation)
+                raise
+        return reservation
+
+    async def _reserve(
+        self,
+        key: str,
+        quota: Dict[str, float],
+        tokens: int,
+        max_wait: float,
+    ) -> Optional[Reservation]:
+        scale = self.window / 60
+        limits = []
+        if quota.get("rpm"):
+            limits.append(("req", 1, max(1, int(quota["rpm"] * scale))))
+        if quota.get("tpm"):
+            limits.append(("tok", tokens, max(1, int(quota["tpm"] * scale))))
+
+        now = time.time()
+        slot = int(now // self.window)
+        ttl = self.window * 2 + max_wait
+        while True:
+            wait = max(0.0, slot * self.window - now)
+            if wait > max_wait:
+                return None
+            taken: List[Tuple[str, int]] = []
+            fits = True
+            for dimension, amount, limit in limits:
+                counter = f"llm_rl:{key}:{dimension}:{slot}"
+                value = await self.store.incr(counter, amount, ttl)
+                taken.append((counter, amount))
+                # 超过单窗口配额的大请求在空窗口中仍可发送
+                if value > limit and value != amount:
+                    fits = False
+                    break
+            if fits:
+                token_key = next((c for c, _ in taken if c.endswith(f":tok:{slot}")), None)
+                return Reservation(taken, token_key, tokens, wait)
+            for counter, amount in taken:
+                await self.store.incr(counter, -amount, ttl)
+            slot += 1
+
+    async def settle(self, reservation: Optional[Reservation], actual_tokens: int) -> None:
+        """按实际 token 用量修正预约窗口的计数"""
+        if reservation is None or reservation.token_key is None or actual_tokens <= 0:
+            return
+        delta = actual_tokens - reservation.tokens
+        if delta == 0:
+            return
+        try:
+            await self.store.incr(reservation.token_key, delta, self.window * 2)
+        except Exception as e:
+            logger.warning(f"修正 token 用量失败: {str(e)}")
+
+    async def release(self, reservation: Optional[Reservation]) -> None:
+        """退还未发送调用的预约（等待配额或并发名额时超时、被取消）"""
+        if reservation is None:
+            return
+        counters, reservation.counters = reservation.counters, []
+        try:
+            for counter, amount in counters:
+                await self.store.incr(counter, -amount, self.window * 2)
+        except Exception as e:
+            logger.warning(f"退还配额预约失败: {str(e)}")
+
+
+def create_store(backend: str) -> CounterStore:
+    """按配置创建计数存储（memory|file|redis）"""
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryCounterStore()
+    if backend == "file":
+        if fcntl is None:
+            logger.warning("当前平台不支持文件锁，限流计数改为进程内")
+            return MemoryCounterStore()
+        return FileCounterStore(settings.LLM_RATE_LIMIT_FILE)
+    if backend == "redis":
+        return RedisCounterStore(settings.LLM_RATE_LIMIT_REDIS_URL)
+    raise ValueError(f"不支持的限流存储: {backend}")
+
+
+rate_limiter = RateLimiter()
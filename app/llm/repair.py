@@ -0,0 +1,257 @@
+"""
+LLM 响应修复
+
+模型返回的 TOON 略有瑕疵（行数声明错误、值中含未加引号的逗号、夹杂说明文字、
+改用 JSON 或 Markdown 表格输出）时，按代价从低到高依次尝试本地修复，
+尽量挽救可用的行；仍缺失的字段由调用方针对性地重新询问模型。
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from app.utils.compiled_schema import CompiledSchema
+from app.utils.toon_utils import (
+    ToonDecodeError,
+    decode_table,
+    encode_toon,
+    parse_scalar,
+    parse_table_header,
+    split_row,
+)
+
+logger = logging.getLogger(__name__)
+
+# 修复类型（用于指标标签）
+REPAIR_COUNT_FIX = "count_fix"
+REPAIR_COLUMN_REALIGN = "column_realign"
+REPAIR_PARTIAL = "partial"
+REPAIR_JSON = "json"
+REPAIR_MARKDOWN = "markdown"
+
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*\n(.*?)\n```", flags=re.S | re.I)
+_MD_SEPARATOR_RE = re.compile(r"^:?-{2,}:?$")
+
+
+class RepairResult:
+    """修复结果：挽救出的行、应用的修复类型与仍缺失的字段"""
+
+    __slots__ = ("rows", "kinds", "missing")
+
+    def __init__(self, rows: List[Dict[str, Any]], kinds: List[str], missing: List[str]):
+        self.rows = rows
+        self.kinds = kinds
+        self.missing = missing
+
+    @property
+    def repaired(self) -> bool:
+        return bool(self.rows)
+
+    def to_toon(self) -> str:
+        """将挽救出的行重新编码为规范的 values 表格"""
+        return encode_toon({"values": self.rows})
+
+
+def _row(field: str, ftype: Any, value: Any, compiled: CompiledSchema) -> Dict[str, Any]:
+    schema_field = compiled.field_map.get(field)
+    if ftype in (None, "") and schema_field is not None:
+        ftype = schema_field.type
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return {"field": field, "type": str(ftype or "text"), "value": value}
+
+
+def _resolve_field(key: Any, compiled: CompiledSchema, names: Dict[str, str]) -> Optional[str]:
+    """将字段名或中文名称映射为 schema 中的 field"""
+    key = str(key).strip()
+    if key in compiled.field_map:
+        return key
+    return names.get(key)
+
+
+def _salvage_table(text: str, compiled: CompiledSchema, kinds: List[str]) -> List[Dict[str, Any]]:
+    """逐行挽救 TOON 表格：修正行数、按已知字段重新对齐列、丢弃无法解析的行"""
+    lines = text.splitlines()
+    start = None
+    for i, line in enumerate(lines):
+        header = parse_table_header(line)
+        if header:
+            start = i
+            break
+    if start is None:
+        return []
+
+    _, declared, delimiter, columns = header
+    if "field" not in columns or "value" not in columns:
+        return []
+    field_idx = columns.index("field")
+    value_idx = columns.index("value")
+    type_idx = columns.index("type") if "type" in columns else None
+
+    rows: List[Dict[str, Any]] = []
+    realigned = dropped = 0
+    for line in lines[start + 1:]:
+        content = line.strip()
+        if content.startswith("```") or parse_table_header(line):
+            break
+        if not content:
+            continue
+
+        try:
+            tokens = split_row(content, delimiter)
+        except ToonDecodeError:
+            tokens = content.split(delimiter)
+
+        if len(tokens) == len(columns):
+            field = parse_scalar(tokens[field_idx])
+            ftype = parse_scalar(tokens[type_idx]) if type_idx is not None else None
+            value = parse_scalar(tokens[value_idx])
+        elif str(parse_scalar(tokens[0])) in compiled.field_map and len(tokens) >= 2:
+            # 值中含未加引号的分隔符（多列）或省略了 type 列（少列）
+            field = parse_scalar(tokens[0])
+            if len(tokens) > len(columns) and value_idx == len(columns) - 1:
+                ftype = parse_scalar(tokens[type_idx]) if type_idx is not None else None
+                value = delimiter.join(tokens[value_idx:]).strip()
+            elif len(tokens) == 2:
+                ftype = None
+                value = parse_scalar(tokens[1])
+            else:
+                dropped += 1
+                continue
+            realigned += 1
+        else:
+            if rows and delimiter not in content:
+                # 表格后的说明文字
+                break
+            dropped += 1
+            continue
+
+        if isinstance(field, str) and field:
+            rows.append(_row(field, ftype, value, compiled))
+
+    if realigned:
+        kinds.append(REPAIR_COLUMN_REALIGN)
+    if dropped:
+        kinds.append(REPAIR_PARTIAL)
+    if rows and len(rows) != declared:
+        kinds.append(REPAIR_COUNT_FIX)
+    return rows
+
+
+def _json_candidates(text: str) -> List[str]:
+    candidates = [m.group(1) for m in _JSON_BLOCK_RE.finditer(text)]
+    for open_ch, close_ch in (("{", "}"), ("[", "]")):
+        begin, end = text.find(open_ch), text.rfind(close_ch)
+        if 0 <= begin < end:
+            candidates.append(text[begin:end + 1])
+    return candidates
+
+
+def _from_json(text: str, compiled: CompiledSchema, names: Dict[str, str]) -> List[Dict[str, Any]]:
+    """JSON 输出：{"values": [...]}、[{field, value}, ...] 或 {字段: 值}"""
+    for candidate in _json_candidates(text):
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+
+        if isinstance(data, dict) and isinstance(data.get("values"), list):
+            data = data["values"]
+
+        rows: List[Dict[str, Any]] = []
+        if isinstance(data, list):
+            for item in data:
+                if isinstance(item, dict) and "field" in item:
+                    field = _resolve_field(item["field"], compiled, names)
+                    if field:
+                        rows.append(_row(field, item.get("type"), item.get("value"), compiled))
+        elif isinstance(data, dict):
+            for key, value in data.items():
+                field = _resolve_field(key, compiled, names)
+                if field:
+                    rows.append(_row(field, None, value, compiled))
+        if rows:
+            return rows
+    return []
+
+
+def _md_cells(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _from_markdown(text: str, compiled: CompiledSchema, names: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Markdown 表格：field/type/value 列，或以字段为表头的单行数据"""
+    table = [
+        _md_cells(line) for line in text.splitlines()
+        if line.strip().startswith("|")
+    ]
+    table = [cells for cells in table if not all(_MD_SEPARATOR_RE.match(c) for c in cells if c)]
+    if len(table) < 2:
+        return []
+
+    header = [c.lower() for c in table[0]]
+    rows: List[Dict[str, Any]] = []
+    if "field" in header and "value" in header:
+        field_idx, value_idx = header.index("field"), header.index("value")
+        type_idx = header.index("type") if "type" in header else None
+        for cells in table[1:]:
+            if len(cells) != len(header):
+                continue
+            field = _resolve_field(cells[field_idx], compiled, names)
+            if field:
+                ftype = cells[type_idx] if type_idx is not None else None
+                rows.append(_row(field, ftype, parse_scalar(cells[value_idx]), compiled))
+        return rows
+
+    fields = [_resolve_field(c, compiled, names) for c in table[0]]
+    if any(fields) and len(table[1]) == len(fields):
+        for field, cell in zip(fields, table[1]):
+            if field:
+                rows.append(_row(field, None, parse_scalar(cell), compiled))
+    return rows
+
+
+def repair_values(text: str, compiled: CompiledSchema) -> RepairResult:
+    """
+    按代价从低到高修复 LLM 响应
+
+    1. 严格解码（无需修复）
+    2. 逐行挽救 TOON 表格（行数修正、列重新对齐、部分行挽救）
+    3. JSON 输出
+    4. Markdown 表格
+
+    Args:
+        text: LLM 原始响应
+        compiled: 编译后的 schema
+
+    Returns:
+        修复结果；rows 为空表示无法修复
+    """
+    text = text or ""
+    kinds: List[str] = []
+    try:
+        rows = decode_table(text)
+    except ToonDecodeError:
+        names = {f.name: f.field for f in compiled.fields}
+        rows = _salvage_table(text, compiled, kinds)
+        if not rows:
+            kinds = []
+            rows = _from_json(text, compiled, names)
+            if rows:
+                kinds.append(REPAIR_JSON)
+        if not rows:
+            rows = _from_markdown(text, compiled, names)
+            if rows:
+                kinds.append(REPAIR_MARKDOWN)
+
+    seen = set()
+    unique: List[Dict[str, Any]] = []
+    for row in rows:
+        if row["field"] not in seen:
+            seen.add(row["field"])
+            unique.append(row)
+
+    missing = [name for name in compiled.field_names if name not in seen]
+    if kinds:
+        logger.info(f"LLM 响应已修复: {kinds}，挽救 {len(unique)} 个字段，缺失 {len(missing)} 个")
+    return RepairResult(unique, kinds, missing)
@@ -0,0 +1,208 @@
+"""
+LLM 调用重试策略
+
+将提供商 SDK 抛出的异常归类为可重试（限流、超时、5xx、连接失败）与不可重试
+（内容过滤、上下文超长、鉴权、请求错误），可重试错误按全抖动指数退避重试，
+优先遵循服务端返回的 Retry-After，且不超过请求截止时间与重试预算。
+"""
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+
+from app.core import settings, AppException
+from app.core.deadline import current_budget
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 错误分类
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_TIMEOUT = "timeout"
+ERROR_SERVER = "server_error"
+ERROR_CONNECTION = "connection"
+ERROR_CONTENT_FILTER = "content_filter"
+ERROR_CONTEXT_LENGTH = "context_length"
+ERROR_AUTH = "auth"
+ERROR_BAD_REQUEST = "bad_request"
+ERROR_UNKNOWN = "unknown"
+ERROR_REJECTED = "rejected"  # 服务自身拒绝（熔断、排队超时），未发往提供商
+
+RETRYABLE_ERRORS = frozenset({ERROR_RATE_LIMIT, ERROR_TIMEOUT, ERROR_SERVER, ERROR_CONNECTION})
+
+_CONTEXT_LENGTH_MARKERS = (
+    "context_length_exceeded",
+    "maximum context length",
+    "prompt is too long",
+    "too many tokens",
+    "exceeds the maximum number of tokens",
+)
+_CONTENT_FILTER_MARKERS = (
+    "content_filter",
+    "content management policy",
+    "responsible ai",
+    "safety",
+    "blocked",
+)
+_TIMEOUT_NAMES = ("Timeout", "DeadlineExceeded")
+_CONNECTION_NAMES = ("APIConnectionError", "ConnectError", "ServiceUnavailable", "RemoteProtocolError")
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return int(value) if isinstance(value, int) else None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """从响应头读取 Retry-After（秒或 HTTP 日期）/ retry-after-ms"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value:
+            return max(0.0, float(value) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException) -> Tuple[str, Optional[float]]:
+    """
+    对模型调用异常分类
+
+    Args:
+        exc: 提供商 SDK 抛出的异常
+
+    Returns:
+        （错误分类, Retry-After 秒数）
+    """
+    if isinstance(exc, AppException):
+        # 不能按 status_code 归类，否则熔断（503）会被当作 5xx 重试
+        return ERROR_REJECTED, None
+
+    name = type(exc).__name__
+    message = str(exc).lower()
+    status = _status_code(exc)
+
+    if isinstance(exc, asyncio.TimeoutError) or any(n in name for n in _TIMEOUT_NAMES) or status in (408, 504):
+        return ERROR_TIMEOUT, None
+    if status == 429 or "RateLimit" in name or "ResourceExhausted" in name:
+        return ERROR_RATE_LIMIT, _retry_after(exc)
+    if status is not None and (status >= 500 or status == 409):
+        return ERROR_SERVER, _retry_after(exc)
+    if any(n in name for n in _CONNECTION_NAMES):
+        return ERROR_CONNECTION, None
+    if any(marker in message for marker in _CONTEXT_LENGTH_MARKERS) or status == 413:
+        return ERROR_CONTEXT_LENGTH, None
+    if any(marker in message for marker in _CONTENT_FILTER_MARKERS):
+        return ERROR_CONTENT_FILTER, None
+    if status in (401, 403):
+        return ERROR_AUTH, None
+    if status is not None and 400 <= status < 500:
+        return ERROR_BAD_REQUEST, None
+    return ERROR_UNKNOWN, None
+
+
+class RetryPolicy:
+    """重试策略：最大尝试次数与全抖动指数退避"""
+
+    __slots__ = ("max_attempts", "base_delay", "max_delay")
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+    ):
+        self.max_attempts = max_attempts if max_attempts is not None else settings.LLM_RETRY_MAX_ATTEMPTS
+        self.base_delay = base_delay if base_delay is not None else settings.LLM_RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else settings.LLM_RETRY_MAX_DELAY
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        第 attempt 次失败后的等待时间
+
+        有 Retry-After 时不短于服务端要求（附加少量抖动以错开并发重试），否则为
+        [0, min(max_delay, base_delay * 2^(attempt-1))] 内的均匀随机值。
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, min(1.0, self.base_delay))
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+
+async def call_with_retry(
+    fn: Callable[[], Awaitable[T]],
+    provider: str,
+    policy: Optional[RetryPolicy] = None,
+) -> T:
+    """
+    按重试策略调用
+
+    每次尝试都受请求截止时间约束；等待时间超过剩余时间或重试预算用尽时
+    直接抛出最后一次的异常。
+
+    Args:
+        fn: 发起一次调用的协程函数
+        provider: 提供商名称（指标标签）
+        policy: 重试策略，默认按配置
+
+    Returns:
+        调用结果
+    """
+    policy = policy or RetryPolicy()
+    budget = current_budget()
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = budget.remaining() if budget is not None else None
+        try:
+            if remaining is None:
+                return await fn()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("已超过请求截止时间")
+            return await asyncio.wait_for(fn(), timeout=remaining)
+        except Exception as e:
+            kind, retry_after = classify_error(e)
+            metrics.inc("llm_errors_total", provider=provider, kind=kind)
+
+            give_up = None
+            if kind not in RETRYABLE_ERRORS:
+                give_up = "fatal"
+            elif attempt >= policy.max_attempts:
+                give_up = "attempts"
+            else:
+                delay = policy.backoff(attempt, retry_after)
+                remaining = budget.remaining() if budget is not None else None
+                if remaining is not None and delay >= remaining:
+                    give_up = "deadline"
+                elif budget is not None and not budget.take_retry():
+                    give_up = "budget"
+
+            if give_up:
+                if give_up != "fatal":
+                    metrics.inc("llm_retry_giveups_total", provider=provider, reason=give_up)
+                    logger.warning(f"{provider} 调用失败（{kind}），放弃重试: {give_up}")
+                raise
+
+            metrics.inc("llm_retries_total", provider=provider, kind=kind)
+            logger.warning(
+                f"{provider} 调用失败（{kind}），{delay:.2f}s 后第 {attempt + 1} 次尝试: {str(e)}"
+            )
+            await asyncio.sleep(delay)
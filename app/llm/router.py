@@ -0,0 +1,186 @@
+"""
+模型路由
+
+provider=auto 或 model=auto 时，按模型目录（各提供商的 ModelInfo）选择模型：
+1. 过滤：需要的能力（图像需 vision）、上下文长度（max_tokens 或 long_context）、
+   熔断状态、调用方约束（单次最高成本、延迟 SLO）；
+2. 评分：按错误率折算的预估成本 + 延迟权重 × 按错误率折算的 EWMA 延迟，取最低者。
+"""
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.core import settings, LLMException, ValidationException
+from .base import ModelInfo
+from .circuit import STATE_OPEN, circuit_breakers
+from .ratelimit import IMAGE_TOKEN_ESTIMATE, estimate_tokens
+from .stats import ModelHealth, model_health
+
+logger = logging.getLogger(__name__)
+
+AUTO = "auto"
+
+# 预估 token：Prompt 固定开销、每个 schema 字段的输入与输出 token
+PROMPT_OVERHEAD_TOKENS = 300
+INPUT_TOKENS_PER_FIELD = 30
+OUTPUT_TOKENS_PER_FIELD = 20
+
+
+class RouteDecision(BaseModel):
+    """路由结果（随响应元数据返回）"""
+    provider: str = Field(..., description="选中的提供商")
+    model: str = Field(..., description="选中的模型")
+    estimated_input_tokens: int = Field(..., description="预估输入 token")
+    estimated_output_tokens: int = Field(..., description="预估输出 token")
+    estimated_cost: float = Field(..., description="预估成本（美元）")
+    expected_latency: Optional[float] = Field(None, description="EWMA 延迟（秒），无样本时为空")
+    error_rate: float = Field(0.0, description="EWMA 错误率")
+    candidates: int = Field(..., description="满足约束的候选模型数")
+    rejected: Dict[str, str] = Field(default_factory=dict, description="被排除的模型及原因")
+
+
+class ModelRouter:
+    """
+    成本与延迟感知的模型路由
+
+    Args:
+        catalog_loader: 返回某提供商模型目录的函数（结果按提供商缓存）
+        health: 延迟与错误率统计，默认全局
+    """
+
+    def __init__(
+        self,
+        catalog_loader: Callable[[str], List[ModelInfo]],
+        health: Optional[ModelHealth] = None,
+    ):
+        self._catalog_loader = catalog_loader
+        self._health = health or model_health
+        self._catalogs: Dict[str, List[ModelInfo]] = {}
+        self._lock = threading.Lock()
+
+    def catalog(self, provider: str) -> List[ModelInfo]:
+        """提供商可路由的模型（LLM_ROUTER_MODELS 白名单；custom 默认仅 CUSTOM_MODEL）"""
+        models = self._catalogs.get(provider)
+        if models is None:
+            try:
+                models = self._catalog_loader(provider)
+            except Exception as e:
+                logger.warning(f"无法获取 {provider} 的模型目录: {str(e)}")
+                models = []
+            allowed = settings.LLM_ROUTER_MODELS.get(provider)
+            if allowed is None and provider == "custom":
+                allowed = [settings.CUSTOM_MODEL]
+            if allowed is not None:
+                models = [m for m in models if m.name in allowed]
+            with self._lock:
+                self._catalogs[provider] = models
+        return models
+
+    def route(
+        self,
+        providers: List[str],
+        model: Optional[str],
+        text: str,
+        image: Optional[bytes],
+        field_count: int,
+        max_cost: Optional[float] = None,
+        latency_slo: Optional[float] = None,
+    ) -> RouteDecision:
+        """
+        选择模型
+
+        Args:
+            providers: 候选提供商
+            model: 指定模型（为空或 auto 时在目录中选择）
+            text: 文档文本
+            image: 图像内容（需要 vision 能力）
+            field_count: schema 字段数
+            max_cost: 单次调用最高成本（美元）
+            latency_slo: 延迟 SLO（秒），EWMA 延迟超过者被排除
+
+        Returns:
+            路由结果
+
+        Raises:
+            LLMException: 没有可路由的模型
+            ValidationException: 没有满足约束的模型
+        """
+        input_tokens = (
+            estimate_tokens(text)
+            + PROMPT_OVERHEAD_TOKENS
+            + INPUT_TOKENS_PER_FIELD * field_count
+            + (IMAGE_TOKEN_ESTIMATE if image else 0)
+        )
+        output_tokens = OUTPUT_TOKENS_PER_FIELD * max(1, field_count)
+        total_tokens = input_tokens + output_tokens
+
+        rejected: Dict[str, str] = {}
+        scored: List[Tuple[float, str, ModelInfo, float, Optional[float], float]] = []
+        for provider in providers:
+            for info in self.catalog(provider):
+                if model and model != AUTO and info.name != model:
+                    continue
+                key = f"{provider}/{info.name}"
+                reason = self._reject_reason(info, image, total_tokens)
+                if reason is None and circuit_breakers.state(provider, info.name) == STATE_OPEN:
+                    reason = "circuit_open"
+
+                cost = (
+                    input_tokens / 1000 * (info.cost_per_1k_input or 0.0)
+                    + output_tokens / 1000 * (info.cost_per_1k_output or 0.0)
+                )
+                latency, error_rate, _ = self._health.get(provider, info.name)
+                if reason is None and max_cost is not None and cost > max_cost:
+                    reason = "max_cost"
+                if reason is None and latency_slo is not None and latency is not None and latency > latency_slo:
+                    reason = "latency_slo"
+                if reason is not None:
+                    rejected[key] = reason
+                    continue
+
+                # 按错误率折算重试带来的额外成本与延迟
+                success = max(0.05, 1.0 - error_rate)
+                expected_latency = latency if latency is not None else settings.LLM_ROUTER_DEFAULT_LATENCY
+                score = cost / success + settings.LLM_ROUTER_LATENCY_WEIGHT * expected_latency / success
+                scored.append((score, provider, info, cost, latency, error_rate))
+
+        if not scored:
+            if not rejected:
+                raise LLMException(f"没有可路由的模型: providers={providers}, model={model}")
+            raise ValidationException(f"没有满足约束的模型: {rejected}")
+
+        scored.sort(key=lambda item: item[0])
+        _, provider, info, cost, latency, error_rate = scored[0]
+        decision = RouteDecision(
+            provider=provider,
+            model=info.name,
+            estimated_input_tokens=input_tokens,
+            estimated_output_tokens=output_tokens,
+            estimated_cost=round(cost, 6),
+            expected_latency=round(latency, 3) if latency is not None else None,
+            error_rate=round(error_rate, 3),
+            candidates=len(scored),
+            rejected=rejected,
+        )
+        logger.info(
+            f"模型路由: {provider}/{info.name}（预估成本 ${cost:.6f}，候选 {len(scored)}，排除 {len(rejected)}）"
+        )
+        return decision
+
+    @staticmethod
+    def _reject_reason(info: ModelInfo, image: Optional[bytes], total_tokens: int) -> Optional[str]:
+        capabilities = set(info.capabilities)
+        if image and "vision" not in capabilities:
+            return "no_vision"
+        if info.max_tokens is not None:
+            if total_tokens > info.max_tokens:
+                return "context_length"
+        elif total_tokens > settings.LLM_ROUTER_LONG_CONTEXT_TOKENS and "long_context" not in capabilities:
+            return "context_length"
+        return None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._catalogs.clear()
@@ -0,0 +1,100 @@
+"""
+LLM 调用延迟统计
+
+按（提供商, 模型）保留最近的调用耗时，用于对冲延迟等需要延迟分位数的策略；
+以及延迟与错误率的 EWMA，用于模型路由。
+"""
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+DEFAULT_WINDOW = 256
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计（线程安全）"""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, seconds: float) -> None:
+        """记录一次成功调用的耗时（秒）"""
+        key = (provider, model)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, provider: str, model: str) -> int:
+        with self._lock:
+            return len(self._samples.get((provider, model), ()))
+
+    def percentile(
+        self,
+        provider: str,
+        model: str,
+        p: float,
+        min_samples: int = 1,
+    ) -> Optional[float]:
+        """
+        延迟分位数（最近邻法）
+
+        Args:
+            provider: 提供商名称
+            model: 模型名称
+            p: 分位（0-100）
+            min_samples: 样本不足时返回 None
+
+        Returns:
+            分位数（秒）
+        """
+        with self._lock:
+            samples = self._samples.get((provider, model))
+            if not samples or len(samples) < max(1, min_samples):
+                return None
+            ordered = sorted(samples)
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return ordered[min(rank, len(ordered)) - 1]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+latency_stats = LatencyTracker()
+
+
+class ModelHealth:
+    """按（提供商, 模型）的延迟与错误率 EWMA（线程安全）"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        # (延迟 EWMA, 错误率 EWMA, 样本数)
+        self._stats: Dict[Tuple[str, str], Tuple[Optional[float], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, seconds: Optional[float], failed: bool) -> None:
+        """记录一次调用：成功时带耗时，失败时仅更新错误率"""
+        key = (provider, model)
+        with self._lock:
+            latency, error_rate, samples = self._stats.get(key, (None, 0.0, 0))
+            if seconds is not None:
+                latency = seconds if latency is None else latency + self.alpha * (seconds - latency)
+            error_rate += self.alpha * ((1.0 if failed else 0.0) - error_rate)
+            self._stats[key] = (latency, error_rate, samples + 1)
+
+    def get(self, provider: str, model: str) -> Tuple[Optional[float], float, int]:
+        """（延迟 EWMA, 错误率 EWMA, 样本数），无样本时为 (None, 0.0, 0)"""
+        with self._lock:
+            return self._stats.get((provider, model), (None, 0.0, 0))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+model_health = ModelHealth()
@@ -1,10 +1,11 @@
 """
 FastAPI应用主文件
 """
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # 在导入其他模块之前加载环境变量
@@ -12,7 +13,13 @@ import dotenv
 dotenv.load_dotenv()
 
 from app.core import settings, AppException
+from app.core import profiling, warmup
+from app.core.metrics import metrics
+from app.core.serialization import FastJSONResponse
+from app.llm.circuit import circuit_breakers
+from app.llm.limiter import concurrency_limiters
 from app.api import router
+from app.api.routes import bulk_service, ingest_service, preprocess_service
 
 # 配置日志
 logging.basicConfig(
@@ -31,7 +38,32 @@ async def lifespan(app: FastAPI):
     logger.info(f"启动应用: {settings.APP_TITLE} v{settings.APP_VERSION}")
     logger.info(f"LLM提供商: {settings.LLM_PROVIDER}")
     logger.info(f"环境变量加载完成，DEBUG模式: {settings.DEBUG}")
+    # 未在 master 中预热（非 preload 部署）时，在 worker 内补做预热
+    if settings.WARMUP_ENABLED and not warmup.is_warmed():
+        await asyncio.to_thread(warmup.warmup)
+    warmup.mark_ready()
+    logger.info(f"应用已就绪，内存占用: {warmup.memory_usage()}")
+    # 继续重启前未结束的离线批量任务
+    if settings.BULK_RESUME_ON_STARTUP:
+        try:
+            bulk_service.resume()
+        except Exception as e:
+            logger.warning(f"无法继续未结束的批量任务: {str(e)}")
+    # 执行进程已退出的批量导入标记为失败（重跑即可从检查点续做）
+    try:
+        await ingest_service.recover()
+    except Exception as e:
+        logger.warning(f"无法检查未结束的批量导入: {str(e)}")
+    # 订阅新对象事件，提前下载与解析
+    if settings.PREPROCESS_ENABLED:
+        try:
+            preprocess_service.start()
+        except Exception as e:
+            logger.warning(f"无法启动事件驱动预处理: {str(e)}")
     yield
+    await bulk_service.stop()
+    await ingest_service.stop()
+    await preprocess_service.stop()
     # 关闭事件
     logger.info("应用已关闭")
 
@@ -48,6 +80,7 @@ def create_app() -> FastAPI:
         version=settings.APP_VERSION,
         debug=settings.DEBUG,
         lifespan=lifespan,
+        default_response_class=FastJSONResponse,
     )
     
     # 添加CORS中间件
@@ -59,6 +92,20 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
+    # 请求级性能分析（仅对 /extract 生效，未开启时直接放行）
+    @app.middleware("http")
+    async def profiling_middleware(request: Request, call_next):
+        if request.url.path != "/extract" or not profiling.should_profile(request.headers):
+            return await call_next(request)
+        
+        session = profiling.start_session(f"{request.method} {request.url.path}")
+        try:
+            response = await call_next(request)
+        finally:
+            await profiling.finish_session(session)
+        response.headers["X-Profile-Id"] = session.profile_id
+        return response
+    
     # 异常处理中间件
     @app.exception_handler(AppException)
     async def app_exception_handler(request: Request, exc: AppException):
@@ -75,13 +122,37 @@ def create_app() -> FastAPI:
     # 健康检查端点
     @app.get("/health")
     async def health_check():
-        """健康检查"""
+        """健康检查（有熔断器处于打开状态时为 degraded）"""
+        circuits = circuit_breakers.snapshot()
+        degraded = any(circuit["state"] == "open" for circuit in circuits)
         return {
-            "status": "healthy",
+            "status": "degraded" if degraded else "healthy",
             "service": settings.APP_TITLE,
             "version": settings.APP_VERSION,
+            "circuits": circuits,
+            "concurrency": concurrency_limiters.snapshot(),
         }
     
+    # 就绪检查端点（预热完成后才返回 200）
+    @app.get("/ready")
+    async def readiness_check():
+        """就绪检查"""
+        ready = warmup.is_ready()
+        return JSONResponse(
+            status_code=200 if ready else 503,
+            content={
+                "status": "ready" if ready else "starting",
+                "warmed": warmup.is_warmed(),
+                "memory": warmup.memory_usage(),
+            },
+        )
+    
+    # 指标端点（Prometheus 文本格式）
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        """进程内指标"""
+        return metrics.render_prometheus()
+    
     # 包含API路由
     app.include_router(router)
     
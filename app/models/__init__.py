@@ -6,6 +6,17 @@ from .schemas import (
     ExtractRequest,
     ExtractedValue,
     ExtractResponse,
+    SchemaRegisterResponse,
+    BulkDocument,
+    BulkJobRequest,
+    BulkJobResponse,
+    BulkItemResult,
+    BulkResultsResponse,
+    BulkExportRequest,
+    BulkExportResponse,
+    IngestRequest,
+    IngestRunResponse,
+    IngestResultsResponse,
     ErrorResponse,
 )
 
@@ -14,5 +25,16 @@ __all__ = [
     "ExtractRequest",
     "ExtractedValue",
     "ExtractResponse",
+    "SchemaRegisterResponse",
+    "BulkDocument",
+    "BulkJobRequest",
+    "BulkJobResponse",
+    "BulkItemResult",
+    "BulkResultsResponse",
+    "BulkExportRequest",
+    "BulkExportResponse",
+    "IngestRequest",
+    "IngestRunResponse",
+    "IngestResultsResponse",
     "ErrorResponse",
 ]
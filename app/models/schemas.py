@@ -1,7 +1,9 @@
 """
 数据模型定义
 """
-from typing import List, Literal, Optional, Any, Union
+import re
+from datetime import datetime
+from typing import Dict, List, Literal, Optional, Any, Union
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -14,6 +16,23 @@ class SchemaField(BaseModel):
         ..., description="字段类型"
     )
     required: bool = Field(default=True, description="字段是否必填")
+    group: Optional[str] = Field(None, description="字段分组：宽 schema 按组并行提取，同组字段在同一次调用中提取")
+    pattern: Optional[str] = Field(
+        None, description="规则预提取：正则表达式（取命名组 value 或第一个分组），全文唯一命中时直接填充"
+    )
+    matcher: Optional[str] = Field(
+        None, description="规则预提取：内置匹配器（id_card|uscc|phone|email|date|amount），none 表示不做预提取"
+    )
+
+    @field_validator("pattern")
+    @classmethod
+    def _check_pattern(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            try:
+                re.compile(value)
+            except re.error as e:
+                raise ValueError(f"无效的正则表达式: {e}")
+        return value
 
 
 class ExtractRequest(BaseModel):
@@ -21,11 +40,16 @@ class ExtractRequest(BaseModel):
     source: Literal["minio", "file"] = Field(..., description="文件来源")
     file: Union[str, bytes] = Field(..., description="minIO URL、原始文本内容或二进制文件数据")
     fields: List[SchemaField] = Field(..., alias="schema", description="数据库中查到的schema")
-    provider: Literal["openai", "azure", "claude", "gemini", "custom"] = Field(
-        default="openai", description="LLM提供商"
+    provider: Literal["openai", "azure", "claude", "gemini", "custom", "auto"] = Field(
+        default="openai", description="LLM提供商（auto 表示由模型路由选择）"
     )
-    model: Optional[str] = Field(None, description="LLM模型名称（若不指定则使用默认值）")
+    model: Optional[str] = Field(None, description="LLM模型名称（若不指定则使用默认值，auto 表示由模型路由选择）")
     filename: Optional[str] = Field(None, description="原始文件名（用于文件类型自动判断）")
+    output_format: Optional[Literal["table", "positional"]] = Field(
+        None, description="LLM 输出格式（若不指定则按提供商配置）"
+    )
+    max_cost: Optional[float] = Field(None, gt=0, description="模型路由约束：单次调用最高预估成本（美元）")
+    latency_slo: Optional[float] = Field(None, gt=0, description="模型路由约束：延迟 SLO（秒）")
 
 
 class ExtractedValue(BaseModel):
@@ -40,6 +64,119 @@ class ExtractResponse(BaseModel):
     data: List[ExtractedValue] = Field(..., description="提取的数据")
     code: str = Field("200", description="状态码")
     message: str = Field("Success", description="消息")
+    metadata: Optional[Dict[str, Any]] = Field(None, description="处理元数据（如模型路由结果）")
+
+
+class SchemaRegisterResponse(BaseModel):
+    """Schema 注册响应"""
+    schema_id: str = Field(..., description="Schema ID")
+    version: int = Field(..., description="版本号")
+    name: Optional[str] = Field(None, description="Schema 名称")
+    hash: str = Field(..., description="规范化内容哈希")
+    fields: List[SchemaField] = Field(..., description="字段定义")
+
+
+class BulkDocument(BaseModel):
+    """批量任务中的一份文档"""
+    id: Optional[str] = Field(None, description="调用方的文档 ID（为空时使用序号）")
+    text: str = Field(..., description="文本内容")
+
+
+class BulkJobRequest(BaseModel):
+    """离线批量提取任务"""
+    fields: Optional[List[SchemaField]] = Field(None, alias="schema", description="数据schema")
+    schema_id: Optional[str] = Field(None, description="已注册的 schema ID（与 schema 二选一）")
+    schema_version: Optional[int] = Field(None, description="schema 版本，为空时取最新版本")
+    provider: Literal["openai", "azure", "claude"] = Field("openai", description="提供批量接口的LLM提供商")
+    model: Optional[str] = Field(None, description="LLM模型名称（Azure 为批量部署名）")
+    output_format: Optional[Literal["table", "positional"]] = Field(None, description="LLM 输出格式")
+    documents: List[BulkDocument] = Field(..., min_length=1, description="待提取的文档")
+
+
+class BulkJobResponse(BaseModel):
+    """批量任务状态"""
+    job_id: str = Field(..., description="任务 ID")
+    provider: str = Field(..., description="提供商")
+    model: str = Field(..., description="模型")
+    status: str = Field(..., description="任务状态: pending | submitted | completed | failed")
+    batch_id: Optional[str] = Field(None, description="提供商侧的批量任务 ID（拆为多批提交时以逗号分隔）")
+    error: Optional[str] = Field(None, description="失败原因")
+    counts: Dict[str, int] = Field(default_factory=dict, description="各状态的文档数")
+    created_at: float = Field(..., description="创建时间")
+    updated_at: float = Field(..., description="更新时间")
+
+
+class BulkItemResult(BaseModel):
+    """批量任务中一份文档的结果"""
+    id: str = Field(..., description="文档 ID")
+    status: str = Field(..., description="状态: pending | succeeded | failed")
+    data: Optional[List[ExtractedValue]] = Field(None, description="提取的数据")
+    error: Optional[str] = Field(None, description="失败原因")
+
+
+class BulkResultsResponse(BaseModel):
+    """批量任务结果"""
+    job_id: str = Field(..., description="任务 ID")
+    status: str = Field(..., description="任务状态")
+    items: List[BulkItemResult] = Field(..., description="文档结果（按提交顺序）")
+
+
+class BulkExportRequest(BaseModel):
+    """批量任务结果导出到 MinIO"""
+    url: str = Field(..., description="目标对象（bucket/object 或完整 URL），以 / 结尾时使用 {job_id}.{扩展名}")
+    format: Literal["arrow", "parquet", "toon"] = Field("parquet", description="导出格式")
+
+
+class BulkExportResponse(BaseModel):
+    """批量任务结果导出结果"""
+    job_id: str = Field(..., description="任务 ID")
+    format: str = Field(..., description="导出格式")
+    url: str = Field(..., description="写入的对象（bucket/object）")
+    size: int = Field(..., description="字节数")
+
+
+class IngestRequest(BaseModel):
+    """MinIO 前缀批量导入"""
+    bucket: str = Field(..., description="存储桶")
+    prefix: str = Field("", description="对象名前缀")
+    extensions: Optional[List[str]] = Field(None, description="只处理这些扩展名（如 pdf、docx），为空时不限")
+    min_size: Optional[int] = Field(None, ge=0, description="最小对象大小（字节）")
+    max_size: Optional[int] = Field(None, ge=0, description="最大对象大小（字节）")
+    modified_after: Optional[datetime] = Field(None, description="只处理此时间之后修改的对象（无时区时按 UTC）")
+    modified_before: Optional[datetime] = Field(None, description="只处理此时间之前修改的对象（无时区时按 UTC）")
+    fields: Optional[List[SchemaField]] = Field(None, alias="schema", description="数据schema")
+    schema_id: Optional[str] = Field(None, description="已注册的 schema ID（与 schema 二选一）")
+    schema_version: Optional[int] = Field(None, description="schema 版本，为空时取最新版本")
+    provider: Literal["openai", "azure", "claude", "gemini", "custom", "auto"] = Field(
+        "openai", description="LLM提供商"
+    )
+    model: Optional[str] = Field(None, description="LLM模型名称")
+    output_format: Optional[Literal["table", "positional"]] = Field(None, description="LLM 输出格式")
+    concurrency: Optional[int] = Field(None, ge=1, description="同时处理的对象数，为空时取 INGEST_CONCURRENCY")
+    name: Optional[str] = Field(
+        None, description="检查点名称：同名导入重跑时跳过已成功且未变化的对象，为空时由存储桶、前缀、schema 与模型生成"
+    )
+    report_url: Optional[str] = Field(
+        None, description="汇总报告写入的 MinIO 对象（以 / 结尾时使用 {run_id}.json），为空时写入 INGEST_REPORT_DIR"
+    )
+
+
+class IngestRunResponse(BaseModel):
+    """批量导入状态"""
+    run_id: str = Field(..., description="运行 ID")
+    name: str = Field(..., description="检查点名称")
+    status: str = Field(..., description="状态: running | completed | failed")
+    error: Optional[str] = Field(None, description="失败原因")
+    report: Optional[Dict[str, Any]] = Field(None, description="汇总报告（结束后）")
+    created_at: float = Field(..., description="创建时间")
+    updated_at: float = Field(..., description="更新时间")
+
+
+class IngestResultsResponse(BaseModel):
+    """批量导入结果"""
+    run_id: str = Field(..., description="运行 ID")
+    status: str = Field(..., description="运行状态")
+    items: List[BulkItemResult] = Field(..., description="本次处理的对象（id 为 bucket/object，按对象名排序）")
 
 
 class ErrorResponse(BaseModel):
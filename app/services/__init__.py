@@ -4,9 +4,21 @@
 from .minio_service import MinIOService
 from .file_service import FileProcessingService
 from .extract_service import ExtractService
+from .schema_registry import SchemaRegistry
+from .job_store import JobStore
+from .bulk_service import BulkService
+from .ingest_store import IngestStore
+from .ingest_service import IngestService
+from .preprocess_service import PreprocessService
 
 __all__ = [
     "MinIOService",
     "FileProcessingService",
     "ExtractService",
+    "SchemaRegistry",
+    "JobStore",
+    "BulkService",
+    "IngestStore",
+    "IngestService",
+    "PreprocessService",
 ]
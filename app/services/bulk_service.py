@@ -0,0 +1,335 @@
+"""
+离线批量提取服务
+
+夜间回填等不要求实时返回的场景：文档按 Prompt 打包为提供商的批量任务
+（OpenAI/Azure 批量文件、Anthropic Message Batches），价格更低且不占用实时接口的配额。
+
+任务推进流程（每一步的状态都持久化在任务存储中，重启后从中断处继续）：
+1. pending：构建各文档的 Prompt，按单批请求数（BULK_BATCH_MAX_REQUESTS）与输入大小
+   （BULK_BATCH_MAX_BYTES，OpenAI 批量输入文件上限 200 MB）拆成多个提供商批量任务
+   依次提交，每提交一批即记录其 ID；
+2. submitted：按 BULK_POLL_INTERVAL 轮询各批，结束的批读取结果，经与实时调用相同的
+   解析路径（table / positional）转换后写入任务存储；
+3. 全部批结束后 completed（所有批都在提供商侧失败时为 failed）。
+
+Prompt 构建、编码、结果解析与任务存储读写都在线程中进行，不阻塞事件循环。
+某批提交成功后、批量任务 ID 写入之前进程崩溃时，重启后会重新提交该批。
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core import settings, AppException, LLMException, ValidationException
+from app.core.metrics import metrics
+from app.llm import LLMFactory
+from app.llm.base import BaseLLM
+from app.llm.bulk import (
+    BATCH_ENDED,
+    BATCH_FAILED,
+    BATCH_PROVIDERS,
+    BATCH_RUNNING,
+    BatchClient,
+    BatchItemResult,
+    create_batch_client,
+)
+from app.llm.retry import RETRYABLE_ERRORS, classify_error
+from app.models import ExtractedValue, SchemaField
+from app.utils.columnar import EXPORT_FORMATS, iter_export
+from .job_store import (
+    JOB_COMPLETED,
+    JOB_FAILED,
+    JOB_PENDING,
+    JOB_UNFINISHED,
+    BulkBatch,
+    BulkJob,
+    JobStore,
+)
+from .minio_service import MinIOService
+from .sqlite_store import BackgroundRunner
+
+logger = logging.getLogger(__name__)
+
+
+class BulkService(BackgroundRunner):
+    """
+    离线批量提取
+
+    Args:
+        store: 任务存储，默认使用 BULK_JOB_STORE_PATH
+        poll_interval: 轮询间隔（秒），默认取配置
+        minio_service: 导出结果写回 MinIO 时使用的服务
+    """
+
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        poll_interval: Optional[float] = None,
+        minio_service: Optional[MinIOService] = None,
+    ):
+        super().__init__()
+        self.store = store or JobStore()
+        self.minio_service = minio_service or MinIOService()
+        self._poll_interval = poll_interval
+
+    @property
+    def poll_interval(self) -> float:
+        return self._poll_interval if self._poll_interval is not None else settings.BULK_POLL_INTERVAL
+
+    def create_job(
+        self,
+        provider: str,
+        model: Optional[str],
+        fields: List[SchemaField],
+        documents: Sequence[Tuple[str, str]],
+        output_format: Optional[str] = None,
+    ) -> BulkJob:
+        """
+        创建批量任务（不立即提交）
+
+        Args:
+            provider: 提供商（openai / azure / claude）
+            model: 模型，为空时使用提供商默认模型
+            fields: 字段定义列表
+            documents: （文档 ID, 文本内容）列表
+            output_format: 输出格式，为空时按配置
+
+        Raises:
+            ValidationException: 提供商不支持批量接口、文档为空或超过上限
+        """
+        if provider not in BATCH_PROVIDERS:
+            raise ValidationException(f"提供商 {provider} 不支持批量接口，可选: {', '.join(BATCH_PROVIDERS)}")
+        if not fields:
+            raise ValidationException("schema 不能为空")
+        if not documents:
+            raise ValidationException("documents 不能为空")
+        if len(documents) > settings.BULK_MAX_DOCUMENTS:
+            raise ValidationException(f"单个批量任务最多 {settings.BULK_MAX_DOCUMENTS} 份文档")
+        model = model or LLMFactory.default_model(provider)
+        if not model:
+            raise ValidationException(f"未指定 {provider} 的模型")
+
+        llm = LLMFactory.create(provider)
+        return self.store.create_job(
+            provider, model, llm._resolve_output_format(output_format), fields, documents
+        )
+
+    def resume(self) -> List[str]:
+        """继续所有未结束的任务（启动时调用）"""
+        job_ids = self.store.unfinished_jobs()
+        for job_id in job_ids:
+            self.start(job_id)
+        if job_ids:
+            logger.info(f"继续 {len(job_ids)} 个未结束的批量任务")
+        return job_ids
+
+    async def run(self, job_id: str) -> None:
+        """
+        推进任务直到结束；其他 worker 持有租约时直接返回
+
+        轮询中的可重试错误（网络、限流、5xx）在下一轮重试，其他错误使任务失败。
+        """
+        try:
+            while True:
+                if not await self._renew_lease(job_id):
+                    logger.info(f"批量任务 {job_id} 由其他 worker 处理")
+                    return
+                try:
+                    if await self.step(job_id):
+                        return
+                except Exception as e:
+                    kind = classify_error(e)[0]
+                    if kind not in RETRYABLE_ERRORS:
+                        logger.error(f"批量任务 {job_id} 失败: {str(e)}")
+                        message = e.message if isinstance(e, AppException) else str(e)
+                        await asyncio.to_thread(self.store.finish, job_id, JOB_FAILED, message)
+                        return
+                    logger.warning(f"批量任务 {job_id} 暂时失败（{kind}），稍后重试: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            await asyncio.to_thread(self.store.release_lease, job_id, self.owner)
+
+    async def _renew_lease(self, job_id: str) -> bool:
+        return await asyncio.to_thread(self.store.acquire_lease, job_id, self.owner, settings.BULK_LEASE_SECONDS)
+
+    async def step(self, job_id: str) -> bool:
+        """
+        推进一步：提交尚未提交的文档，或轮询一次各提供商批量任务
+
+        Returns:
+            任务是否已结束
+        """
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job.status not in JOB_UNFINISHED:
+            return True
+        llm = LLMFactory.create(job.provider)
+        client = create_batch_client(llm)
+
+        if job.status == JOB_PENDING:
+            return await self._submit(job, llm, client)
+
+        batches = await asyncio.to_thread(self.store.batches, job_id)
+        running = False
+        for batch in batches:
+            if batch.status != BATCH_RUNNING:
+                continue
+            state, error = await client.status(batch.batch_id)
+            if state == BATCH_RUNNING:
+                running = True
+                continue
+            if state == BATCH_FAILED:
+                logger.error(f"批量任务 {job_id} 的批次 {batch.batch_id} 在提供商侧失败: {error}")
+                await asyncio.to_thread(self.store.finish_batch, job_id, batch, BATCH_FAILED, error)
+                batch.status, batch.error = BATCH_FAILED, error
+                continue
+            results = await client.results(batch.batch_id)
+            await asyncio.to_thread(self._save_batch, job, llm, batch, results)
+            batch.status = BATCH_ENDED
+        if running:
+            return False
+
+        failed = [batch for batch in batches if batch.status == BATCH_FAILED]
+        if batches and len(failed) == len(batches):
+            await asyncio.to_thread(self.store.finish, job_id, JOB_FAILED, failed[0].error)
+            return True
+        await asyncio.to_thread(self.store.finish, job_id, JOB_COMPLETED)
+        counts = await asyncio.to_thread(self.store.counts, job_id)
+        for status, count in counts.items():
+            metrics.inc("bulk_items_total", count, provider=job.provider, status=status)
+        logger.info(f"批量任务 {job_id} 已完成（{len(batches)} 批）: {counts}")
+        return True
+
+    def _save_batch(
+        self,
+        job: BulkJob,
+        llm: BaseLLM,
+        batch: BulkBatch,
+        results: Dict[str, BatchItemResult],
+    ) -> None:
+        """解析并保存一批的结果（在线程中执行）"""
+        self.store.save_results(job.job_id, self._parse_results(job, llm, results))
+        self.store.finish_batch(job.job_id, batch, BATCH_ENDED)
+
+    async def _submit(self, job: BulkJob, llm: BaseLLM, client: BatchClient) -> bool:
+        """依次提交尚未提交的文档（每批提交后立即记录，并续期租约）"""
+        chunks = self._iter_chunks(job, llm, client)
+        submitted = 0
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            # 上传大批量文件耗时较长，提交下一批前续期租约
+            if submitted and not await self._renew_lease(job.job_id):
+                return False
+            requests, first_item, last_item = chunk
+            batch_id = await client.submit(requests, metadata={"job_id": job.job_id})
+            await asyncio.to_thread(
+                self.store.add_batch, job.job_id, batch_id, first_item, last_item, len(requests)
+            )
+            submitted += 1
+            metrics.inc("bulk_batches_submitted_total", provider=job.provider)
+            logger.info(f"批量任务 {job.job_id} 已提交一批: {batch_id}（{len(requests)} 个请求）")
+
+        if not await asyncio.to_thread(self.store.batches, job.job_id):
+            await asyncio.to_thread(self.store.finish, job.job_id, JOB_COMPLETED)
+            return True
+        await asyncio.to_thread(self.store.mark_submitted, job.job_id)
+        return False
+
+    def _iter_chunks(
+        self,
+        job: BulkJob,
+        llm: BaseLLM,
+        client: BatchClient,
+    ) -> Iterator[Tuple[List[Dict[str, Any]], str, str]]:
+        """
+        构建尚未提交文档的请求，按单批请求数与输入大小上限分批产出
+
+        Yields:
+            （请求列表, 第一个 item_id, 最后一个 item_id）
+        """
+        max_requests = max(1, settings.BULK_BATCH_MAX_REQUESTS)
+        requests: List[Dict[str, Any]] = []
+        size = 0
+        first_item = last_item = ""
+        for item_id, content in self.store.iter_unsubmitted_items(job.job_id):
+            request = client.build_request(
+                item_id,
+                llm._build_prompt_parts(content, job.fields, output_format=job.output_format),
+                job.model,
+            )
+            # 按 JSONL 中一行的大小计算
+            request_size = len(json.dumps(request, ensure_ascii=False).encode("utf-8")) + 1
+            if requests and (len(requests) >= max_requests or size + request_size > settings.BULK_BATCH_MAX_BYTES):
+                yield requests, first_item, last_item
+                requests, size = [], 0
+            if not requests:
+                first_item = item_id
+            requests.append(request)
+            size += request_size
+            last_item = item_id
+        if requests:
+            yield requests, first_item, last_item
+
+    def export(self, job_id: str, file_format: str) -> Iterator[bytes]:
+        """
+        导出任务结果：每份文档一行、每个字段一列，按提交顺序以字节块流式产出
+
+        Args:
+            job_id: 任务 ID
+            file_format: arrow | parquet | toon
+
+        Raises:
+            JobNotFoundException: 任务不存在
+            ValidationException: 格式不支持或未安装 pyarrow
+        """
+        job = self.store.get_job(job_id)
+        batch_rows = settings.EXPORT_BATCH_ROWS
+        total = sum(self.store.counts(job_id).values())
+        rows = (
+            (item.document_id, item.status, item.error, item.values)
+            for item in self.store.iter_items(job_id, batch_size=batch_rows)
+        )
+        chunks = iter_export(file_format, job.fields, rows, total, batch_rows)
+        metrics.inc("bulk_exports_total", format=file_format)
+        logger.info(f"导出批量任务 {job_id} 的结果（{file_format}，{total} 行）")
+        return chunks
+
+    async def export_to_minio(self, job_id: str, url: str, file_format: str = "parquet") -> Dict[str, Any]:
+        """
+        导出任务结果并写入 MinIO
+
+        Args:
+            job_id: 任务 ID
+            url: 目标对象（bucket/object 或完整 URL）；以 / 结尾时使用 {job_id}.{扩展名}
+            file_format: arrow | parquet | toon
+
+        Returns:
+            {"url": "bucket/object", "size": 字节数}
+        """
+        content_type, extension = EXPORT_FORMATS.get(file_format, ("", ""))
+        if url.endswith("/"):
+            url = f"{url}{job_id}{extension}"
+        chunks = await asyncio.to_thread(self.export, job_id, file_format)
+        bucket_name, object_name, size = await self.minio_service.upload_stream(url, chunks, content_type)
+        logger.info(f"批量任务 {job_id} 的结果已写入 MinIO: {bucket_name}/{object_name}（{size} 字节）")
+        return {"url": f"{bucket_name}/{object_name}", "size": size}
+
+    @staticmethod
+    def _parse_results(
+        job: BulkJob,
+        llm: BaseLLM,
+        results: Dict[str, BatchItemResult],
+    ) -> Dict[str, Tuple[Optional[List[ExtractedValue]], Optional[str]]]:
+        """按任务的输出格式解析各请求的响应"""
+        parsed: Dict[str, Tuple[Optional[List[ExtractedValue]], Optional[str]]] = {}
+        for item_id, (completion, error) in results.items():
+            if completion is None:
+                parsed[item_id] = (None, error)
+                continue
+            llm._record_usage(job.model, completion)
+            try:
+                parsed[item_id] = (llm._parse_output(completion.text, job.fields, job.output_format), None)
+            except LLMException as e:
+                parsed[item_id] = (None, e.message)
+        return parsed
@@ -1,19 +1,52 @@
 """
 提取服务 - 业务逻辑层
 """
+import hashlib
 import logging
 import os
-from typing import List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from app.models import ExtractRequest, ExtractedValue, SchemaField
-from app.core import ValidationException
-from app.llm import LLMFactory
+from app.core import (
+    settings,
+    ValidationException,
+    LLMException,
+    CircuitOpenException,
+    ConcurrencyLimitException,
+    RateLimitException,
+)
+from app.core.deadline import current_budget, request_budget
+from app.core.metrics import metrics
+from app.core.profiling import stage
+from app.core.response_metadata import collect_metadata, merge_metadata, set_metadata
+from app.core.serialization import values_json
+from app.core.singleflight import FileCoordinator, SingleFlight
+from app.llm import BaseLLM, LLMFactory
+from app.llm.base import ModelInfo
+from app.llm.retry import RETRYABLE_ERRORS, classify_error
+from app.llm.router import AUTO, ModelRouter, RouteDecision
+from app.utils.cache_store import CacheStore, create_cache_store
+from app.utils.compiled_schema import compile_fields
+from app.utils.rules import prefill
 from .minio_service import MinIOService
 from .file_service import FileProcessingService
 
 logger = logging.getLogger(__name__)
 
 
+def _should_failover(error: LLMException) -> bool:
+    """
+    是否值得换下一个提供商重试
+
+    熔断短路、排队或配额超时属于本地拒绝，直接转移；其余按提供商 SDK 的原始异常
+    （提供商包装 LLMException 时保留在异常链上）分类，只有可重试的错误才转移。
+    """
+    if isinstance(error, (CircuitOpenException, ConcurrencyLimitException, RateLimitException)):
+        return True
+    cause = error.__cause__ or error.__context__
+    return cause is not None and classify_error(cause)[0] in RETRYABLE_ERRORS
+
+
 class ExtractService:
     """数据提取服务 - 协调各个服务完成数据提取"""
     
@@ -21,6 +54,27 @@ class ExtractService:
         """初始化服务"""
         self.minio_service = MinIOService()
         self.file_service = FileProcessingService()
+        self.router = ModelRouter(self._load_catalog)
+        # 共享的计算返回 (提取值, 执行方收集的响应元数据)
+        self._flight: SingleFlight[Tuple[List[ExtractedValue], Dict[str, Any]]] = SingleFlight("extract")
+        self._file_coordinator: Optional[FileCoordinator] = None
+        # 合并键 -> data 的 JSON 字节（CACHE_BACKEND=file 时同一主机的 worker 共享）
+        self._results: CacheStore[bytes] = create_cache_store(
+            settings.CACHE_BACKEND,
+            "results",
+            settings.RESULT_CACHE_SIZE,
+            serialize=lambda body: body.decode("utf-8"),
+            deserialize=lambda text: text.encode("utf-8"),
+        )
+        # 文档内容哈希 + 扩展名 + 文件名 -> 提取的文本
+        self._parsed: CacheStore[str] = create_cache_store(
+            settings.CACHE_BACKEND,
+            "parsed",
+            settings.PARSE_CACHE_SIZE,
+            serialize=lambda text: text,
+            deserialize=lambda text: text,
+        )
+        self._parse_flight: SingleFlight[str] = SingleFlight("parse")
     
     async def extract(self, request: ExtractRequest) -> List[ExtractedValue]:
         """
@@ -37,19 +91,124 @@ class ExtractService:
             其他异常: 处理过程中的异常
         """
         logger.info(f"开始数据提取: source={request.source}, provider={request.provider}, model={request.model}")
-
+        return await self._extract_coalesced(request)
+    
+    async def extract_json(self, request: ExtractRequest) -> bytes:
+        """
+        执行数据提取并返回序列化后的提取值（JSON 数组字节）
+        
+        开启 RESULT_CACHE_ENABLED 时按合并键缓存序列化结果，有效期内的相同请求
+        直接返回缓存的字节，不再提取与序列化。
+        
+        Args:
+            request: 提取请求
+            
+        Returns:
+            提取值列表的 JSON 字节
+        """
+        logger.info(f"开始数据提取: source={request.source}, provider={request.provider}, model={request.model}")
+        if not settings.RESULT_CACHE_ENABLED:
+            return values_json(await self._extract_coalesced(request))
+        
+        key = await self._coalesce_key(request)
+        cached = await self._results.get(key)
+        if cached is not None:
+            logger.info("命中提取结果缓存")
+            metrics.inc("result_cache_hits_total")
+            set_metadata("cached", True)
+            return cached
+        metrics.inc("result_cache_misses_total")
+        
+        body = values_json(await self._extract_coalesced(request, key))
+        await self._results.put(key, body, settings.RESULT_CACHE_TTL)
+        return body
+    
+    async def _extract_coalesced(self, request: ExtractRequest, key: Optional[str] = None) -> List[ExtractedValue]:
+        if not settings.COALESCE_ENABLED:
+            return await self._extract_with_budget(request)
+        
+        # 相同文档与 schema 的并发请求只执行一次，其余等待同一结果
+        (values, metadata), coalesced = await self._flight.do(
+            key or await self._coalesce_key(request),
+            lambda: self._extract_collecting(request),
+            coordinator=self._coordinator(),
+        )
+        # 路由、字段分组、批大小等元数据在执行提取的任务中收集，每个等待方都合并一份
+        merge_metadata(metadata)
+        if coalesced:
+            logger.info("与进行中的相同请求合并，复用其结果")
+            set_metadata("coalesced", True)
+        return values
+    
+    async def _extract_collecting(self, request: ExtractRequest) -> Tuple[List[ExtractedValue], Dict[str, Any]]:
+        with collect_metadata() as metadata:
+            values = await self._extract_with_budget(request)
+        return values, metadata
+    
+    async def _extract_with_budget(self, request: ExtractRequest) -> List[ExtractedValue]:
+        # 请求内所有模型调用共享截止时间与重试预算
+        with request_budget(settings.LLM_REQUEST_TIMEOUT, settings.LLM_RETRY_BUDGET):
+            return await self._extract(request)
+    
+    async def _coalesce_key(self, request: ExtractRequest) -> str:
+        """
+        合并键：文档内容哈希、schema 哈希、提供商、模型及影响结果的参数
+        
+        minio 来源的 file 只是对象路径，另取对象的 ETag，对象被覆盖后不再命中旧结果。
+        """
+        digest = hashlib.sha256()
+        content = request.file if isinstance(request.file, bytes) else request.file.encode("utf-8")
+        digest.update(hashlib.sha256(content).digest())
+        if request.source == "minio":
+            digest.update(b"\x00" + (await self.minio_service.object_etag(str(request.file))).encode("utf-8"))
+        digest.update(compile_fields(request.fields).canonical_hash.encode("utf-8"))
+        for part in (
+            request.source,
+            request.filename,
+            request.provider,
+            request.model,
+            request.output_format,
+            request.max_cost,
+            request.latency_slo,
+        ):
+            digest.update(b"\x00" + str(part).encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _coordinator(self) -> Optional[FileCoordinator]:
+        """跨 worker 协调（COALESCE_CROSS_WORKER 开启时）"""
+        if not settings.COALESCE_CROSS_WORKER:
+            return None
+        if self._file_coordinator is None:
+            self._file_coordinator = FileCoordinator(
+                settings.COALESCE_DIR,
+                serialize=lambda result: {
+                    "values": [value.model_dump() for value in result[0]],
+                    "metadata": result[1],
+                },
+                deserialize=lambda payload: (
+                    [ExtractedValue(**row) for row in payload["values"]],
+                    payload["metadata"],
+                ),
+                claim_timeout=settings.COALESCE_CLAIM_TIMEOUT,
+            )
+        return self._file_coordinator
+    
+    async def _extract(self, request: ExtractRequest) -> List[ExtractedValue]:
+        """按 获取文件 -> 判别类型 -> 文本提取 -> 规则预提取 -> LLM 提取 的顺序执行"""
         # 1. 获取文件内容
         logger.info("步骤1: 获取文件内容")
-        file_content = await self._get_file_content(request.source, request.file)
+        with stage("fetch"):
+            file_content = await self._get_file_content(request.source, request.file)
         image_bytes: Optional[bytes] = None
 
         # 2. 判别是否为图像文件；若为图像，跳过OCR，直接走LLM视觉
         logger.info("步骤2: 判别文件类型并准备多模态输入")
         detected_ext = None
-        try:
-            detected_ext = self.file_service.detect_file_type(file_content, request.filename)
-        except Exception:
-            detected_ext = None
+        with stage("detect"):
+            try:
+                detected_ext = self.file_service.detect_file_type(file_content, request.filename)
+            except Exception:
+                detected_ext = None
 
         is_image = bool(detected_ext and detected_ext.lower() in self.file_service.IMAGE_TYPES)
 
@@ -59,22 +218,50 @@ class ExtractService:
             image_bytes = file_content
         else:
             logger.info("非图像文件，提取文本内容供LLM使用")
-            text_content = await self._extract_text(
-                request.source,
-                request.file,
-                file_content,
-                request.filename,
+            with stage("parse"):
+                text_content = await self.parse_text(
+                    request.source,
+                    request.file,
+                    file_content,
+                    request.filename,
+                )
+        
+        # 3. 规则预提取：高置信度命中的字段直接填充，其余字段交给 LLM
+        fields = request.fields
+        prefilled: Dict[str, ExtractedValue] = {}
+        if settings.RULES_ENABLED and text_content:
+            logger.info("步骤3: 规则预提取")
+            with stage("rules"):
+                prefilled, fields = prefill(text_content, request.fields)
+            if prefilled:
+                logger.info(f"规则预提取命中{len(prefilled)}个字段: {', '.join(prefilled)}")
+                set_metadata("prefilled", list(prefilled))
+            if not fields:
+                logger.info("全部字段由规则预提取命中，跳过LLM调用")
+                metrics.inc("rule_llm_skipped_total")
+                return [prefilled[f.field] for f in request.fields]
+        
+        # 4. 使用LLM提取数据（provider/model 为 auto 时先路由）
+        logger.info("步骤4: 使用LLM提取数据")
+        provider, model = request.provider, request.model
+        if provider == AUTO or model == AUTO:
+            decision = self._route(request, text_content, image_bytes, fields)
+            provider, model = decision.provider, decision.model
+        with stage("llm"):
+            extracted_data = await self._extract_with_llm(
+                text_content=text_content,
+                image=image_bytes,
+                schema=fields,
+                provider=provider,
+                model=model,
+                output_format=request.output_format,
             )
         
-        # 3. 使用LLM提取数据
-        logger.info("步骤3: 使用LLM提取数据")
-        extracted_data = await self._extract_with_llm(
-            text_content=text_content,
-            image=image_bytes,
-            schema=request.fields,
-            provider=request.provider,
-            model=request.model,
-        )
+        if prefilled:
+            # 按 schema 字段顺序合并规则命中与 LLM 结果
+            values = {value.field: value for value in extracted_data}
+            values.update(prefilled)
+            extracted_data = [values[f.field] for f in request.fields if f.field in values]
         
         logger.info(f"数据提取完成，共提取{len(extracted_data)}个字段")
         return extracted_data
@@ -102,6 +289,53 @@ class ExtractService:
         else:
             raise ValidationException(f"不支持的文件来源: {source}")
     
+    async def parse_text(
+        self,
+        source: str,
+        file_data: Union[str, bytes],
+        file_content: bytes,
+        filename: Optional[str] = None,
+    ) -> str:
+        """
+        提取文本，开启 PARSE_CACHE_ENABLED 时按文档内容缓存
+        
+        同一文档的并发解析只执行一次（例如预处理消费者正在解析时到达的请求等待其结果）。
+        
+        Args:
+            source: 文件来源
+            file_data: 文件路径/URL或文本/二进制数据
+            file_content: 文件内容字节
+            filename: 原始文件名（可选）
+            
+        Returns:
+            提取的文本内容
+        """
+        if not settings.PARSE_CACHE_ENABLED:
+            return await self._extract_text(source, file_data, file_content, filename)
+        
+        key = self._parse_key(file_data, file_content, filename)
+        cached = await self._parsed.get(key)
+        if cached is not None:
+            metrics.inc("parse_cache_hits_total")
+            set_metadata("parse_cached", True)
+            return cached
+        metrics.inc("parse_cache_misses_total")
+        
+        async def parse() -> str:
+            text = await self._extract_text(source, file_data, file_content, filename)
+            await self._parsed.put(key, text, settings.PARSE_CACHE_TTL)
+            return text
+        
+        text, _ = await self._parse_flight.do(key, parse)
+        return text
+    
+    def _parse_key(self, file_data: Union[str, bytes], file_content: bytes, filename: Optional[str]) -> str:
+        """解析缓存键：文档内容哈希及决定解析方式的扩展名与文件名"""
+        extension = self.file_service._get_file_extension(str(file_data)) if isinstance(file_data, str) else ""
+        digest = hashlib.sha256(file_content)
+        digest.update(f"\x00{extension}\x00{filename or ''}".encode("utf-8"))
+        return digest.hexdigest()
+    
     async def _extract_text(
         self,
         source: str,
@@ -129,29 +363,60 @@ class ExtractService:
             filename,
         )
     
-    async def _extract_with_llm(
+    def _load_catalog(self, provider: str) -> List[ModelInfo]:
+        """提供商的模型目录（未配置凭据的提供商为空）"""
+        if not LLMFactory.is_configured(provider):
+            return []
+        return self._create_llm(provider, None).get_available_models()
+    
+    def _route(
         self,
+        request: ExtractRequest,
         text_content: str,
         image: Optional[bytes],
-        schema: List[SchemaField],
-        provider: str,
-        model: Optional[str] = None,
-    ) -> List[ExtractedValue]:
+        fields: Optional[List[SchemaField]] = None,
+    ) -> RouteDecision:
         """
-        使用LLM提取数据
+        按模型目录、能力需求与调用方约束选择提供商和模型，并写入响应元数据
+        
+        fields 为规则预提取后仍需 LLM 提取的字段（默认全部字段）
+        """
+        if request.provider == AUTO:
+            providers = settings.LLM_ROUTER_PROVIDERS or LLMFactory.get_supported_providers()
+        else:
+            providers = [request.provider]
+        decision = self.router.route(
+            providers=providers,
+            model=request.model,
+            text=text_content,
+            image=image,
+            field_count=len(request.fields if fields is None else fields),
+            max_cost=request.max_cost,
+            latency_slo=request.latency_slo,
+        )
+        set_metadata("route", decision.model_dump())
+        return decision
+    
+    def _failover_chain(self, provider: str, model: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+        """
+        请求的提供商及其故障转移链（LLM_FAILOVER_CHAINS 中的 "provider" 或 "provider:model"）
         
-        Args:
-            text_content: 文本内容
-            schema: 数据schema
-            provider: LLM提供商 (openai|azure|claude|gemini|custom)
-            model: 模型名称（若不指定则使用默认值）
-            
         Returns:
-            提取的数据列表
+            [(提供商, 模型)]，模型为空表示使用该提供商的默认模型
         """
-        # 为 custom 提供商构建参数
+        provider = provider.lower()
+        chain: List[Tuple[str, Optional[str]]] = [(provider, model)]
+        for entry in settings.LLM_FAILOVER_CHAINS.get(provider, []):
+            name, _, chained_model = entry.partition(":")
+            candidate = (name.strip().lower(), chained_model.strip() or None)
+            if candidate not in chain:
+                chain.append(candidate)
+        return chain
+    
+    def _create_llm(self, provider: str, model: Optional[str]) -> BaseLLM:
+        """创建 LLM 实例（custom 提供商从环境变量读取连接参数）"""
         kwargs = {}
-        if provider.lower() == "custom":
+        if provider == "custom":
             # 从环境变量获取 custom 提供商的配置
             base_url = os.getenv("CUSTOM_BASE_URL")
             if not base_url:
@@ -166,12 +431,78 @@ class ExtractService:
                 kwargs["model_name"] = model
         
         # 使用工厂模式创建LLM实例
-        llm = LLMFactory.create(provider, **kwargs)
+        return LLMFactory.create(provider, **kwargs)
+    
+    async def _extract_with_llm(
+        self,
+        text_content: str,
+        image: Optional[bytes],
+        schema: List[SchemaField],
+        provider: str,
+        model: Optional[str] = None,
+        output_format: Optional[str] = None,
+    ) -> List[ExtractedValue]:
+        """
+        使用LLM提取数据
         
-        # 使用LLM提取数据
-        return await llm.extract(
-            content=text_content,
-            image=image,
-            schema=schema,
-            model=model or "default",
-        )
+        请求的提供商不可用（熔断短路、排队或配额超时、超时、5xx、连接失败）时，
+        按 LLM_FAILOVER_CHAINS 依次尝试下一个提供商；输出无法解析、请求错误等
+        换提供商也会同样失败的错误直接抛出。
+        
+        Args:
+            text_content: 文本内容
+            schema: 数据schema
+            provider: LLM提供商 (openai|azure|claude|gemini|custom)
+            model: 模型名称（若不指定则使用默认值）
+            output_format: LLM 输出格式（若不指定则按提供商配置）
+            
+        Returns:
+            提取的数据列表
+        """
+        chain = self._failover_chain(provider, model)
+        last_error: Optional[Exception] = None
+        
+        for index, (name, chained_model) in enumerate(chain):
+            if index > 0:
+                budget = current_budget()
+                if budget is not None and budget.expired():
+                    break
+                if isinstance(last_error, CircuitOpenException):
+                    reason = "circuit_open"
+                elif isinstance(last_error, (ConcurrencyLimitException, RateLimitException)):
+                    reason = "overloaded"
+                else:
+                    reason = "error"
+                logger.warning(f"提供商 {chain[index - 1][0]} 不可用（{reason}），切换到 {name}")
+                metrics.inc(
+                    "llm_failovers_total",
+                    from_provider=chain[index - 1][0],
+                    to_provider=name,
+                    reason=reason,
+                )
+            
+            try:
+                llm = self._create_llm(name, chained_model)
+            except (ValidationException, LLMException) as e:
+                # 请求的提供商配置有误直接报错；故障转移目标配置有误则跳过
+                if index == 0:
+                    raise
+                logger.warning(f"无法创建故障转移提供商 {name}: {str(e)}")
+                continue
+            
+            try:
+                return await llm.extract(
+                    content=text_content,
+                    image=image,
+                    schema=schema,
+                    model=chained_model or LLMFactory.default_model(name) or "default",
+                    output_format=output_format,
+                )
+            except LLMException as e:
+                if not _should_failover(e):
+                    raise
+                last_error = e
+        
+        if last_error is None:
+            raise LLMException("没有可用的LLM提供商")
+        raise last_error
@@ -1,24 +1,65 @@
 """
 文件处理服务
 """
+import importlib
 import logging
-from typing import Optional
+from functools import lru_cache
+from typing import Callable, Optional
 from pathlib import Path
 import tempfile
 import os
 import io
-import magic
-
-from PIL import Image
-import pytesseract
-
-from unstructured.partition.auto import partition
-from unstructured.partition.text import partition_text
 
 from app.core import FileProcessingException
 
 logger = logging.getLogger(__name__)
 
+# 各文件类型对应的 unstructured 分区函数（按需导入，未列出的类型使用自动分区）
+PARTITIONERS = {
+    "pdf": "unstructured.partition.pdf:partition_pdf",
+    "docx": "unstructured.partition.docx:partition_docx",
+    "doc": "unstructured.partition.doc:partition_doc",
+    "txt": "unstructured.partition.text:partition_text",
+    "xlsx": "unstructured.partition.xlsx:partition_xlsx",
+    "xls": "unstructured.partition.xlsx:partition_xlsx",
+    "pptx": "unstructured.partition.pptx:partition_pptx",
+    "ppt": "unstructured.partition.ppt:partition_ppt",
+}
+AUTO_PARTITIONER = "unstructured.partition.auto:partition"
+
+
+@lru_cache(maxsize=None)
+def _load_partitioner(import_path: str) -> Callable:
+    """按导入路径加载分区函数（每种类型只导入一次）"""
+    module_path, _, func_name = import_path.partition(":")
+    module = importlib.import_module(module_path)
+    return getattr(module, func_name)
+
+
+def _get_partitioner(extension: Optional[str]) -> Callable:
+    """获取文件类型对应的分区函数，缺少可选依赖时回退到自动分区"""
+    import_path = PARTITIONERS.get((extension or "").lower())
+    if import_path:
+        try:
+            return _load_partitioner(import_path)
+        except ImportError as e:
+            logger.warning(f"加载 {extension} 分区器失败，回退到自动分区: {str(e)}")
+    return _load_partitioner(AUTO_PARTITIONER)
+
+
+@lru_cache(maxsize=None)
+def _get_ocr_engine():
+    """获取 OCR 引擎（pytesseract，首次使用时导入）"""
+    import pytesseract
+    return pytesseract
+
+
+@lru_cache(maxsize=None)
+def _get_magic():
+    """获取 libmagic 绑定（首次使用时导入）"""
+    import magic
+    return magic
+
 
 class FileProcessingService:
     """文件处理服务 - 使用Unstructured库处理各种文件格式"""
@@ -72,7 +113,7 @@ class FileProcessingService:
             文件扩展名（不含点），如 'pdf', 'docx' 等；如无法判断则返回 None
         """
         try:
-            mime_type = magic.from_buffer(file_content, mime=True)
+            mime_type = _get_magic().from_buffer(file_content, mime=True)
             logger.debug(f"检测到 MIME 类型: {mime_type}")
                 
             # 从 MIME 类型映射到扩展名
@@ -107,6 +148,8 @@ class FileProcessingService:
         try:
             logger.info(f"开始处理图像文件: {filename or '未命名'}")
             
+            from PIL import Image
+            
             # 从字节流打开图像
             try:
                 image = Image.open(io.BytesIO(file_content))
@@ -123,7 +166,7 @@ class FileProcessingService:
                 # 使用 lang='chi_sim+eng' 支持中文和英文
                 # 如果只需要中文，使用 lang='chi_sim'
                 # 如果只需要英文，使用 lang='eng'
-                text_content = pytesseract.image_to_string(
+                text_content = _get_ocr_engine().image_to_string(
                     image,
                     lang='chi_sim+eng',
                     config='--psm 6'  # PSM 6: 假设单个文本块
@@ -206,8 +249,16 @@ class FileProcessingService:
                 tmp_file_path = tmp_file.name
             
             try:
-                # 使用Unstructured自动分区
-                elements = partition(filename=tmp_file_path)
+                # 使用与文件类型对应的 Unstructured 分区器
+                partition = _get_partitioner(detected_extension)
+                try:
+                    elements = partition(filename=tmp_file_path)
+                except Exception as e:
+                    auto_partition = _load_partitioner(AUTO_PARTITIONER)
+                    if partition is auto_partition:
+                        raise
+                    logger.warning(f"{detected_extension} 分区失败，回退到自动分区: {str(e)}")
+                    elements = auto_partition(filename=tmp_file_path)
                 
                 # 提取文本
                 text_content = "\n".join(
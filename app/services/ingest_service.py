@@ -0,0 +1,300 @@
+"""
+MinIO 前缀批量导入
+
+逐页列出存储桶前缀下的对象，按扩展名、大小与修改时间过滤后，以有限并发
+（INGEST_CONCURRENCY）逐个执行与 /extract 相同的提取流程：
+
+1. 列表协程按页读取对象，放入有界队列（队列满时暂停列表，内存占用与前缀大小无关）；
+2. 工作协程取出对象并提取，每个对象完成后立即写入检查点（对象名 + ETag + 结果）；
+3. 全部完成后生成汇总报告，写入 MinIO（report_url）或 INGEST_REPORT_DIR。
+
+同名（name）导入重跑时，ETag 未变且已成功的对象直接跳过（每页对象的检查点一次查出），
+失败或内容已变化的对象重新处理；执行中的运行定期续约，进程中断后租约过期的运行在启动时
+（recover）标记为失败，以相同参数重跑即可从检查点续做。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.core import settings, AppException, ValidationException
+from app.core.metrics import metrics
+from app.models import ExtractRequest, IngestRequest, SchemaField
+from app.utils.compiled_schema import compile_fields
+from .extract_service import ExtractService
+from .ingest_store import RUN_COMPLETED, RUN_FAILED, IngestRun, IngestStore
+from .minio_service import MinIOService, ObjectInfo
+from .sqlite_store import BackgroundRunner
+
+logger = logging.getLogger(__name__)
+
+
+def _utc(moment: datetime) -> datetime:
+    """无时区的时间按 UTC 处理"""
+    return moment if moment.tzinfo is not None else moment.replace(tzinfo=timezone.utc)
+
+
+class ObjectFilter:
+    """按扩展名、大小与修改时间过滤对象"""
+
+    def __init__(self, request: IngestRequest):
+        self.extensions = (
+            {ext.lower().lstrip(".") for ext in request.extensions} if request.extensions else None
+        )
+        self.min_size = request.min_size
+        self.max_size = request.max_size
+        self.modified_after = _utc(request.modified_after) if request.modified_after else None
+        self.modified_before = _utc(request.modified_before) if request.modified_before else None
+
+    def accepts(self, obj: ObjectInfo) -> bool:
+        if self.extensions is not None:
+            if os.path.splitext(obj.key)[1].lstrip(".").lower() not in self.extensions:
+                return False
+        if self.min_size is not None and obj.size < self.min_size:
+            return False
+        if self.max_size is not None and obj.size > self.max_size:
+            return False
+        if self.modified_after or self.modified_before:
+            if obj.last_modified is None:
+                return False
+            modified = _utc(obj.last_modified)
+            if self.modified_after and modified <= self.modified_after:
+                return False
+            if self.modified_before and modified >= self.modified_before:
+                return False
+        return True
+
+
+class IngestService(BackgroundRunner):
+    """
+    MinIO 前缀批量导入
+
+    Args:
+        extract_service: 执行单个对象提取的服务
+        store: 检查点存储，默认使用 INGEST_STORE_PATH
+        minio_service: 列表与写入报告使用的服务，默认与 extract_service 共用
+    """
+
+    def __init__(
+        self,
+        extract_service: ExtractService,
+        store: Optional[IngestStore] = None,
+        minio_service: Optional[MinIOService] = None,
+    ):
+        super().__init__()
+        self.extract_service = extract_service
+        self.store = store or IngestStore()
+        self.minio_service = minio_service or extract_service.minio_service
+
+    def create_run(self, request: IngestRequest, fields: List[SchemaField]) -> IngestRun:
+        """
+        创建导入运行（不立即执行）
+
+        Args:
+            request: 导入参数
+            fields: 已解析的字段定义列表（schema_id 由调用方解析）
+
+        Raises:
+            ValidationException: schema 为空或过滤条件无效
+        """
+        if not fields:
+            raise ValidationException("schema 不能为空")
+        if request.min_size is not None and request.max_size is not None and request.min_size > request.max_size:
+            raise ValidationException("min_size 不能大于 max_size")
+        if (
+            request.modified_after is not None
+            and request.modified_before is not None
+            and _utc(request.modified_after) >= _utc(request.modified_before)
+        ):
+            raise ValidationException("modified_after 必须早于 modified_before")
+
+        name = request.name or (
+            f"{request.bucket}/{request.prefix}:{compile_fields(fields).canonical_hash[:12]}"
+            f":{request.provider}/{request.model or ''}"
+        )
+        definition = request.model_dump(
+            mode="json", by_alias=True, exclude={"fields", "schema_id", "schema_version"}
+        )
+        definition["schema"] = [f.model_dump(exclude_none=True) for f in fields]
+        definition["name"] = name
+        run = self.store.create_run(name, definition)
+        logger.info(f"已创建导入任务: {run.run_id}（{request.bucket}/{request.prefix}，检查点 {name}）")
+        return run
+
+    async def recover(self) -> List[str]:
+        """将执行进程已退出（租约过期）的运行标记为失败，返回这些运行的 ID"""
+        run_ids = await asyncio.to_thread(self.store.fail_stale_runs)
+        if run_ids:
+            logger.warning(f"{len(run_ids)} 个导入任务的执行进程已退出，已标记为失败: {', '.join(run_ids)}")
+        return run_ids
+
+    async def run(self, run_id: str) -> Dict[str, Any]:
+        """
+        执行导入直到结束
+
+        单个对象的失败记录在检查点与报告中，不影响其他对象；列出对象失败时运行失败。
+        执行期间每 INGEST_LEASE_SECONDS / 3 秒续约一次。
+
+        Returns:
+            汇总报告
+
+        Raises:
+            ValidationException: 运行已结束或正由其他进程执行
+        """
+        run = await asyncio.to_thread(self.store.get_run, run_id)
+        if not await self._renew_lease(run_id):
+            raise ValidationException(f"导入任务 {run_id} 已结束或正由其他进程执行")
+        request = IngestRequest.model_validate(run.definition)
+        fields = request.fields or []
+        concurrency = request.concurrency or settings.INGEST_CONCURRENCY
+        object_filter = ObjectFilter(request)
+        counts = {"listed": 0, "filtered": 0, "skipped": 0, "succeeded": 0, "failed": 0}
+        failures: List[Dict[str, str]] = []
+        started = time.time()
+        queue: "asyncio.Queue[Optional[ObjectInfo]]" = asyncio.Queue(maxsize=concurrency * 2)
+        status, run_error = RUN_COMPLETED, None
+
+        async def produce() -> None:
+            nonlocal status, run_error
+            try:
+                async for page in self.minio_service.list_object_pages(
+                    request.bucket, request.prefix, settings.INGEST_LIST_PAGE_SIZE
+                ):
+                    accepted = [obj for obj in page if object_filter.accepts(obj)]
+                    counts["listed"] += len(page)
+                    counts["filtered"] += len(page) - len(accepted)
+                    completed = await asyncio.to_thread(
+                        self.store.completed_etags, run.name, request.bucket, [obj.key for obj in accepted]
+                    ) if accepted else {}
+                    for obj in accepted:
+                        if completed.get(obj.key) == obj.etag:
+                            counts["skipped"] += 1
+                            continue
+                        await queue.put(obj)
+            except Exception as e:
+                run_error = e.message if isinstance(e, AppException) else str(e)
+                logger.error(f"导入任务 {run_id} 列出对象失败: {run_error}")
+                status = RUN_FAILED
+            # 列表结束（或失败）后通知工作协程处理完已入队的对象后退出
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(settings.INGEST_LEASE_SECONDS / 3)
+                if not await self._renew_lease(run_id):
+                    logger.warning(f"导入任务 {run_id} 的租约已失效")
+
+        async def work() -> None:
+            while True:
+                obj = await queue.get()
+                if obj is None:
+                    return
+                try:
+                    error = await self._process(run, request, fields, obj)
+                except Exception as e:
+                    # 检查点写入失败等：记为该对象失败，继续处理其他对象
+                    error = e.message if isinstance(e, AppException) else str(e)
+                    logger.error(f"导入对象 {obj.url} 时出错: {error}")
+                if error is None:
+                    counts["succeeded"] += 1
+                else:
+                    counts["failed"] += 1
+                    if len(failures) < settings.INGEST_REPORT_MAX_FAILURES:
+                        failures.append({"object": obj.url, "error": error})
+
+        renewal = asyncio.ensure_future(heartbeat())
+        try:
+            # 任一协程意外退出时取消其余协程（生产者不会阻塞在已满的队列上）
+            async with asyncio.TaskGroup() as group:
+                group.create_task(produce())
+                for _ in range(concurrency):
+                    group.create_task(work())
+        except asyncio.CancelledError:
+            # 已处理的对象已写入检查点，运行立即标记为失败，不必等待租约过期
+            await asyncio.to_thread(
+                self.store.finish_run, run_id, RUN_FAILED, None, "导入已中断，以相同参数重跑即可从检查点续做"
+            )
+            raise
+        except Exception as e:
+            errors = e.exceptions if isinstance(e, BaseExceptionGroup) else [e]
+            run_error = "; ".join(err.message if isinstance(err, AppException) else str(err) for err in errors)
+            logger.error(f"导入任务 {run_id} 异常中止: {run_error}")
+            status = RUN_FAILED
+        finally:
+            renewal.cancel()
+
+        for key in ("filtered", "skipped"):
+            metrics.inc("ingest_objects_total", counts[key], status=key)
+        report: Dict[str, Any] = {
+            "run_id": run_id,
+            "name": run.name,
+            "bucket": request.bucket,
+            "prefix": request.prefix,
+            "status": status,
+            "error": run_error,
+            "counts": counts,
+            "failures": failures,
+            "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+            "elapsed_seconds": round(time.time() - started, 3),
+        }
+        report["report_url"] = await self._write_report(run_id, request.report_url, report)
+        await asyncio.to_thread(self.store.finish_run, run_id, status, report, run_error)
+        logger.info(f"导入任务 {run_id} 结束（{status}）: {counts}")
+        return report
+
+    async def _renew_lease(self, run_id: str) -> bool:
+        return await asyncio.to_thread(self.store.acquire_lease, run_id, self.owner, settings.INGEST_LEASE_SECONDS)
+
+    async def _process(
+        self,
+        run: IngestRun,
+        request: IngestRequest,
+        fields: List[SchemaField],
+        obj: ObjectInfo,
+    ) -> Optional[str]:
+        """提取单个对象并写入检查点，返回失败原因（成功时为 None）"""
+        try:
+            values = await self.extract_service.extract(ExtractRequest(
+                source="minio",
+                file=obj.url,
+                schema=fields,
+                provider=request.provider,
+                model=request.model,
+                filename=os.path.basename(obj.key),
+                output_format=request.output_format,
+            ))
+        except Exception as e:
+            error = e.message if isinstance(e, AppException) else str(e)
+            logger.warning(f"导入对象失败 {obj.url}: {error}")
+            await asyncio.to_thread(
+                self.store.save_object, run.name, run.run_id, obj.bucket, obj.key, obj.etag, None, error
+            )
+            metrics.inc("ingest_objects_total", status="failed")
+            return error
+        await asyncio.to_thread(self.store.save_object, run.name, run.run_id, obj.bucket, obj.key, obj.etag, values)
+        metrics.inc("ingest_objects_total", status="succeeded")
+        return None
+
+    async def _write_report(self, run_id: str, report_url: Optional[str], report: Dict[str, Any]) -> Optional[str]:
+        """写入汇总报告，返回写入位置（失败时记录日志并返回 None）"""
+        body = json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8")
+        try:
+            if report_url:
+                if report_url.endswith("/"):
+                    report_url = f"{report_url}{run_id}.json"
+                bucket_name, object_name, _ = await self.minio_service.upload_stream(
+                    report_url, [body], "application/json"
+                )
+                return f"{bucket_name}/{object_name}"
+            os.makedirs(settings.INGEST_REPORT_DIR, exist_ok=True)
+            path = os.path.join(settings.INGEST_REPORT_DIR, f"{run_id}.json")
+            with open(path, "wb") as f:
+                f.write(body)
+            return path
+        except (AppException, OSError) as e:
+            logger.warning(f"无法写入导入任务 {run_id} 的汇总报告: {str(e)}")
+            return None
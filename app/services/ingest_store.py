@@ -0,0 +1,271 @@
+"""
+批量导入检查点存储
+
+以 SQLite 记录 MinIO 前缀导入的运行记录与逐对象检查点（对象名 + ETag + 状态 + 结果）。
+检查点按导入名称（name）区分：同一名称重新运行时，ETag 未变且已成功的对象直接跳过，
+失败或内容已变化的对象重新处理。每个对象处理完成后立即写入，进程中断后重跑即可续做。
+执行中的运行由所在进程定期续约（INGEST_LEASE_SECONDS），进程退出后租约过期的运行标记为失败。
+"""
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import settings, JobNotFoundException
+from app.models import ExtractedValue
+from .sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# 运行状态
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+
+# 对象状态
+OBJECT_SUCCEEDED = "succeeded"
+OBJECT_FAILED = "failed"
+
+_CREATE_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS ingest_runs (
+        run_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        definition TEXT NOT NULL,
+        status TEXT NOT NULL,
+        report TEXT,
+        error TEXT,
+        lease_owner TEXT,
+        lease_until REAL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_objects (
+        name TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        object_key TEXT NOT NULL,
+        etag TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        run_id TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (name, bucket, object_key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ingest_objects_run ON ingest_objects (run_id, object_key)",
+)
+
+# 单条 IN 查询的对象名数量（低于旧版 SQLite 999 个参数的限制）
+_LOOKUP_CHUNK = 500
+
+
+class IngestRun:
+    """一次导入运行"""
+
+    __slots__ = ("run_id", "name", "definition", "status", "report", "error", "created_at", "updated_at")
+
+    def __init__(
+        self,
+        run_id: str,
+        name: str,
+        definition: Dict[str, Any],
+        status: str,
+        report: Optional[Dict[str, Any]],
+        error: Optional[str],
+        created_at: float,
+        updated_at: float,
+    ):
+        self.run_id = run_id
+        self.name = name
+        self.definition = definition
+        self.status = status
+        self.report = report
+        self.error = error
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+
+class IngestStore(SQLiteStore):
+    """批量导入检查点存储（SQLite）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化检查点存储
+
+        Args:
+            db_path: SQLite 文件路径，默认使用 INGEST_STORE_PATH
+        """
+        super().__init__(db_path or settings.INGEST_STORE_PATH, _CREATE_TABLES)
+
+    def create_run(self, name: str, definition: Dict[str, Any]) -> IngestRun:
+        """创建运行记录（租约从创建时起算，启动前进程退出的运行同样会过期）"""
+        run_id = f"ingest_{uuid.uuid4().hex[:16]}"
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO ingest_runs (run_id, name, definition, status, lease_until, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        run_id, name, json.dumps(definition, ensure_ascii=False), RUN_RUNNING,
+                        now + settings.INGEST_LEASE_SECONDS, now, now,
+                    ),
+                )
+        finally:
+            conn.close()
+        return IngestRun(run_id, name, definition, RUN_RUNNING, None, None, now, now)
+
+    def get_run(self, run_id: str) -> IngestRun:
+        """
+        获取运行记录
+
+        Raises:
+            JobNotFoundException: 运行记录不存在
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT name, definition, status, report, error, created_at, updated_at "
+                "FROM ingest_runs WHERE run_id = ?",
+                (run_id,),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise JobNotFoundException(f"导入任务不存在: {run_id}")
+        return IngestRun(
+            run_id, row[0], json.loads(row[1]), row[2],
+            json.loads(row[3]) if row[3] else None, row[4], row[5], row[6],
+        )
+
+    def finish_run(
+        self,
+        run_id: str,
+        status: str,
+        report: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """结束运行并保存汇总报告"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE ingest_runs SET status = ?, report = ?, error = ?, lease_owner = NULL, lease_until = NULL, "
+                    "updated_at = ? WHERE run_id = ?",
+                    (
+                        status,
+                        json.dumps(report, ensure_ascii=False) if report is not None else None,
+                        error,
+                        time.time(),
+                        run_id,
+                    ),
+                )
+        finally:
+            conn.close()
+
+    def acquire_lease(self, run_id: str, owner: str, seconds: float) -> bool:
+        """
+        获取或续期执行中运行的租约
+
+        Returns:
+            是否持有租约（运行已结束或由其他未过期的持有者执行时为 False）
+        """
+        return self._acquire_lease("ingest_runs", "run_id", run_id, owner, seconds, "status = ?", (RUN_RUNNING,))
+
+    def fail_stale_runs(self) -> List[str]:
+        """将租约已过期（所在进程已退出）的执行中运行标记为失败，返回这些运行的 ID"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                run_ids = [
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT run_id FROM ingest_runs WHERE status = ? AND lease_until < ?",
+                        (RUN_RUNNING, now),
+                    ).fetchall()
+                ]
+                conn.executemany(
+                    "UPDATE ingest_runs SET status = ?, error = ?, lease_owner = NULL, lease_until = NULL, "
+                    "updated_at = ? WHERE run_id = ? AND status = ? AND lease_until < ?",
+                    [
+                        (RUN_FAILED, "导入进程已退出，以相同参数重跑即可从检查点续做", now, run_id, RUN_RUNNING, now)
+                        for run_id in run_ids
+                    ],
+                )
+        finally:
+            conn.close()
+        return run_ids
+
+    def completed_etags(self, name: str, bucket: str, keys: List[str]) -> Dict[str, str]:
+        """一组对象中已成功处理的对象的 ETag（对象名 -> ETag，未处理或处理失败的对象不在结果中）"""
+        etags: Dict[str, str] = {}
+        conn = self._connect()
+        try:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                rows = conn.execute(
+                    "SELECT object_key, etag FROM ingest_objects WHERE name = ? AND bucket = ? AND status = ? "
+                    f"AND object_key IN ({', '.join('?' * len(chunk))})",
+                    (name, bucket, OBJECT_SUCCEEDED, *chunk),
+                ).fetchall()
+                etags.update(rows)
+        finally:
+            conn.close()
+        return etags
+
+    def save_object(
+        self,
+        name: str,
+        run_id: str,
+        bucket: str,
+        key: str,
+        etag: str,
+        values: Optional[List[ExtractedValue]],
+        error: Optional[str] = None,
+    ) -> None:
+        """写入对象检查点（成功时保存提取结果）"""
+        payload = json.dumps([v.model_dump() for v in values], ensure_ascii=False) if values is not None else None
+        status = OBJECT_SUCCEEDED if values is not None else OBJECT_FAILED
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ingest_objects "
+                    "(name, bucket, object_key, etag, status, result, error, run_id, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (name, bucket, key, etag, status, payload, error, run_id, time.time()),
+                )
+        finally:
+            conn.close()
+
+    def objects(
+        self,
+        run_id: str,
+        offset: int = 0,
+        limit: int = 1000,
+    ) -> List[Tuple[str, str, Optional[List[ExtractedValue]], Optional[str]]]:
+        """按对象名分页读取某次运行处理的对象（对象名, 状态, 提取结果, 错误信息）"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT bucket, object_key, status, result, error FROM ingest_objects "
+                "WHERE run_id = ? ORDER BY object_key LIMIT ? OFFSET ?",
+                (run_id, limit, offset),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            (
+                f"{row[0]}/{row[1]}",
+                row[2],
+                [ExtractedValue(**v) for v in json.loads(row[3])] if row[3] else None,
+                row[4],
+            )
+            for row in rows
+        ]
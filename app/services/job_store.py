@@ -0,0 +1,457 @@
+"""
+批量任务存储
+
+以 SQLite 持久化离线批量提取任务及其文档、结果与提供商侧的批量任务 ID，
+进程重启后可从中断处继续（未提交的重新提交，已提交的继续轮询）。
+一个任务可拆分为多个提供商批量任务（受单批请求数与输入文件大小限制），每批覆盖
+按 item_id 排序的一段连续文档。
+多个 worker 共享同一文件时，通过租约保证同一任务只由一个 worker 推进。
+"""
+import json
+import logging
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core import settings, JobNotFoundException
+from app.llm.bulk import BATCH_RUNNING
+from app.models import ExtractedValue, SchemaField
+from .sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_PENDING = "pending"  # 已创建，尚未提交给提供商
+JOB_SUBMITTED = "submitted"  # 已提交，等待提供商完成
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_UNFINISHED = (JOB_PENDING, JOB_SUBMITTED)
+
+# 文档状态
+ITEM_PENDING = "pending"
+ITEM_SUCCEEDED = "succeeded"
+ITEM_FAILED = "failed"
+
+_CREATE_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS bulk_jobs (
+        job_id TEXT PRIMARY KEY,
+        provider TEXT NOT NULL,
+        model TEXT NOT NULL,
+        output_format TEXT NOT NULL,
+        definition TEXT NOT NULL,
+        status TEXT NOT NULL,
+        batch_id TEXT,
+        error TEXT,
+        lease_owner TEXT,
+        lease_until REAL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bulk_items (
+        job_id TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        document_id TEXT NOT NULL,
+        content TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        PRIMARY KEY (job_id, item_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bulk_batches (
+        job_id TEXT NOT NULL,
+        batch_id TEXT NOT NULL,
+        first_item TEXT NOT NULL,
+        last_item TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        error TEXT,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (job_id, batch_id)
+    )
+    """,
+)
+
+
+class BulkJob:
+    """批量任务"""
+
+    __slots__ = (
+        "job_id", "provider", "model", "output_format", "fields",
+        "status", "batch_id", "error", "created_at", "updated_at",
+    )
+
+    def __init__(
+        self,
+        job_id: str,
+        provider: str,
+        model: str,
+        output_format: str,
+        fields: List[SchemaField],
+        status: str,
+        batch_id: Optional[str],
+        error: Optional[str],
+        created_at: float,
+        updated_at: float,
+    ):
+        self.job_id = job_id
+        self.provider = provider
+        self.model = model
+        self.output_format = output_format
+        self.fields = fields
+        self.status = status
+        self.batch_id = batch_id
+        self.error = error
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+
+class BulkItem:
+    """批量任务中的一份文档"""
+
+    __slots__ = ("item_id", "document_id", "status", "values", "error")
+
+    def __init__(
+        self,
+        item_id: str,
+        document_id: str,
+        status: str,
+        values: Optional[List[ExtractedValue]],
+        error: Optional[str],
+    ):
+        self.item_id = item_id
+        self.document_id = document_id
+        self.status = status
+        self.values = values
+        self.error = error
+
+
+class BulkBatch:
+    """任务中的一个提供商批量任务（覆盖 first_item 到 last_item 的文档）"""
+
+    __slots__ = ("batch_id", "first_item", "last_item", "size", "status", "error")
+
+    def __init__(
+        self,
+        batch_id: str,
+        first_item: str,
+        last_item: str,
+        size: int,
+        status: str,
+        error: Optional[str],
+    ):
+        self.batch_id = batch_id
+        self.first_item = first_item
+        self.last_item = last_item
+        self.size = size
+        self.status = status
+        self.error = error
+
+
+class JobStore(SQLiteStore):
+    """批量任务存储（SQLite）"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化任务存储
+
+        Args:
+            db_path: SQLite 文件路径，默认使用 BULK_JOB_STORE_PATH
+        """
+        super().__init__(db_path or settings.BULK_JOB_STORE_PATH, _CREATE_TABLES)
+
+    def create_job(
+        self,
+        provider: str,
+        model: str,
+        output_format: str,
+        fields: List[SchemaField],
+        documents: Sequence[Tuple[str, str]],
+    ) -> BulkJob:
+        """
+        创建任务
+
+        Args:
+            provider: 提供商
+            model: 模型（Azure 为部署名）
+            output_format: 输出格式
+            fields: 字段定义列表
+            documents: （文档 ID, 文本内容）列表
+
+        Returns:
+            新任务
+        """
+        job_id = f"job_{uuid.uuid4().hex[:16]}"
+        definition = json.dumps([f.model_dump(exclude_none=True) for f in fields], ensure_ascii=False)
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO bulk_jobs (job_id, provider, model, output_format, definition, status, "
+                    "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, provider, model, output_format, definition, JOB_PENDING, now, now),
+                )
+                # custom_id 由服务端生成（提供商对 custom_id 的字符集与长度有限制）
+                conn.executemany(
+                    "INSERT INTO bulk_items (job_id, item_id, document_id, content, status) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (job_id, f"item-{index:06d}", document_id, content, ITEM_PENDING)
+                        for index, (document_id, content) in enumerate(documents)
+                    ],
+                )
+        finally:
+            conn.close()
+        logger.info(f"已创建批量任务: {job_id}（{provider}/{model}，{len(documents)} 份文档）")
+        return BulkJob(job_id, provider, model, output_format, list(fields), JOB_PENDING, None, None, now, now)
+
+    def get_job(self, job_id: str) -> BulkJob:
+        """
+        获取任务
+
+        Raises:
+            JobNotFoundException: 任务不存在
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT provider, model, output_format, definition, status, batch_id, error, "
+                "created_at, updated_at FROM bulk_jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise JobNotFoundException(f"批量任务不存在: {job_id}")
+        fields = [SchemaField(**item) for item in json.loads(row[3])]
+        return BulkJob(job_id, row[0], row[1], row[2], fields, row[4], row[5], row[6], row[7], row[8])
+
+    def unfinished_jobs(self) -> List[str]:
+        """未结束（待提交或等待提供商完成）的任务 ID"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT job_id FROM bulk_jobs WHERE status IN (?, ?) ORDER BY created_at",
+                JOB_UNFINISHED,
+            ).fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in rows]
+
+    def acquire_lease(self, job_id: str, owner: str, seconds: float) -> bool:
+        """
+        获取或续期任务的租约（租约过期后其他 worker 可接管）
+
+        Returns:
+            是否持有租约
+        """
+        return self._acquire_lease("bulk_jobs", "job_id", job_id, owner, seconds)
+
+    def release_lease(self, job_id: str, owner: str) -> None:
+        """释放租约"""
+        self._release_lease("bulk_jobs", "job_id", job_id, owner)
+
+    def iter_unsubmitted_items(self, job_id: str, batch_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """
+        按顺序逐批读取尚未提交的待处理文档（item_id, 文本内容）
+
+        即排在已提交的最后一批之后的文档（各批覆盖按 item_id 排序的连续文档）。
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT MAX(last_item) FROM bulk_batches WHERE job_id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        last_item_id = row[0] or ""
+        while True:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT item_id, content FROM bulk_items WHERE job_id = ? AND status = ? AND item_id > ? "
+                    "ORDER BY item_id LIMIT ?",
+                    (job_id, ITEM_PENDING, last_item_id, batch_size),
+                ).fetchall()
+            finally:
+                conn.close()
+            for item_id, content in rows:
+                yield item_id, content
+            if len(rows) < batch_size:
+                return
+            last_item_id = rows[-1][0]
+
+    def add_batch(self, job_id: str, batch_id: str, first_item: str, last_item: str, size: int) -> None:
+        """记录已提交的一个提供商批量任务（任务的 batch_id 为各批 ID 以逗号连接）"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO bulk_batches (job_id, batch_id, first_item, last_item, size, status, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, batch_id, first_item, last_item, size, BATCH_RUNNING, now),
+                )
+                conn.execute(
+                    "UPDATE bulk_jobs SET batch_id = CASE WHEN batch_id IS NULL THEN ? ELSE batch_id || ',' || ? END, "
+                    "updated_at = ? WHERE job_id = ?",
+                    (batch_id, batch_id, now, job_id),
+                )
+        finally:
+            conn.close()
+
+    def batches(self, job_id: str) -> List[BulkBatch]:
+        """任务的各提供商批量任务（按提交顺序）"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT batch_id, first_item, last_item, size, status, error FROM bulk_batches "
+                "WHERE job_id = ? ORDER BY first_item",
+                (job_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [BulkBatch(*row) for row in rows]
+
+    def finish_batch(self, job_id: str, batch: BulkBatch, status: str, error: Optional[str] = None) -> None:
+        """结束一个提供商批量任务；该批中仍未处理的文档标记为失败"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE bulk_items SET status = ?, error = ? WHERE job_id = ? AND status = ? "
+                    "AND item_id >= ? AND item_id <= ?",
+                    (ITEM_FAILED, error or "提供商未返回结果", job_id, ITEM_PENDING, batch.first_item, batch.last_item),
+                )
+                conn.execute(
+                    "UPDATE bulk_batches SET status = ?, error = ? WHERE job_id = ? AND batch_id = ?",
+                    (status, error, job_id, batch.batch_id),
+                )
+        finally:
+            conn.close()
+
+    def mark_submitted(self, job_id: str) -> None:
+        """全部文档已提交给提供商"""
+        self._update_job(job_id, status=JOB_SUBMITTED)
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """结束任务；仍未处理的文档标记为失败"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE bulk_items SET status = ?, error = ? WHERE job_id = ? AND status = ?",
+                    (ITEM_FAILED, error or "提供商未返回结果", job_id, ITEM_PENDING),
+                )
+                conn.execute(
+                    "UPDATE bulk_jobs SET status = ?, error = ?, lease_owner = NULL, lease_until = NULL, "
+                    "updated_at = ? WHERE job_id = ?",
+                    (status, error, time.time(), job_id),
+                )
+        finally:
+            conn.close()
+
+    def save_results(
+        self,
+        job_id: str,
+        results: Dict[str, Tuple[Optional[List[ExtractedValue]], Optional[str]]],
+    ) -> None:
+        """
+        保存文档结果
+
+        Args:
+            job_id: 任务 ID
+            results: item_id -> （提取结果, 错误信息）
+        """
+        rows = []
+        for item_id, (values, error) in results.items():
+            if values is not None:
+                payload = json.dumps([v.model_dump() for v in values], ensure_ascii=False)
+                rows.append((ITEM_SUCCEEDED, payload, None, job_id, item_id))
+            else:
+                rows.append((ITEM_FAILED, None, error, job_id, item_id))
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE bulk_items SET status = ?, result = ?, error = ? WHERE job_id = ? AND item_id = ?",
+                    rows,
+                )
+        finally:
+            conn.close()
+
+    def counts(self, job_id: str) -> Dict[str, int]:
+        """各状态的文档数"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM bulk_items WHERE job_id = ? GROUP BY status",
+                (job_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        counts = {ITEM_PENDING: 0, ITEM_SUCCEEDED: 0, ITEM_FAILED: 0}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def items(self, job_id: str, offset: int = 0, limit: int = 1000) -> List[BulkItem]:
+        """按顺序分页读取文档结果"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT item_id, document_id, status, result, error FROM bulk_items "
+                "WHERE job_id = ? ORDER BY item_id LIMIT ? OFFSET ?",
+                (job_id, limit, offset),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            BulkItem(
+                row[0],
+                row[1],
+                row[2],
+                [ExtractedValue(**v) for v in json.loads(row[3])] if row[3] else None,
+                row[4],
+            )
+            for row in rows
+        ]
+
+    def iter_items(self, job_id: str, batch_size: int = 1000) -> Iterator[BulkItem]:
+        """按顺序逐批读取全部文档结果（按 item_id 翻页，每次只持有一批）"""
+        last_item_id = ""
+        while True:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT item_id, document_id, status, result, error FROM bulk_items "
+                    "WHERE job_id = ? AND item_id > ? ORDER BY item_id LIMIT ?",
+                    (job_id, last_item_id, batch_size),
+                ).fetchall()
+            finally:
+                conn.close()
+            for row in rows:
+                yield BulkItem(
+                    row[0],
+                    row[1],
+                    row[2],
+                    [ExtractedValue(**v) for v in json.loads(row[3])] if row[3] else None,
+                    row[4],
+                )
+            if len(rows) < batch_size:
+                return
+            last_item_id = rows[-1][0]
+
+    def _update_job(self, job_id: str, **columns) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"UPDATE bulk_jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                    (*columns.values(), time.time(), job_id),
+                )
+        finally:
+            conn.close()
@@ -1,28 +1,64 @@
 """
 MinIO文件服务
 """
+import asyncio
 import logging
-from typing import Optional
-from minio import Minio
-from minio.error import S3Error
+import tempfile
+import weakref
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
 import io
 
-from app.core import MinIOException, settings
+from app.core import AppException, MinIOException, settings
+from app.core.warmup import register_after_fork
 
 logger = logging.getLogger(__name__)
 
 
+class ObjectInfo:
+    """MinIO对象信息"""
+    
+    __slots__ = ("bucket", "key", "size", "etag", "last_modified")
+    
+    def __init__(self, bucket: str, key: str, size: int, etag: str, last_modified: Optional[datetime]):
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+    
+    @property
+    def url(self) -> str:
+        """bucket/object 形式的路径（可直接作为 download_file 的参数）"""
+        return f"{self.bucket}/{self.key}"
+
+
 class MinIOService:
     """MinIO文件服务"""
     
     def __init__(self):
-        """初始化MinIO客户端"""
-        self.client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE,
-        )
+        """初始化MinIO服务（客户端在首次使用时创建）"""
+        self._client = None
+        # 连接池不可跨进程共享，fork 后重新创建（弱引用，不延长实例生命周期）
+        _instances.add(self)
+    
+    def _reset_client(self) -> None:
+        """丢弃当前客户端，下次访问时重新创建"""
+        self._client = None
+    
+    @property
+    def client(self):
+        """MinIO客户端（首次访问时导入 minio 并创建）"""
+        if self._client is None:
+            from minio import Minio
+            self._client = Minio(
+                settings.MINIO_ENDPOINT,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=settings.MINIO_SECURE,
+            )
+        return self._client
     
     async def download_file(self, url: str) -> bytes:
         """
@@ -37,16 +73,16 @@ class MinIOService:
         Raises:
             MinIOException: 文件下载失败
         """
+        from minio.error import S3Error
+        
         try:
             # 解析URL获取bucket和object_name
             bucket_name, object_name = self._parse_url(url)
             
             logger.info(f"开始从MinIO下载文件: {bucket_name}/{object_name}")
             
-            # 下载文件
-            response = self.client.get_object(bucket_name, object_name)
-            file_content = response.read()
-            response.close()
+            # 下载文件（阻塞调用放到线程中，避免并发下载时阻塞事件循环）
+            file_content = await asyncio.to_thread(self._read_object, bucket_name, object_name)
             
             logger.info(f"文件下载成功，大小: {len(file_content)} 字节")
             return file_content
@@ -58,6 +94,146 @@ class MinIOService:
             logger.error(f"文件下载失败: {str(e)}")
             raise MinIOException(f"文件下载失败: {str(e)}")
     
+    async def object_etag(self, url: str) -> str:
+        """
+        读取对象的 ETag（HEAD 请求，不下载内容），对象被覆盖后随之变化
+        
+        Args:
+            url: MinIO文件URL，格式同 download_file
+            
+        Raises:
+            MinIOException: 对象不存在或请求失败
+        """
+        from minio.error import S3Error
+        
+        try:
+            bucket_name, object_name = self._parse_url(url)
+            stat = await asyncio.to_thread(self.client.stat_object, bucket_name, object_name)
+        except S3Error as e:
+            logger.error(f"MinIO S3错误: {str(e)}")
+            raise MinIOException(f"MinIO操作失败: {str(e)}")
+        except Exception as e:
+            logger.error(f"读取对象信息失败: {str(e)}")
+            raise MinIOException(f"读取对象信息失败: {str(e)}")
+        return (stat.etag or "").strip('"')
+    
+    def _read_object(self, bucket_name: str, object_name: str) -> bytes:
+        response = self.client.get_object(bucket_name, object_name)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+    
+    async def list_object_pages(
+        self,
+        bucket_name: str,
+        prefix: str = "",
+        page_size: int = 1000,
+    ) -> AsyncIterator[List[ObjectInfo]]:
+        """
+        逐页列出前缀下的对象（递归，不含目录）
+        
+        客户端按服务端分页（continuation token）惰性读取列表，这里每次在线程中取出
+        page_size 个对象，整个前缀的列表不会一次性载入内存。
+        
+        Args:
+            bucket_name: 存储桶
+            prefix: 对象名前缀
+            page_size: 每次取出的对象数
+            
+        Raises:
+            MinIOException: 列表失败
+        """
+        from minio.error import S3Error
+        
+        objects = iter(self.client.list_objects(bucket_name, prefix=prefix or None, recursive=True))
+        while True:
+            try:
+                page = await asyncio.to_thread(lambda: list(islice(objects, page_size)))
+            except S3Error as e:
+                logger.error(f"MinIO S3错误: {str(e)}")
+                raise MinIOException(f"MinIO操作失败: {str(e)}")
+            except Exception as e:
+                logger.error(f"列出对象失败: {str(e)}")
+                raise MinIOException(f"列出对象失败: {str(e)}")
+            yield [
+                ObjectInfo(
+                    bucket_name,
+                    item.object_name,
+                    item.size or 0,
+                    (item.etag or "").strip('"'),
+                    item.last_modified,
+                )
+                for item in page
+                if not item.is_dir
+            ]
+            if len(page) < page_size:
+                return
+    
+    def listen_notifications(self, bucket_name: str, prefix: str = "") -> Iterable[dict]:
+        """
+        订阅存储桶的新对象通知（MinIO ListenBucketNotification）
+        
+        返回阻塞的迭代器，每项为一条 S3 通知（含 Records 列表），连接断开时自动重连；
+        应在线程中迭代。
+        
+        Args:
+            bucket_name: 存储桶
+            prefix: 只接收此前缀下对象的通知
+        """
+        return self.client.listen_bucket_notification(
+            bucket_name, prefix=prefix, events=("s3:ObjectCreated:*",)
+        )
+    
+    async def upload_stream(
+        self,
+        url: str,
+        chunks: Iterable[bytes],
+        content_type: str = "application/octet-stream",
+    ) -> Tuple[str, str, int]:
+        """
+        将逐块产出的内容写入MinIO
+        
+        内容先写入临时文件（内存中只保留当前一块），再按分片上传。
+        
+        Args:
+            url: 目标对象，格式同 download_file
+            chunks: 字节块
+            content_type: 对象的 Content-Type
+            
+        Returns:
+            (bucket_name, object_name, 字节数)
+            
+        Raises:
+            MinIOException: 上传失败
+        """
+        from minio.error import S3Error
+        
+        bucket_name, object_name = self._parse_url(url)
+        
+        def upload() -> int:
+            with tempfile.TemporaryFile() as buffer:
+                for chunk in chunks:
+                    buffer.write(chunk)
+                size = buffer.tell()
+                buffer.seek(0)
+                self.client.put_object(bucket_name, object_name, buffer, size, content_type=content_type)
+            return size
+        
+        try:
+            logger.info(f"开始上传到MinIO: {bucket_name}/{object_name}")
+            size = await asyncio.to_thread(upload)
+            return bucket_name, object_name, size
+        except S3Error as e:
+            logger.error(f"MinIO S3错误: {str(e)}")
+            raise MinIOException(f"MinIO操作失败: {str(e)}")
+        except AppException:
+            raise
+        except Exception as e:
+            logger.error(f"文件上传失败: {str(e)}")
+            raise MinIOException(f"文件上传失败: {str(e)}")
+    
     def _parse_url(self, url: str) -> tuple:
         """
         解析MinIO URL获取bucket和object_name
@@ -100,3 +276,15 @@ class MinIOService:
         except Exception as e:
             logger.error(f"URL解析失败: {str(e)}")
             raise MinIOException(f"MinIO URL格式不正确: {url}")
+
+
+# 所有 MinIOService 实例（弱引用），fork 后统一丢弃其客户端
+_instances: "weakref.WeakSet[MinIOService]" = weakref.WeakSet()
+
+
+def _reset_clients() -> None:
+    for service in list(_instances):
+        service._reset_client()
+
+
+register_after_fork(_reset_clients)
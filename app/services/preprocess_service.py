@@ -0,0 +1,342 @@
+"""
+事件驱动预处理
+
+新对象写入 MinIO 后，提前完成 /extract 中最慢的几步，客户端请求到达时直接命中缓存：
+
+1. 事件来源：订阅存储桶通知（PREPROCESS_SOURCE=minio），或轮询本地事件目录
+   （PREPROCESS_SOURCE=queue，每个文件一条 S3 通知 JSON，作为没有通知配置时的替代）；
+2. 下载对象、判别类型、解析文本，写入 ExtractService 的解析缓存；
+3. 配置了 PREPROCESS_SCHEMAS 且开启结果缓存时，按这些已注册 schema 预提取，写入结果缓存。
+
+等待预处理的对象放入有界队列（PREPROCESS_MAX_BACKLOG）：队列满时丢弃存储桶通知
+（预处理只是预热，客户端请求仍会正常处理），本地事件目录则暂停读取，文件留待下次轮询。
+同一对象的 ETag 未变化时不重复处理（重复通知、重复写入相同内容）。
+
+多 worker 部署时只有持有 PREPROCESS_LOCK_PATH 文件锁的 worker 订阅通知或读取事件目录，
+其他 worker 每隔 PREPROCESS_POLL_INTERVAL 秒尝试接管（持有者退出时锁随之释放）。
+CACHE_BACKEND=file 时解析缓存与结果缓存由同一主机的 worker 共享，预热对所有 worker 生效。
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote_plus
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from app.core import settings, AppException, ValidationException
+from app.core.metrics import metrics
+from app.models import ExtractRequest, SchemaField
+from app.utils.lru_cache import LRUCache
+from .extract_service import ExtractService
+from .minio_service import MinIOService, ObjectInfo
+from .schema_registry import SchemaRegistry
+
+logger = logging.getLogger(__name__)
+
+SOURCE_MINIO = "minio"
+SOURCE_QUEUE = "queue"
+
+
+def parse_notification(payload: Dict[str, Any]) -> List[ObjectInfo]:
+    """
+    从 S3 通知中取出新建的对象（忽略删除、访问等其他事件）
+
+    Args:
+        payload: S3 通知（含 Records 列表）
+
+    Returns:
+        对象列表（对象名已解码）
+    """
+    objects: List[ObjectInfo] = []
+    for record in payload.get("Records") or []:
+        # MinIO 的事件名带 s3: 前缀（s3:ObjectCreated:Put），AWS 不带
+        if "ObjectCreated:" not in str(record.get("eventName", "")):
+            continue
+        s3 = record.get("s3") or {}
+        bucket = (s3.get("bucket") or {}).get("name")
+        obj = s3.get("object") or {}
+        key = obj.get("key")
+        if not bucket or not key:
+            continue
+        objects.append(ObjectInfo(
+            bucket,
+            unquote_plus(key),
+            int(obj.get("size") or 0),
+            str(obj.get("eTag") or "").strip('"'),
+            None,
+        ))
+    return objects
+
+
+class PreprocessService:
+    """
+    事件驱动预处理
+
+    Args:
+        extract_service: 预热其解析缓存与结果缓存的提取服务
+        schema_registry: 解析 PREPROCESS_SCHEMAS 的注册中心
+        minio_service: 订阅通知使用的服务，默认与 extract_service 共用
+    """
+
+    def __init__(
+        self,
+        extract_service: ExtractService,
+        schema_registry: Optional[SchemaRegistry] = None,
+        minio_service: Optional[MinIOService] = None,
+    ):
+        self.extract_service = extract_service
+        self.schema_registry = schema_registry or SchemaRegistry()
+        self.minio_service = minio_service or extract_service.minio_service
+        self._queue: "asyncio.Queue[ObjectInfo]" = asyncio.Queue(maxsize=settings.PREPROCESS_MAX_BACKLOG)
+        # (bucket, key) -> 已接收（排队、处理中或已完成）的 ETag
+        self._seen: LRUCache[str] = LRUCache(settings.PREPROCESS_DEDUPE_SIZE)
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._stopping = threading.Event()
+        self._leader = False
+        self._lock_fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        """本 worker 是否正在执行预处理"""
+        return self._leader
+
+    @property
+    def backlog(self) -> int:
+        """等待预处理的对象数"""
+        return self._queue.qsize()
+
+    def submit(self, obj: ObjectInfo) -> bool:
+        """
+        提交一个新对象（不阻塞）
+
+        Returns:
+            是否已放入队列（被过滤、重复或队列已满时为 False）
+        """
+        if not self._accepts(obj):
+            metrics.inc("preprocess_events_total", status="filtered")
+            return False
+        if obj.etag and self._seen.get((obj.bucket, obj.key)) == obj.etag:
+            metrics.inc("preprocess_events_total", status="duplicate")
+            return False
+        try:
+            self._queue.put_nowait(obj)
+        except asyncio.QueueFull:
+            logger.warning(f"预处理队列已满（{self._queue.maxsize}），丢弃: {obj.url}")
+            metrics.inc("preprocess_events_total", status="dropped")
+            return False
+        if obj.etag:
+            self._seen.put((obj.bucket, obj.key), obj.etag)
+        metrics.inc("preprocess_events_total", status="accepted")
+        metrics.set_gauge("preprocess_backlog", self._queue.qsize())
+        return True
+
+    def submit_notification(self, payload: Dict[str, Any]) -> int:
+        """提交一条 S3 通知，返回放入队列的对象数"""
+        if self._stopping.is_set():
+            return 0
+        return sum(1 for obj in parse_notification(payload) if self.submit(obj))
+
+    @staticmethod
+    def _accepts(obj: ObjectInfo) -> bool:
+        if obj.key.endswith("/") or not obj.key.startswith(settings.PREPROCESS_PREFIX):
+            return False
+        if settings.PREPROCESS_SUFFIXES:
+            extension = os.path.splitext(obj.key)[1].lstrip(".").lower()
+            return extension in {suffix.lower().lstrip(".") for suffix in settings.PREPROCESS_SUFFIXES}
+        return True
+
+    def start(self) -> None:
+        """
+        启动工作协程与事件来源（需在事件循环中调用，重复调用无效）
+
+        未取得文件锁时（其他 worker 正在预处理）只启动接管协程，取得锁后再启动。
+
+        Raises:
+            ValidationException: 事件来源配置无效或未开启解析缓存
+        """
+        if self._tasks:
+            return
+        source = settings.PREPROCESS_SOURCE
+        if source == SOURCE_MINIO and not settings.PREPROCESS_BUCKET:
+            raise ValidationException("PREPROCESS_SOURCE=minio 时必须设置 PREPROCESS_BUCKET")
+        if source not in (SOURCE_MINIO, SOURCE_QUEUE):
+            raise ValidationException(f"不支持的预处理事件来源: {source}")
+        if not settings.PARSE_CACHE_ENABLED:
+            # 解析结果无处保存，预处理只会额外下载与解析一次
+            raise ValidationException("事件驱动预处理需要开启 PARSE_CACHE_ENABLED")
+        if settings.CACHE_BACKEND.lower() == "memory":
+            logger.warning("CACHE_BACKEND=memory 时只有执行预处理的 worker 的缓存被预热，多 worker 部署请使用 file")
+        if settings.PREPROCESS_SCHEMAS and not settings.RESULT_CACHE_ENABLED:
+            logger.warning("未开启 RESULT_CACHE_ENABLED，预处理只预热解析缓存，不按 PREPROCESS_SCHEMAS 预提取")
+
+        # 每次启动使用新的停止标志：上一次的订阅线程可能仍阻塞在读取上
+        self._stopping = threading.Event()
+        if self._try_lock():
+            self._start_consumers(source)
+        else:
+            logger.info(f"其他 worker 正在执行预处理，本 worker 等待接管（{settings.PREPROCESS_LOCK_PATH}）")
+            self._tasks = [asyncio.ensure_future(self._wait_for_lock(source))]
+
+    def _start_consumers(self, source: str) -> None:
+        self._leader = True
+        self._tasks.extend(
+            asyncio.ensure_future(self._work()) for _ in range(max(1, settings.PREPROCESS_CONCURRENCY))
+        )
+        if source == SOURCE_MINIO:
+            loop = asyncio.get_running_loop()
+            threading.Thread(
+                target=self._listen, args=(loop, self._stopping), name="preprocess-listener", daemon=True
+            ).start()
+        else:
+            self._tasks.append(asyncio.ensure_future(self._poll_queue_dir()))
+        logger.info(f"事件驱动预处理已启动（来源: {source}）")
+
+    async def _wait_for_lock(self, source: str) -> None:
+        while True:
+            await asyncio.sleep(settings.PREPROCESS_POLL_INTERVAL)
+            if self._try_lock():
+                self._start_consumers(source)
+                return
+
+    def _try_lock(self) -> bool:
+        """以非阻塞方式获取 PREPROCESS_LOCK_PATH 文件锁（进程退出时由系统释放）"""
+        if fcntl is None:
+            logger.warning("当前平台不支持文件锁，每个 worker 各自执行预处理")
+            return True
+        directory = os.path.dirname(settings.PREPROCESS_LOCK_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(settings.PREPROCESS_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def _unlock(self) -> None:
+        self._leader = False
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def stop(self) -> None:
+        """停止预处理并释放文件锁（队列中未处理的对象被丢弃）"""
+        self._stopping.set()
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._unlock()
+
+    def _listen(self, loop: asyncio.AbstractEventLoop, stopping: threading.Event) -> None:
+        """在线程中订阅存储桶通知，逐条交给事件循环（连接失败时按轮询间隔重试）"""
+        while not stopping.is_set():
+            try:
+                with self.minio_service.listen_notifications(
+                    settings.PREPROCESS_BUCKET, settings.PREPROCESS_PREFIX
+                ) as events:
+                    for payload in events:
+                        # 迭代器阻塞在读取上，停止后收到下一条通知或连接断开时退出
+                        if stopping.is_set():
+                            return
+                        loop.call_soon_threadsafe(self.submit_notification, payload)
+            except Exception as e:
+                if stopping.is_set():
+                    return
+                logger.warning(f"订阅存储桶通知失败，稍后重试: {str(e)}")
+                stopping.wait(settings.PREPROCESS_POLL_INTERVAL)
+
+    async def _poll_queue_dir(self) -> None:
+        """轮询本地事件目录：按文件名顺序读取，队列满时暂停读取"""
+        directory = settings.PREPROCESS_QUEUE_DIR
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith(".json"):
+                    continue
+                if self._queue.full():
+                    break
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        payload = json.load(f)
+                    self.submit_notification(payload)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"无法读取预处理事件 {path}: {str(e)}")
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            await asyncio.sleep(settings.PREPROCESS_POLL_INTERVAL)
+
+    async def _work(self) -> None:
+        while True:
+            obj = await self._queue.get()
+            metrics.set_gauge("preprocess_backlog", self._queue.qsize())
+            await self.process(obj)
+
+    async def process(self, obj: ObjectInfo) -> bool:
+        """
+        预处理单个对象：下载、判别类型、解析文本，并按已注册 schema 预提取
+
+        失败的对象不计入去重记录，之后的通知会重新处理。
+
+        Returns:
+            是否成功
+        """
+        started = time.perf_counter()
+        try:
+            content = await self.minio_service.download_file(obj.url)
+            file_service = self.extract_service.file_service
+            # 与 /extract 的 minio 来源保持一致（文件名为空），以命中相同的缓存键
+            try:
+                detected = file_service.detect_file_type(content, "")
+            except Exception:
+                detected = None
+            if not (detected and detected.lower() in file_service.IMAGE_TYPES):
+                await self.extract_service.parse_text("minio", obj.url, content, "")
+            if settings.RESULT_CACHE_ENABLED:
+                # 结果缓存键包含对象的 ETag，被覆盖前的结果不会再被命中
+                for request in await self._extract_requests(obj):
+                    await self.extract_service.extract_json(request)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e.message if isinstance(e, AppException) else str(e)
+            logger.warning(f"预处理失败 {obj.url}: {error}")
+            if self._seen.get((obj.bucket, obj.key)) == obj.etag:
+                self._seen.pop((obj.bucket, obj.key))
+            metrics.inc("preprocess_objects_total", status="failed")
+            return False
+        metrics.inc("preprocess_objects_total", status="succeeded")
+        metrics.observe("preprocess_seconds", time.perf_counter() - started)
+        return True
+
+    async def _extract_requests(self, obj: ObjectInfo) -> List[ExtractRequest]:
+        """PREPROCESS_SCHEMAS 中每个 schema 对应的提取请求（与客户端以 schema_id 请求时相同）"""
+        return [
+            ExtractRequest(
+                source="minio",
+                file=obj.url,
+                schema=await self._resolve_schema(reference),
+                provider=settings.PREPROCESS_PROVIDER,
+                model=settings.PREPROCESS_MODEL or None,
+                filename="",
+            )
+            for reference in settings.PREPROCESS_SCHEMAS
+        ]
+
+    async def _resolve_schema(self, reference: str) -> List[SchemaField]:
+        """解析 "schema_id" 或 "schema_id:version"（未指定版本时取最新版本）"""
+        schema_id, _, version = reference.partition(":")
+        return (await self.schema_registry.get_async(schema_id, int(version) if version else None)).compiled.fields
@@ -0,0 +1,251 @@
+"""
+Schema 注册中心
+
+以 SQLite 持久化 schema 定义并分配带版本的 schema_id，注册时即完成编译
+（Prompt 片段、字段查找表），已编译结果保存在内存热集中供 /extract 直接复用。
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from app.core import settings, SchemaNotFoundException, ValidationException
+from app.models import SchemaField
+from app.utils.compiled_schema import CompiledSchema, compile_fields, parse_schema_text
+from app.utils.lru_cache import LRUCache
+from .sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# 并发注册冲突时的最多尝试次数
+_REGISTER_ATTEMPTS = 5
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS schemas (
+    schema_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    name TEXT,
+    definition TEXT NOT NULL,
+    canonical_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (schema_id, version)
+)
+"""
+
+
+class RegisteredSchema:
+    """已注册的 schema"""
+
+    __slots__ = ("schema_id", "version", "name", "compiled", "created_at")
+
+    def __init__(
+        self,
+        schema_id: str,
+        version: int,
+        name: Optional[str],
+        compiled: CompiledSchema,
+        created_at: float,
+    ):
+        self.schema_id = schema_id
+        self.version = version
+        self.name = name
+        self.compiled = compiled
+        self.created_at = created_at
+
+
+class SchemaRegistry(SQLiteStore):
+    """Schema 注册中心（SQLite 存储 + 内存热集）"""
+
+    def __init__(self, db_path: Optional[str] = None, hot_size: Optional[int] = None):
+        """
+        初始化注册中心
+
+        Args:
+            db_path: SQLite 文件路径，默认使用 SCHEMA_REGISTRY_PATH
+            hot_size: 内存热集容量，默认使用 SCHEMA_CACHE_SIZE
+        """
+        super().__init__(db_path or settings.SCHEMA_REGISTRY_PATH, (_CREATE_TABLE,))
+        self._hot: LRUCache[RegisteredSchema] = LRUCache(hot_size or settings.SCHEMA_CACHE_SIZE)
+        # schema_id -> (过期时间, 最新版本号)
+        self._latest: LRUCache[Tuple[float, int]] = LRUCache(hot_size or settings.SCHEMA_CACHE_SIZE)
+
+    def register(
+        self,
+        fields: List[SchemaField],
+        schema_id: Optional[str] = None,
+        name: Optional[str] = None,
+    ) -> RegisteredSchema:
+        """
+        注册 schema；内容与最新版本相同时直接返回已有版本
+
+        Args:
+            fields: 字段定义列表
+            schema_id: 指定的 schema ID（为空时根据内容哈希生成）
+            name: 可读名称
+
+        Returns:
+            已注册的 schema
+        """
+        if not fields:
+            raise ValidationException("schema 不能为空")
+
+        compiled = compile_fields(fields)
+        schema_id = schema_id or f"sch_{compiled.canonical_hash[:16]}"
+        definition = json.dumps(
+            [f.model_dump(exclude_none=True) for f in compiled.fields],
+            ensure_ascii=False,
+        )
+
+        # 多个 worker 并发注册时可能读到相同的最新版本，插入冲突后重新读取
+        for attempt in range(_REGISTER_ATTEMPTS):
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(
+                        "SELECT version, canonical_hash, name, created_at FROM schemas "
+                        "WHERE schema_id = ? ORDER BY version DESC LIMIT 1",
+                        (schema_id,),
+                    ).fetchone()
+                    if row and row[1] == compiled.canonical_hash:
+                        registered = RegisteredSchema(schema_id, row[0], row[2], compiled, row[3])
+                        self._remember(registered)
+                        return registered
+
+                    version = (row[0] + 1) if row else 1
+                    created_at = time.time()
+                    conn.execute(
+                        "INSERT INTO schemas (schema_id, version, name, definition, canonical_hash, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (schema_id, version, name, definition, compiled.canonical_hash, created_at),
+                    )
+                break
+            except sqlite3.IntegrityError:
+                if attempt == _REGISTER_ATTEMPTS - 1:
+                    raise ValidationException(f"schema 注册冲突，请重试: {schema_id}")
+                logger.info(f"schema {schema_id} v{version} 已被并发注册，重新读取最新版本")
+            finally:
+                conn.close()
+
+        registered = RegisteredSchema(schema_id, version, name, compiled, created_at)
+        self._remember(registered)
+        logger.info(f"已注册 schema: {schema_id} v{version}（{len(compiled)} 个字段）")
+        return registered
+
+    def _remember(self, registered: RegisteredSchema) -> None:
+        """写入热集并刷新最新版本缓存"""
+        self._hot.put((registered.schema_id, registered.version), registered)
+        cached = self._latest.get(registered.schema_id)
+        if cached is None or cached[1] <= registered.version:
+            self._latest.put(
+                registered.schema_id,
+                (time.monotonic() + settings.SCHEMA_LATEST_TTL, registered.version),
+            )
+
+    def register_text(
+        self,
+        raw: str,
+        schema_id: Optional[str] = None,
+        name: Optional[str] = None,
+    ) -> RegisteredSchema:
+        """
+        注册 JSON 或 TOON 格式的 schema 文本
+
+        Raises:
+            ValidationException: schema 无法解析
+        """
+        try:
+            fields = parse_schema_text(raw)
+        except ValueError as e:
+            raise ValidationException(f"Schema 格式无效: {str(e)}")
+        return self.register(fields, schema_id=schema_id, name=name)
+
+    def _cached_latest(self, schema_id: str) -> Optional[int]:
+        cached = self._latest.get(schema_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+
+    def _latest_version(self, schema_id: str) -> Optional[int]:
+        """最新版本号（按 SCHEMA_LATEST_TTL 缓存）"""
+        version = self._cached_latest(schema_id)
+        if version is not None:
+            return version
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT MAX(version) FROM schemas WHERE schema_id = ?",
+                (schema_id,),
+            ).fetchone()
+        finally:
+            conn.close()
+        version = row[0] if row else None
+        if version is not None:
+            self._latest.put(schema_id, (time.monotonic() + settings.SCHEMA_LATEST_TTL, version))
+        return version
+
+    def get(self, schema_id: str, version: Optional[int] = None) -> RegisteredSchema:
+        """
+        获取已注册的 schema（优先命中内存热集）
+
+        Args:
+            schema_id: schema ID
+            version: 版本号，为空时取最新版本
+
+        Returns:
+            已注册的 schema
+
+        Raises:
+            SchemaNotFoundException: schema 不存在
+        """
+        if version is None:
+            version = self._latest_version(schema_id)
+            if version is None:
+                raise SchemaNotFoundException(f"schema 不存在: {schema_id}")
+
+        registered = self._hot.get((schema_id, version))
+        if registered is not None:
+            return registered
+
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT name, definition, created_at FROM schemas WHERE schema_id = ? AND version = ?",
+                (schema_id, version),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise SchemaNotFoundException(f"schema 不存在: {schema_id} v{version}")
+
+        fields = [SchemaField(**item) for item in json.loads(row[1])]
+        registered = RegisteredSchema(schema_id, version, row[0], compile_fields(fields), row[2])
+        self._hot.put((schema_id, version), registered)
+        return registered
+
+    async def get_async(self, schema_id: str, version: Optional[int] = None) -> RegisteredSchema:
+        """
+        在异步处理中获取 schema：命中内存时直接返回，否则在线程中读取 SQLite
+
+        Raises:
+            SchemaNotFoundException: schema 不存在
+        """
+        cached_version = version if version is not None else self._cached_latest(schema_id)
+        if cached_version is not None:
+            registered = self._hot.get((schema_id, cached_version))
+            if registered is not None:
+                return registered
+        return await asyncio.to_thread(self.get, schema_id, version)
+
+    def list_versions(self, schema_id: str) -> List[Tuple[int, float]]:
+        """列出 schema 的所有版本（版本号, 创建时间）"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT version, created_at FROM schemas WHERE schema_id = ? ORDER BY version",
+                (schema_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [(row[0], row[1]) for row in rows]
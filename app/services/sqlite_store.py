@@ -0,0 +1,129 @@
+"""
+SQLite 存储与租约的公共实现
+
+- SQLiteStore：每次操作使用独立连接（避免跨线程/跨进程共享），首次连接时建表；
+  带 lease_owner / lease_until 列的表可通过租约保证同一记录只由一个 worker 推进；
+- BackgroundRunner：按 ID 在后台执行、同一 ID 只启动一次的任务，以及租约持有者标识。
+"""
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Sequence
+
+
+class SQLiteStore:
+    """
+    SQLite 存储基类
+
+    Args:
+        db_path: SQLite 文件路径
+        create_statements: 首次连接时执行的建表语句
+    """
+
+    def __init__(self, db_path: str, create_statements: Sequence[str]):
+        self.db_path = db_path
+        self._create_statements = tuple(create_statements)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用独立连接，避免跨线程/跨进程共享"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    directory = os.path.dirname(self.db_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with sqlite3.connect(self.db_path) as conn:
+                        for statement in self._create_statements:
+                            conn.execute(statement)
+                    self._initialized = True
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _acquire_lease(
+        self,
+        table: str,
+        key_column: str,
+        key: str,
+        owner: str,
+        seconds: float,
+        condition: str = "",
+        params: Sequence[Any] = (),
+    ) -> bool:
+        """
+        获取或续期一条记录的租约（未持有、已由 owner 持有或已过期时成功）
+
+        Args:
+            table: 表名
+            key_column: 主键列
+            key: 主键值
+            owner: 持有者标识
+            seconds: 租约时长
+            condition: 额外的 WHERE 条件（如只对执行中的记录加锁）
+            params: 额外条件的参数
+
+        Returns:
+            是否持有租约
+        """
+        now = time.time()
+        extra = f" AND {condition}" if condition else ""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    f"UPDATE {table} SET lease_owner = ?, lease_until = ? WHERE {key_column} = ?{extra} "
+                    "AND (lease_owner IS NULL OR lease_owner = ? OR lease_until < ?)",
+                    (owner, now + seconds, key, *params, owner, now),
+                )
+        finally:
+            conn.close()
+        return cursor.rowcount == 1
+
+    def _release_lease(self, table: str, key_column: str, key: str, owner: str) -> None:
+        """释放 owner 持有的租约"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"UPDATE {table} SET lease_owner = NULL, lease_until = NULL "
+                    f"WHERE {key_column} = ? AND lease_owner = ?",
+                    (key, owner),
+                )
+        finally:
+            conn.close()
+
+
+class BackgroundRunner:
+    """在后台执行 run(key) 的服务基类（同一 key 只启动一次）"""
+
+    def __init__(self):
+        # 租约持有者标识（主机 + 进程 + 实例）
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[str, "asyncio.Task[Any]"] = {}
+
+    async def run(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def start(self, key: str) -> "asyncio.Task[Any]":
+        """在后台执行（同一 key 只启动一次）"""
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self.run(key))
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return task
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    async def stop(self) -> None:
+        """取消后台任务"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
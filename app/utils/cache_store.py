@@ -0,0 +1,162 @@
+"""
+带有效期的缓存存储（进程内或同一主机的 worker 共享）
+
+- memory：进程内 LRU，每个 worker 各有一份；
+- file：每个键一个 JSON 文件（先写临时文件再原子替换），同一主机的 worker 共享，
+  目录放在 /dev/shm 等内存文件系统上时读写开销很小。超过容量时按最近访问时间淘汰。
+
+文件读写放到线程中执行，不阻塞事件循环。
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from app.core import settings
+from app.utils.lru_cache import LRUCache
+
+V = TypeVar("V")
+
+
+class CacheStore(Generic[V]):
+    """缓存存储接口"""
+
+    async def get(self, key: str) -> Optional[V]:
+        """读取未过期的值（不存在或已过期时为 None）"""
+        raise NotImplementedError
+
+    async def put(self, key: str, value: V, ttl: float) -> None:
+        """写入值，ttl 秒后过期"""
+        raise NotImplementedError
+
+
+class MemoryCacheStore(CacheStore[V]):
+    """进程内缓存"""
+
+    def __init__(self, maxsize: int):
+        self._data: LRUCache[Any] = LRUCache(maxsize)
+
+    async def get(self, key: str) -> Optional[V]:
+        cached = self._data.get(key)
+        if cached is None:
+            return None
+        expires_at, value = cached
+        if expires_at <= time.time():
+            self._data.pop(key)
+            return None
+        return value
+
+    async def put(self, key: str, value: V, ttl: float) -> None:
+        self._data.put(key, (time.time() + ttl, value))
+
+
+class FileCacheStore(CacheStore[V]):
+    """
+    文件缓存，同一主机的所有 worker 共享
+
+    Args:
+        directory: 缓存目录
+        maxsize: 最多保留的条目数
+        serialize: 值 -> JSON 可序列化对象
+        deserialize: JSON 对象 -> 值
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        maxsize: int,
+        serialize: Callable[[V], Any],
+        deserialize: Callable[[Any], V],
+    ):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.serialize = serialize
+        self.deserialize = deserialize
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # 键是十六进制摘要，可直接作为文件名
+        return os.path.join(self.directory, f"{key}.json")
+
+    async def get(self, key: str) -> Optional[V]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, value: V, ttl: float) -> None:
+        await asyncio.to_thread(self._put, key, self.serialize(value), ttl)
+
+    def _get(self, key: str) -> Optional[V]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("expires_at", 0) <= time.time():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        try:
+            # 更新访问时间，淘汰时按最近访问排序
+            os.utime(path)
+        except OSError:
+            pass
+        return self.deserialize(payload.get("value"))
+
+    def _put(self, key: str, value: Any, ttl: float) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": time.time() + ttl, "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        """超过容量时删除最久未访问的条目"""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        except OSError:
+            return
+        if len(names) <= self.maxsize:
+            return
+        entries = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        entries.sort()
+        for _, path in entries[:len(entries) - self.maxsize]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def create_cache_store(
+    backend: str,
+    name: str,
+    maxsize: int,
+    serialize: Callable[[V], Any],
+    deserialize: Callable[[Any], V],
+) -> CacheStore[V]:
+    """
+    按配置创建缓存存储
+
+    Args:
+        backend: memory|file
+        name: 缓存名称（file 后端在 CACHE_DIR 下的子目录）
+        maxsize: 最多保留的条目数
+        serialize: 值 -> JSON 可序列化对象（file 后端）
+        deserialize: JSON 对象 -> 值（file 后端）
+    """
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryCacheStore(maxsize)
+    if backend == "file":
+        return FileCacheStore(os.path.join(settings.CACHE_DIR, name), maxsize, serialize, deserialize)
+    raise ValueError(f"不支持的缓存存储: {backend}")
@@ -0,0 +1,273 @@
+"""
+列式导出
+
+将批量提取结果导出为每份文档一行、每个 schema 字段一列的表格，供分析管道直接读取：
+
+- arrow：Arrow IPC 流（application/vnd.apache.arrow.stream）；
+- parquet：Parquet 文件，每 EXPORT_BATCH_ROWS 行一个 row group；
+- toon：TOON 表格 `results[N]{_id,_status,_error,字段...}:`。
+
+列类型由 SchemaField.type 决定：text -> string，int -> int64，float -> float64，
+boolean -> bool，date -> date32，datetime -> timestamp[us]（带时区的值换算为 UTC），
+json -> string（JSON 文本）。与列类型不符的值（如未通过校验而保留原始文本的值）导出为 null。
+前三列 _id / _status / _error 为文档 ID、状态与失败原因。
+
+导出按批进行：每次只读取并编码 EXPORT_BATCH_ROWS 行，编码结果以字节块产出，
+百万行的回填结果也无需整体载入内存。Arrow / Parquet 需要安装 pyarrow。
+"""
+import json
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core import ValidationException
+from app.models import ExtractedValue, SchemaField
+from app.utils.converters import ConversionError, to_bool, to_date, to_datetime, to_float, to_int, to_text
+from app.utils.toon_utils import encode_scalar
+
+# 格式 -> （Content-Type, 文件扩展名）
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrows"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "toon": ("text/plain; charset=utf-8", ".toon"),
+}
+
+META_COLUMNS = ("_id", "_status", "_error")
+
+# 一行导出数据：（文档 ID, 状态, 失败原因, 提取值）
+ExportRow = Tuple[str, str, Optional[str], Optional[Sequence[ExtractedValue]]]
+
+
+def _json_text(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+# 字段类型 -> 单元格转换（结果为 JSON 兼容的值，date / datetime 为 ISO 文本）
+_CELL_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "text": to_text,
+    "int": to_int,
+    "float": to_float,
+    "boolean": to_bool,
+    "date": to_date,
+    "datetime": to_datetime,
+    "json": _json_text,
+}
+
+
+def _cell(converter: Callable[[Any], Any], value: Any) -> Any:
+    if value is None:
+        return None
+    try:
+        return converter(value)
+    except (ConversionError, TypeError, ValueError):
+        return None
+
+
+def column_names(fields: Sequence[SchemaField]) -> List[str]:
+    """导出表格的列名"""
+    names = [*META_COLUMNS, *(f.field for f in fields)]
+    if len(set(names)) != len(names):
+        raise ValidationException(f"导出列名重复（字段名不能与 {', '.join(META_COLUMNS)} 相同或彼此重复）")
+    return names
+
+
+def iter_records(fields: Sequence[SchemaField], rows: Iterable[ExportRow]) -> Iterator[List[Any]]:
+    """逐行转换为按列顺序排列的单元格"""
+    plan = [(f.field, _CELL_CONVERTERS.get(f.type, to_text)) for f in fields]
+    for document_id, status, error, values in rows:
+        by_field = {v.field: v.value for v in values} if values else {}
+        yield [
+            document_id,
+            status,
+            error,
+            *(_cell(converter, by_field.get(name)) for name, converter in plan),
+        ]
+
+
+def _batches(records: Iterator[List[Any]], size: int) -> Iterator[List[List[Any]]]:
+    batch: List[List[Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------------------------------------------------------------------
+# TOON
+# ---------------------------------------------------------------------------
+
+def iter_toon(
+    fields: Sequence[SchemaField],
+    rows: Iterable[ExportRow],
+    total: int,
+    batch_rows: int = 10000,
+) -> Iterator[bytes]:
+    """
+    编码为 TOON 表格
+
+    Args:
+        fields: 字段定义列表
+        rows: 导出行
+        total: 行数（TOON 表格头需要预先声明）
+        batch_rows: 每个字节块包含的行数
+    """
+    header = ",".join(encode_scalar(name) for name in column_names(fields))
+    yield f"results[{total}]{{{header}}}:\n".encode("utf-8")
+    for batch in _batches(iter_records(fields, rows), batch_rows):
+        yield "".join(
+            "  " + ",".join(encode_scalar(cell) for cell in record) + "\n" for record in batch
+        ).encode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Arrow / Parquet
+# ---------------------------------------------------------------------------
+
+def _pyarrow():
+    try:
+        import pyarrow  # type: ignore
+    except ImportError as e:
+        raise ValidationException("pyarrow 未安装，无法导出 Arrow / Parquet。请安装依赖 pyarrow。") from e
+    return pyarrow
+
+
+def _utc_naive(text: str) -> datetime:
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def arrow_schema(fields: Sequence[SchemaField]):
+    """由字段类型推导 Arrow schema"""
+    pa = _pyarrow()
+    types = {
+        "text": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "boolean": pa.bool_(),
+        "date": pa.date32(),
+        "datetime": pa.timestamp("us"),
+        "json": pa.string(),
+    }
+    column_names(fields)
+    return pa.schema(
+        [pa.field(name, pa.string()) for name in META_COLUMNS]
+        + [pa.field(f.field, types.get(f.type, pa.string())) for f in fields]
+    )
+
+
+# Arrow 列需要的 Python 类型（其余列直接使用单元格的值）
+_ARROW_CASTS: Dict[str, Callable[[str], Any]] = {
+    "date": date.fromisoformat,
+    "datetime": _utc_naive,
+}
+
+
+def _record_batch(pa, schema, casts: List[Optional[Callable[[str], Any]]], batch: List[List[Any]]):
+    columns = []
+    for index, cast in enumerate(casts):
+        cells = [record[index] for record in batch]
+        if cast is not None:
+            cells = [None if cell is None else cast(cell) for cell in cells]
+        columns.append(pa.array(cells, type=schema.field(index).type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+class _ChunkSink:
+    """收集写入内容的文件对象，每写完一批后取出已编码的字节"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_arrow(
+    fields: Sequence[SchemaField],
+    rows: Iterable[ExportRow],
+    file_format: str = "arrow",
+    batch_rows: int = 10000,
+) -> Iterator[bytes]:
+    """
+    编码为 Arrow IPC 流或 Parquet 文件
+
+    Args:
+        fields: 字段定义列表
+        rows: 导出行
+        file_format: arrow | parquet
+        batch_rows: 每个 record batch / row group 的行数
+    """
+    pa = _pyarrow()
+    schema = arrow_schema(fields)
+    casts = [None] * len(META_COLUMNS) + [_ARROW_CASTS.get(f.type) for f in fields]
+    sink = _ChunkSink()
+    if file_format == "parquet":
+        import pyarrow.parquet as pq  # type: ignore
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+
+    try:
+        for batch in _batches(iter_records(fields, rows), batch_rows):
+            writer.write_batch(_record_batch(pa, schema, casts, batch))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+def iter_export(
+    file_format: str,
+    fields: Sequence[SchemaField],
+    rows: Iterable[ExportRow],
+    total: int,
+    batch_rows: int = 10000,
+) -> Iterator[bytes]:
+    """
+    按格式编码导出表格
+
+    Args:
+        file_format: arrow | parquet | toon
+        fields: 字段定义列表
+        rows: 导出行
+        total: 行数
+        batch_rows: 每批行数
+
+    Raises:
+        ValidationException: 格式不支持、列名重复或未安装 pyarrow
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValidationException(f"不支持的导出格式: {file_format}，可选: {', '.join(EXPORT_FORMATS)}")
+    # 提前检查列名与依赖，使错误在开始输出之前抛出
+    column_names(fields)
+    if file_format == "toon":
+        return iter_toon(fields, rows, total, batch_rows)
+    arrow_schema(fields)
+    return iter_arrow(fields, rows, file_format, batch_rows)
@@ -0,0 +1,282 @@
+"""
+编译后的 Schema
+
+将 schema 的解析结果与各处反复使用的派生数据（规范哈希、schema TOON、
+输出示例、字段查找表、值转换函数）一次性计算并缓存，供路由、Prompt 构建与响应解析复用。
+"""
+from __future__ import annotations
+import hashlib
+import json
+from typing import Dict, List, Sequence, Tuple
+
+from app.core import settings
+from app.models import SchemaField
+from app.utils.converters import build_row_converter
+from app.utils.lru_cache import LRUCache
+from app.utils.toon_utils import (
+    decode_schema_table,
+    schema_to_toon,
+)
+
+# 各字段类型在输出示例中使用的示例值
+EXAMPLE_VALUES = {
+    "text": "示例文本值",
+    "int": "123",
+    "float": "123.45",
+    "boolean": "true",
+    "date": "2024-01-01",
+    "datetime": "2024-01-01 12:00:00",
+}
+DEFAULT_EXAMPLE_VALUE = "示例值"
+
+# 前缀缓存布局下的静态 Prompt 模板（文档内容在其后单独追加）
+STATIC_PROMPT_TEMPLATE = """请从{source}的文本内容中提取信息，并按照指定的 schema 返回 TOON 数据。
+
+【Schema定义（TOON）】
+```toon
+{schema_toon}
+```
+
+【输出格式要求（TOON）】
+请严格输出如下 TOON 表结构：
+```toon
+{output_example}
+```
+
+【特别说明】
+- 仅提取schema中定义的字段
+- 严格按照指定的字段类型进行类型转换
+- 如果字段为必填但内容中找不到相关信息，设置为null
+- 日期字段使用ISO 8601格式
+- 布尔值使用true/false
+- 数值保持数值类型
+- 仅返回 TOON 内容（如上结构），不要添加其他说明文字或代码块外文本。"""
+
+
+# 位置输出格式的静态 Prompt 模板：仅按 schema 顺序输出值，字段名与类型由服务端回填
+POSITIONAL_PROMPT_TEMPLATE = """请从{source}的文本内容中提取信息，并按照指定的 schema 返回 TOON 数据。
+
+【Schema定义（TOON）】
+```toon
+{schema_toon}
+```
+
+【输出格式要求（TOON）】
+仅输出一行，按 schema 中字段的先后顺序依次给出 {count} 个值：
+```toon
+{positional_example}
+```
+
+【特别说明】
+- 值的个数必须与 schema 字段数一致（{count} 个），顺序与 schema 完全相同
+- 不要输出字段名和类型
+- 值中包含逗号、引号或换行时用双引号包裹，并对引号转义
+- 如果内容中找不到相关信息，该位置输出null
+- 日期字段使用ISO 8601格式
+- 布尔值使用true/false
+- 数值保持数值类型
+- 仅返回 TOON 内容（如上结构），不要添加其他说明文字或代码块外文本。"""
+
+
+class CompiledSchema:
+    """schema 的编译结果（只读）"""
+
+    __slots__ = (
+        "fields",
+        "canonical_hash",
+        "schema_toon",
+        "output_example",
+        "positional_example",
+        "field_map",
+        "field_names",
+        "convert_rows",
+        "_static_prompts",
+    )
+
+    def __init__(self, fields: Sequence[SchemaField]):
+        self.fields: List[SchemaField] = list(fields)
+        self.field_map: Dict[str, SchemaField] = {f.field: f for f in self.fields}
+        self.field_names: List[str] = [f.field for f in self.fields]
+        # 按声明类型一次性选定各字段的转换函数
+        self.convert_rows = build_row_converter((f.field, f.type) for f in self.fields)
+
+        canonical = [f.model_dump(exclude_none=True) for f in self.fields]
+        self.canonical_hash: str = hashlib.sha256(
+            json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+
+        self.schema_toon: str = schema_to_toon([
+            {"name": f.name, "field": f.field, "type": f.type, "required": f.required}
+            for f in self.fields
+        ])
+
+        rows = [
+            f"  {f.field},{f.type},{EXAMPLE_VALUES.get(f.type, DEFAULT_EXAMPLE_VALUE)}"
+            for f in self.fields
+        ]
+        self.output_example: str = (
+            f"values[{len(self.fields)}]{{field,type,value}}:\n" + "\n".join(rows)
+        )
+        self.positional_example: str = f"values[{len(self.fields)}]: " + ",".join(
+            EXAMPLE_VALUES.get(f.type, DEFAULT_EXAMPLE_VALUE) for f in self.fields
+        )
+        self._static_prompts: Dict[str, str] = {}
+
+    def static_prompt(self, output_format: str = "table", document_first: bool = False) -> str:
+        """
+        与文档内容无关的 Prompt 前缀（schema + 输出格式 + 说明），
+        放在文档内容之前以便命中提供商侧的前缀缓存
+
+        Args:
+            output_format: 输出格式（table|positional）
+            document_first: 文档内容在前（字段分组提取时各组共享文档前缀）
+        """
+        key = f"{output_format}:{document_first}"
+        prompt = self._static_prompts.get(key)
+        if prompt is None:
+            source = "上面给出" if document_first else "随后给出"
+            if output_format == "positional":
+                prompt = POSITIONAL_PROMPT_TEMPLATE.format(
+                    source=source,
+                    schema_toon=self.schema_toon,
+                    positional_example=self.positional_example,
+                    count=len(self.fields),
+                )
+            else:
+                prompt = STATIC_PROMPT_TEMPLATE.format(
+                    source=source,
+                    schema_toon=self.schema_toon,
+                    output_example=self.output_example,
+                )
+            self._static_prompts[key] = prompt
+        return prompt
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def __repr__(self) -> str:
+        return f"CompiledSchema(fields={len(self.fields)}, hash={self.canonical_hash[:12]})"
+
+
+_raw_cache: LRUCache[CompiledSchema] = LRUCache(settings.SCHEMA_CACHE_SIZE)
+_fields_cache: LRUCache[CompiledSchema] = LRUCache(settings.SCHEMA_CACHE_SIZE)
+
+
+def _fields_key(fields: Sequence[SchemaField]) -> Tuple:
+    """字段列表的缓存键（仅读取属性，不做序列化）"""
+    return tuple(
+        (f.name, f.field, f.description, f.type, f.required, f.group, f.pattern, f.matcher)
+        for f in fields
+    )
+
+
+def parse_schema_text(raw: str) -> List[SchemaField]:
+    """
+    解析 schema 文本（优先 JSON 数组，其次 TOON 表格）
+
+    Args:
+        raw: schema 文本
+
+    Returns:
+        字段定义列表
+
+    Raises:
+        ValueError: 两种格式均无法解析
+    """
+    try:
+        schema_list = json.loads(raw)
+        if not isinstance(schema_list, list):
+            raise ValueError("schema 必须是数组")
+        return [SchemaField(**item) for item in schema_list]
+    except Exception as json_err:
+        try:
+            schema_dicts = decode_schema_table(raw)
+            if not schema_dicts:
+                raise ValueError("无法从 TOON 中解析到字段定义列表")
+            return [SchemaField(**item) for item in schema_dicts]
+        except Exception as toon_err:
+            raise ValueError(f"JSON: {json_err}; TOON: {toon_err}") from toon_err
+
+
+def compile_schema(raw: str) -> CompiledSchema:
+    """
+    编译 schema 文本，按原始文本的哈希缓存
+
+    Args:
+        raw: JSON 或 TOON 格式的 schema 文本
+
+    Returns:
+        编译后的 schema
+
+    Raises:
+        ValueError: schema 无法解析
+    """
+    key = hashlib.sha256(raw.encode("utf-8")).digest()
+    compiled = _raw_cache.get(key)
+    if compiled is not None:
+        return compiled
+
+    compiled = compile_fields(parse_schema_text(raw))
+    _raw_cache.put(key, compiled)
+    return compiled
+
+
+def compile_fields(fields: Sequence[SchemaField]) -> CompiledSchema:
+    """
+    编译字段列表，相同字段定义复用同一编译结果
+
+    Args:
+        fields: 字段定义列表
+
+    Returns:
+        编译后的 schema
+    """
+    if isinstance(fields, CompiledSchema):
+        return fields
+
+    key = _fields_key(fields)
+    compiled = _fields_cache.get(key)
+    if compiled is None:
+        compiled = CompiledSchema(fields)
+        _fields_cache.put(key, compiled)
+    return compiled
+
+
+def partition_fields(fields: Sequence[SchemaField], group_size: int = 0) -> List[Tuple[str, List[SchemaField]]]:
+    """
+    将宽 schema 划分为字段组
+
+    带 group 标签的字段按标签分组（按首次出现的顺序）；其余字段在 group_size > 0 且
+    数量超过 group_size 时按大小均分，否则合为一组。
+
+    Args:
+        fields: 字段定义列表
+        group_size: 每组最多字段数，0 表示不按大小划分
+
+    Returns:
+        （组名, 字段列表）；无需划分时只有一组
+    """
+    tagged: Dict[str, List[SchemaField]] = {}
+    untagged: List[SchemaField] = []
+    for f in fields:
+        if f.group:
+            tagged.setdefault(f.group, []).append(f)
+        else:
+            untagged.append(f)
+
+    groups: List[Tuple[str, List[SchemaField]]] = list(tagged.items())
+    if untagged:
+        count = -(-len(untagged) // group_size) if group_size > 0 else 1
+        # 均分：前 extra 组各多一个字段
+        size, extra = divmod(len(untagged), count)
+        start = 0
+        for index in range(count):
+            end = start + size + (1 if index < extra else 0)
+            groups.append((f"#{index + 1}" if count > 1 or tagged else "", untagged[start:end]))
+            start = end
+    return groups
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """编译缓存统计"""
+    return {"raw": _raw_cache.stats(), "fields": _fields_cache.stats()}
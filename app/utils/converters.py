@@ -0,0 +1,268 @@
+"""
+字段值转换与校验
+
+按 schema 声明的字段类型（而不是模型回显的类型）将解码出的原始值规范化：
+- int / float：支持千分位、全角数字与正负号，int 不接受非整数；
+- boolean：true/false、yes/no、1/0、是/否 等；
+- date / datetime：ISO 8601、斜杠与点分隔、8 位紧凑格式及中文日期（含汉字数字），
+  统一输出 YYYY-MM-DD / YYYY-MM-DD HH:MM:SS；
+- json：字符串按 JSON 解析；
+- text：对象与数组序列化为 JSON，其余转为字符串。
+
+无法转换的值保留原始文本并标记为未通过校验，由调用方针对性地重新提取。
+转换函数按字段类型在编译 schema 时一次性选定（见 CompiledSchema.convert_rows）。
+"""
+import json
+import re
+import unicodedata
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.models import ExtractedValue
+
+
+class ConversionError(ValueError):
+    """值与字段类型不符"""
+
+
+class ConvertedValues:
+    """一次转换的结果：按输入顺序的提取值与未通过校验的字段（其值为原始文本）"""
+
+    __slots__ = ("values", "invalid")
+
+    def __init__(self, values: List[ExtractedValue], invalid: List[str]):
+        self.values = values
+        self.invalid = invalid
+
+
+_BOOLEANS = {
+    **{text: True for text in ("true", "yes", "y", "1", "是", "对", "有", "真")},
+    **{text: False for text in ("false", "no", "n", "0", "否", "错", "无", "假")},
+}
+
+_NUMBER_RE = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+_CN_DIGITS = {"〇": 0, "零": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+_DATE_RE = re.compile(
+    r"(?P<year>\d{4}|[〇零一二三四五六七八九]{4})\s*(?:年|[-/.])\s*"
+    r"(?P<month>\d{1,2}|[一二三四五六七八九十]{1,2})\s*(?:月|[-/.])\s*"
+    r"(?P<day>\d{1,2}|[一二三四五六七八九十]{1,3})\s*[日号]?"
+    r"|(?P<compact>\d{8})"
+)
+_TIME_RE = re.compile(
+    r"[T\s]*(?P<hour>\d{1,2})\s*[:时點点]\s*(?P<minute>\d{1,2})"
+    r"(?:\s*[:分]\s*(?P<second>\d{1,2})(?:\.\d+)?\s*秒?)?\s*分?"
+    r"\s*(?P<tz>Z|[+-]\d{2}:?\d{2})?"
+)
+
+
+def _normalize_text(value: Any) -> str:
+    """全角字符转半角并去除首尾空白"""
+    return unicodedata.normalize("NFKC", str(value)).strip()
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        raise ConversionError(f"布尔值不是数值: {value}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = _normalize_text(value).replace(",", "").replace("_", "").replace(" ", "")
+    if not text:
+        return None
+    if not _NUMBER_RE.fullmatch(text):
+        raise ConversionError(f"不是数值: {value}")
+    return float(text)
+
+
+def to_int(value: Any) -> Optional[int]:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    number = _number(value)
+    if number is None:
+        return None
+    if not number.is_integer():
+        raise ConversionError(f"不是整数: {value}")
+    return int(number)
+
+
+def to_float(value: Any) -> Optional[float]:
+    if isinstance(value, float):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return _number(value)
+
+
+def to_bool(value: Any) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    text = _normalize_text(value).lower()
+    result = _BOOLEANS.get(text)
+    if result is not None or not text:
+        return result
+    raise ConversionError(f"不是布尔值: {value}")
+
+
+def _cn_number(text: str) -> int:
+    """阿拉伯数字或汉字数字（年份逐位，月日含"十"）"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (_CN_DIGITS[tens] if tens else 1) * 10 + (_CN_DIGITS[ones] if ones else 0)
+    return int("".join(str(_CN_DIGITS[char]) for char in text))
+
+
+def _parse_datetime(value: Any) -> Tuple[Optional[date], Optional[datetime]]:
+    """解析日期及可选的时间部分（空字符串为 None）"""
+    text = _normalize_text(value)
+    if not text:
+        return None, None
+    match = _DATE_RE.match(text)
+    if match is None:
+        raise ConversionError(f"不是日期: {value}")
+    try:
+        if match.group("compact"):
+            compact = match.group("compact")
+            parsed = date(int(compact[:4]), int(compact[4:6]), int(compact[6:]))
+        else:
+            parsed = date(
+                _cn_number(match.group("year")),
+                _cn_number(match.group("month")),
+                _cn_number(match.group("day")),
+            )
+    except (KeyError, ValueError):
+        raise ConversionError(f"无效日期: {value}")
+
+    rest = text[match.end():]
+    if not rest.strip():
+        return parsed, None
+    time_match = _TIME_RE.fullmatch(rest)
+    if time_match is None:
+        raise ConversionError(f"无法解析时间: {value}")
+    tz = time_match.group("tz")
+    tzinfo = None
+    if tz == "Z":
+        tzinfo = timezone.utc
+    elif tz:
+        sign = -1 if tz[0] == "-" else 1
+        digits = tz[1:].replace(":", "")
+        tzinfo = timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+    try:
+        moment = datetime(
+            parsed.year, parsed.month, parsed.day,
+            int(time_match.group("hour")),
+            int(time_match.group("minute")),
+            int(time_match.group("second") or 0),
+            tzinfo=tzinfo,
+        )
+    except ValueError:
+        raise ConversionError(f"无效时间: {value}")
+    return parsed, moment
+
+
+def to_date(value: Any) -> Optional[str]:
+    if isinstance(value, str) and len(value) == 10:
+        try:
+            return date.fromisoformat(value).isoformat()
+        except ValueError:
+            pass
+    parsed = _parse_datetime(value)[0]
+    return parsed.isoformat() if parsed else None
+
+
+def to_datetime(value: Any) -> Optional[str]:
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).isoformat(sep=" ")
+        except ValueError:
+            pass
+    parsed, moment = _parse_datetime(value)
+    if parsed is None:
+        return None
+    if moment is None:
+        moment = datetime(parsed.year, parsed.month, parsed.day)
+    return moment.isoformat(sep=" ")
+
+
+def to_json(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        if not value.strip():
+            return None
+        raise ConversionError(f"不是有效的 JSON: {value}")
+
+
+def to_text(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    "text": to_text,
+    "int": to_int,
+    "float": to_float,
+    "boolean": to_bool,
+    "date": to_date,
+    "datetime": to_datetime,
+    "json": to_json,
+}
+
+
+def convert_value(value: Any, field_type: str) -> Any:
+    """
+    按字段类型转换单个值（空值视为 None，非 text 类型的空字符串也视为 None）
+
+    Raises:
+        ConversionError: 值与字段类型不符
+    """
+    if value is None:
+        return None
+    return CONVERTERS.get(field_type, to_text)(value)
+
+
+def build_row_converter(
+    fields: Iterable[Tuple[str, str]],
+) -> Callable[[Iterable[Tuple[Any, Any]]], ConvertedValues]:
+    """
+    为一组字段编译转换函数
+
+    Args:
+        fields: （字段名, 字段类型）
+
+    Returns:
+        将 (字段名, 原始值) 序列一次性转换为 ConvertedValues 的函数；
+        不在 schema 中的字段被跳过
+    """
+    plan = {name: (field_type, CONVERTERS.get(field_type, to_text)) for name, field_type in fields}
+
+    def convert(pairs: Iterable[Tuple[Any, Any]]) -> ConvertedValues:
+        values: List[ExtractedValue] = []
+        invalid: List[str] = []
+        for name, value in pairs:
+            entry = plan.get(name)
+            if entry is None:
+                continue
+            field_type, converter = entry
+            if value is not None:
+                try:
+                    value = converter(value)
+                except ConversionError:
+                    invalid.append(name)
+                    value = to_text(value)
+            values.append(ExtractedValue(field=name, type=field_type, value=value))
+        return ConvertedValues(values, invalid)
+
+    return convert
@@ -0,0 +1,310 @@
+"""
+规则预提取
+
+身份证号、统一社会信用代码、电话、邮箱、日期、金额等字段用正则即可可靠识别，
+无需一次完整的 LLM 调用。调用 LLM 之前先按字段的匹配规则扫描文本：
+
+- 字段声明的 pattern（正则，取命名组 value 或第一个分组）；
+- 字段声明的 matcher（内置匹配器名称，none 表示不做预提取）；
+- 未声明时按字段类型与名称推断内置匹配器（RULES_INFER，默认关闭）。
+
+只接受高置信度命中：pattern 要求全文只有一个不同的取值；内置匹配器要求取值紧跟在
+字段名之后（同一行、间隔不超过 RULES_LABEL_WINDOW 个字符）且唯一。可独立识别的匹配器
+（带校验位的证件号、电话、邮箱）找不到紧跟的取值时，只有该字段是 schema 中唯一使用
+此匹配器的字段、且文中出现了字段名时，才接受全文唯一的取值（否则甲方电话、乙方电话
+等字段会被填成同一个值）。其余情况交给 LLM。
+"""
+import re
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core import settings, ValidationException
+from app.core.metrics import metrics
+from app.models import ExtractedValue, SchemaField
+from app.utils.converters import ConversionError, convert_value
+
+# 字段声明 matcher=none 时不做预提取
+MATCHER_NONE = "none"
+
+
+class Matcher:
+    """
+    内置匹配器
+
+    Args:
+        name: 名称
+        pattern: 候选值正则
+        normalize: 将匹配结果规范化为取值，无效时返回 None（如校验位不符）
+        types: 可推断使用该匹配器的字段类型
+        standalone: 取值不紧跟字段名时也可认定（全文唯一时填充，条件见模块说明）
+    """
+
+    __slots__ = ("name", "regex", "normalize", "types", "standalone")
+
+    def __init__(
+        self,
+        name: str,
+        pattern: str,
+        normalize: Callable[[re.Match], Optional[Any]],
+        types: Tuple[str, ...],
+        standalone: bool = False,
+    ):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.normalize = normalize
+        self.types = types
+        self.standalone = standalone
+
+    def candidates(self, line: str) -> List[Tuple[int, Any]]:
+        """行内的候选值（起始位置, 规范化后的值）"""
+        found = []
+        for match in self.regex.finditer(line):
+            value = self.normalize(match)
+            if value is not None:
+                found.append((match.start(), value))
+        return found
+
+
+MATCHERS: Dict[str, Matcher] = {}
+
+# 按字段名推断匹配器：中文关键字匹配 name，英文关键字匹配 field 的分词
+_NAME_HINTS: Tuple[Tuple[str, Tuple[str, ...], Tuple[str, ...]], ...] = (
+    ("uscc", ("统一社会信用代码", "信用代码"), ("uscc", "creditcode")),
+    ("id_card", ("身份证",), ("idcard", "idno")),
+    ("phone", ("手机", "电话", "联系方式"), ("phone", "mobile", "tel", "telephone")),
+    ("email", ("邮箱", "电子邮件"), ("email", "mail")),
+    ("amount", ("金额", "价款", "总价"), ("amount",)),
+)
+
+
+def register_matcher(matcher: Matcher) -> None:
+    """注册（或替换）内置匹配器"""
+    MATCHERS[matcher.name] = matcher
+
+
+# ---------------------------------------------------------------------------
+# 内置匹配器
+# ---------------------------------------------------------------------------
+
+_ID_CARD_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+_ID_CARD_CHECK = "10X98765432"
+
+_USCC_CHARSET = "0123456789ABCDEFGHJKLMNPQRTUWXY"
+_USCC_WEIGHTS = (1, 3, 9, 27, 19, 26, 16, 17, 20, 29, 25, 13, 8, 24, 10, 30, 28)
+
+
+def _valid_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _normalize_id_card(match: re.Match) -> Optional[str]:
+    """18 位居民身份证号：出生日期有效且校验位正确（GB 11643）"""
+    number = match.group(1).upper()
+    if _valid_date(int(number[6:10]), int(number[10:12]), int(number[12:14])) is None:
+        return None
+    total = sum(int(digit) * weight for digit, weight in zip(number[:17], _ID_CARD_WEIGHTS))
+    return number if _ID_CARD_CHECK[total % 11] == number[17] else None
+
+
+def _normalize_uscc(match: re.Match) -> Optional[str]:
+    """统一社会信用代码：校验位正确（GB 32100）"""
+    code = match.group(1).upper()
+    total = sum(_USCC_CHARSET.index(char) * weight for char, weight in zip(code[:17], _USCC_WEIGHTS))
+    return code if _USCC_CHARSET[(31 - total % 31) % 31] == code[17] else None
+
+
+def _normalize_phone(match: re.Match) -> str:
+    return match.group(1) or match.group(2)
+
+
+def _normalize_date(match: re.Match) -> Optional[str]:
+    year = int(match.group(1))
+    month, day = (match.group(2), match.group(3)) if match.group(2) else (match.group(5), match.group(6))
+    parsed = _valid_date(year, int(month), int(day))
+    return parsed.isoformat() if parsed else None
+
+
+def _normalize_amount(match: re.Match) -> Optional[float]:
+    amount = float(match.group(2).replace(",", "") + (match.group(3) or ""))
+    return amount * 10000 if match.group(4) == "万元" else amount
+
+
+register_matcher(Matcher(
+    "id_card",
+    r"(?<![0-9A-Za-z])(\d{17}[\dXx])(?![0-9A-Za-z])",
+    _normalize_id_card,
+    types=("text",),
+    standalone=True,
+))
+register_matcher(Matcher(
+    "uscc",
+    r"(?<![0-9A-Za-z])([0-9A-HJ-NP-RTUWXYa-hj-np-rtuwxy]{2}\d{6}[0-9A-HJ-NP-RTUWXYa-hj-np-rtuwxy]{10})(?![0-9A-Za-z])",
+    _normalize_uscc,
+    types=("text",),
+    standalone=True,
+))
+register_matcher(Matcher(
+    "phone",
+    r"(?<![\d-])(?:(?:\+?86[-\s]?)?(1[3-9]\d{9})|(0\d{2,3}-\d{7,8}))(?![\d-])",
+    _normalize_phone,
+    types=("text",),
+    standalone=True,
+))
+register_matcher(Matcher(
+    "email",
+    r"(?<![\w.%+-])([A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,})",
+    lambda match: match.group(1).lower(),
+    types=("text",),
+    standalone=True,
+))
+register_matcher(Matcher(
+    "date",
+    r"(?<!\d)(\d{4})(?:\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日|([-/.])(\d{1,2})\4(\d{1,2})(?!\d))",
+    _normalize_date,
+    types=("date",),
+))
+register_matcher(Matcher(
+    "amount",
+    r"(?<![\d.,])([¥￥]\s*)?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?(?![\d.,])\s*(万元|元)?",
+    _normalize_amount,
+    types=("int", "float"),
+))
+
+
+# ---------------------------------------------------------------------------
+# 预提取
+# ---------------------------------------------------------------------------
+
+def _field_tokens(field: str) -> List[str]:
+    """field 的英文分词（含相邻两词拼接，如 idCard -> id, card, idcard）"""
+    words = re.findall(r"[a-z]+", re.sub(r"([a-z])([A-Z])", r"\1 \2", field).lower())
+    return words + [a + b for a, b in zip(words, words[1:])]
+
+
+def infer_matcher(field: SchemaField) -> Optional[str]:
+    """按字段类型与名称推断内置匹配器"""
+    if field.type == "date":
+        return "date"
+    tokens = _field_tokens(field.field)
+    for name, keywords, english in _NAME_HINTS:
+        matcher = MATCHERS.get(name)
+        if matcher is None or field.type not in matcher.types:
+            continue
+        if any(k in field.name for k in keywords) or any(t in tokens for t in english):
+            return name
+    return None
+
+
+def _rule_for(field: SchemaField) -> Optional[str]:
+    """字段使用的规则：pattern、内置匹配器名称或 None"""
+    if field.pattern:
+        return "pattern"
+    if field.matcher:
+        if field.matcher == MATCHER_NONE:
+            return None
+        if field.matcher not in MATCHERS:
+            raise ValidationException(
+                f"字段 {field.field} 的匹配器不存在: {field.matcher}，可选: {', '.join(sorted(MATCHERS))}"
+            )
+        return field.matcher
+    return infer_matcher(field) if settings.RULES_INFER else None
+
+
+def _unique(values: Sequence[Any]) -> Optional[Any]:
+    """只有一个不同取值时返回该值"""
+    distinct = set(values)
+    return values[0] if len(distinct) == 1 else None
+
+
+def _match_pattern(text: str, pattern: str) -> Optional[str]:
+    values = []
+    for match in re.finditer(pattern, text, flags=re.M):
+        if "value" in match.re.groupindex:
+            value = match.group("value")
+        elif match.re.groups:
+            value = match.group(1)
+        else:
+            value = match.group(0)
+        if value:
+            values.append(value.strip())
+    return _unique(values)
+
+
+def _match_builtin(lines: Sequence[str], matcher: Matcher, label: str, standalone: bool) -> Optional[Any]:
+    labelled: List[Any] = []
+    anywhere: List[Any] = []
+    window = settings.RULES_LABEL_WINDOW
+    for line in lines:
+        candidates = matcher.candidates(line)
+        if not candidates:
+            continue
+        anywhere.extend(value for _, value in candidates)
+        start = line.find(label)
+        while start >= 0:
+            end = start + len(label)
+            for position, value in candidates:
+                # 值紧跟在字段名之后，中间没有其他数字
+                if 0 <= position - end <= window and not re.search(r"\d", line[end:position]):
+                    labelled.append(value)
+            start = line.find(label, end)
+    value = _unique(labelled)
+    if value is None and standalone and matcher.standalone and not labelled:
+        value = _unique(anywhere)
+    return value
+
+
+def _coerce(value: Any, field_type: str) -> Optional[Any]:
+    """按字段类型转换命中的值，无法转换时视为未命中"""
+    if field_type not in ("text", "int", "float", "date"):
+        # boolean / datetime / json 不做规则预提取
+        return None
+    if field_type == "text" and isinstance(value, float):
+        return f"{value:f}".rstrip("0").rstrip(".")
+    try:
+        return convert_value(value, field_type)
+    except ConversionError:
+        return None
+
+
+def prefill(text: str, fields: Sequence[SchemaField]) -> Tuple[Dict[str, ExtractedValue], List[SchemaField]]:
+    """
+    按字段规则预提取
+
+    Args:
+        text: 文档文本（各分区按行拼接）
+        fields: 字段定义列表
+
+    Returns:
+        （命中的字段 -> 提取值, 仍需 LLM 提取的字段）
+
+    Raises:
+        ValidationException: 字段声明的匹配器不存在
+    """
+    lines = text.splitlines()
+    rules = [(f, _rule_for(f)) for f in fields]
+    # 各内置匹配器被多少个字段使用（多个字段共用时不能按全文唯一认定）
+    usage: Dict[str, int] = {}
+    for _, rule in rules:
+        if rule is not None:
+            usage[rule] = usage.get(rule, 0) + 1
+
+    hits: Dict[str, ExtractedValue] = {}
+    for f, rule in rules:
+        if rule is None:
+            continue
+        if rule == "pattern":
+            value = _match_pattern(text, f.pattern)
+        else:
+            standalone = usage[rule] == 1 and f.name in text
+            value = _match_builtin(lines, MATCHERS[rule], f.name, standalone)
+        metrics.inc("rule_prefill_attempts_total", field=f.field, rule=rule)
+        if value is not None:
+            value = _coerce(value, f.type)
+        if value is None:
+            continue
+        metrics.inc("rule_prefill_hits_total", field=f.field, rule=rule)
+        hits[f.field] = ExtractedValue(field=f.field, type=f.type, value=value)
+    return hits, [f for f in fields if f.field not in hits]
@@ -3,7 +3,7 @@ TOON 工具函数
 """
 from __future__ import annotations
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from toon import decode as toon_decode  # type: ignore
 
 
@@ -105,3 +105,335 @@ def schema_to_toon(schema: List[Dict[str, Any]]) -> str:
         rows.append(f"  {name},{field},{ftype},{req_str}")
     header = f"values[{len(rows)}]{{name,field,type,required}}:"
     return header + ("\n" + "\n".join(rows) if rows else "\n")
+
+
+# ---------------------------------------------------------------------------
+# 流式表格解码
+# ---------------------------------------------------------------------------
+
+class ToonDecodeError(ValueError):
+    """TOON 表格解码失败"""
+
+
+# 表格头：可选键名 + [N] 或 [N,] / [N|] / [N\t] + {列名} + 冒号
+_TABLE_HEADER_RE = re.compile(r'^(\s*)(?:"[^"]*"|[^\s\[\]{}:"]+)?\[(\d+)([,|\t]?)\]\{([^}]*)\}:\s*$')
+# 行内数组：可选键名 + [N] 或 [N,] / [N|] / [N\t] + 冒号 + 值
+_INLINE_ARRAY_RE = re.compile(r'^\s*(?:"[^"]*"|[^\s\[\]{}:"]+)?\[(\d+)([,|\t]?)\]:[ \t]*(.*?)\s*$')
+_LEADING_ZERO_RE = re.compile(r"^0\d+$")
+_ESCAPES = {"\\": "\\", '"': '"', "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    out: List[str] = []
+    i = 0
+    n = len(value)
+    while i < n:
+        ch = value[i]
+        if ch == "\\":
+            if i + 1 >= n:
+                raise ToonDecodeError("字符串未闭合")
+            mapped = _ESCAPES.get(value[i + 1])
+            if mapped is None:
+                raise ToonDecodeError(f"非法转义序列: \\{value[i + 1]}")
+            out.append(mapped)
+            i += 2
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def parse_scalar(token: str) -> Any:
+    """
+    解析单个 TOON 原始值（语义与 python-toon 一致）：
+    带引号为字符串，true/false/null 为字面量，合法数字转为 int/float，其余为字符串
+    """
+    token = token.strip()
+    if not token:
+        return token
+    first = token[0]
+    if first == '"':
+        if len(token) < 2 or token[-1] != '"':
+            raise ToonDecodeError("字符串未闭合")
+        return _unescape(token[1:-1])
+    if token == "true":
+        return True
+    if token == "false":
+        return False
+    if token == "null":
+        return None
+    if first in "+-.0123456789":
+        if _LEADING_ZERO_RE.match(token):
+            return token
+        try:
+            if "." not in token and "e" not in token and "E" not in token:
+                return int(token)
+            return float(token)
+        except ValueError:
+            pass
+    return token
+
+
+_QUOTE_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def encode_scalar(value: Any, delimiter: str = ",") -> str:
+    """
+    将单个值编码为 TOON 原始值（parse_scalar 的逆过程）：
+    None 为 null，布尔与数值直接输出，字符串仅在会被误解析时加引号
+    """
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value) if value == value and value not in (float("inf"), float("-inf")) else "null"
+    text = str(value)
+    if (
+        text
+        and text == text.strip()
+        and delimiter not in text
+        and not any(ch in text for ch in '"\\\n\r\t:')
+        and parse_scalar(text) == text
+    ):
+        return text
+    return '"' + "".join(_QUOTE_ESCAPES.get(ch, ch) for ch in text) + '"'
+
+
+def split_row(line: str, delimiter: str) -> List[str]:
+    """按分隔符切分一行（引号内的分隔符与转义字符不切分）"""
+    if '"' not in line:
+        return line.split(delimiter)
+    tokens: List[str] = []
+    start = 0
+    in_quotes = False
+    i = 0
+    n = len(line)
+    while i < n:
+        ch = line[i]
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == "\\" and in_quotes:
+            i += 1
+        elif ch == delimiter and not in_quotes:
+            tokens.append(line[start:i])
+            start = i + 1
+        i += 1
+    if in_quotes:
+        raise ToonDecodeError("字符串未闭合")
+    tokens.append(line[start:])
+    return tokens
+
+
+def parse_table_header(line: str) -> Optional[Tuple[int, int, str, List[str]]]:
+    """
+    解析表格头行
+
+    Returns:
+        （缩进, 声明行数, 分隔符, 列名）；不是表格头时返回 None
+    """
+    match = _TABLE_HEADER_RE.match(line)
+    if not match:
+        return None
+    delimiter = match.group(3) or ","
+    fields = [str(parse_scalar(f)) for f in split_row(match.group(4), delimiter)]
+    return len(match.group(1)), int(match.group(2)), delimiter, fields
+
+
+class ToonTableDecoder:
+    """
+    TOON 表格的增量解码器
+
+    面向 LLM 输出中的 `values[N]{field,type,value}:` 表格（以及 schema 表格），
+    逐块接收文本，每凑满一行即产出一行，不依赖完整响应：
+
+        decoder = ToonTableDecoder()
+        for chunk in stream:
+            for row in decoder.feed(chunk):
+                ...
+        decoder.close()
+
+    表格头之前的内容（说明文字、```toon 围栏）会被跳过，表格行数达到声明数量后
+    的内容会被忽略。strict 模式下行数或列数与表格头不符时抛出 ToonDecodeError。
+    """
+
+    __slots__ = (
+        "strict", "fields", "declared", "rows",
+        "_delimiter", "_indent", "_buffer", "_done", "_closed",
+    )
+
+    def __init__(self, strict: bool = True):
+        self.strict = strict
+        self.fields: Optional[List[str]] = None
+        self.declared: Optional[int] = None
+        self.rows: List[Dict[str, Any]] = []
+        self._delimiter = ","
+        self._indent = 0
+        self._buffer = ""
+        self._done = False
+        self._closed = False
+
+    @property
+    def complete(self) -> bool:
+        """是否已读满声明的行数"""
+        return self.declared is not None and len(self.rows) >= self.declared
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        输入一段文本
+
+        Args:
+            chunk: 任意切分的文本片段
+
+        Returns:
+            本次新完成的行
+        """
+        if self._closed:
+            raise ToonDecodeError("解码器已关闭")
+        if self._done or not chunk:
+            return []
+        data = self._buffer + chunk
+        lines = data.split("\n")
+        self._buffer = lines.pop()
+        produced: List[Dict[str, Any]] = []
+        for line in lines:
+            row = self._consume(line)
+            if row is not None:
+                produced.append(row)
+            if self._done:
+                self._buffer = ""
+                break
+        return produced
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        结束输入，处理剩余的不完整行并校验行数
+
+        Returns:
+            本次新完成的行
+
+        Raises:
+            ToonDecodeError: 未找到表格头，或 strict 模式下行数与声明不符
+        """
+        if self._closed:
+            return []
+        produced: List[Dict[str, Any]] = []
+        if not self._done and self._buffer:
+            row = self._consume(self._buffer)
+            if row is not None:
+                produced.append(row)
+        self._buffer = ""
+        self._closed = True
+
+        if self.fields is None:
+            raise ToonDecodeError("未找到 TOON 表格头")
+        if self.strict and len(self.rows) != self.declared:
+            raise ToonDecodeError(f"表格声明 {self.declared} 行，实际 {len(self.rows)} 行")
+        return produced
+
+    def _consume(self, line: str) -> Optional[Dict[str, Any]]:
+        if line.endswith("\r"):
+            line = line[:-1]
+
+        if self.fields is None:
+            header = parse_table_header(line)
+            if header:
+                self._indent, self.declared, self._delimiter, self.fields = header
+                self._done = self.declared == 0
+            return None
+
+        content = line.strip()
+        if not content or content.startswith("```") or len(line) - len(line.lstrip()) <= self._indent:
+            # 表格结束
+            self._done = True
+            return None
+
+        if len(self.rows) >= self.declared:
+            self._done = True
+            if self.strict:
+                raise ToonDecodeError(f"表格声明 {self.declared} 行，实际多于声明")
+            return None
+
+        values = split_row(content, self._delimiter)
+        if len(values) != len(self.fields):
+            if self.strict:
+                raise ToonDecodeError(
+                    f"第 {len(self.rows) + 1} 行应有 {len(self.fields)} 列，实际 {len(values)} 列"
+                )
+            return None
+
+        row = dict(zip(self.fields, map(parse_scalar, values)))
+        self.rows.append(row)
+        if not self.strict and len(self.rows) >= self.declared:
+            self._done = True
+        return row
+
+
+def iter_table_rows(chunks: Iterable[str], strict: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    从文本片段流中逐行产出 TOON 表格行
+
+    Args:
+        chunks: 文本片段（如 LLM 的流式 token）
+        strict: 是否校验行数与列数
+    """
+    decoder = ToonTableDecoder(strict=strict)
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+def decode_table(text: str, strict: bool = True) -> List[Dict[str, Any]]:
+    """一次性解码文本中的第一个 TOON 表格"""
+    decoder = ToonTableDecoder(strict=strict)
+    decoder.feed(text)
+    decoder.close()
+    return decoder.rows
+
+
+def decode_positional(text: str) -> List[Any]:
+    """
+    解码位置格式的输出：`values[N]: v1,v2,...`
+
+    Returns:
+        按顺序排列的值
+
+    Raises:
+        ToonDecodeError: 未找到行内数组，或值的个数与声明不符
+    """
+    for line in text.splitlines():
+        match = _INLINE_ARRAY_RE.match(line)
+        if not match:
+            continue
+        declared = int(match.group(1))
+        body = match.group(3)
+        values = [parse_scalar(v) for v in split_row(body, match.group(2) or ",")] if body else []
+        if len(values) != declared:
+            raise ToonDecodeError(f"数组声明 {declared} 个值，实际 {len(values)} 个")
+        return values
+    raise ToonDecodeError("未找到 TOON 行内数组")
+
+
+def decode_values_table(text: str) -> List[Dict[str, Any]]:
+    """
+    解码 LLM 响应中的 values 表格（field/type/value）
+
+    优先使用专用表格解码器；响应不是规范表格时（如列表写法），
+    退回通用 python-toon 解码。
+    """
+    try:
+        return decode_table(text)
+    except ToonDecodeError:
+        return extract_values_list(toon_decode(extract_toon_block(text)))
+
+
+def decode_schema_table(text: str) -> List[Dict[str, Any]]:
+    """解码 TOON 格式的 schema 表格（name/field/type/required），失败时退回通用解码"""
+    try:
+        return decode_table(text)
+    except ToonDecodeError:
+        return extract_schema_list(toon_decode(extract_toon_block(text)))
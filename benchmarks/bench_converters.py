@@ -0,0 +1,139 @@
+"""
+字段值转换基准
+
+对比原有逐行转换（按模型回显的类型逐个比较字符串）与按 schema 编译的转换函数
+（CompiledSchema.convert_rows）在宽 schema 下的耗时，以及转换后类型不符的值的个数。
+分别使用规范值与模型常见的不规范写法（千分位、全角数字、中文日期等）；
+输入均为已解码的表格行，不含 TOON 解码本身。
+
+用法：
+    python benchmarks/bench_converters.py --fields 20 100 400 --repeat 200
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models import ExtractedValue, SchemaField  # noqa: E402
+from app.utils.compiled_schema import compile_fields  # noqa: E402
+
+# 按提示要求输出的规范值
+CLEAN = [
+    ("text", "张三"),
+    ("int", "1234"),
+    ("float", "1234.56"),
+    ("date", "2024-01-15"),
+    ("boolean", "true"),
+    ("datetime", "2024-01-15 08:30:00"),
+    ("json", '{"a": 1}'),
+    ("text", None),
+]
+
+# 模型常见的不规范写法
+MESSY = [
+    ("text", "张三"),
+    ("int", "1,234"),
+    ("float", "１２３４.５６"),
+    ("date", "2024年1月15日"),
+    ("boolean", "是"),
+    ("datetime", "2024-01-15T08:30:00"),
+    ("json", '{"a": 1}'),
+    ("text", None),
+]
+
+EXPECTED_TYPES = {"int": int, "float": float, "boolean": bool, "json": dict}
+
+
+def build_rows(samples, n_fields: int):
+    schema, rows = [], []
+    for i in range(n_fields):
+        ftype, value = samples[i % len(samples)]
+        schema.append(SchemaField(name=f"字段{i}", field=f"field_{i}", type=ftype))
+        rows.append({"field": f"field_{i}", "type": ftype, "value": value})
+    return schema, rows
+
+
+def mistyped(values) -> int:
+    """值的 Python 类型与字段类型不符的个数（日期未规范为 ISO 的也计入）"""
+    count = 0
+    for v in values:
+        if v.value is None:
+            continue
+        expected = EXPECTED_TYPES.get(v.type)
+        if expected is not None and not isinstance(v.value, expected):
+            count += 1
+        elif v.type == "date" and not (len(v.value) == 10 and v.value[4] == "-"):
+            count += 1
+    return count
+
+
+def legacy_convert_value(value, field_type):
+    """原 BaseLLM._convert_value"""
+    if value is None:
+        return None
+    try:
+        if field_type == "int":
+            return int(value)
+        elif field_type == "float":
+            return float(value)
+        elif field_type == "boolean":
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, str):
+                return value.lower() in ("true", "yes", "1")
+            return bool(value)
+        elif field_type in ("date", "datetime"):
+            return str(value)
+        else:
+            return str(value)
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def legacy(rows, schema):
+    schema_dict = compile_fields(schema).field_map
+    values = []
+    for item in rows:
+        field_name = item.get("field")
+        if not isinstance(field_name, str) or field_name not in schema_dict:
+            continue
+        field_type = str(item.get("type") or "text")
+        values.append(ExtractedValue(
+            field=field_name, type=field_type, value=legacy_convert_value(item.get("value"), field_type)
+        ))
+    return values
+
+
+def compiled(rows, schema):
+    return compile_fields(schema).convert_rows((row.get("field"), row.get("value")) for row in rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="字段值转换基准")
+    parser.add_argument("--fields", type=int, nargs="+", default=[20, 100, 400])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for label, samples in (("clean", CLEAN), ("messy", MESSY)):
+        for n_fields in args.fields:
+            schema, rows = build_rows(samples, n_fields)
+            old_values = legacy(rows, schema)
+            result = compiled(rows, schema)
+            assert len(result.values) == len(old_values) == n_fields and not result.invalid
+
+            old = timeit.timeit(lambda: legacy(rows, schema), number=args.repeat) / args.repeat
+            new = timeit.timeit(lambda: compiled(rows, schema), number=args.repeat) / args.repeat
+            print({
+                "values": label,
+                "fields": n_fields,
+                "legacy_us": round(old * 1e6, 1),
+                "compiled_us": round(new * 1e6, 1),
+                "legacy_mistyped": mistyped(old_values),
+                "compiled_mistyped": mistyped(result.values),
+            })
+
+
+if __name__ == "__main__":
+    main()
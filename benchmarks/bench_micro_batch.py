@@ -0,0 +1,81 @@
+"""
+微批处理基准
+
+对比逐份调用与微批处理在大量短文档（身份证、小票等）上的吞吐、调用次数与输入
+token，基于本地模拟服务。提供商侧并发通过自适应并发限制器固定为 --concurrency。
+
+用法：
+    python benchmarks/bench_micro_batch.py --docs 200 --concurrency 4 --batch-size 8
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import mock_llm_server  # noqa: E402
+from benchmarks.bench_prompt_cache import build_schema  # noqa: E402
+from benchmarks.mock_llm_server import MockServer  # noqa: E402
+
+MODEL = "gpt-4o-mini"
+
+
+async def run_mode(batched: bool, schema, docs: int, batch_size: int) -> dict:
+    from app.core import settings
+    from app.core.metrics import metrics
+    from app.llm import LLMFactory
+    from app.llm.limiter import concurrency_limiters
+
+    mock_llm_server.reset()
+    metrics.reset()
+    concurrency_limiters.reset()
+    settings.LLM_BATCH_ENABLED = batched
+    settings.LLM_BATCH_MAX_DOCS = batch_size
+    llm = LLMFactory.create("openai")
+
+    async def one(i: int) -> None:
+        document = f"姓名：张{i}，性别：男，民族：汉，出生：1990年1月{i % 28 + 1}日，住址：北京市海淀区"
+        values = await llm.extract(content=document, image=None, schema=schema, model=MODEL)
+        assert len(values) == len(schema)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(docs)])
+    elapsed = time.perf_counter() - started
+
+    labels = {"provider": llm.provider_name, "model": MODEL}
+    return {
+        "mode": "batched" if batched else "single",
+        "docs_per_s": round(docs / elapsed, 1),
+        "calls": int(metrics.get("llm_requests_total", **labels)),
+        "input_tokens": int(metrics.get("llm_input_tokens_total", **labels)),
+        "fallbacks": int(metrics.get("llm_batch_fallbacks_total", **labels)),
+    }
+
+
+async def main_async(args) -> None:
+    from app.core import settings
+
+    with MockServer(args.port) as server:
+        settings.OPENAI_API_KEY = "mock"
+        settings.OPENAI_BASE_URL = f"{server.base_url}/v1"
+        settings.LLM_LIMITER_INITIAL = settings.LLM_LIMITER_MAX = args.concurrency
+        schema = build_schema(args.fields)
+        for batched in (False, True):
+            print(await run_mode(batched, schema, args.docs, args.batch_size))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="微批处理基准")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--fields", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--port", type=int, default=9102)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+输出格式基准
+
+对比 table（逐行 field,type,value）与 positional（仅按 schema 顺序输出值）两种
+输出格式在宽 schema 上的输出 token 与延迟，基于本地模拟服务（输出 token 延迟
+远高于输入 token）。
+
+用法：
+    python benchmarks/bench_output_format.py --fields 40 80 160 --requests 10
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks import mock_llm_server  # noqa: E402
+from benchmarks.bench_prompt_cache import build_schema  # noqa: E402
+from benchmarks.mock_llm_server import MockServer  # noqa: E402
+
+MODEL = "gpt-4o-mini"
+
+
+async def run_format(output_format: str, schema, requests: int) -> dict:
+    from app.core.metrics import metrics
+    from app.llm import LLMFactory
+
+    mock_llm_server.reset()
+    metrics.reset()
+    llm = LLMFactory.create("openai")
+
+    latencies = []
+    for i in range(requests):
+        document = f"第 {i} 份文档：张三，32 岁，软件工程师，居住在北京。" * 20
+        started = time.perf_counter()
+        values = await llm.extract(
+            content=document, image=None, schema=schema, model=MODEL, output_format=output_format
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert len(values) == len(schema)
+
+    labels = {"provider": llm.provider_name, "model": MODEL}
+    return {
+        "fields": len(schema),
+        "format": output_format,
+        "mean_ms": round(statistics.mean(latencies), 1),
+        "output_tokens": int(metrics.get("llm_output_tokens_total", **labels) / requests),
+    }
+
+
+async def main_async(args) -> None:
+    from app.core import settings
+
+    with MockServer(args.port) as server:
+        settings.OPENAI_API_KEY = "mock"
+        settings.OPENAI_BASE_URL = f"{server.base_url}/v1"
+        for n_fields in args.fields:
+            schema = build_schema(n_fields)
+            for output_format in ("table", "positional"):
+                print(await run_format(output_format, schema, args.requests))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="输出格式基准")
+    parser.add_argument("--fields", type=int, nargs="+", default=[40, 80, 160])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--port", type=int, default=9101)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+预加载内存基准
+
+分别以 GUNICORN_PRELOAD=true/false 启动 gunicorn，等待所有 worker 就绪后
+统计 master 与 worker 的 PSS 总和，对比写时复制共享带来的内存节省。
+
+用法：
+    python benchmarks/bench_preload_memory.py --workers 4
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _children(pid: int) -> list:
+    children = []
+    task_dir = Path(f"/proc/{pid}/task")
+    for task in task_dir.iterdir():
+        content = (task / "children").read_text().split()
+        children.extend(int(c) for c in content)
+    return children
+
+
+def _pss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _wait_ready(port: int, workers: int, timeout: float) -> None:
+    deadline = time.time() + timeout
+    ready = 0
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=2) as resp:
+                if resp.status == 200:
+                    ready += 1
+                    if ready >= workers * 2:
+                        return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("等待 worker 就绪超时")
+
+
+def measure(preload: bool, workers: int, port: int, timeout: float) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "GUNICORN_PRELOAD": "true" if preload else "false",
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_THREADS": "1",
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+    })
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        started = time.perf_counter()
+        _wait_ready(port, workers, timeout)
+        ready_s = time.perf_counter() - started
+        worker_pids = _children(proc.pid)
+        worker_pss = [_pss_kb(pid) for pid in worker_pids]
+        master_pss = _pss_kb(proc.pid)
+        return {
+            "preload": preload,
+            "ready_s": round(ready_s, 2),
+            "workers": len(worker_pids),
+            "master_pss_mb": round(master_pss / 1024, 1),
+            "workers_pss_mb": round(sum(worker_pss) / 1024, 1),
+            "total_pss_mb": round((master_pss + sum(worker_pss)) / 1024, 1),
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="preload 内存对比基准")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    results = [
+        measure(preload, args.workers, args.port, args.timeout)
+        for preload in (False, True)
+    ]
+    for result in results:
+        print(result)
+    saved = results[0]["total_pss_mb"] - results[1]["total_pss_mb"]
+    print(f"preload 节省 PSS: {saved:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
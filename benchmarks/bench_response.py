@@ -0,0 +1,115 @@
+"""
+响应路径基准
+
+对比 /extract 成功响应的构造与序列化开销（每个响应的 CPU 时间）：
+
+- legacy：构造 ExtractResponse，经 FastAPI 响应模型校验（serialize_response）后由 JSONResponse 渲染；
+- direct：提取值直接序列化（orjson，未安装时为标准库 json）后拼接响应体；
+- direct_stdlib：同上，强制使用标准库 json；
+- cached：命中结果缓存，只拼接外层响应体。
+
+提取值由 CompiledSchema.convert_rows 生成，与线上路径一致；不含提取本身。
+
+用法：
+    python benchmarks/bench_response.py --fields 20 100 400 --repeat 500
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import Response  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.core import serialization  # noqa: E402
+from app.core.serialization import extract_response_body, values_json  # noqa: E402
+from app.models import ExtractResponse, SchemaField  # noqa: E402
+from app.utils.compiled_schema import compile_fields  # noqa: E402
+
+SAMPLES = [
+    ("text", "某某科技有限公司"),
+    ("int", "1234"),
+    ("float", "1234.56"),
+    ("date", "2024-01-15"),
+    ("boolean", "true"),
+    ("datetime", "2024-01-15 08:30:00"),
+    ("json", '{"items": [1, 2, 3], "note": "备注"}'),
+    ("text", None),
+]
+
+METADATA = {"route": {"provider": "openai", "model": "gpt-4o-mini", "reason": "cheapest"}}
+
+
+def build_values(n_fields: int):
+    schema, pairs = [], []
+    for i in range(n_fields):
+        ftype, value = SAMPLES[i % len(SAMPLES)]
+        schema.append(SchemaField(name=f"字段{i}", field=f"field_{i}", type=ftype))
+        pairs.append((f"field_{i}", value))
+    return compile_fields(schema).convert_rows(pairs).values
+
+
+async def cpu_per_response(fn, repeat: int) -> float:
+    """每个响应的 CPU 时间（微秒）"""
+    await fn()
+    started = time.process_time()
+    for _ in range(repeat):
+        await fn()
+    return (time.process_time() - started) / repeat * 1e6
+
+
+async def run(n_fields: int, repeat: int) -> dict:
+    values = build_values(n_fields)
+    field = create_model_field(name="Response_extract", type_=ExtractResponse, mode="serialization")
+    cached = values_json(values)
+
+    async def legacy():
+        response = ExtractResponse(data=values, code="200", message="Success", metadata=METADATA)
+        content = await serialize_response(field=field, response_content=response)
+        return JSONResponse(content).body
+
+    async def direct():
+        body = extract_response_body(values_json(values), METADATA)
+        return Response(content=body, media_type="application/json").body
+
+    async def cache_hit():
+        body = extract_response_body(cached, METADATA)
+        return Response(content=body, media_type="application/json").body
+
+    # 两条路径的响应内容一致
+    assert json.loads(await legacy()) == json.loads(await direct())
+
+    result = {
+        "fields": n_fields,
+        "legacy_us": await cpu_per_response(legacy, repeat),
+        "direct_us": await cpu_per_response(direct, repeat),
+        "cached_us": await cpu_per_response(cache_hit, repeat),
+    }
+    fast_backend = serialization.orjson
+    serialization.orjson = None
+    try:
+        result["direct_stdlib_us"] = await cpu_per_response(direct, repeat)
+    finally:
+        serialization.orjson = fast_backend
+    return {key: round(value, 1) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="响应路径基准")
+    parser.add_argument("--fields", type=int, nargs="+", default=[20, 100, 400])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    print({"orjson": serialization.orjson is not None})
+    for n_fields in args.fields:
+        print(asyncio.run(run(n_fields, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+TOON 响应解码基准
+
+对比原有解码路径（extract_toon_block 正则 -> python-toon decode -> extract_values_list）
+与专用表格解码器（一次性解码与按 token 流式解码）在不同行数下的耗时。
+
+用法：
+    python benchmarks/bench_toon_decode.py --rows 10 50 200 --repeat 200
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.toon_utils import (  # noqa: E402
+    decode_values_table,
+    extract_toon_block,
+    extract_values_list,
+    iter_table_rows,
+    toon_decode,
+)
+
+
+def build_response(n_rows: int) -> str:
+    samples = [
+        ("text", "张三"),
+        ("int", "32"),
+        ("float", "1234.56"),
+        ("date", "2024-01-15"),
+        ("boolean", "true"),
+        ("text", '"北京市朝阳区, 建国路 88 号"'),
+        ("text", "null"),
+    ]
+    rows = []
+    for i in range(n_rows):
+        ftype, value = samples[i % len(samples)]
+        rows.append(f"  field_{i},{ftype},{value}")
+    header = f"values[{n_rows}]{{field,type,value}}:"
+    return "以下是提取结果：\n```toon\n" + header + "\n" + "\n".join(rows) + "\n```\n"
+
+
+def legacy_decode(text: str):
+    return extract_values_list(toon_decode(extract_toon_block(text)))
+
+
+def chunked(text: str, size: int = 4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TOON 响应解码基准")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for n_rows in args.rows:
+        text = build_response(n_rows)
+        chunks = chunked(text)
+        assert legacy_decode(text) == decode_values_table(text) == list(iter_table_rows(chunks))
+
+        legacy = timeit.timeit(lambda: legacy_decode(text), number=args.repeat) / args.repeat
+        table = timeit.timeit(lambda: decode_values_table(text), number=args.repeat) / args.repeat
+        stream = timeit.timeit(lambda: list(iter_table_rows(chunks)), number=args.repeat) / args.repeat
+        print({
+            "rows": n_rows,
+            "legacy_us": round(legacy * 1e6, 1),
+            "table_us": round(table * 1e6, 1),
+            "stream_us": round(stream * 1e6, 1),
+            "speedup": round(legacy / table, 1),
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+本地模拟 LLM 服务（基准测试用）
+
+实现 OpenAI Chat Completions（/v1/chat/completions）、Files + Batches 与 Anthropic
+Messages（/v1/messages）、Message Batches 接口的最小子集，并模拟：
+- 与输入/输出 token 数成正比的延迟（输出 token 远慢于输入 token）
+- 提供商侧的前缀缓存：OpenAI 以 system 消息为前缀，Anthropic 以带
+  cache_control 的 system 块为前缀；命中缓存的输入 token 延迟大幅降低
+
+响应内容直接回显 Prompt 中最后一个 ```toon 代码块（即输出格式示例），
+保证客户端能得到结构合法的 TOON；批量提取的示例按文档份数扩展行数。
+
+用法：
+    uvicorn benchmarks.mock_llm_server:app --port 9100
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import FastAPI, Request, Response
+
+app = FastAPI(title="Mock LLM Server")
+
+# 延迟模型（毫秒）
+CONFIG = {
+    "base_latency_ms": 30.0,
+    "input_ms_per_1k_tokens": 60.0,
+    "cached_input_ms_per_1k_tokens": 6.0,
+    "output_ms_per_token": 2.0,
+    "min_cache_tokens": 1024,
+    "batch_delay_ms": 50.0,
+    "batch_error_marker": "[mock-error]",
+}
+
+_prefix_cache: Set[str] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（UTF-8 字节数 / 3）"""
+    return max(1, len(text.encode("utf-8")) // 3) if text else 0
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            block.get("text", "") for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        )
+    return ""
+
+
+def _echo_output(prompt: str) -> str:
+    blocks = re.findall(r"```toon\s*\n(.*?)\n```", prompt, flags=re.S)
+    if not blocks:
+        return "values[0]{field,type,value}:"
+    block = blocks[-1]
+    # 批量提取：按 Prompt 中的文档份数逐行输出
+    count = re.search(r"共 (\d+) 份文档", prompt)
+    if count and block.startswith("results["):
+        lines = block.split("\n")
+        header = re.sub(r"^results\[\d+\]", f"results[{count.group(1)}]", lines[0])
+        row = lines[1].split(",", 1)[1]
+        rows = [f"  {i},{row}" for i in range(1, int(count.group(1)) + 1)]
+        block = "\n".join([header] + rows)
+    return f"```toon\n{block}\n```"
+
+
+def _lookup_prefix(prefix: str) -> Tuple[int, int]:
+    """返回（命中缓存的 token 数, 新写入缓存的 token 数）"""
+    tokens = estimate_tokens(prefix)
+    if tokens < CONFIG["min_cache_tokens"]:
+        return 0, 0
+    digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+    if digest in _prefix_cache:
+        return tokens, 0
+    _prefix_cache.add(digest)
+    return 0, tokens
+
+
+async def _simulate_latency(input_tokens: int, cached_tokens: int, output_tokens: int) -> None:
+    uncached = input_tokens - cached_tokens
+    delay_ms = (
+        CONFIG["base_latency_ms"]
+        + uncached / 1000 * CONFIG["input_ms_per_1k_tokens"]
+        + cached_tokens / 1000 * CONFIG["cached_input_ms_per_1k_tokens"]
+        + output_tokens * CONFIG["output_ms_per_token"]
+    )
+    await asyncio.sleep(delay_ms / 1000)
+
+
+def _chat_completion(body: Dict[str, Any]) -> Tuple[Dict[str, Any], int, int, int]:
+    """返回（Chat Completions 响应, 输入 token, 命中缓存的 token, 输出 token）"""
+    messages: List[Dict[str, Any]] = body.get("messages", [])
+    system = "".join(_text_of(m.get("content")) for m in messages if m.get("role") == "system")
+    full_prompt = "\n".join(_text_of(m.get("content")) for m in messages)
+
+    cached_tokens, _ = _lookup_prefix(system)
+    input_tokens = estimate_tokens(full_prompt)
+    output = _echo_output(full_prompt)
+    output_tokens = estimate_tokens(output)
+
+    response = {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": output},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": input_tokens,
+            "completion_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    }
+    return response, input_tokens, cached_tokens, output_tokens
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request) -> Dict[str, Any]:
+    response, input_tokens, cached_tokens, output_tokens = _chat_completion(await request.json())
+    await _simulate_latency(input_tokens, cached_tokens, output_tokens)
+    return response
+
+
+def _message(body: Dict[str, Any]) -> Tuple[Dict[str, Any], int, int, int]:
+    """返回（Messages 响应, 输入 token, 命中缓存的 token, 输出 token）"""
+    system: Any = body.get("system") or ""
+    cache_prefix: Optional[str] = None
+    if isinstance(system, list):
+        texts = []
+        for block in system:
+            texts.append(block.get("text", ""))
+            if block.get("cache_control"):
+                cache_prefix = "\n".join(texts)
+        system_text = "\n".join(texts)
+    else:
+        system_text = system
+
+    user_text = "\n".join(_text_of(m.get("content")) for m in body.get("messages", []))
+    full_prompt = f"{system_text}\n{user_text}"
+
+    cache_read, cache_write = _lookup_prefix(cache_prefix) if cache_prefix else (0, 0)
+    total_input = estimate_tokens(full_prompt)
+    output = _echo_output(full_prompt)
+    output_tokens = estimate_tokens(output)
+
+    response = {
+        "id": f"msg_{uuid.uuid4().hex}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "mock"),
+        "content": [{"type": "text", "text": output}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": total_input - cache_read - cache_write,
+            "output_tokens": output_tokens,
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": cache_write,
+        },
+    }
+    return response, total_input, cache_read, output_tokens
+
+
+@app.post("/v1/messages")
+async def messages(request: Request) -> Dict[str, Any]:
+    response, input_tokens, cached_tokens, output_tokens = _message(await request.json())
+    await _simulate_latency(input_tokens, cached_tokens, output_tokens)
+    return response
+
+
+# ---------------------------------------------------------------------------
+# 批量接口：OpenAI Files + Batches、Anthropic Message Batches
+# 批量任务在创建 batch_delay_ms 毫秒后一次性完成；请求中包含 batch_error_marker 的
+# 返回错误结果，便于测试部分失败
+# ---------------------------------------------------------------------------
+
+_files: Dict[str, bytes] = {}
+_batches: Dict[str, Dict[str, Any]] = {}
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def _batch_ready(batch: Dict[str, Any]) -> bool:
+    return time.time() - batch["created"] >= CONFIG["batch_delay_ms"] / 1000
+
+
+def _is_error_request(body: Dict[str, Any]) -> bool:
+    return CONFIG["batch_error_marker"] in json.dumps(body, ensure_ascii=False)
+
+
+@app.post("/v1/files")
+async def upload_file(request: Request) -> Dict[str, Any]:
+    form = await request.form()
+    upload = form["file"]
+    data = await upload.read()  # type: ignore[union-attr]
+    file_id = f"file-{uuid.uuid4().hex}"
+    _files[file_id] = data
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(data),
+        "created_at": int(time.time()),
+        "filename": getattr(upload, "filename", None) or "batch.jsonl",
+        "purpose": form.get("purpose", "batch"),
+        "status": "processed",
+    }
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str) -> Response:
+    return Response(_files.get(file_id, b""), media_type="application/jsonl")
+
+
+def _openai_batch(batch: Dict[str, Any]) -> Dict[str, Any]:
+    if batch["status"] == "in_progress" and _batch_ready(batch):
+        output, errors = [], []
+        for line in _files[batch["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if _is_error_request(entry["body"]):
+                errors.append({
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": entry["custom_id"],
+                    "response": {"status_code": 400, "body": {"error": {"message": "mock error"}}},
+                    "error": None,
+                })
+                continue
+            response, _, _, _ = _chat_completion(entry["body"])
+            output.append({
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": entry["custom_id"],
+                "response": {"status_code": 200, "body": response},
+                "error": None,
+            })
+        for key, rows in (("output_file_id", output), ("error_file_id", errors)):
+            if rows:
+                file_id = f"file-{uuid.uuid4().hex}"
+                _files[file_id] = "\n".join(json.dumps(r, ensure_ascii=False) for r in rows).encode("utf-8")
+                batch[key] = file_id
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        batch["request_counts"] = {"completed": len(output), "failed": len(errors), "total": len(output) + len(errors)}
+    return {k: v for k, v in batch.items() if k != "created"}
+
+
+@app.post("/v1/batches")
+async def create_batch(request: Request) -> Dict[str, Any]:
+    body = await request.json()
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    now = time.time()
+    _batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body["endpoint"],
+        "input_file_id": body["input_file_id"],
+        "completion_window": body.get("completion_window", "24h"),
+        "status": "in_progress",
+        "created_at": int(now),
+        "metadata": body.get("metadata"),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"completed": 0, "failed": 0, "total": 0},
+        "created": now,
+    }
+    return _openai_batch(_batches[batch_id])
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str) -> Dict[str, Any]:
+    return _openai_batch(_batches[batch_id])
+
+
+def _message_batch(batch: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+    ended = _batch_ready(batch)
+    results = [] if not ended else batch["results"]
+    return {
+        "id": batch["id"],
+        "type": "message_batch",
+        "processing_status": "ended" if ended else "in_progress",
+        "request_counts": {
+            "processing": 0 if ended else len(batch["requests"]),
+            "succeeded": sum(1 for r in results if r["result"]["type"] == "succeeded"),
+            "errored": sum(1 for r in results if r["result"]["type"] == "errored"),
+            "canceled": 0,
+            "expired": 0,
+        },
+        "created_at": _iso(batch["created"]),
+        "expires_at": _iso(batch["created"] + 86400),
+        "ended_at": _iso(time.time()) if ended else None,
+        "archived_at": None,
+        "cancel_initiated_at": None,
+        "results_url": f"{base_url}v1/messages/batches/{batch['id']}/results" if ended else None,
+    }
+
+
+@app.post("/v1/messages/batches")
+async def create_message_batch(request: Request) -> Dict[str, Any]:
+    body = await request.json()
+    batch_id = f"msgbatch_{uuid.uuid4().hex}"
+    results = []
+    for entry in body["requests"]:
+        if _is_error_request(entry["params"]):
+            result: Dict[str, Any] = {
+                "type": "errored",
+                "error": {"type": "error", "error": {"type": "invalid_request_error", "message": "mock error"}},
+            }
+        else:
+            result = {"type": "succeeded", "message": _message(entry["params"])[0]}
+        results.append({"custom_id": entry["custom_id"], "result": result})
+    _batches[batch_id] = {"id": batch_id, "requests": body["requests"], "results": results, "created": time.time()}
+    return _message_batch(_batches[batch_id], str(request.base_url))
+
+
+@app.get("/v1/messages/batches/{batch_id}")
+async def retrieve_message_batch(batch_id: str, request: Request) -> Dict[str, Any]:
+    return _message_batch(_batches[batch_id], str(request.base_url))
+
+
+@app.get("/v1/messages/batches/{batch_id}/results")
+async def message_batch_results(batch_id: str) -> Response:
+    lines = [json.dumps(r, ensure_ascii=False) for r in _batches[batch_id]["results"]]
+    return Response("\n".join(lines), media_type="application/x-jsonl")
+
+
+def reset() -> None:
+    """清空模拟的前缀缓存与批量任务"""
+    _prefix_cache.clear()
+    _files.clear()
+    _batches.clear()
+
+
+class MockServer:
+    """在后台线程中运行模拟服务（上下文管理器）"""
+
+    def __init__(self, port: int = 9100):
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self._server = None
+        self._thread = None
+
+    def __enter__(self) -> "MockServer":
+        import threading
+        import uvicorn
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join()
@@ -0,0 +1,201 @@
+"""
+本地模拟 S3 / MinIO 服务（测试与基准用）
+
+实现 minio 客户端用到的最小子集：查询存储桶区域、创建/检查存储桶、
+ListObjectsV2（按 CONFIG["max_keys"] 分页，返回 continuation token）、
+GetObject / HeadObject / PutObject，以及 MinIO 的 ListenBucketNotification
+（写入对象时推送 s3:ObjectCreated:Put 事件）。不校验签名，对象保存在内存中。
+
+用法：
+    uvicorn benchmarks.mock_s3_server:app --port 9200
+
+    with MockS3Server(9200) as server:
+        put_object("docs", "a.txt", b"...")
+        client = Minio(server.endpoint, access_key="mock", secret_key="mock", secure=False)
+"""
+import asyncio
+import hashlib
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+# 关闭文档路由，避免与存储桶路径冲突
+app = FastAPI(title="Mock S3 Server", docs_url=None, redoc_url=None, openapi_url=None)
+
+CONFIG = {
+    "max_keys": 1000,  # 每页最多返回的对象数
+}
+
+_XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+# bucket -> key -> （内容, ETag, 修改时间）
+_buckets: Dict[str, Dict[str, Tuple[bytes, str, datetime]]] = {}
+# 统计：请求次数
+STATS: Dict[str, int] = {"list": 0, "get": 0, "put": 0}
+# 通知订阅：(bucket, prefix, 事件队列)
+_subscribers: List[Tuple[str, str, "queue.Queue[dict]"]] = []
+_closing = threading.Event()
+
+
+def reset() -> None:
+    _buckets.clear()
+    for key in STATS:
+        STATS[key] = 0
+
+
+def put_object(bucket: str, key: str, data: bytes, last_modified: Optional[datetime] = None) -> str:
+    """直接写入对象（不经过 HTTP），返回 ETag"""
+    etag = hashlib.md5(data).hexdigest()
+    modified = (last_modified or datetime.now(timezone.utc)).replace(microsecond=0)
+    _buckets.setdefault(bucket, {})[key] = (data, etag, modified)
+    _notify(bucket, key, len(data), etag)
+    return etag
+
+
+def subscribers() -> int:
+    """当前的通知订阅数"""
+    return len(_subscribers)
+
+
+def _notify(bucket: str, key: str, size: int, etag: str) -> None:
+    record = {
+        "eventName": "s3:ObjectCreated:Put",
+        "s3": {
+            "bucket": {"name": bucket},
+            "object": {"key": quote(key), "size": size, "eTag": etag},
+        },
+    }
+    for subscribed_bucket, prefix, events in list(_subscribers):
+        if subscribed_bucket == bucket and key.startswith(prefix):
+            events.put({"Records": [record]})
+
+
+async def _listen(bucket: str, prefix: str, request: Request) -> AsyncIterator[bytes]:
+    subscription = (bucket, prefix, queue.Queue())
+    _subscribers.append(subscription)
+    try:
+        while not _closing.is_set() and not await request.is_disconnected():
+            try:
+                event = subscription[2].get_nowait()
+            except queue.Empty:
+                await asyncio.sleep(0.02)
+                continue
+            yield (json.dumps(event) + "\n").encode("utf-8")
+    finally:
+        _subscribers.remove(subscription)
+
+
+def get_object(bucket: str, key: str) -> Optional[bytes]:
+    entry = _buckets.get(bucket, {}).get(key)
+    return entry[0] if entry else None
+
+
+def _xml(body: str, status_code: int = 200) -> Response:
+    return Response(
+        content='<?xml version="1.0" encoding="UTF-8"?>\n' + body,
+        status_code=status_code,
+        media_type="application/xml",
+    )
+
+
+def _error(code: str, message: str, status_code: int) -> Response:
+    return _xml(f"<Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>", status_code)
+
+
+def _iso(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+@app.api_route("/{bucket}", methods=["GET", "HEAD", "PUT"])
+async def bucket_endpoint(bucket: str, request: Request) -> Response:
+    params = request.query_params
+    if request.method == "PUT":
+        _buckets.setdefault(bucket, {})
+        return Response(status_code=200)
+    if "location" in params:
+        return _xml(f'<LocationConstraint xmlns="{_XMLNS}"></LocationConstraint>')
+    if "events" in params:
+        return StreamingResponse(_listen(bucket, params.get("prefix", ""), request), media_type="application/json")
+    if bucket not in _buckets:
+        return _error("NoSuchBucket", "The specified bucket does not exist", 404)
+    if request.method == "HEAD":
+        return Response(status_code=200)
+
+    STATS["list"] += 1
+    prefix = params.get("prefix", "")
+    start = params.get("continuation-token") or params.get("start-after") or ""
+    max_keys = min(int(params.get("max-keys", 1000)), CONFIG["max_keys"])
+    keys = sorted(k for k in _buckets[bucket] if k.startswith(prefix) and k > start)
+    page, truncated = keys[:max_keys], len(keys) > max_keys
+
+    contents = "".join(
+        f"<Contents><Key>{escape(key)}</Key><LastModified>{_iso(_buckets[bucket][key][2])}</LastModified>"
+        f'<ETag>"{_buckets[bucket][key][1]}"</ETag><Size>{len(_buckets[bucket][key][0])}</Size>'
+        f"<StorageClass>STANDARD</StorageClass></Contents>"
+        for key in page
+    )
+    token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+    return _xml(
+        f'<ListBucketResult xmlns="{_XMLNS}"><Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>'
+        f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>"
+        f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>{token}{contents}</ListBucketResult>"
+    )
+
+
+@app.api_route("/{bucket}/{key:path}", methods=["GET", "HEAD", "PUT"])
+async def object_endpoint(bucket: str, key: str, request: Request) -> Response:
+    if request.method == "PUT":
+        STATS["put"] += 1
+        etag = put_object(bucket, key, await request.body())
+        return Response(status_code=200, headers={"ETag": f'"{etag}"'})
+
+    entry = _buckets.get(bucket, {}).get(key)
+    if entry is None:
+        return _error("NoSuchKey", "The specified key does not exist.", 404)
+    data, etag, modified = entry
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": format_datetime(modified, usegmt=True),
+        "Content-Length": str(len(data)),
+    }
+    if request.method == "HEAD":
+        return Response(status_code=200, headers=headers)
+    STATS["get"] += 1
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
+
+
+class MockS3Server:
+    """在后台线程中运行模拟服务（上下文管理器）"""
+
+    def __init__(self, port: int = 9200):
+        self.port = port
+        self.endpoint = f"127.0.0.1:{port}"
+        self._server = None
+        self._thread = None
+
+    def __enter__(self) -> "MockS3Server":
+        import uvicorn
+
+        _closing.clear()
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        # 结束通知流，否则服务会等待其关闭
+        _closing.set()
+        self._server.should_exit = True
+        self._thread.join()
@@ -0,0 +1,32 @@
+"""
+gunicorn 配置
+
+preload_app 模式下应用在 master 中导入并预热一次，worker 通过 fork
+以写时复制方式共享已加载的模块与只读数据。
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "8"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def when_ready(server):
+    """master 启动完成、fork worker 之前执行预热"""
+    if not preload_app:
+        return
+    from app.core import settings, warmup
+
+    if settings.WARMUP_ENABLED:
+        summary = warmup.warmup()
+        server.log.info(f"master 预热完成: {summary}")
+
+
+def post_fork(server, worker):
+    """worker fork 之后记录内存基线（fork 回调已通过 os.register_at_fork 执行）"""
+    from app.core import warmup
+
+    server.log.info(f"worker {worker.pid} 已启动，内存占用: {warmup.memory_usage()}")
@@ -0,0 +1,63 @@
+"""
+测试共用的 fixture
+"""
+import asyncio
+import inspect
+
+import pytest
+
+from app.core import settings
+from app.llm.base import LLMCompletion
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """共享缓存（CACHE_BACKEND=file）写入每个测试自己的目录，避免测试之间互相命中"""
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def fake_llm():
+    """
+    以假的提供商代替模型调用，返回 make(responses=(), provider="openai", respond=None, delay=0.0)
+
+    - responses: 依次返回的响应文本或抛出的异常，用完后重复最后一个
+    - respond: 按 Prompt（PromptParts）生成响应或异常的函数（可为协程函数），优先于 responses
+    - provider: 提供商名称（指标标签、熔断与限流的键）
+    - delay: 每次调用前等待的秒数
+
+    生成的提供商记录每次调用的 PromptParts（calls）及在途与峰值调用数（in_flight / peak）。
+    """
+    from app.llm.openai_llm import OpenAILLM
+
+    def make(responses=(), provider="openai", respond=None, delay=0.0):
+        class FakeLLM(OpenAILLM):
+            provider_name = provider
+
+            def __init__(self):
+                self.calls = []
+                self.in_flight = 0
+                self.peak = 0
+
+            async def _complete(self, parts, image, model):
+                self.calls.append(parts)
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                try:
+                    if delay:
+                        await asyncio.sleep(delay)
+                    if respond is not None:
+                        response = respond(parts)
+                        if inspect.isawaitable(response):
+                            response = await response
+                    else:
+                        response = responses[min(len(self.calls), len(responses)) - 1]
+                    if isinstance(response, BaseException):
+                        raise response
+                    return LLMCompletion(response)
+                finally:
+                    self.in_flight -= 1
+
+        return FakeLLM()
+
+    return make
@@ -0,0 +1,183 @@
+"""
+微批处理测试
+"""
+import asyncio
+import re
+
+import pytest
+
+from app.core import settings, LLMException
+from app.core.metrics import metrics
+from app.core.response_metadata import collect_metadata
+from app.llm.batcher import batch_documents, split_batch_response
+from app.models import SchemaField
+
+SCHEMA = [
+    SchemaField(name="人名", field="name", type="text"),
+    SchemaField(name="年龄", field="age", type="int"),
+]
+
+SINGLE = "values[2]{field,type,value}:\n  name,text,{name}\n  age,int,{age}"
+
+
+def _respond(batch_response=None, error=None):
+    """批量调用按文档内容（"姓名:年龄"）生成结果；batch_response 可改写批量响应"""
+
+    def respond(parts):
+        if error is not None:
+            return error
+        docs = re.findall(r"【文档 (\d+)】\n(.*?)\n【文档 \1 结束】", parts.dynamic, flags=re.S)
+        if not docs:
+            name, age = re.findall(r"^(\S+):(\d+)$", parts.text, flags=re.M)[-1]
+            return SINGLE.replace("{name}", name).replace("{age}", age)
+        rows = [f"  {index},{content.replace(':', ',')}" for index, content in docs]
+        text = f"results[{len(rows)}]{{doc,name,age}}:\n" + "\n".join(rows)
+        return batch_response(text) if batch_response is not None else text
+
+    return respond
+
+
+@pytest.fixture(autouse=True)
+def batching(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(settings, "LLM_BATCH_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_BATCH_WINDOW_MS", 20.0)
+    monkeypatch.setattr(settings, "LLM_BATCH_MAX_DOCS", 8)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_ENABLED", False)
+
+
+def _extract(llm, content):
+    return llm.extract(content=content, image=None, schema=SCHEMA, model="m")
+
+
+def _pairs(values):
+    return [(v.field, v.value) for v in values]
+
+
+def test_split_batch_response():
+    text = "```toon\nresults[4]{doc,name,age}:\n  2,李四,40\n  1,张三,30\n  3,王五,x\n  3,赵六,50\n```"
+    rows = split_batch_response(text, count=3, field_count=2)
+    # 重复的序号视为无效
+    assert rows == {1: ["张三", 30], 2: ["李四", 40]}
+    assert split_batch_response("results[1]{doc,name}:\n  1,张三", 1, 2) == {}
+    assert split_batch_response("无法解析", 1, 2) == {}
+
+
+def test_batch_documents_are_delimited():
+    text = batch_documents(["甲", "乙"])
+    assert "共 2 份文档" in text
+    assert "【文档 1】\n甲\n【文档 1 结束】" in text
+    assert "【文档 2】\n乙\n【文档 2 结束】" in text
+
+
+@pytest.mark.asyncio
+async def test_small_documents_share_one_call(fake_llm):
+    llm = fake_llm(respond=_respond(), delay=0.01)
+
+    async def call(content):
+        with collect_metadata() as metadata:
+            return await _extract(llm, content), metadata
+
+    results = await asyncio.gather(*[call(f"人{i}:{20 + i}") for i in range(5)])
+    assert len(llm.calls) == 1
+    for i, (values, metadata) in enumerate(results):
+        assert _pairs(values) == [("name", f"人{i}"), ("age", 20 + i)]
+        assert metadata["batch_size"] == 5
+    assert metrics.get("llm_batches_total", provider="openai", model="m") == 1
+
+
+@pytest.mark.asyncio
+async def test_max_docs_flushes_immediately(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_BATCH_WINDOW_MS", 10000.0)
+    monkeypatch.setattr(settings, "LLM_BATCH_MAX_DOCS", 2)
+    llm = fake_llm(respond=_respond(), delay=0.01)
+    results = await asyncio.wait_for(
+        asyncio.gather(*[_extract(llm, f"人{i}:{i}") for i in range(4)]), timeout=1.0
+    )
+    assert len(llm.calls) == 2
+    assert [values[1].value for values in results] == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_single_document_is_not_batched(fake_llm):
+    llm = fake_llm(respond=_respond(), delay=0.01)
+    values = await _extract(llm, "张三:30")
+    assert _pairs(values) == [("name", "张三"), ("age", 30)]
+    assert "【文档 1】" not in llm.calls[0].dynamic
+    assert metrics.get("llm_batches_total", provider="openai", model="m") == 0
+
+
+@pytest.mark.asyncio
+async def test_lone_request_does_not_wait_for_window(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_BATCH_WINDOW_MS", 10000.0)
+    llm = fake_llm(respond=_respond(), delay=0.01)
+    values = await asyncio.wait_for(_extract(llm, "张三:30"), timeout=1.0)
+    assert _pairs(values) == [("name", "张三"), ("age", 30)]
+
+
+@pytest.mark.asyncio
+async def test_requests_arriving_during_a_call_are_collected(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_BATCH_WINDOW_MS", 50.0)
+    llm = fake_llm(respond=_respond(), delay=0.01)
+    first = asyncio.ensure_future(_extract(llm, "张三:30"))
+    await asyncio.sleep(0.005)
+    # 第一个请求处理中：之后到达的请求按窗口收集
+    second = asyncio.ensure_future(_extract(llm, "李四:40"))
+    await asyncio.sleep(0.02)
+    third = asyncio.ensure_future(_extract(llm, "王五:50"))
+    results = await asyncio.gather(first, second, third)
+    assert [values[0].value for values in results] == ["张三", "李四", "王五"]
+    assert len(llm.calls) == 2
+    assert "共 2 份文档" in llm.calls[1].dynamic
+
+
+@pytest.mark.asyncio
+async def test_invalid_batch_values_are_requeried(fake_llm):
+    # 第 2 份文档的年龄未通过 int 校验，仅对该字段重新询问
+    llm = fake_llm(
+        respond=_respond(batch_response=lambda text: text.replace("  2,人1,21", "  2,人1,二十一")),
+        delay=0.01,
+    )
+    results = await asyncio.gather(*[_extract(llm, f"人{i}:{20 + i}") for i in range(3)])
+    assert [_pairs(values) for values in results] == [
+        [("name", f"人{i}"), ("age", 20 + i)] for i in range(3)
+    ]
+    assert len(llm.calls) == 2
+    assert "人1:21" in llm.calls[1].text
+    assert metrics.get("llm_response_repairs_total", provider="openai", kind="requery") == 1
+    assert metrics.get("llm_invalid_values_total", provider="openai", type="int") == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_rows_fall_back_to_single_calls(fake_llm):
+    # 模型漏掉了第 2 份文档
+    llm = fake_llm(
+        respond=_respond(batch_response=lambda text: text.replace("  2,人1,21\n", "").replace("[3]", "[2]")),
+        delay=0.01,
+    )
+    results = await asyncio.gather(*[_extract(llm, f"人{i}:{20 + i}") for i in range(3)])
+    assert [_pairs(values)[0][1] for values in results] == ["人0", "人1", "人2"]
+    assert len(llm.calls) == 2
+    assert metrics.get("llm_batch_fallbacks_total", provider="openai", model="m") == 1
+
+
+@pytest.mark.asyncio
+async def test_call_error_reaches_every_waiter(fake_llm):
+    llm = fake_llm(respond=_respond(error=LLMException("boom")), delay=0.01)
+    results = await asyncio.gather(*[_extract(llm, f"人{i}:{i}") for i in range(3)], return_exceptions=True)
+    assert len(llm.calls) == 1
+    assert all(isinstance(r, LLMException) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_long_or_different_schema_requests_are_separate(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_BATCH_MAX_CHARS", 10)
+    llm = fake_llm(respond=_respond(), delay=0.01)
+    other_schema = SCHEMA[:1] + [SchemaField(name="年龄", field="age", type="int", description="周岁")]
+    await asyncio.gather(
+        _extract(llm, "张三:30"),
+        llm.extract(content="李四:40", image=None, schema=other_schema, model="m"),
+        _extract(llm, "王五" * 10 + ":50"),
+    )
+    assert len(llm.calls) == 3
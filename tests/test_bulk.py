@@ -0,0 +1,164 @@
+"""
+离线批量提取测试（基于本地模拟服务的批量接口）
+"""
+import pytest
+
+from app.core import settings, JobNotFoundException, ValidationException
+from app.models import SchemaField
+from app.services.bulk_service import BulkService
+from app.services.job_store import (
+    ITEM_FAILED,
+    ITEM_PENDING,
+    ITEM_SUCCEEDED,
+    JOB_COMPLETED,
+    JOB_PENDING,
+    JOB_SUBMITTED,
+    JobStore,
+)
+from benchmarks import mock_llm_server
+from benchmarks.mock_llm_server import MockServer
+
+SCHEMA = [
+    SchemaField(name="人名", field="name", type="text"),
+    SchemaField(name="年龄", field="age", type="int"),
+]
+
+DOCUMENTS = [("a", "张三，32 岁"), ("b", "李四，40 岁 [mock-error]"), ("c", "王五，28 岁")]
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockServer(9131) as server:
+        yield server
+
+
+@pytest.fixture
+def service(server, tmp_path, monkeypatch):
+    mock_llm_server.reset()
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "mock")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", f"{server.base_url}/v1")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "mock")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+    return BulkService(JobStore(str(tmp_path / "jobs.db")), poll_interval=0.02)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider,model", [("openai", "gpt-4o-mini"), ("claude", "claude-3-haiku-20240307")])
+async def test_job_runs_to_completion(service, provider, model):
+    job = service.create_job(provider, model, SCHEMA, DOCUMENTS, output_format="table")
+    assert job.status == JOB_PENDING
+
+    await service.run(job.job_id)
+
+    job = service.store.get_job(job.job_id)
+    assert job.status == JOB_COMPLETED
+    assert job.batch_id
+    assert service.store.counts(job.job_id) == {ITEM_PENDING: 0, ITEM_SUCCEEDED: 2, ITEM_FAILED: 1}
+
+    items = {item.document_id: item for item in service.store.items(job.job_id)}
+    assert items["b"].status == ITEM_FAILED and items["b"].error
+    # 模拟服务回显输出示例，结果经 _parse_response 按 schema 转换类型
+    assert [(v.field, v.value) for v in items["a"].values] == [("name", "示例文本值"), ("age", 123)]
+
+
+@pytest.mark.asyncio
+async def test_positional_output_uses_same_parse_path(service):
+    job = service.create_job("openai", "gpt-4o-mini", SCHEMA, DOCUMENTS[:1], output_format="positional")
+    await service.run(job.job_id)
+    item = service.store.items(job.job_id)[0]
+    assert [(v.field, v.value) for v in item.values] == [("name", "示例文本值"), ("age", 123)]
+
+
+@pytest.mark.asyncio
+async def test_progress_is_resumed_after_restart(service, tmp_path, monkeypatch):
+    job = service.create_job("openai", "gpt-4o-mini", SCHEMA, DOCUMENTS, output_format="table")
+    # 提交后"进程退出"：只推进一步，不等待完成
+    assert await service.step(job.job_id) is False
+    batch_id = service.store.get_job(job.job_id).batch_id
+    assert service.store.get_job(job.job_id).status == JOB_SUBMITTED
+
+    restarted = BulkService(JobStore(str(tmp_path / "jobs.db")), poll_interval=0.02)
+    assert restarted.resume() == [job.job_id]
+    await restarted._tasks[job.job_id]
+
+    job = restarted.store.get_job(job.job_id)
+    assert job.status == JOB_COMPLETED
+    # 继续轮询原批量任务，没有重新提交
+    assert job.batch_id == batch_id
+    assert len(mock_llm_server._batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_lease_prevents_concurrent_runners(service, tmp_path):
+    job = service.create_job("openai", "gpt-4o-mini", SCHEMA, DOCUMENTS, output_format="table")
+    assert service.store.acquire_lease(job.job_id, "other-worker", 60)
+
+    await service.run(job.job_id)
+    assert service.store.get_job(job.job_id).status == JOB_PENDING
+    assert not mock_llm_server._batches
+
+    # 租约过期后接管
+    assert service.store.acquire_lease(job.job_id, "other-worker", -1)
+    await service.run(job.job_id)
+    assert service.store.get_job(job.job_id).status == JOB_COMPLETED
+
+
+def test_create_job_validation(service):
+    with pytest.raises(ValidationException):
+        service.create_job("gemini", "gemini-pro", SCHEMA, DOCUMENTS)
+    with pytest.raises(ValidationException):
+        service.create_job("openai", "gpt-4o-mini", SCHEMA, [])
+    with pytest.raises(JobNotFoundException):
+        service.store.get_job("job_missing")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider,model", [("openai", "gpt-4o-mini"), ("claude", "claude-3-haiku-20240307")])
+async def test_large_jobs_are_split_into_several_batches(service, monkeypatch, provider, model):
+    monkeypatch.setattr(settings, "BULK_BATCH_MAX_REQUESTS", 2)
+    job = service.create_job(provider, model, SCHEMA, DOCUMENTS, output_format="table")
+    await service.run(job.job_id)
+
+    job = service.store.get_job(job.job_id)
+    assert job.status == JOB_COMPLETED
+    assert len(mock_llm_server._batches) == 2
+    assert job.batch_id.split(",") == [batch.batch_id for batch in service.store.batches(job.job_id)]
+    assert [batch.size for batch in service.store.batches(job.job_id)] == [2, 1]
+    assert service.store.counts(job.job_id) == {ITEM_PENDING: 0, ITEM_SUCCEEDED: 2, ITEM_FAILED: 1}
+
+
+@pytest.mark.asyncio
+async def test_batches_are_limited_by_input_size(service, monkeypatch):
+    monkeypatch.setattr(settings, "BULK_BATCH_MAX_BYTES", 1)
+    job = service.create_job("openai", "gpt-4o-mini", SCHEMA, DOCUMENTS, output_format="table")
+    await service.run(job.job_id)
+    # 单个请求超过上限时仍单独成批
+    assert [batch.size for batch in service.store.batches(job.job_id)] == [1, 1, 1]
+    assert service.store.get_job(job.job_id).status == JOB_COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_interrupted_submission_resumes_with_remaining_batches(service, monkeypatch):
+    from app.llm.bulk import OpenAIBatchClient
+
+    monkeypatch.setattr(settings, "BULK_BATCH_MAX_REQUESTS", 2)
+    submit = OpenAIBatchClient.submit
+    calls = []
+
+    async def flaky_submit(self, requests, metadata):
+        calls.append(len(requests))
+        if len(calls) == 2:
+            raise ConnectionError("上传中断")
+        return await submit(self, requests, metadata)
+
+    monkeypatch.setattr(OpenAIBatchClient, "submit", flaky_submit)
+    job = service.create_job("openai", "gpt-4o-mini", SCHEMA, DOCUMENTS, output_format="table")
+    with pytest.raises(ConnectionError):
+        await service.step(job.job_id)
+    assert service.store.get_job(job.job_id).status == JOB_PENDING
+
+    await service.run(job.job_id)
+    # 已提交的第一批不重复提交
+    assert calls == [2, 1, 1]
+    assert len(mock_llm_server._batches) == 2
+    assert service.store.get_job(job.job_id).status == JOB_COMPLETED
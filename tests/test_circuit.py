@@ -0,0 +1,207 @@
+"""
+熔断器与故障转移测试
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.core import settings, CircuitOpenException, LLMException
+from app.core.metrics import metrics
+from app.llm.circuit import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    circuit_breakers,
+)
+from app.models import SchemaField
+from app.services.extract_service import ExtractService
+
+SCHEMA = [SchemaField(name="人名", field="name", type="text")]
+RESPONSE = "values[1]{field,type,value}:\n  name,text,张三"
+
+
+class _ServerError(Exception):
+    status_code = 503
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    options = dict(
+        window=10,
+        min_requests=4,
+        failure_rate=0.5,
+        slow_call_seconds=1.0,
+        slow_call_rate=0.5,
+        open_seconds=0.05,
+        half_open_probes=1,
+    )
+    options.update(kwargs)
+    return CircuitBreaker("openai", "m", **options)
+
+
+@pytest.fixture(autouse=True)
+def _reset_breakers(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    circuit_breakers.reset()
+    metrics.reset()
+    yield
+    circuit_breakers.reset()
+
+
+def test_opens_on_failure_rate():
+    breaker = _breaker()
+    breaker.on_success(0.1)
+    breaker.on_failure()
+    breaker.on_success(0.1)
+    assert breaker.state == STATE_CLOSED  # 样本不足
+    breaker.on_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+    assert metrics.get("llm_circuit_state", provider="openai", model="m") == 2
+
+
+def test_opens_on_slow_call_rate():
+    breaker = _breaker()
+    for seconds in (2.0, 0.1, 2.0, 0.1):
+        breaker.on_success(seconds)
+    assert breaker.state == STATE_OPEN
+
+
+def test_half_open_probe_closes_on_success():
+    breaker = _breaker(min_requests=1)
+    breaker.on_failure()
+    assert breaker.state == STATE_OPEN
+
+    time.sleep(0.06)
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # 仅放行一个探测请求
+    breaker.on_success(0.1)
+    assert breaker.state == STATE_CLOSED
+
+
+def test_half_open_probe_reopens_on_failure():
+    breaker = _breaker(min_requests=1)
+    breaker.on_failure()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.on_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.allow()
+
+
+def test_abandoned_probe_releases_slot():
+    breaker = _breaker(min_requests=1)
+    breaker.on_failure()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.on_abandon(0.1)
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_short_circuits_call(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_MIN_REQUESTS", 2)
+    llm = fake_llm([_ServerError("down")])
+    for _ in range(2):
+        with pytest.raises(LLMException):
+            await llm.extract(content="文档", image=None, schema=SCHEMA, model="m")
+    assert circuit_breakers.get("openai", "m").state == STATE_OPEN
+
+    with pytest.raises(CircuitOpenException):
+        await llm.extract(content="文档", image=None, schema=SCHEMA, model="m")
+    assert len(llm.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_bad_request_does_not_trip_breaker(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_MIN_REQUESTS", 1)
+
+    class _BadRequest(Exception):
+        status_code = 400
+
+    llm = fake_llm([_BadRequest("bad")])
+    with pytest.raises(LLMException):
+        await llm.extract(content="文档", image=None, schema=SCHEMA, model="m")
+    assert circuit_breakers.get("openai", "m").state == STATE_CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failover_to_next_provider(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_FAILOVER_CHAINS", {"azure": ["openai:gpt-4o-mini"]})
+    llms = {
+        "azure": fake_llm([_ServerError("down")], provider="azure"),
+        "openai": fake_llm([RESPONSE]),
+    }
+    created = []
+
+    def create(self, provider, model):
+        created.append((provider, model))
+        return llms[provider]
+
+    monkeypatch.setattr(ExtractService, "_create_llm", create)
+    values = await ExtractService()._extract_with_llm("文档", None, SCHEMA, "azure", "dep")
+
+    assert values[0].value == "张三"
+    assert created == [("azure", "dep"), ("openai", "gpt-4o-mini")]
+    assert metrics.get(
+        "llm_failovers_total", from_provider="azure", to_provider="openai", reason="error"
+    ) == 1
+
+
+@pytest.mark.asyncio
+async def test_failover_skips_open_circuit(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_FAILOVER_CHAINS", {"azure": ["openai"]})
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_MIN_REQUESTS", 1)
+    circuit_breakers.get("azure", "dep").on_failure()
+    llms = {
+        "azure": fake_llm([RESPONSE], provider="azure"),
+        "openai": fake_llm([RESPONSE]),
+    }
+    monkeypatch.setattr(ExtractService, "_create_llm", lambda self, provider, model: llms[provider])
+
+    values = await ExtractService()._extract_with_llm("文档", None, SCHEMA, "azure", "dep")
+    assert values[0].value == "张三"
+    assert len(llms["azure"].calls) == 0
+    assert metrics.get(
+        "llm_failovers_total", from_provider="azure", to_provider="openai", reason="circuit_open"
+    ) == 1
+
+
+@pytest.mark.asyncio
+async def test_all_providers_failing_raises_last_error(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_FAILOVER_CHAINS", {"azure": ["openai"]})
+    llms = {
+        "azure": fake_llm([_ServerError("down")], provider="azure"),
+        "openai": fake_llm([asyncio.TimeoutError()]),
+    }
+    monkeypatch.setattr(ExtractService, "_create_llm", lambda self, provider, model: llms[provider])
+
+    with pytest.raises(LLMException) as exc_info:
+        await ExtractService()._extract_with_llm("文档", None, SCHEMA, "azure", "dep")
+    assert "OpenAI" in str(exc_info.value)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("response", ["values[3]{field,type,value}:\n  name,text,张三", "bad request"])
+async def test_non_retryable_errors_do_not_fail_over(monkeypatch, response, fake_llm):
+    class _BadRequest(Exception):
+        status_code = 400
+
+    monkeypatch.setattr(settings, "LLM_FAILOVER_CHAINS", {"azure": ["openai"]})
+    monkeypatch.setattr(settings, "LLM_REPAIR_ENABLED", False)
+    error = _BadRequest(response) if response == "bad request" else response
+    llms = {
+        "azure": fake_llm([error], provider="azure"),
+        "openai": fake_llm([RESPONSE]),
+    }
+    monkeypatch.setattr(ExtractService, "_create_llm", lambda self, provider, model: llms[provider])
+
+    with pytest.raises(LLMException):
+        await ExtractService()._extract_with_llm("文档", None, SCHEMA, "azure", "dep")
+    assert len(llms["openai"].calls) == 0
+    assert metrics.get("llm_failovers_total", from_provider="azure", to_provider="openai", reason="error") == 0
@@ -0,0 +1,60 @@
+"""
+编译 schema 缓存测试
+"""
+import json
+
+import pytest
+
+from app.models import SchemaField
+from app.utils.compiled_schema import compile_schema, compile_fields, parse_schema_text
+
+SCHEMA_JSON = json.dumps([
+    {"name": "人名", "field": "name", "type": "text", "required": True},
+    {"name": "年龄", "field": "age", "type": "int", "required": True},
+], ensure_ascii=False)
+
+SCHEMA_TOON = (
+    "```toon\n"
+    "values[2]{name,field,type,required}:\n"
+    "  人名,name,text,true\n"
+    "  年龄,age,int,true\n"
+    "```"
+)
+
+
+class TestCompiledSchema:
+    """编译 schema 测试"""
+
+    def test_compile_json_and_toon_share_canonical_hash(self):
+        """JSON 与 TOON 描述的相同 schema 规范哈希一致"""
+        from_json = compile_schema(SCHEMA_JSON)
+        from_toon = compile_schema(SCHEMA_TOON)
+        assert from_json.canonical_hash == from_toon.canonical_hash
+        assert from_json.field_names == ["name", "age"]
+
+    def test_compile_schema_is_cached(self):
+        """相同原始文本返回同一编译对象"""
+        assert compile_schema(SCHEMA_JSON) is compile_schema(SCHEMA_JSON)
+
+    def test_compile_fields_reuses_compiled(self):
+        """字段列表相同时复用编译结果，提供商侧无需重新渲染"""
+        compiled = compile_schema(SCHEMA_JSON)
+        copies = [SchemaField(**f.model_dump()) for f in compiled.fields]
+        assert compile_fields(copies) is compiled
+        assert compile_fields(compiled) is compiled
+
+    def test_prompt_fragments(self):
+        """预渲染的 schema TOON 与输出示例"""
+        compiled = compile_schema(SCHEMA_JSON)
+        assert compiled.schema_toon.startswith("values[2]{name,field,type,required}:")
+        assert compiled.output_example.splitlines() == [
+            "values[2]{field,type,value}:",
+            "  name,text,示例文本值",
+            "  age,int,123",
+        ]
+        assert compiled.field_map["age"].type == "int"
+
+    def test_invalid_schema(self):
+        """无法解析的 schema 抛出 ValueError"""
+        with pytest.raises(ValueError):
+            parse_schema_text("not a schema")
@@ -0,0 +1,74 @@
+"""
+字段值转换测试
+"""
+import pytest
+
+from app.models import SchemaField
+from app.utils.compiled_schema import compile_fields
+from app.utils.converters import ConversionError, convert_value
+
+
+@pytest.mark.parametrize("field_type,value,expected", [
+    ("int", "1,234", 1234),
+    ("int", "１２３", 123),
+    ("int", 12.0, 12),
+    ("int", " -7 ", -7),
+    ("float", "1,234.50", 1234.5),
+    ("float", "１２.５", 12.5),
+    ("float", 3, 3.0),
+    ("boolean", "是", True),
+    ("boolean", "No", False),
+    ("boolean", 0, False),
+    ("date", "2024-03-05", "2024-03-05"),
+    ("date", "2024年3月5日", "2024-03-05"),
+    ("date", "二〇二四年三月十五日", "2024-03-15"),
+    ("date", "2024/3/5", "2024-03-05"),
+    ("date", "20240305", "2024-03-05"),
+    ("date", "2024-03-05T10:00:00Z", "2024-03-05"),
+    ("datetime", "2024-03-05T08:30:00", "2024-03-05 08:30:00"),
+    ("datetime", "2024年3月5日 8时30分", "2024-03-05 08:30:00"),
+    ("datetime", "2024-03-05", "2024-03-05 00:00:00"),
+    ("json", '{"a": [1, 2]}', {"a": [1, 2]}),
+    ("json", [1], [1]),
+    ("text", {"a": "中"}, '{"a": "中"}'),
+    ("text", 12, "12"),
+    ("int", "", None),
+    ("date", " ", None),
+])
+def test_convert_value(field_type, value, expected):
+    assert convert_value(value, field_type) == expected
+
+
+@pytest.mark.parametrize("field_type,value", [
+    ("int", "12.5"),
+    ("int", True),
+    ("float", "约 12"),
+    ("boolean", "也许"),
+    ("date", "2024-02-30"),
+    ("date", "下周一"),
+    ("datetime", "2024-03-05 25:00"),
+    ("json", "{a: 1}"),
+])
+def test_convert_value_rejects(field_type, value):
+    with pytest.raises(ConversionError):
+        convert_value(value, field_type)
+
+
+def test_convert_rows_uses_declared_types():
+    compiled = compile_fields([
+        SchemaField(name="年龄", field="age", type="int"),
+        SchemaField(name="生日", field="birthday", type="date"),
+        SchemaField(name="备注", field="note", type="text"),
+    ])
+    result = compiled.convert_rows([
+        ("unknown", "x"),
+        ("birthday", "2024年1月2日"),
+        ("age", "三十"),
+        ("note", None),
+    ])
+    assert [(v.field, v.type, v.value) for v in result.values] == [
+        ("birthday", "date", "2024-01-02"),
+        ("age", "int", "三十"),
+        ("note", "text", None),
+    ]
+    assert result.invalid == ["age"]
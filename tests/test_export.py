@@ -0,0 +1,124 @@
+"""
+批量结果列式导出测试
+"""
+import io
+
+import pytest
+
+from app.core import settings, ValidationException
+from app.models import ExtractedValue, SchemaField
+from app.services.bulk_service import BulkService
+from app.services.job_store import JobStore
+from app.utils.toon_utils import decode_table, encode_scalar, parse_scalar
+
+SCHEMA = [
+    SchemaField(name="人名", field="name", type="text"),
+    SchemaField(name="年龄", field="age", type="int"),
+    SchemaField(name="签订日期", field="signed", type="date"),
+    SchemaField(name="提交时间", field="submitted", type="datetime"),
+    SchemaField(name="已婚", field="married", type="boolean"),
+    SchemaField(name="明细", field="extra", type="json"),
+]
+
+
+def _values(index):
+    return [
+        ExtractedValue(field="name", type="text", value=f"张三,{index}"),
+        # 未通过校验时保留的原始文本导出为 null
+        ExtractedValue(field="age", type="int", value=index if index % 2 else "三十"),
+        ExtractedValue(field="signed", type="date", value="2024-03-05"),
+        ExtractedValue(field="submitted", type="datetime", value="2024-03-05 08:30:00+08:00"),
+        ExtractedValue(field="married", type="boolean", value=True),
+        ExtractedValue(field="extra", type="json", value={"items": [1, 2]}),
+    ]
+
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_ROWS", 2)
+    store = JobStore(str(tmp_path / "jobs.db"))
+    documents = [(f"doc-{i}", "...") for i in range(5)]
+    created = store.create_job("openai", "gpt-4o-mini", "table", SCHEMA, documents)
+    results = {f"item-{i:06d}": (_values(i), None) for i in range(4)}
+    results["item-000004"] = (None, "模型输出无法解析")
+    store.save_results(created.job_id, results)
+    return BulkService(store), created.job_id
+
+
+def test_encode_scalar_round_trips():
+    for value in ["张三", "a,b", "", " x", "true", "1.0", "007", 'say "hi"\n', "k: v", 12, 1.5, False, None]:
+        assert parse_scalar(encode_scalar(value)) == value
+
+
+def test_toon_export(job):
+    service, job_id = job
+    chunks = list(service.export(job_id, "toon"))
+    # 表格头 + 每 2 行一块
+    assert len(chunks) == 4
+
+    rows = decode_table(b"".join(chunks).decode("utf-8"))
+    assert len(rows) == 5
+    assert rows[0] == {
+        "_id": "doc-0", "_status": "succeeded", "_error": None,
+        "name": "张三,0", "age": None, "signed": "2024-03-05",
+        "submitted": "2024-03-05 08:30:00+08:00", "married": True, "extra": '{"items": [1, 2]}',
+    }
+    assert rows[1]["age"] == 1
+    assert rows[4]["_status"] == "failed" and rows[4]["_error"] == "模型输出无法解析"
+    assert rows[4]["name"] is None
+
+
+@pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+def test_arrow_and_parquet_export(job, file_format):
+    pa = pytest.importorskip("pyarrow")
+    from datetime import date, datetime
+
+    service, job_id = job
+    data = b"".join(service.export(job_id, file_format))
+    if file_format == "arrow":
+        table = pa.ipc.open_stream(data).read_all()
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(io.BytesIO(data))
+        assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 3
+
+    assert [str(field.type) for field in table.schema] == [
+        "string", "string", "string", "string", "int64", "date32[day]", "timestamp[us]", "bool", "string",
+    ]
+    rows = table.to_pylist()
+    assert [row["age"] for row in rows] == [None, 1, None, 3, None]
+    assert rows[0]["signed"] == date(2024, 3, 5)
+    # 带时区的值换算为 UTC
+    assert rows[0]["submitted"] == datetime(2024, 3, 5, 0, 30)
+    assert rows[4]["_error"] == "模型输出无法解析"
+
+
+def test_export_rejects_unknown_format_and_conflicting_columns(job, tmp_path):
+    service, job_id = job
+    with pytest.raises(ValidationException):
+        service.export(job_id, "csv")
+
+    store = JobStore(str(tmp_path / "other.db"))
+    schema = [SchemaField(name="状态", field="_status", type="text")]
+    conflicting = store.create_job("openai", "gpt-4o-mini", "table", schema, [("a", "...")])
+    with pytest.raises(ValidationException):
+        BulkService(store).export(conflicting.job_id, "toon")
+
+
+@pytest.mark.asyncio
+async def test_export_to_minio(job):
+    service, job_id = job
+    uploads = {}
+
+    class FakeClient:
+        def put_object(self, bucket_name, object_name, data, length, content_type):
+            uploads[(bucket_name, object_name)] = (data.read(), length, content_type)
+
+    service.minio_service._client = FakeClient()
+    written = await service.export_to_minio(job_id, "exports/nightly/", "toon")
+
+    key = ("exports", f"nightly/{job_id}.toon")
+    assert written == {"url": "exports/" + key[1], "size": uploads[key][1]}
+    body, length, content_type = uploads[key]
+    assert len(body) == length and body.startswith(b"results[5]")
+    assert content_type.startswith("text/plain")
@@ -0,0 +1,122 @@
+"""
+字段分组并行提取测试
+"""
+import re
+
+import pytest
+
+from app.core import settings, LLMException
+from app.core.metrics import metrics
+from app.core.response_metadata import collect_metadata
+from app.models import SchemaField
+from app.utils.compiled_schema import partition_fields
+
+DOCUMENT = "合同编号 HT-001，甲方张三，金额 100"
+
+
+def _schema(count, group=None):
+    return [
+        SchemaField(name=f"字段{i}", field=f"f{i}", type="int", group=group(i) if group else None)
+        for i in range(count)
+    ]
+
+
+def _respond(fail_on=None):
+    """按 Prompt 中的 schema 定义逐字段返回序号；fail_on 中的字段所在组调用失败"""
+
+    def respond(parts):
+        fields = re.findall(r"^  字段\d+,(f(\d+)),int,\w+$", parts.dynamic, flags=re.M)
+        if fail_on and any(field in fail_on for field, _ in fields):
+            return LLMException("模型调用失败")
+        rows = "\n".join(f"  {field},int,{index}" for field, index in fields)
+        return f"values[{len(fields)}]{{field,type,value}}:\n{rows}"
+
+    return respond
+
+
+@pytest.fixture(autouse=True)
+def grouping(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(settings, "LLM_OUTPUT_FORMAT", "table")
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_SIZE", 0)
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_PARALLELISM", 4)
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_WARM_CACHE", False)
+    monkeypatch.setattr(settings, "LLM_BATCH_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_ENABLED", False)
+
+
+def test_partition_fields():
+    assert partition_fields(_schema(5)) == [("", _schema(5))]
+
+    groups = partition_fields(_schema(7), group_size=3)
+    assert [(name, [f.field for f in fields]) for name, fields in groups] == [
+        ("#1", ["f0", "f1", "f2"]),
+        ("#2", ["f3", "f4"]),
+        ("#3", ["f5", "f6"]),
+    ]
+
+    tagged = _schema(5, group=lambda i: {0: "甲方", 3: "甲方", 4: "金额"}.get(i))
+    groups = partition_fields(tagged)
+    assert [(name, [f.field for f in fields]) for name, fields in groups] == [
+        ("甲方", ["f0", "f3"]),
+        ("金额", ["f4"]),
+        ("#1", ["f1", "f2"]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_single_group_keeps_schema_first_layout(fake_llm):
+    llm = fake_llm(respond=_respond(), delay=0.02)
+    values = await llm.extract(content=DOCUMENT, image=None, schema=_schema(3), model="m")
+    assert [v.value for v in values] == [0, 1, 2]
+    assert len(llm.calls) == 1
+    assert "【待提取的文本内容】" in llm.calls[0].dynamic
+
+
+@pytest.mark.asyncio
+async def test_groups_share_document_prefix_and_merge_in_order(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_SIZE", 4)
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_PARALLELISM", 2)
+    schema = _schema(12, group=lambda i: "尾部" if i in (1, 11) else None)
+    llm = fake_llm(respond=_respond(), delay=0.02)
+
+    with collect_metadata() as metadata:
+        values = await llm.extract(content=DOCUMENT, image=None, schema=schema, model="m")
+
+    assert [v.field for v in values] == [f.field for f in schema]
+    assert [v.value for v in values] == list(range(12))
+    # 1 个标签组 + 10 个未标记字段按 4 个一组划分为 3 组
+    assert len(llm.calls) == 4
+    assert llm.peak == 2
+    # 各组以相同的文档内容作为静态前缀
+    assert {parts.static for parts in llm.calls} == {f"【待提取的文本内容】\n{DOCUMENT}"}
+    assert all("上面给出" in parts.dynamic for parts in llm.calls)
+
+    timings = metadata["field_groups"]
+    assert sorted(t["group"] for t in timings) == ["#1", "#2", "#3", "尾部"]
+    assert sum(t["fields"] for t in timings) == 12
+    assert metrics.get("llm_field_group_seconds", provider="openai", model="m") == 4
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_runs_first_group_alone(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_SIZE", 2)
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_WARM_CACHE", True)
+    llm = fake_llm(respond=_respond(), delay=0.02)
+
+    values = await llm.extract(content=DOCUMENT, image=None, schema=_schema(6), model="m")
+
+    assert [v.value for v in values] == list(range(6))
+    assert "字段0," in llm.calls[0].dynamic
+    assert llm.peak == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_group_fails_request(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_FIELD_GROUP_SIZE", 2)
+    llm = fake_llm(respond=_respond(fail_on={"f2"}), delay=0.02)
+
+    with pytest.raises(LLMException):
+        await llm.extract(content=DOCUMENT, image=None, schema=_schema(6), model="m")
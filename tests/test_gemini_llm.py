@@ -0,0 +1,50 @@
+"""
+Gemini 调用测试
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.llm import gemini_llm
+from app.llm.base import PromptParts
+
+
+class FakeModel:
+    def __init__(self, model_name, system_instruction):
+        self.model_name = model_name
+
+    def generate_content(self, request):
+        raise AssertionError("不应调用阻塞接口")
+
+    async def generate_content_async(self, request):
+        await asyncio.sleep(0.1)
+
+        class Response:
+            text = "values[1]{field,type,value}:\n  name,text,张三"
+            usage_metadata = None
+
+        return Response()
+
+
+class FakeGenai:
+    GenerativeModel = FakeModel
+
+    @staticmethod
+    def configure(**kwargs):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_complete_yields_to_event_loop_and_can_be_cancelled(monkeypatch):
+    monkeypatch.setattr(gemini_llm, "genai", FakeGenai)
+    llm = gemini_llm.GeminiLLM(api_key="test")
+    parts = PromptParts("system", "static", "document")
+
+    started = time.perf_counter()
+    completions = await asyncio.gather(*(llm._complete(parts, None, "gemini-2.0-flash") for _ in range(5)))
+    assert time.perf_counter() - started < 0.4
+    assert completions[0].text.endswith("张三")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(llm._complete(parts, None, "gemini-2.0-flash"), 0.01)
@@ -0,0 +1,138 @@
+"""
+对冲请求测试
+"""
+import asyncio
+
+import pytest
+
+from app.core import settings
+from app.core.metrics import metrics
+from app.llm.hedge import HedgeBudget, hedged_call
+from app.llm.stats import LatencyTracker
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    """p95 约为 50ms 的延迟统计"""
+    monkeypatch.setattr(settings, "LLM_HEDGE_PERCENTILE", 95.0)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 10)
+    tracker = LatencyTracker()
+    for i in range(20):
+        tracker.record("openai", "m", 0.01 + (0.04 if i == 19 else 0))
+    return tracker
+
+
+def _budget(tokens: float = 5) -> HedgeBudget:
+    budget = HedgeBudget(percent=0)
+    budget._tokens = tokens
+    return budget
+
+
+def _call(result, delay, log, fail=False):
+    async def fn():
+        log.append(f"{result}:start")
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(f"{result}:cancelled")
+            raise
+        if fail:
+            raise RuntimeError(result)
+        return result
+    return fn
+
+
+def test_percentile():
+    tracker = LatencyTracker()
+    assert tracker.percentile("p", "m", 95) is None
+    for i in range(1, 101):
+        tracker.record("p", "m", i / 100)
+    assert tracker.percentile("p", "m", 50) == 0.5
+    assert tracker.percentile("p", "m", 95) == 0.95
+    assert tracker.percentile("p", "m", 95, min_samples=200) is None
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged(tracker):
+    log = []
+    result = await hedged_call(
+        _call("primary", 0, log), _call("backup", 0, log), "openai", "m", tracker, _budget()
+    )
+    assert result == "primary"
+    assert log == ["primary:start"]
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled(tracker):
+    metrics.reset()
+    log = []
+    result = await hedged_call(
+        _call("primary", 1.0, log), _call("backup", 0.01, log), "openai", "m", tracker, _budget()
+    )
+    assert result == "backup"
+    assert log == ["primary:start", "backup:start", "primary:cancelled"]
+    assert metrics.get("llm_hedge_wins_total", provider="openai", winner="backup") == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_backup_falls_back_to_primary(tracker):
+    log = []
+    result = await hedged_call(
+        _call("primary", 0.2, log), _call("backup", 0, log, fail=True), "openai", "m", tracker, _budget()
+    )
+    assert result == "primary"
+
+
+@pytest.mark.asyncio
+async def test_both_fail_raises_primary_error(tracker):
+    log = []
+    with pytest.raises(RuntimeError, match="primary"):
+        await hedged_call(
+            _call("primary", 0.1, log, fail=True), _call("backup", 0, log, fail=True),
+            "openai", "m", tracker, _budget(),
+        )
+
+
+@pytest.mark.asyncio
+async def test_budget_exhausted_waits_for_primary(tracker):
+    log = []
+    result = await hedged_call(
+        _call("primary", 0.1, log), _call("backup", 0, log), "openai", "m", tracker, _budget(0)
+    )
+    assert result == "primary"
+    assert log == ["primary:start"]
+
+
+def test_budget_bounds_hedge_rate():
+    budget = HedgeBudget(percent=5)
+    hedges = 0
+    for _ in range(1000):
+        budget.on_request()
+        hedges += budget.try_acquire()
+    assert hedges == 50
+
+
+@pytest.mark.asyncio
+async def test_provider_hedges_to_same_provider(monkeypatch, fake_llm):
+    """启用对冲后慢请求由同一提供商的备份请求完成，且结果经过完整解析"""
+    from app.llm import hedge
+    from app.llm.stats import latency_stats
+    from app.models import SchemaField
+
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(hedge, "hedge_budget", _budget())
+    latency_stats.reset()
+    for _ in range(5):
+        latency_stats.record("openai", "m", 0.02)
+
+    async def slow_first(parts):
+        await asyncio.sleep(1.0 if len(llm.calls) == 1 else 0)
+        return "values[1]{field,type,value}:\n  age,int,32"
+
+    llm = fake_llm(respond=slow_first)
+    schema = [SchemaField(name="年龄", field="age", type="int")]
+    values = await llm.extract(content="文档", image=None, schema=schema, model="m")
+    assert [(v.field, v.value) for v in values] == [("age", 32)]
+    assert len(llm.calls) == 2
+    latency_stats.reset()
@@ -0,0 +1,66 @@
+"""
+冷启动导入预算测试
+
+在独立的子进程中导入 app.main，确保重量级依赖不会在启动时被加载，
+且导入耗时不超过预算（可通过环境变量 IMPORT_BUDGET_MS 调整）。
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 启动时不应导入的重量级模块
+HEAVY_MODULES = [
+    "unstructured",
+    "pytesseract",
+    "PIL",
+    "magic",
+    "openai",
+    "anthropic",
+    "google.generativeai",
+    "minio",
+]
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "2000"))
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"elapsed_ms": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _probe_import() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.slow
+def test_heavy_modules_not_imported_at_startup():
+    """导入 app.main 不应加载提供商 SDK 与文档解析依赖"""
+    probe = _probe_import()
+    assert probe["loaded"] == []
+
+
+@pytest.mark.slow
+def test_import_time_within_budget():
+    """app.main 冷启动导入耗时不超过预算"""
+    timings = [_probe_import()["elapsed_ms"] for _ in range(3)]
+    median = statistics.median(timings)
+    assert median <= IMPORT_BUDGET_MS, (
+        f"冷启动导入耗时 {median:.0f}ms 超出预算 {IMPORT_BUDGET_MS:.0f}ms"
+    )
@@ -0,0 +1,238 @@
+"""
+MinIO 前缀批量导入测试（使用 benchmarks/mock_s3_server.py）
+"""
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core import settings, ValidationException
+from app.core.metrics import metrics
+from app.models import ExtractedValue, IngestRequest, SchemaField
+from app.services.extract_service import ExtractService
+from app.services.ingest_service import IngestService
+from app.services import ingest_store
+from app.services.ingest_store import IngestStore, RUN_COMPLETED, RUN_FAILED, RUN_RUNNING
+from benchmarks import mock_s3_server
+from benchmarks.mock_s3_server import MockS3Server
+
+SCHEMA = [SchemaField(name="人名", field="name", type="text")]
+
+
+@pytest.fixture(scope="module")
+def s3():
+    with MockS3Server(9232) as server:
+        yield server
+
+
+@pytest.fixture
+def service(s3, tmp_path, monkeypatch):
+    mock_s3_server.reset()
+    metrics.reset()
+    # 每页 2 个对象，覆盖 continuation token 分页
+    monkeypatch.setitem(mock_s3_server.CONFIG, "max_keys", 2)
+    monkeypatch.setattr(settings, "MINIO_ENDPOINT", s3.endpoint)
+    monkeypatch.setattr(settings, "MINIO_ACCESS_KEY", "mock")
+    monkeypatch.setattr(settings, "MINIO_SECRET_KEY", "mock")
+    monkeypatch.setattr(settings, "INGEST_REPORT_DIR", str(tmp_path / "reports"))
+
+    extract_service = ExtractService()
+    extract_service.minio_service._client = None
+    calls = []
+
+    async def extract_text_from_file(content, extension, filename=None):
+        return content.decode("utf-8")
+
+    async def extract_with_llm(text_content, image, schema, provider, model=None, output_format=None):
+        calls.append(text_content)
+        if "损坏" in text_content:
+            raise ValueError("模型输出无法解析")
+        return [ExtractedValue(field=f.field, type=f.type, value=text_content) for f in schema]
+
+    monkeypatch.setattr(extract_service.file_service, "extract_text_from_file", extract_text_from_file)
+    monkeypatch.setattr(extract_service, "_extract_with_llm", extract_with_llm)
+    service = IngestService(extract_service, IngestStore(str(tmp_path / "ingest.db")))
+    return service, calls
+
+
+def _seed():
+    old = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    mock_s3_server.put_object("docs", "contracts/a.txt", "张三".encode("utf-8"))
+    mock_s3_server.put_object("docs", "contracts/b.txt", "李四".encode("utf-8"))
+    mock_s3_server.put_object("docs", "contracts/c.txt", "损坏".encode("utf-8"))
+    mock_s3_server.put_object("docs", "contracts/d.pdf", b"pdf")
+    mock_s3_server.put_object("docs", "contracts/e.txt", b"")
+    mock_s3_server.put_object("docs", "contracts/old.txt", "王五".encode("utf-8"), last_modified=old)
+    mock_s3_server.put_object("docs", "other/f.txt", "赵六".encode("utf-8"))
+
+
+def _request(**kwargs):
+    return IngestRequest(
+        bucket="docs",
+        prefix="contracts/",
+        extensions=["TXT"],
+        min_size=1,
+        modified_after=datetime(2021, 1, 1),
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_ingest_filters_and_reports(service):
+    service, calls = service
+    _seed()
+    run = service.create_run(_request(), SCHEMA)
+    report = await service.run(run.run_id)
+
+    assert report["status"] == RUN_COMPLETED
+    assert report["counts"] == {"listed": 6, "filtered": 3, "skipped": 0, "succeeded": 2, "failed": 1}
+    assert report["failures"] == [{"object": "docs/contracts/c.txt", "error": "模型输出无法解析"}]
+    assert sorted(calls) == sorted(["张三", "李四", "损坏"])
+    assert mock_s3_server.STATS["list"] == 3
+
+    with open(report["report_url"], "r", encoding="utf-8") as f:
+        assert json.load(f)["counts"] == report["counts"]
+
+    stored = service.store.get_run(run.run_id)
+    assert stored.status == RUN_COMPLETED and stored.report["counts"] == report["counts"]
+    objects = service.store.objects(run.run_id)
+    assert [(url, status) for url, status, _, _ in objects] == [
+        ("docs/contracts/a.txt", "succeeded"),
+        ("docs/contracts/b.txt", "succeeded"),
+        ("docs/contracts/c.txt", "failed"),
+    ]
+    assert objects[0][2][0].value == "张三"
+    assert metrics.get("ingest_objects_total", status="succeeded") == 2
+
+
+@pytest.mark.asyncio
+async def test_rerun_resumes_from_checkpoint(service):
+    service, calls = service
+    _seed()
+    first = service.create_run(_request(), SCHEMA)
+    await service.run(first.run_id)
+    calls.clear()
+
+    # 修复失败对象、修改一个已完成对象，其余对象应跳过
+    mock_s3_server.put_object("docs", "contracts/c.txt", "钱七".encode("utf-8"))
+    mock_s3_server.put_object("docs", "contracts/b.txt", "孙八".encode("utf-8"))
+    second = service.create_run(_request(), SCHEMA)
+    assert second.name == first.name
+    report = await service.run(second.run_id)
+
+    assert sorted(calls) == ["孙八", "钱七"]
+    assert report["counts"]["skipped"] == 1
+    assert report["counts"]["succeeded"] == 2 and report["counts"]["failed"] == 0
+
+    # 不同名称的导入不共享检查点
+    calls.clear()
+    third = service.create_run(_request(name="另一次导入"), SCHEMA)
+    await service.run(third.run_id)
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_report_written_to_minio(service):
+    service, _ = service
+    _seed()
+    run = service.create_run(_request(report_url="reports/ingest/"), SCHEMA)
+    report = await service.run(run.run_id)
+
+    assert report["report_url"] == f"reports/ingest/{run.run_id}.json"
+    body = mock_s3_server.get_object("reports", f"ingest/{run.run_id}.json")
+    assert json.loads(body)["counts"]["succeeded"] == 2
+
+
+def test_create_run_validates_request(service):
+    service, _ = service
+    with pytest.raises(ValidationException):
+        service.create_run(_request(), [])
+    with pytest.raises(ValidationException):
+        service.create_run(IngestRequest(bucket="docs", min_size=10, max_size=1), SCHEMA)
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_are_loaded_once_per_page(service, monkeypatch):
+    service, calls = service
+    monkeypatch.setattr(settings, "INGEST_LIST_PAGE_SIZE", 2)
+    monkeypatch.setattr(ingest_store, "_LOOKUP_CHUNK", 1)
+    _seed()
+    first = service.create_run(_request(), SCHEMA)
+    await service.run(first.run_id)
+
+    lookups = []
+    completed_etags = service.store.completed_etags
+
+    def counting(name, bucket, keys):
+        lookups.append(keys)
+        return completed_etags(name, bucket, keys)
+
+    monkeypatch.setattr(service.store, "completed_etags", counting)
+    calls.clear()
+    second = service.create_run(_request(), SCHEMA)
+    report = await service.run(second.run_id)
+
+    # 第三页（e.txt、old.txt）全部被过滤，不查询检查点
+    assert lookups == [["contracts/a.txt", "contracts/b.txt"], ["contracts/c.txt"]]
+    assert report["counts"]["skipped"] == 2 and calls == ["损坏"]
+
+
+@pytest.mark.asyncio
+async def test_interrupted_runs_do_not_stay_running(service, monkeypatch):
+    service, _ = service
+    _seed()
+
+    # 服务关闭时取消的运行立即标记为失败
+    release = asyncio.Event()
+
+    async def blocked(*args, **kwargs):
+        await release.wait()
+
+    monkeypatch.setattr(service.extract_service, "_extract_with_llm", blocked)
+    cancelled = service.create_run(_request(), SCHEMA)
+    service.start(cancelled.run_id)
+    await asyncio.sleep(0.2)
+    await service.stop()
+    assert service.store.get_run(cancelled.run_id).status == RUN_FAILED
+
+    # 执行进程已退出（租约过期）的运行在启动时标记为失败，租约未过期的运行不受影响
+    monkeypatch.setattr(settings, "INGEST_LEASE_SECONDS", 0)
+    stale = service.create_run(_request(), SCHEMA)
+    monkeypatch.setattr(settings, "INGEST_LEASE_SECONDS", 300)
+    active = service.create_run(_request(), SCHEMA)
+    await asyncio.sleep(0.01)
+    assert await service.recover() == [stale.run_id]
+    assert service.store.get_run(stale.run_id).status == RUN_FAILED
+    assert service.store.get_run(active.run_id).status == RUN_RUNNING
+
+    # 已结束的运行不能再执行，其他进程持有租约的运行也不能
+    with pytest.raises(ValidationException):
+        await service.run(stale.run_id)
+    assert service.store.acquire_lease(active.run_id, "other-worker", 300)
+    with pytest.raises(ValidationException):
+        await service.run(active.run_id)
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_write_failure_does_not_stall_run(service, monkeypatch):
+    service, _ = service
+    _seed()
+
+    def save_object(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(service.store, "save_object", save_object)
+    run = service.create_run(_request(concurrency=1), SCHEMA)
+    report = await asyncio.wait_for(service.run(run.run_id), 5)
+
+    assert report["status"] == RUN_COMPLETED
+    assert report["counts"]["failed"] == 3 and report["counts"]["succeeded"] == 0
+    assert {failure["error"] for failure in report["failures"]} == {"database is locked"}
+
+    # 工作协程意外退出时取消列表，运行以失败结束
+    monkeypatch.setattr(settings, "INGEST_REPORT_MAX_FAILURES", None)
+    run = service.create_run(_request(concurrency=1, name="崩溃"), SCHEMA)
+    report = await asyncio.wait_for(service.run(run.run_id), 5)
+    assert report["status"] == RUN_FAILED and report["error"]
+    assert service.store.get_run(run.run_id).status == RUN_FAILED
@@ -0,0 +1,152 @@
+"""
+自适应并发限制测试
+"""
+import asyncio
+
+import pytest
+
+from app.core import settings, ConcurrencyLimitException
+from app.core.metrics import metrics
+from app.llm.limiter import (
+    OUTCOME_DROPPED,
+    OUTCOME_IGNORE,
+    OUTCOME_SUCCESS,
+    AdaptiveLimiter,
+    concurrency_limiters,
+)
+from app.llm.retry import ERROR_REJECTED, classify_error
+from app.models import SchemaField
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    metrics.reset()
+    concurrency_limiters.reset()
+    yield
+    concurrency_limiters.reset()
+
+
+def _limiter(**kwargs) -> AdaptiveLimiter:
+    options = dict(initial_limit=4, min_limit=1, max_limit=8, backoff_ratio=0.5, latency_tolerance=2.0)
+    options.update(kwargs)
+    return AdaptiveLimiter("openai", "m", **options)
+
+
+@pytest.mark.asyncio
+async def test_additive_increase_when_saturated():
+    limiter = _limiter()
+    for _ in range(30):
+        permits = [await limiter.acquire() for _ in range(limiter.limit)]
+        for permit in permits:
+            limiter.release(permit, OUTCOME_SUCCESS, 1.0)
+    # 每轮满载约 +1，且不超过上限
+    assert limiter.limit == 8
+    assert metrics.get("llm_concurrency_limit", provider="openai", model="m") == 8
+
+
+@pytest.mark.asyncio
+async def test_no_increase_when_underused():
+    limiter = _limiter()
+    for _ in range(20):
+        limiter.release(await limiter.acquire(), OUTCOME_SUCCESS, 1.0)
+    assert limiter.limit == 4
+
+
+@pytest.mark.asyncio
+async def test_multiplicative_decrease_once_per_burst():
+    limiter = _limiter()
+    permits = [await limiter.acquire() for _ in range(4)]
+    for permit in permits:
+        limiter.release(permit, OUTCOME_DROPPED)
+    # 同一批调用的多个 429 只减小一次
+    assert limiter.limit == 2
+    limiter.release(await limiter.acquire(), OUTCOME_DROPPED)
+    assert limiter.limit == 1
+    assert metrics.get("llm_limiter_decreases_total", provider="openai", model="m", reason="dropped") == 2
+
+
+@pytest.mark.asyncio
+async def test_latency_gradient_decreases_limit():
+    limiter = _limiter()
+    for _ in range(20):
+        limiter.release(await limiter.acquire(), OUTCOME_IGNORE)
+        limiter.release(await limiter.acquire(), OUTCOME_SUCCESS, 1.0)
+    assert limiter.limit == 4
+    for _ in range(10):
+        limiter.release(await limiter.acquire(), OUTCOME_SUCCESS, 10.0)
+    assert limiter.limit < 4
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_fifo():
+    limiter = _limiter(initial_limit=1)
+    permit = await limiter.acquire()
+    order = []
+
+    async def waiter(name):
+        acquired = await limiter.acquire(timeout=1.0)
+        order.append(name)
+        limiter.release(acquired, OUTCOME_IGNORE)
+
+    tasks = [asyncio.ensure_future(waiter(name)) for name in ("a", "b")]
+    await asyncio.sleep(0)
+    assert limiter.queued == 2
+    assert metrics.get("llm_queue_depth", provider="openai", model="m") == 2
+    limiter.release(permit, OUTCOME_IGNORE)
+    await asyncio.gather(*tasks)
+    assert order == ["a", "b"]
+    assert limiter.inflight == 0 and limiter.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_rejects():
+    limiter = _limiter(initial_limit=1)
+    await limiter.acquire()
+    with pytest.raises(ConcurrencyLimitException):
+        await limiter.acquire(timeout=0.01)
+    assert limiter.queued == 0
+    assert metrics.get("llm_limiter_rejections_total", provider="openai", model="m") == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    limiter = _limiter(initial_limit=1)
+    permit = await limiter.acquire()
+    task = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert limiter.queued == 0
+    limiter.release(permit, OUTCOME_IGNORE)
+    assert limiter.inflight == 0
+
+
+def test_rejections_are_not_retried():
+    assert classify_error(ConcurrencyLimitException("x"))[0] == ERROR_REJECTED
+
+
+@pytest.mark.asyncio
+async def test_call_model_respects_limit(monkeypatch, fake_llm):
+    """在途调用数不超过上限，429 使上限减小"""
+    monkeypatch.setattr(settings, "LLM_LIMITER_INITIAL", 2)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_ENABLED", False)
+
+    class _RateLimited(Exception):
+        status_code = 429
+
+    responses = iter([_RateLimited("slow down")])
+
+    def respond(parts):
+        return next(responses, "values[1]{field,type,value}:\n  name,text,张三")
+
+    llm = fake_llm(respond=respond, delay=0.01)
+    schema = [SchemaField(name="人名", field="name", type="text")]
+    results = await asyncio.gather(
+        *[llm.extract(content="文档", image=None, schema=schema, model="m") for _ in range(6)],
+        return_exceptions=True,
+    )
+    assert llm.peak <= 2
+    assert sum(isinstance(r, Exception) for r in results) == 1
+    assert metrics.get("llm_limiter_decreases_total", provider="openai", model="m", reason="dropped") == 1
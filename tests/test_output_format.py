@@ -0,0 +1,85 @@
+"""
+位置输出格式测试
+"""
+import pytest
+
+from app.core import settings, LLMException
+from app.llm.base import OUTPUT_FORMAT_POSITIONAL, OUTPUT_FORMAT_TABLE
+from app.models import SchemaField
+from app.utils.compiled_schema import compile_fields
+
+SCHEMA = [
+    SchemaField(name="人名", field="name", type="text"),
+    SchemaField(name="年龄", field="age", type="int"),
+    SchemaField(name="在职", field="employed", type="boolean"),
+]
+
+
+def test_positional_prompt():
+    compiled = compile_fields(SCHEMA)
+    assert compiled.positional_example == "values[3]: 示例文本值,123,true"
+    assert compiled.positional_example in compiled.static_prompt(OUTPUT_FORMAT_POSITIONAL)
+    assert compiled.output_example in compiled.static_prompt(OUTPUT_FORMAT_TABLE)
+
+
+@pytest.mark.parametrize("layout", ["legacy", "prefix_cache"])
+def test_system_prompt_does_not_fix_table_header(monkeypatch, layout, fake_llm):
+    """系统提示词不固定表头，位置格式下只有一种输出结构说明"""
+    monkeypatch.setattr(settings, "PROMPT_LAYOUT", layout)
+    parts = fake_llm([])._build_prompt_parts("文档", SCHEMA, output_format=OUTPUT_FORMAT_POSITIONAL)
+    assert "{field,type,value}" not in parts.system
+    assert "{field,type,value}" not in parts.text
+    assert compile_fields(SCHEMA).positional_example in parts.text
+
+
+@pytest.mark.asyncio
+async def test_positional_rehydrates_fields_and_types(fake_llm):
+    llm = fake_llm(['```toon\nvalues[3]: "张三, 先生",32,true\n```'])
+    values = await llm.extract(
+        content="文档", image=None, schema=SCHEMA, model="m", output_format=OUTPUT_FORMAT_POSITIONAL
+    )
+
+    assert [(v.field, v.type, v.value) for v in values] == [
+        ("name", "text", "张三, 先生"),
+        ("age", "int", 32),
+        ("employed", "boolean", True),
+    ]
+    assert "values[3]: 示例文本值,123,true" in llm.calls[0].text
+
+
+@pytest.mark.asyncio
+async def test_positional_length_mismatch(monkeypatch, fake_llm):
+    """值的个数与 schema 不一致时不按位置猜测，关闭修复时直接报错"""
+    monkeypatch.setattr(settings, "LLM_REPAIR_ENABLED", False)
+    llm = fake_llm(["values[2]: 张三,32"])
+    with pytest.raises(LLMException):
+        await llm.extract(
+            content="文档", image=None, schema=SCHEMA, model="m", output_format=OUTPUT_FORMAT_POSITIONAL
+        )
+
+
+@pytest.mark.asyncio
+async def test_positional_mismatch_requeries_in_table_format(fake_llm):
+    llm = fake_llm([
+        "values[2]: 张三,32",
+        "values[3]{field,type,value}:\n  name,text,张三\n  age,int,32\n  employed,boolean,false",
+    ])
+    values = await llm.extract(
+        content="文档", image=None, schema=SCHEMA, model="m", output_format=OUTPUT_FORMAT_POSITIONAL
+    )
+    assert {v.field: v.value for v in values} == {"name": "张三", "age": 32, "employed": False}
+    assert "values[3]{field,type,value}:" in llm.calls[1].text
+
+
+def test_output_format_resolution(monkeypatch, fake_llm):
+    """请求指定 > 提供商配置 > 全局默认"""
+    llm = fake_llm([])
+    monkeypatch.setattr(settings, "LLM_OUTPUT_FORMAT", OUTPUT_FORMAT_TABLE)
+    assert llm._resolve_output_format() == OUTPUT_FORMAT_TABLE
+
+    monkeypatch.setattr(settings, "LLM_OUTPUT_FORMAT_OVERRIDES", {"openai": OUTPUT_FORMAT_POSITIONAL})
+    assert llm._resolve_output_format() == OUTPUT_FORMAT_POSITIONAL
+    assert llm._resolve_output_format(OUTPUT_FORMAT_TABLE) == OUTPUT_FORMAT_TABLE
+
+    with pytest.raises(LLMException):
+        llm._resolve_output_format("csv")
@@ -0,0 +1,266 @@
+"""
+事件驱动预处理测试（使用 benchmarks/mock_s3_server.py）
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.core import settings, ValidationException
+from app.core.metrics import metrics
+from app.models import ExtractRequest, ExtractedValue, SchemaField
+from app.services.extract_service import ExtractService
+from app.services.minio_service import ObjectInfo
+from app.services.preprocess_service import PreprocessService, parse_notification
+from app.services.schema_registry import SchemaRegistry
+from benchmarks import mock_s3_server
+from benchmarks.mock_s3_server import MockS3Server
+
+SCHEMA = [SchemaField(name="人名", field="name", type="text")]
+
+
+def _record(key, etag="e1", event="s3:ObjectCreated:Put", bucket="docs"):
+    return {"eventName": event, "s3": {"bucket": {"name": bucket}, "object": {"key": key, "size": 3, "eTag": etag}}}
+
+
+@pytest.fixture(scope="module")
+def s3():
+    with MockS3Server(9233) as server:
+        yield server
+
+
+@pytest.fixture
+def services(s3, tmp_path, monkeypatch):
+    mock_s3_server.reset()
+    metrics.reset()
+    monkeypatch.setattr(settings, "MINIO_ENDPOINT", s3.endpoint)
+    monkeypatch.setattr(settings, "MINIO_ACCESS_KEY", "mock")
+    monkeypatch.setattr(settings, "MINIO_SECRET_KEY", "mock")
+    monkeypatch.setattr(settings, "PARSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "PREPROCESS_BUCKET", "docs")
+    monkeypatch.setattr(settings, "PREPROCESS_PREFIX", "inbox/")
+    monkeypatch.setattr(settings, "PREPROCESS_SUFFIXES", ["txt"])
+    monkeypatch.setattr(settings, "PREPROCESS_QUEUE_DIR", str(tmp_path / "events"))
+    monkeypatch.setattr(settings, "PREPROCESS_POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(settings, "PREPROCESS_LOCK_PATH", str(tmp_path / "preprocess.lock"))
+    monkeypatch.setattr(settings, "PREPROCESS_PROVIDER", "openai")
+    monkeypatch.setattr(settings, "PREPROCESS_MODEL", "gpt-4o-mini")
+
+    extract_service = ExtractService()
+    extract_service.minio_service._client = None
+    calls = {"parse": [], "llm": []}
+
+    async def extract_text(source, file_data, file_content, filename=None):
+        calls["parse"].append(file_data)
+        return file_content.decode("utf-8")
+
+    async def extract_with_llm(text_content, image, schema, provider, model=None, output_format=None):
+        calls["llm"].append(text_content)
+        return [ExtractedValue(field=f.field, type=f.type, value=text_content) for f in schema]
+
+    monkeypatch.setattr(extract_service, "_extract_text", extract_text)
+    monkeypatch.setattr(extract_service, "_extract_with_llm", extract_with_llm)
+    registry = SchemaRegistry(str(tmp_path / "schemas.db"))
+    registry.register(SCHEMA, schema_id="person")
+    return extract_service, PreprocessService(extract_service, registry), calls
+
+
+async def _wait_until(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.02)
+
+
+def test_parse_notification():
+    payload = {"Records": [
+        _record("inbox/a+b%2C1.txt"),
+        _record("inbox/b.txt", event="ObjectCreated:CompleteMultipartUpload"),
+        _record("inbox/c.txt", event="s3:ObjectRemoved:Delete"),
+    ]}
+    objects = parse_notification(payload)
+    assert [(obj.bucket, obj.key, obj.etag) for obj in objects] == [
+        ("docs", "inbox/a b,1.txt", "e1"),
+        ("docs", "inbox/b.txt", "e1"),
+    ]
+
+
+def test_submit_filters_dedupes_and_bounds_backlog(services, monkeypatch):
+    monkeypatch.setattr(settings, "PREPROCESS_MAX_BACKLOG", 2)
+    extract_service, _, _ = services
+    service = PreprocessService(extract_service)
+
+    assert service.submit(ObjectInfo("docs", "inbox/a.txt", 3, "e1", None))
+    assert not service.submit(ObjectInfo("docs", "inbox/a.txt", 3, "e1", None))
+    assert not service.submit(ObjectInfo("docs", "inbox/a.pdf", 3, "e1", None))
+    assert not service.submit(ObjectInfo("docs", "other/b.txt", 3, "e1", None))
+    # 内容变化（ETag 不同）时重新处理
+    assert service.submit(ObjectInfo("docs", "inbox/a.txt", 3, "e2", None))
+    assert not service.submit(ObjectInfo("docs", "inbox/c.txt", 3, "e1", None))
+
+    assert service.backlog == 2
+    assert metrics.get("preprocess_events_total", status="accepted") == 2
+    assert metrics.get("preprocess_events_total", status="duplicate") == 1
+    assert metrics.get("preprocess_events_total", status="filtered") == 2
+    assert metrics.get("preprocess_events_total", status="dropped") == 1
+
+
+def test_start_requires_parse_cache(services, monkeypatch):
+    monkeypatch.setattr(settings, "PARSE_CACHE_ENABLED", False)
+    _, service, _ = services
+    with pytest.raises(ValidationException):
+        service.start()
+    assert not service.is_leader
+
+
+@pytest.mark.asyncio
+async def test_bucket_notifications_warm_caches(services, monkeypatch):
+    monkeypatch.setattr(settings, "PREPROCESS_SOURCE", "minio")
+    monkeypatch.setattr(settings, "PREPROCESS_SCHEMAS", ["person"])
+    extract_service, service, calls = services
+    service.start()
+    try:
+        await _wait_until(lambda: mock_s3_server.subscribers() > 0)
+        mock_s3_server.put_object("docs", "inbox/a.txt", "张三".encode("utf-8"))
+        mock_s3_server.put_object("docs", "other/b.txt", "李四".encode("utf-8"))
+        await _wait_until(lambda: metrics.get("preprocess_objects_total", status="succeeded") == 1)
+    finally:
+        await service.stop()
+    assert calls == {"parse": ["docs/inbox/a.txt"], "llm": ["张三"]}
+
+    # 客户端以相同参数请求时直接命中结果缓存
+    request = ExtractRequest(
+        source="minio", file="docs/inbox/a.txt", schema=SCHEMA, provider="openai", model="gpt-4o-mini", filename="",
+    )
+    assert json.loads(await extract_service.extract_json(request)) == [
+        {"field": "name", "type": "text", "value": "张三"}
+    ]
+    assert metrics.get("result_cache_hits_total") == 1
+
+    # 其他 schema 或模型未预提取，但文本解析命中解析缓存
+    request = ExtractRequest(source="minio", file="docs/inbox/a.txt", schema=SCHEMA, provider="openai", filename="")
+    await extract_service.extract_json(request)
+    assert calls["parse"] == ["docs/inbox/a.txt"]
+    # 预提取与本次请求各命中一次
+    assert metrics.get("parse_cache_hits_total") == 2
+
+
+@pytest.mark.asyncio
+async def test_warmed_caches_are_shared_with_other_workers(services, monkeypatch):
+    monkeypatch.setattr(settings, "PREPROCESS_SCHEMAS", ["person"])
+    _, service, calls = services
+    etag = mock_s3_server.put_object("docs", "inbox/a.txt", "张三".encode("utf-8"))
+    assert await service.process(ObjectInfo("docs", "inbox/a.txt", 6, etag, None))
+
+    # 另一个 worker 的服务：结果与解析出的文本都直接命中预处理写入的共享缓存
+    other = ExtractService()
+    other.minio_service._client = None
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("不应重新解析或提取")
+
+    monkeypatch.setattr(other, "_extract_text", fail)
+    monkeypatch.setattr(other, "_extract_with_llm", fail)
+    request = ExtractRequest(
+        source="minio", file="docs/inbox/a.txt", schema=SCHEMA, provider="openai", model="gpt-4o-mini", filename="",
+    )
+    assert json.loads(await other.extract_json(request))[0]["value"] == "张三"
+    assert await other.parse_text("minio", "docs/inbox/a.txt", "张三".encode("utf-8"), "") == "张三"
+    assert calls == {"parse": ["docs/inbox/a.txt"], "llm": ["张三"]}
+
+
+@pytest.mark.asyncio
+async def test_overwritten_object_replaces_cached_result(services, monkeypatch):
+    monkeypatch.setattr(settings, "PREPROCESS_SCHEMAS", ["person"])
+    extract_service, service, calls = services
+    request = ExtractRequest(
+        source="minio", file="docs/inbox/a.txt", schema=SCHEMA, provider="openai", model="gpt-4o-mini", filename="",
+    )
+
+    etag = mock_s3_server.put_object("docs", "inbox/a.txt", "张三".encode("utf-8"))
+    assert await service.process(ObjectInfo("docs", "inbox/a.txt", 6, etag, None))
+    etag = mock_s3_server.put_object("docs", "inbox/a.txt", "李四".encode("utf-8"))
+    assert await service.process(ObjectInfo("docs", "inbox/a.txt", 6, etag, None))
+
+    assert json.loads(await extract_service.extract_json(request))[0]["value"] == "李四"
+    assert calls["llm"] == ["张三", "李四"]
+
+
+@pytest.mark.asyncio
+async def test_queue_dir_source_and_retry_after_failure(services, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PREPROCESS_SOURCE", "queue")
+    _, service, calls = services
+    events = tmp_path / "events"
+    events.mkdir()
+    # 对象尚不存在：下载失败，不计入去重记录
+    (events / "001.json").write_text(json.dumps({"Records": [_record("inbox/a.txt")]}), encoding="utf-8")
+    (events / "002.json").write_text("not json", encoding="utf-8")
+    service.start()
+    try:
+        await _wait_until(lambda: metrics.get("preprocess_objects_total", status="failed") == 1)
+        await _wait_until(lambda: not list(events.iterdir()))
+
+        mock_s3_server.put_object("docs", "inbox/a.txt", "张三".encode("utf-8"))
+        (events / "003.json").write_text(json.dumps({"Records": [_record("inbox/a.txt")]}), encoding="utf-8")
+        await _wait_until(lambda: metrics.get("preprocess_objects_total", status="succeeded") == 1)
+    finally:
+        await service.stop()
+    assert calls["parse"] == ["docs/inbox/a.txt"]
+    # 未开启预提取时只预热解析缓存
+    assert calls["llm"] == []
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_consumes_events(services, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PREPROCESS_SOURCE", "queue")
+    extract_service, first, calls = services
+    second = PreprocessService(extract_service, first.schema_registry)
+    events = tmp_path / "events"
+    events.mkdir()
+    first.start()
+    second.start()
+    try:
+        assert first.is_leader and not second.is_leader
+        mock_s3_server.put_object("docs", "inbox/a.txt", "张三".encode("utf-8"))
+        (events / "001.json").write_text(json.dumps({"Records": [_record("inbox/a.txt")]}), encoding="utf-8")
+        await _wait_until(lambda: metrics.get("preprocess_objects_total", status="succeeded") == 1)
+
+        # 持有者停止后由等待中的 worker 接管
+        await first.stop()
+        await _wait_until(lambda: second.is_leader)
+        mock_s3_server.put_object("docs", "inbox/b.txt", "李四".encode("utf-8"))
+        (events / "002.json").write_text(json.dumps({"Records": [_record("inbox/b.txt")]}), encoding="utf-8")
+        await _wait_until(lambda: metrics.get("preprocess_objects_total", status="succeeded") == 2)
+    finally:
+        await first.stop()
+        await second.stop()
+    assert calls["parse"] == ["docs/inbox/a.txt", "docs/inbox/b.txt"]
+    assert not second.is_leader
+
+
+@pytest.mark.asyncio
+async def test_minio_coalesce_key_follows_object_etag(services):
+    extract_service, _, _ = services
+    request = ExtractRequest(source="minio", file="docs/inbox/a.txt", schema=SCHEMA, provider="openai", filename="")
+
+    mock_s3_server.put_object("docs", "inbox/a.txt", "张三".encode("utf-8"))
+    first = await extract_service._coalesce_key(request)
+    assert await extract_service._coalesce_key(request) == first
+    mock_s3_server.put_object("docs", "inbox/a.txt", "李四".encode("utf-8"))
+    assert await extract_service._coalesce_key(request) != first
+
+
+@pytest.mark.asyncio
+async def test_result_cache_does_not_serve_overwritten_minio_object(services):
+    extract_service, _, calls = services
+    request = ExtractRequest(source="minio", file="docs/inbox/a.txt", schema=SCHEMA, provider="openai", filename="")
+
+    mock_s3_server.put_object("docs", "inbox/a.txt", "张三".encode("utf-8"))
+    assert json.loads(await extract_service.extract_json(request))[0]["value"] == "张三"
+    assert json.loads(await extract_service.extract_json(request))[0]["value"] == "张三"
+    assert metrics.get("result_cache_hits_total") == 1
+
+    mock_s3_server.put_object("docs", "inbox/a.txt", "李四".encode("utf-8"))
+    assert json.loads(await extract_service.extract_json(request))[0]["value"] == "李四"
+    assert calls["llm"] == ["张三", "李四"]
@@ -0,0 +1,63 @@
+"""
+请求级性能分析测试
+"""
+import json
+import time
+
+import pytest
+
+from app.core import profiling, settings
+
+
+class TestProfiling:
+    """采样分析器与阶段计时测试"""
+
+    def test_stage_is_noop_without_session(self):
+        """未开启分析时 stage 不记录任何内容"""
+        with profiling.stage("noop"):
+            pass
+        assert profiling._current_session.get() is None
+
+    def test_should_profile_disabled(self, monkeypatch):
+        """总开关关闭时即使携带令牌也不分析"""
+        monkeypatch.setattr(settings, "PROFILE_ENABLED", False)
+        monkeypatch.setattr(settings, "PROFILE_ADMIN_TOKEN", "secret")
+        assert not profiling.should_profile({profiling.PROFILE_HEADER: "secret"})
+
+    def test_should_profile_admin_token(self, monkeypatch):
+        """管理员令牌匹配时开启分析"""
+        monkeypatch.setattr(settings, "PROFILE_ENABLED", True)
+        monkeypatch.setattr(settings, "PROFILE_ADMIN_TOKEN", "secret")
+        monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+        assert profiling.should_profile({profiling.PROFILE_HEADER: "secret"})
+        assert not profiling.should_profile({profiling.PROFILE_HEADER: "wrong"})
+        assert not profiling.should_profile({})
+
+    @pytest.mark.asyncio
+    async def test_session_writes_profile_and_summary(self, monkeypatch, tmp_path):
+        """分析会话写入 speedscope 文件与阶段汇总"""
+        monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+        monkeypatch.setattr(settings, "PROFILE_INTERVAL_MS", 1.0)
+
+        session = profiling.start_session("test")
+        with profiling.stage("busy"):
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+        path = await profiling.finish_session(session)
+
+        data = json.loads(path.read_text(encoding="utf-8"))
+        assert data["profiles"][0]["type"] == "sampled"
+        summary = json.loads(
+            (tmp_path / f"{session.profile_id}.stages.json").read_text(encoding="utf-8")
+        )
+        assert "busy" in summary["stage_totals_ms"]
+        assert summary["samples"] > 0
+
+    def test_retention_bound(self, tmp_path):
+        """超出保留数量的旧分析文件被清理"""
+        for i in range(5):
+            session = profiling.ProfileSession(f"req-{i}", 0.001)
+            session.write(str(tmp_path), max_files=3)
+        assert len(list(tmp_path.glob("*.speedscope.json"))) == 3
+        assert len(list(tmp_path.glob("*.stages.json"))) == 3
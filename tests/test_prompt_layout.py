@@ -0,0 +1,74 @@
+"""
+Prompt 布局与 token 用量指标测试
+"""
+import pytest
+
+from app.core import settings
+from app.core.metrics import MetricsRegistry
+from app.llm.base import LLMCompletion, PROMPT_LAYOUT_LEGACY, PROMPT_LAYOUT_PREFIX_CACHE
+from app.llm.openai_chat import build_messages
+from app.models import SchemaField
+
+SCHEMA = [
+    SchemaField(name="人名", field="name", type="text", required=True),
+    SchemaField(name="年龄", field="age", type="int", required=True),
+]
+
+
+@pytest.fixture
+def layout(monkeypatch):
+    def _set(value: str):
+        monkeypatch.setattr(settings, "PROMPT_LAYOUT", value)
+    return _set
+
+
+def _openai_llm(monkeypatch):
+    from app.llm.openai_llm import OpenAILLM
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    return OpenAILLM()
+
+
+def test_prefix_cache_static_prefix_is_document_independent(layout, monkeypatch):
+    """prefix_cache 布局下不同文档共享逐字节一致的 system 前缀"""
+    layout(PROMPT_LAYOUT_PREFIX_CACHE)
+    llm = _openai_llm(monkeypatch)
+    first = build_messages(llm._build_prompt_parts("文档一", SCHEMA))
+    second = build_messages(llm._build_prompt_parts("文档二", SCHEMA))
+
+    assert first[0] == second[0]
+    assert "values[2]{field,type,value}:" in first[0]["content"]
+    assert "文档一" in first[1]["content"]
+
+
+def test_legacy_layout_keeps_single_prompt(layout, monkeypatch):
+    """legacy 布局保持原有单段 Prompt"""
+    layout(PROMPT_LAYOUT_LEGACY)
+    llm = _openai_llm(monkeypatch)
+    parts = llm._build_prompt_parts("文档一", SCHEMA)
+
+    assert parts.static == ""
+    assert parts.text == llm._build_prompt("文档一", SCHEMA)
+
+
+def test_claude_marks_static_block_cacheable(layout):
+    """Claude 的静态 system 块带 cache_control"""
+    pytest.importorskip("anthropic")
+    from app.llm.claude_llm import ClaudeLLM
+
+    layout(PROMPT_LAYOUT_PREFIX_CACHE)
+    llm = ClaudeLLM(api_key="test")
+    system = llm._build_system(llm._build_prompt_parts("文档一", SCHEMA))
+
+    assert isinstance(system, list)
+    assert "cache_control" not in system[0]
+    assert system[-1]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_usage_metrics_render():
+    """缓存命中 token 计入指标并以 Prometheus 格式导出"""
+    registry = MetricsRegistry()
+    completion = LLMCompletion("", input_tokens=100, output_tokens=10, cached_tokens=80)
+    registry.inc("llm_cached_input_tokens_total", completion.cached_tokens, provider="openai", model="m")
+
+    assert registry.get("llm_cached_input_tokens_total", provider="openai", model="m") == 80
+    assert 'llm_cached_input_tokens_total{model="m",provider="openai"} 80' in registry.render_prometheus()
@@ -0,0 +1,251 @@
+"""
+RPM/TPM 配额调度测试
+"""
+import asyncio
+import fcntl
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from app.core import settings, ConcurrencyLimitException, RateLimitException
+from app.core.metrics import metrics
+from app.llm import base
+from app.llm.ratelimit import (
+    FileCounterStore,
+    MemoryCounterStore,
+    RateLimiter,
+    RedisCounterStore,
+    estimate_tokens,
+)
+
+
+class RespStandIn:
+    """本地 Redis 替身：实现 INCRBY / EXPIRE / AUTH / SELECT / PING"""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.server = None
+        self.port = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _read_command(self, reader):
+        header = await reader.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2].decode())
+        return args
+
+    async def _handle(self, reader, writer):
+        while True:
+            command = await self._read_command(reader)
+            if command is None:
+                break
+            self.commands.append(command[0].upper())
+            name = command[0].upper()
+            if name == "INCRBY":
+                self.data[command[1]] = self.data.get(command[1], 0) + int(command[2])
+                writer.write(b":%d\r\n" % self.data[command[1]])
+            elif name == "EXPIRE":
+                writer.write(b":1\r\n")
+            elif name in ("AUTH", "SELECT"):
+                writer.write(b"+OK\r\n")
+            elif name == "PING":
+                writer.write(b"+PONG\r\n")
+            else:
+                writer.write(b"-ERR unknown command\r\n")
+            await writer.drain()
+        writer.close()
+
+
+@pytest.fixture
+def quotas(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RATE_LIMITS", {
+        "openai": {"rpm": 60, "tpm": 6000},
+        "azure:gpt-4o": {"rpm": 6},
+    })
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("张三住在北京") == 6
+
+
+def test_quota_lookup(quotas):
+    assert RateLimiter.quota("openai", "gpt-4o-mini") == {"rpm": 60, "tpm": 6000}
+    assert RateLimiter.quota("azure", "gpt-4o") == {"rpm": 6}
+    assert RateLimiter.quota("azure", "other") is None
+
+
+@pytest.mark.asyncio
+async def test_requests_within_window_then_scheduled(quotas):
+    """每 10 秒窗口 1 个请求（rpm=6）：第二个请求预约到下一个窗口"""
+    limiter = RateLimiter(MemoryCounterStore(), window=10)
+    first = await limiter.acquire("azure", "gpt-4o", "-", 100, max_wait=0)
+    assert first.wait == 0
+    with pytest.raises(RateLimitException):
+        await limiter.acquire("azure", "gpt-4o", "-", 100, max_wait=0)
+    reservation = await limiter._reserve("azure:gpt-4o:-", {"rpm": 6}, 100, max_wait=30)
+    assert 0 < reservation.wait <= 10
+
+
+@pytest.mark.asyncio
+async def test_token_quota_and_settle(quotas):
+    limiter = RateLimiter(MemoryCounterStore(), window=10)
+    # 每窗口 1000 token
+    reservation = await limiter.acquire("openai", "m", "-", 900, max_wait=0)
+    with pytest.raises(RateLimitException):
+        await limiter.acquire("openai", "m", "-", 200, max_wait=0)
+    # 实际只用了 300，释放的配额可供后续请求使用
+    await limiter.settle(reservation, 300)
+    assert await limiter.acquire("openai", "m", "-", 600, max_wait=0) is not None
+
+
+@pytest.mark.asyncio
+async def test_oversized_request_fits_empty_window(quotas):
+    limiter = RateLimiter(MemoryCounterStore(), window=10)
+    assert await limiter.acquire("openai", "m", "-", 5000, max_wait=0) is not None
+
+
+@pytest.mark.asyncio
+async def test_keys_are_separate_per_credential(quotas):
+    limiter = RateLimiter(MemoryCounterStore(), window=10)
+    await limiter.acquire("azure", "gpt-4o", "key-a", 1, max_wait=0)
+    assert await limiter.acquire("azure", "gpt-4o", "key-b", 1, max_wait=0) is not None
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_next_window(quotas):
+    limiter = RateLimiter(MemoryCounterStore(), window=0.2)
+    # rpm=6 折算为每窗口至少 1 个
+    await limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=1)
+    started = time.monotonic()
+    reservation = await limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=1)
+    assert reservation.wait > 0
+    assert time.monotonic() - started >= reservation.wait * 0.9
+
+
+@pytest.mark.asyncio
+async def test_release_refunds_unsent_reservation(quotas):
+    limiter = RateLimiter(MemoryCounterStore(), window=10)
+    reservation = await limiter.acquire("openai", "m", "-", 900, max_wait=0)
+    await limiter.release(reservation)
+    await limiter.release(reservation)  # 重复退还无效
+    assert await limiter.acquire("openai", "m", "-", 1000, max_wait=0) is not None
+    with pytest.raises(RateLimitException):
+        await limiter.acquire("openai", "m", "-", 1, max_wait=0)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_wait_refunds_reservation(quotas):
+    limiter = RateLimiter(MemoryCounterStore(), window=0.5)
+    await limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=0)
+    task = asyncio.ensure_future(limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=1))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # 被取消的请求不再占用下一个窗口
+    reservation = await limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=1)
+    assert reservation.wait > 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_timeout_refunds_quota(quotas, monkeypatch, fake_llm):
+    class Rejecting:
+        async def acquire(self, timeout):
+            raise ConcurrencyLimitException("排队超时")
+
+    class Limiters:
+        def get(self, provider, model):
+            return Rejecting()
+
+    limiter = RateLimiter(MemoryCounterStore(), window=10)
+    monkeypatch.setattr(base, "rate_limiter", limiter)
+    monkeypatch.setattr(base, "concurrency_limiters", Limiters())
+    monkeypatch.setattr(settings, "LLM_LIMITER_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    parts = base.PromptParts("system", "static", "document")
+    llm = fake_llm(provider="azure")
+    for _ in range(3):
+        with pytest.raises(ConcurrencyLimitException):
+            await llm._call_model(parts, None, "gpt-4o")
+    assert llm.calls == []
+    # 三次调用都未发出，rpm=6（每窗口 1 个）的配额仍可用
+    assert await limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=0) is not None
+
+
+@pytest.mark.asyncio
+async def test_file_store_does_not_block_event_loop(tmp_path):
+    path = str(tmp_path / "counters.json")
+    store = FileCounterStore(path)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        task = asyncio.ensure_future(store.incr("k", 1, 60))
+        # 锁被其他 worker 持有时事件循环仍可调度
+        await asyncio.wait_for(asyncio.sleep(0.05), 1)
+        assert not task.done()
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    assert await asyncio.wait_for(task, 5) == 1
+
+
+@pytest.mark.asyncio
+async def test_no_quota_is_noop():
+    limiter = RateLimiter(MemoryCounterStore(), window=10)
+    assert await limiter.acquire("gemini", "m", "-", 10 ** 9) is None
+
+
+@pytest.mark.asyncio
+async def test_backend_errors_fail_open(quotas):
+    metrics.reset()
+    limiter = RateLimiter(RedisCounterStore("redis://127.0.0.1:1/0"), window=10)
+    assert await limiter.acquire("openai", "m", "-", 1, max_wait=0) is None
+    assert metrics.get("llm_rate_limit_backend_errors_total", provider="openai", model="m") == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_store_against_stand_in(quotas):
+    async with RespStandIn() as server:
+        store = RedisCounterStore(f"redis://:secret@127.0.0.1:{server.port}/2")
+        limiter = RateLimiter(store, window=10)
+        await limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=0)
+        with pytest.raises(RateLimitException):
+            await limiter.acquire("azure", "gpt-4o", "-", 1, max_wait=0)
+        await store.close()
+    assert server.commands[:2] == ["AUTH", "SELECT"]
+    assert "INCRBY" in server.commands and "EXPIRE" in server.commands
+    assert all(value in (0, 1) for value in server.data.values())
+
+
+def _hammer(path, count):
+    store = FileCounterStore(path)
+    for _ in range(count):
+        asyncio.run(store.incr("shared", 1, 60))
+
+
+def test_file_store_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "counters.json")
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_hammer, args=(path, 25)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert asyncio.run(FileCounterStore(path).incr("shared", 0, 60)) == 100
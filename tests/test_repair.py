@@ -0,0 +1,158 @@
+"""
+LLM 响应修复测试
+"""
+import pytest
+
+from app.core import settings, LLMException
+from app.core.metrics import metrics
+from app.llm.repair import (
+    REPAIR_COLUMN_REALIGN,
+    REPAIR_COUNT_FIX,
+    REPAIR_JSON,
+    REPAIR_MARKDOWN,
+    REPAIR_PARTIAL,
+    repair_values,
+)
+from app.models import SchemaField
+from app.utils.compiled_schema import compile_fields
+
+SCHEMA = [
+    SchemaField(name="人名", field="name", type="text"),
+    SchemaField(name="年龄", field="age", type="int"),
+    SchemaField(name="地址", field="address", type="text"),
+]
+COMPILED = compile_fields(SCHEMA)
+
+
+def _values(result):
+    return {row["field"]: row["value"] for row in result.rows}
+
+
+def test_valid_response_needs_no_repair():
+    result = repair_values("values[1]{field,type,value}:\n  name,text,张三", COMPILED)
+    assert result.kinds == []
+    assert result.missing == ["age", "address"]
+
+
+def test_count_fix():
+    text = "```toon\nvalues[5]{field,type,value}:\n  name,text,张三\n  age,int,32\n  address,text,北京\n```"
+    result = repair_values(text, COMPILED)
+    assert result.kinds == [REPAIR_COUNT_FIX]
+    assert _values(result) == {"name": "张三", "age": 32, "address": "北京"}
+
+
+def test_column_realign_for_unquoted_delimiter():
+    text = "values[3]{field,type,value}:\n  name,text,张三\n  age,32\n  address,text,北京市, 朝阳区, 建国路"
+    result = repair_values(text, COMPILED)
+    assert REPAIR_COLUMN_REALIGN in result.kinds
+    assert _values(result) == {"name": "张三", "age": 32, "address": "北京市, 朝阳区, 建国路"}
+
+
+def test_partial_salvage():
+    text = "values[3]{field,type,value}:\n  name,text,张三\n  ???,oops\n  age,int,32\n以上为结果。"
+    result = repair_values(text, COMPILED)
+    assert REPAIR_PARTIAL in result.kinds
+    assert _values(result) == {"name": "张三", "age": 32}
+    assert result.missing == ["address"]
+
+
+@pytest.mark.parametrize("text", [
+    '```json\n{"values": [{"field": "name", "value": "张三"}, {"field": "age", "type": "int", "value": 32}]}\n```',
+    '结果如下：{"人名": "张三", "age": 32}',
+])
+def test_json_fallback(text):
+    result = repair_values(text, COMPILED)
+    assert result.kinds == [REPAIR_JSON]
+    assert _values(result) == {"name": "张三", "age": 32}
+    assert result.rows[0]["type"] == "text"
+
+
+@pytest.mark.parametrize("text", [
+    "| field | type | value |\n|---|---|---|\n| name | text | 张三 |\n| age | int | 32 |",
+    "| 人名 | 年龄 |\n| --- | --- |\n| 张三 | 32 |",
+])
+def test_markdown_fallback(text):
+    result = repair_values(text, COMPILED)
+    assert result.kinds == [REPAIR_MARKDOWN]
+    assert _values(result) == {"name": "张三", "age": 32}
+
+
+def test_repaired_rows_reencode_as_valid_toon():
+    result = repair_values('{"name": "a, \\"b\\"", "age": null}', COMPILED)
+    assert repair_values(result.to_toon(), COMPILED).rows == result.rows
+
+
+@pytest.mark.asyncio
+async def test_requery_only_missing_fields(fake_llm):
+    """本地修复后仍缺失的字段才重新询问模型"""
+    metrics.reset()
+    llm = fake_llm([
+        "values[3]{field,type,value}:\n  name,text,张三\n  ???\n",
+        "values[2]{field,type,value}:\n  age,int,32\n  address,text,北京",
+    ])
+    values = await llm.extract(content="文档", image=None, schema=SCHEMA, model="m")
+
+    assert {v.field: v.value for v in values} == {"name": "张三", "age": 32, "address": "北京"}
+    assert len(llm.calls) == 2
+    assert "人名" not in llm.calls[1].text and "年龄" in llm.calls[1].text
+    assert metrics.get("llm_response_repairs_total", provider="openai", kind="requery") == 1
+
+
+@pytest.mark.asyncio
+async def test_requeried_fields_keep_schema_order(fake_llm):
+    """重新询问得到的字段按 schema 顺序合并，而不是追加在末尾"""
+    llm = fake_llm([
+        "values[3]{field,type,value}:\n  age,int,32\n  address,text,北京\n",
+        "values[1]{field,type,value}:\n  name,text,张三",
+    ])
+    values = await llm.extract(content="文档", image=None, schema=SCHEMA, model="m")
+
+    assert [v.field for v in values] == ["name", "age", "address"]
+    assert len(llm.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_requery_fields_left_out_of_valid_table(fake_llm):
+    """格式正确但漏掉字段的表格同样只重新询问漏掉的字段"""
+    metrics.reset()
+    llm = fake_llm([
+        "values[1]{field,type,value}:\n  name,text,张三",
+        "values[2]{field,type,value}:\n  age,int,32\n  address,text,北京",
+    ])
+    values = await llm.extract(content="文档", image=None, schema=SCHEMA, model="m")
+
+    assert [(v.field, v.value) for v in values] == [("name", "张三"), ("age", 32), ("address", "北京")]
+    assert len(llm.calls) == 2
+    assert "人名" not in llm.calls[1].text and "地址" in llm.calls[1].text
+    assert metrics.get("llm_response_repairs_total", provider="openai", kind="requery") == 1
+
+
+@pytest.mark.asyncio
+async def test_repair_disabled_raises(monkeypatch, fake_llm):
+    monkeypatch.setattr(settings, "LLM_REPAIR_ENABLED", False)
+    llm = fake_llm(["values[9]{field,type,value}:\n  name,text,张三"])
+    with pytest.raises(LLMException):
+        await llm.extract(content="文档", image=None, schema=SCHEMA, model="m")
+
+
+@pytest.mark.asyncio
+async def test_requery_fields_failing_validation(fake_llm):
+    """值未通过 schema 类型校验的字段重新询问；仍无效时保留原始文本"""
+    metrics.reset()
+    schema = SCHEMA + [SchemaField(name="生日", field="birthday", type="date")]
+    llm = fake_llm([
+        "values[4]{field,type,value}:\n  name,text,张三\n  age,text,三十二\n  address,text,北京\n  birthday,text,1992年3月5日",
+        "values[1]{field,type,value}:\n  age,int,未知",
+    ])
+    values = await llm.extract(content="文档", image=None, schema=schema, model="m")
+
+    # 按 schema 声明的类型转换，而不是模型回显的类型
+    assert [(v.field, v.type, v.value) for v in values] == [
+        ("name", "text", "张三"),
+        ("age", "int", "三十二"),
+        ("address", "text", "北京"),
+        ("birthday", "date", "1992-03-05"),
+    ]
+    assert len(llm.calls) == 2
+    assert "年龄" in llm.calls[1].text and "生日" not in llm.calls[1].text
+    assert metrics.get("llm_invalid_values_total", provider="openai", type="int") == 2
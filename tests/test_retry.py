@@ -0,0 +1,138 @@
+"""
+LLM 调用重试策略测试
+"""
+import asyncio
+
+import anthropic
+import httpx
+import openai
+import pytest
+
+from app.core.deadline import request_budget
+from app.core.metrics import metrics
+from app.llm.retry import (
+    ERROR_AUTH,
+    ERROR_CONNECTION,
+    ERROR_CONTENT_FILTER,
+    ERROR_CONTEXT_LENGTH,
+    ERROR_RATE_LIMIT,
+    ERROR_SERVER,
+    ERROR_TIMEOUT,
+    RetryPolicy,
+    call_with_retry,
+    classify_error,
+)
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+
+
+def _response(status: int, headers=None) -> httpx.Response:
+    return httpx.Response(status, headers=headers or {}, request=REQUEST)
+
+
+@pytest.mark.parametrize("exc, kind, retry_after", [
+    (openai.RateLimitError("rate", response=_response(429, {"retry-after": "2"}), body=None), ERROR_RATE_LIMIT, 2.0),
+    (openai.RateLimitError("rate", response=_response(429, {"retry-after-ms": "1500"}), body=None), ERROR_RATE_LIMIT, 1.5),
+    (anthropic.InternalServerError("overloaded", response=_response(529), body=None), ERROR_SERVER, None),
+    (openai.APITimeoutError(request=REQUEST), ERROR_TIMEOUT, None),
+    (openai.APIConnectionError(request=REQUEST), ERROR_CONNECTION, None),
+    (asyncio.TimeoutError(), ERROR_TIMEOUT, None),
+    (openai.BadRequestError(
+        "This model's maximum context length is 128000 tokens", response=_response(400), body=None,
+    ), ERROR_CONTEXT_LENGTH, None),
+    (openai.BadRequestError(
+        "The response was filtered due to the prompt triggering content management policy",
+        response=_response(400), body=None,
+    ), ERROR_CONTENT_FILTER, None),
+    (anthropic.AuthenticationError("invalid x-api-key", response=_response(401), body=None), ERROR_AUTH, None),
+])
+def test_classify_error(exc, kind, retry_after):
+    assert classify_error(exc) == (kind, retry_after)
+
+
+def _flaky(errors, result="ok"):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return fn, calls
+
+
+FAST = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.01)
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors():
+    metrics.reset()
+    fn, calls = _flaky([
+        openai.InternalServerError("boom", response=_response(503), body=None),
+        openai.APIConnectionError(request=REQUEST),
+    ])
+    assert await call_with_retry(fn, provider="openai", policy=FAST) == "ok"
+    assert len(calls) == 3
+    assert metrics.get("llm_retries_total", provider="openai", kind=ERROR_SERVER) == 1
+    assert metrics.get("llm_retries_total", provider="openai", kind=ERROR_CONNECTION) == 1
+
+
+@pytest.mark.asyncio
+async def test_fatal_error_is_not_retried():
+    fn, calls = _flaky([anthropic.AuthenticationError("bad key", response=_response(401), body=None)])
+    with pytest.raises(anthropic.AuthenticationError):
+        await call_with_retry(fn, provider="claude", policy=FAST)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_attempts_exhausted():
+    metrics.reset()
+    fn, calls = _flaky([openai.APITimeoutError(request=REQUEST)] * 5)
+    with pytest.raises(openai.APITimeoutError):
+        await call_with_retry(fn, provider="openai", policy=FAST)
+    assert len(calls) == 3
+    assert metrics.get("llm_retry_giveups_total", provider="openai", reason="attempts") == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_beyond_deadline_gives_up():
+    """Retry-After 超过剩余时间时不再等待"""
+    metrics.reset()
+    error = openai.RateLimitError("rate", response=_response(429, {"retry-after": "30"}), body=None)
+    fn, calls = _flaky([error])
+    with request_budget(timeout=1.0):
+        with pytest.raises(openai.RateLimitError):
+            await call_with_retry(fn, provider="openai", policy=FAST)
+    assert len(calls) == 1
+    assert metrics.get("llm_retry_giveups_total", provider="openai", reason="deadline") == 1
+
+
+@pytest.mark.asyncio
+async def test_request_retry_budget_is_shared():
+    """同一请求内的多次调用共享重试预算"""
+    with request_budget(retries=1):
+        first, _ = _flaky([openai.APIConnectionError(request=REQUEST)])
+        assert await call_with_retry(first, provider="openai", policy=FAST) == "ok"
+
+        second, calls = _flaky([openai.APIConnectionError(request=REQUEST)])
+        with pytest.raises(openai.APIConnectionError):
+            await call_with_retry(second, provider="openai", policy=FAST)
+        assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_attempt_bounded_by_deadline():
+    async def slow():
+        await asyncio.sleep(5)
+
+    with request_budget(timeout=0.05):
+        with pytest.raises(asyncio.TimeoutError):
+            await call_with_retry(slow, provider="openai", policy=FAST)
+
+
+def test_backoff_honours_retry_after_and_cap():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=2.0)
+    assert all(0 <= policy.backoff(attempt) <= 2.0 for attempt in range(1, 10))
+    assert 3.0 <= policy.backoff(1, retry_after=3.0) <= 3.5
@@ -0,0 +1,128 @@
+"""
+模型路由测试
+"""
+import pytest
+
+from app.core import settings, LLMException, ValidationException
+from app.core.response_metadata import collect_metadata
+from app.llm.base import ModelInfo
+from app.llm.circuit import circuit_breakers
+from app.llm.router import ModelRouter
+from app.llm.stats import ModelHealth
+from app.models import ExtractRequest, SchemaField
+from app.services.extract_service import ExtractService
+
+CATALOG = {
+    "openai": [
+        ModelInfo(name="mini", display_name="mini", provider="openai", max_tokens=128000,
+                  capabilities=["text", "vision"], cost_per_1k_input=0.00015, cost_per_1k_output=0.0006),
+        ModelInfo(name="big", display_name="big", provider="openai", max_tokens=128000,
+                  capabilities=["text", "vision"], cost_per_1k_input=0.0025, cost_per_1k_output=0.01),
+    ],
+    "claude": [
+        ModelInfo(name="haiku", display_name="haiku", provider="claude", max_tokens=200000,
+                  capabilities=["text"], cost_per_1k_input=0.00025, cost_per_1k_output=0.00125),
+    ],
+    "custom": [
+        ModelInfo(name="local", display_name="local", provider="custom", max_tokens=4096,
+                  capabilities=["text"], cost_per_1k_input=0.0, cost_per_1k_output=0.0),
+        ModelInfo(name="gpt-3.5-turbo", display_name="gpt-3.5", provider="custom", max_tokens=4096,
+                  capabilities=["text"], cost_per_1k_input=0.0015, cost_per_1k_output=0.002),
+    ],
+}
+
+
+@pytest.fixture
+def health():
+    return ModelHealth()
+
+
+@pytest.fixture
+def router(health):
+    circuit_breakers.reset()
+    yield ModelRouter(lambda provider: CATALOG.get(provider, []), health)
+    circuit_breakers.reset()
+
+
+def _route(router, providers=("openai", "claude"), **kwargs):
+    options = dict(model=None, text="合同正文" * 100, image=None, field_count=5)
+    options.update(kwargs)
+    return router.route(list(providers), **options)
+
+
+def test_picks_cheapest_capable_model(router):
+    decision = _route(router)
+    assert (decision.provider, decision.model) == ("openai", "mini")
+    assert decision.candidates == 3
+    assert decision.estimated_cost > 0
+
+
+def test_image_requires_vision(router):
+    decision = _route(router, providers=["claude", "openai"], image=b"\x89PNG")
+    assert decision.provider == "openai"
+    assert decision.rejected == {"claude/haiku": "no_vision"}
+
+
+def test_long_document_excludes_small_context(router, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_ROUTER_MODELS", {"custom": ["local"]})
+    decision = _route(router, providers=["custom", "claude"], text="x" * 40000)
+    assert decision.model == "haiku"
+    assert decision.rejected["custom/local"] == "context_length"
+
+
+def test_custom_defaults_to_configured_model(router, monkeypatch):
+    monkeypatch.setattr(settings, "CUSTOM_MODEL", "gpt-3.5-turbo")
+    assert [m.name for m in router.catalog("custom")] == ["gpt-3.5-turbo"]
+
+
+def test_max_cost_constraint(router):
+    decision = _route(router, providers=["openai"], model="big", max_cost=1.0)
+    assert decision.model == "big"
+    with pytest.raises(ValidationException):
+        _route(router, providers=["openai"], model="big", max_cost=1e-6)
+
+
+def test_latency_slo_and_error_rate(router, health):
+    for _ in range(5):
+        health.record("openai", "mini", 20.0, False)
+        health.record("claude", "haiku", 2.0, False)
+    decision = _route(router, latency_slo=10.0)
+    assert decision.model == "haiku"
+    assert decision.rejected["openai/mini"] == "latency_slo"
+    assert decision.expected_latency == 2.0
+
+    # 错误率高的模型被折算为更贵
+    for _ in range(10):
+        health.record("claude", "haiku", None, True)
+    decision = _route(router, providers=["openai", "claude"], text="")
+    assert decision.model != "haiku"
+
+
+def test_open_circuit_is_skipped(router, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CIRCUIT_MIN_REQUESTS", 1)
+    circuit_breakers.get("openai", "mini").on_failure()
+    decision = _route(router)
+    assert decision.model != "mini"
+    assert decision.rejected["openai/mini"] == "circuit_open"
+
+
+def test_no_candidates(router):
+    with pytest.raises(LLMException):
+        _route(router, providers=["gemini"])
+
+
+def test_service_routes_and_records_metadata(router, monkeypatch):
+    service = ExtractService()
+    service.router = router
+    request = ExtractRequest(
+        source="file",
+        file="文档",
+        schema=[SchemaField(name="人名", field="name", type="text")],
+        provider="auto",
+        max_cost=0.01,
+    )
+    monkeypatch.setattr(settings, "LLM_ROUTER_PROVIDERS", ["openai", "claude"])
+    with collect_metadata() as metadata:
+        decision = service._route(request, "文档", None)
+    assert metadata["route"]["provider"] == decision.provider == "openai"
+    assert metadata["route"]["model"] == "mini"
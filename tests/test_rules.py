@@ -0,0 +1,170 @@
+"""
+规则预提取测试
+"""
+import pytest
+
+from app.core import settings, ValidationException
+from app.core.metrics import metrics
+from app.core.response_metadata import collect_metadata
+from app.models import ExtractRequest, ExtractedValue, SchemaField
+from app.services.extract_service import ExtractService
+from app.utils.rules import MATCHERS, infer_matcher, prefill
+
+DOCUMENT = """统一社会信用代码：91350100M000100Y43
+法定代表人身份证：11010519491231002X
+电话：+86 13900000000，13812345678
+签订日期：2024年3月5日，到期日期：2025-03-04
+合同金额：1,200,000.00元（含税）
+甲方：某某科技有限公司"""
+
+
+def _field(name, field, type="text", **kwargs):
+    return SchemaField(name=name, field=field, type=type, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def rules(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(settings, "RULES_ENABLED", True)
+    monkeypatch.setattr(settings, "RULES_INFER", True)
+    monkeypatch.setattr(settings, "RULES_LABEL_WINDOW", 12)
+
+
+def test_checksums():
+    assert MATCHERS["id_card"].candidates("11010519491231002X") == [(0, "11010519491231002X")]
+    # 校验位错误或出生日期无效
+    assert MATCHERS["id_card"].candidates("110105194912310021") == []
+    assert MATCHERS["id_card"].candidates("11010519491331002X") == []
+    assert MATCHERS["uscc"].candidates("代码91350100M000100Y43") == [(2, "91350100M000100Y43")]
+    assert MATCHERS["uscc"].candidates("91350100M000100Y44") == []
+
+
+def test_infer_matcher():
+    assert infer_matcher(_field("身份证号", "ownerId")) == "id_card"
+    assert infer_matcher(_field("证件", "idCard")) == "id_card"
+    assert infer_matcher(_field("联系方式", "contact")) == "phone"
+    assert infer_matcher(_field("酒店名称", "hotelName")) is None
+    assert infer_matcher(_field("生效", "effective", "date")) == "date"
+    assert infer_matcher(_field("合同金额", "total", "float")) == "amount"
+    # 类型不符时不推断
+    assert infer_matcher(_field("合同金额", "total", "boolean")) is None
+
+
+def test_prefill_fills_confident_fields_only():
+    fields = [
+        _field("统一社会信用代码", "creditCode"),
+        _field("身份证", "idNo"),
+        _field("联系电话", "phone"),
+        _field("签订日期", "signDate", "date"),
+        _field("日期", "anyDate", "date"),
+        _field("合同金额", "amount", "float"),
+        _field("甲方", "partyA"),
+    ]
+    hits, remaining = prefill(DOCUMENT, fields)
+
+    assert {field: value.value for field, value in hits.items()} == {
+        "creditCode": "91350100M000100Y43",
+        "idNo": "11010519491231002X",
+        "signDate": "2024-03-05",
+        "amount": 1200000.0,
+    }
+    # 两个不同的电话、两个带"日期"的取值均有歧义，交给 LLM
+    assert [f.field for f in remaining] == ["phone", "anyDate", "partyA"]
+    assert metrics.get("rule_prefill_hits_total", field="idNo", rule="id_card") == 1
+    assert metrics.get("rule_prefill_attempts_total", field="phone", rule="phone") == 1
+    assert metrics.get("rule_prefill_hits_total", field="phone", rule="phone") == 0
+
+
+def test_standalone_hits_need_a_sole_field_and_its_label():
+    text = "甲方：张三\n乙方：李四\n联系方式如下\n13900000000\n11010519491231002X"
+    # 多个字段共用同一匹配器时，不能把全文唯一的值填给每个字段
+    fields = [
+        _field("甲方电话", "phoneA"),
+        _field("乙方电话", "phoneB"),
+        _field("甲方身份证", "idA"),
+        _field("乙方身份证", "idB"),
+    ]
+    hits, remaining = prefill(text, fields)
+    assert hits == {}
+    assert len(remaining) == 4
+
+    # 唯一使用该匹配器的字段，且文中出现了字段名
+    hits, _ = prefill(text, [_field("联系方式", "phone")])
+    assert hits["phone"].value == "13900000000"
+    # 文中没有字段名
+    hits, _ = prefill(text, [_field("联系电话", "phone")])
+    assert hits == {}
+
+
+def test_infer_is_opt_in():
+    assert type(settings).model_fields["RULES_INFER"].default is False
+
+
+def test_declared_pattern_and_matcher(monkeypatch):
+    monkeypatch.setattr(settings, "RULES_INFER", False)
+    fields = [
+        _field("合同编号", "contractNo", pattern=r"合同编号[:：]\s*(?P<value>HT-\d+)"),
+        _field("数量", "count", "int", pattern=r"共\s*(\d+)\s*件"),
+        _field("联系电话", "phone", matcher="phone"),
+        _field("身份证号", "idNo", matcher="none"),
+        _field("统一社会信用代码", "creditCode"),
+    ]
+    hits, remaining = prefill("合同编号：HT-0042\n共 12 件\n电话 010-12345678 / 010-87654321\n" + DOCUMENT[:40], fields)
+    assert {field: value.value for field, value in hits.items()} == {"contractNo": "HT-0042", "count": 12}
+    # 电话有歧义；matcher=none 与未开启推断的字段不做预提取
+    assert [f.field for f in remaining] == ["phone", "idNo", "creditCode"]
+
+    with pytest.raises(ValidationException):
+        prefill(DOCUMENT, [_field("编号", "no", matcher="unknown")])
+    with pytest.raises(ValueError):
+        _field("编号", "no", pattern="(")
+
+
+def _service(monkeypatch, text):
+    service = ExtractService()
+    calls = []
+
+    async def extract_text(source, file_data, file_content, filename=None):
+        return text
+
+    async def extract_with_llm(text_content, image, schema, provider, model=None, output_format=None):
+        calls.append([f.field for f in schema])
+        return [ExtractedValue(field=f.field, type=f.type, value="LLM") for f in schema]
+
+    monkeypatch.setattr(service.file_service, "detect_file_type", lambda content, filename=None: "txt")
+    monkeypatch.setattr(service, "_extract_text", extract_text)
+    monkeypatch.setattr(service, "_extract_with_llm", extract_with_llm)
+    return service, calls
+
+
+@pytest.mark.asyncio
+async def test_service_asks_llm_only_for_remaining_fields(monkeypatch):
+    service, calls = _service(monkeypatch, DOCUMENT)
+    schema = [_field("甲方", "partyA"), _field("身份证", "idNo"), _field("签订日期", "signDate", "date")]
+
+    with collect_metadata() as metadata:
+        values = await service._extract(ExtractRequest(source="file", file=DOCUMENT, schema=schema))
+
+    assert calls == [["partyA"]]
+    assert [(v.field, v.value) for v in values] == [
+        ("partyA", "LLM"),
+        ("idNo", "11010519491231002X"),
+        ("signDate", "2024-03-05"),
+    ]
+    assert metadata["prefilled"] == ["idNo", "signDate"]
+
+
+@pytest.mark.asyncio
+async def test_service_skips_llm_when_all_fields_resolve(monkeypatch):
+    service, calls = _service(monkeypatch, DOCUMENT)
+    schema = [_field("统一社会信用代码", "creditCode"), _field("合同金额", "amount", "int")]
+
+    values = await service._extract(ExtractRequest(source="file", file=DOCUMENT, schema=schema))
+
+    assert calls == []
+    assert [(v.field, v.value) for v in values] == [("creditCode", "91350100M000100Y43"), ("amount", 1200000)]
+    assert metrics.get("rule_llm_skipped_total") == 1
+
+    monkeypatch.setattr(settings, "RULES_ENABLED", False)
+    await service._extract(ExtractRequest(source="file", file=DOCUMENT, schema=schema))
+    assert calls == [["creditCode", "amount"]]
@@ -0,0 +1,127 @@
+"""
+Schema 注册中心测试
+"""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.core import settings, SchemaNotFoundException
+from app.main import app
+from app.services import SchemaRegistry
+
+SCHEMA = [
+    {"name": "人名", "field": "name", "type": "text", "required": True},
+    {"name": "年龄", "field": "age", "type": "int", "required": True},
+]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return SchemaRegistry(db_path=str(tmp_path / "schemas.db"))
+
+
+class TestSchemaRegistry:
+    """注册中心存储与版本测试"""
+
+    def test_register_is_idempotent(self, registry):
+        """相同内容重复注册返回同一 ID 与版本"""
+        first = registry.register_text(json.dumps(SCHEMA, ensure_ascii=False))
+        second = registry.register_text(json.dumps(SCHEMA, ensure_ascii=False))
+        assert first.schema_id == second.schema_id
+        assert first.version == second.version == 1
+
+    def test_new_version_on_change(self, registry):
+        """指定 ID 且内容变化时生成新版本"""
+        registry.register_text(json.dumps(SCHEMA), schema_id="person")
+        changed = SCHEMA + [{"name": "职业", "field": "job", "type": "text"}]
+        v2 = registry.register_text(json.dumps(changed), schema_id="person")
+        assert v2.version == 2
+        assert registry.get("person").version == 2
+        assert registry.get("person", 1).compiled.field_names == ["name", "age"]
+
+    def test_get_from_storage(self, registry, tmp_path):
+        """新实例从 SQLite 读取并重新编译"""
+        registered = registry.register_text(json.dumps(SCHEMA), schema_id="person")
+        fresh = SchemaRegistry(db_path=str(tmp_path / "schemas.db"))
+        loaded = fresh.get("person")
+        assert loaded.compiled.canonical_hash == registered.compiled.canonical_hash
+
+    def test_latest_version_is_cached(self, registry, tmp_path, monkeypatch):
+        """未指定版本时在 SCHEMA_LATEST_TTL 内不再查询 SQLite，过期后看到其他 worker 注册的新版本"""
+        monkeypatch.setattr(settings, "SCHEMA_LATEST_TTL", 60.0)
+        registry.register_text(json.dumps(SCHEMA), schema_id="person")
+        other = SchemaRegistry(db_path=str(tmp_path / "schemas.db"))
+        changed = SCHEMA + [{"name": "职业", "field": "job", "type": "text"}]
+        other.register_text(json.dumps(changed), schema_id="person")
+
+        monkeypatch.setattr(registry, "_connect", lambda: pytest.fail("不应访问 SQLite"))
+        assert registry.get("person").version == 1
+        monkeypatch.undo()
+        registry._latest.clear()
+        assert registry.get("person").version == 2
+
+    def test_concurrent_register_retries_after_conflict(self, registry, tmp_path):
+        """其他 worker 抢先插入同一版本时重新读取并分配下一版本"""
+        registry.register_text(json.dumps(SCHEMA), schema_id="person")
+        other = SchemaRegistry(db_path=str(tmp_path / "schemas.db"))
+        connect = registry._connect
+        raced = []
+
+        class RacingConnection:
+            def __init__(self, conn):
+                self._conn = conn
+
+            def __getattr__(self, name):
+                return getattr(self._conn, name)
+
+            def __enter__(self):
+                return self._conn.__enter__()
+
+            def __exit__(self, *exc):
+                return self._conn.__exit__(*exc)
+
+            def execute(self, sql, params=()):
+                if sql.startswith("INSERT") and not raced:
+                    raced.append(True)
+                    other.register_text(json.dumps(SCHEMA[:1]), schema_id="person")
+                return self._conn.execute(sql, params)
+
+        registry._connect = lambda: RacingConnection(connect())
+        changed = SCHEMA + [{"name": "职业", "field": "job", "type": "text"}]
+        registered = registry.register_text(json.dumps(changed), schema_id="person")
+        assert registered.version == 3
+        assert [v for v, _ in registry.list_versions("person")] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_get_async(self, registry):
+        """异步获取：命中热集时直接返回，否则在线程中读取"""
+        registered = registry.register_text(json.dumps(SCHEMA), schema_id="person")
+        assert await registry.get_async("person") is registered
+        registry._hot.clear()
+        loaded = await registry.get_async("person", 1)
+        assert loaded.compiled.canonical_hash == registered.compiled.canonical_hash
+        with pytest.raises(SchemaNotFoundException):
+            await registry.get_async("missing")
+
+    def test_missing_schema(self, registry):
+        """不存在的 schema 抛出异常"""
+        with pytest.raises(SchemaNotFoundException):
+            registry.get("missing")
+
+
+def test_schemas_api(monkeypatch, registry):
+    """注册与查询接口"""
+    monkeypatch.setattr(routes, "schema_registry", registry)
+    client = TestClient(app)
+
+    resp = client.post("/schemas", json={"schema": SCHEMA, "schema_id": "person"})
+    assert resp.status_code == 200
+    assert resp.json()["version"] == 1
+
+    resp = client.get("/schemas/person")
+    assert resp.status_code == 200
+    assert [f["field"] for f in resp.json()["fields"]] == ["name", "age"]
+
+    assert client.get("/schemas/missing").status_code == 404
@@ -0,0 +1,136 @@
+"""
+响应序列化与结果缓存测试
+"""
+import json
+import os
+
+import pytest
+
+from app.core import serialization, settings
+from app.core.metrics import metrics
+from app.core.response_metadata import collect_metadata
+from app.core.serialization import FastJSONResponse, dumps, extract_response_body, values_json
+from app.models import ExtractRequest, ExtractResponse, ExtractedValue, SchemaField
+from app.services.extract_service import ExtractService
+from app.utils.cache_store import FileCacheStore
+
+VALUES = [
+    ExtractedValue(field="name", type="text", value="张三"),
+    ExtractedValue(field="age", type="int", value=30),
+    ExtractedValue(field="score", type="float", value=98.5),
+    ExtractedValue(field="married", type="boolean", value=False),
+    ExtractedValue(field="extra", type="json", value={"tags": ["a", "b"], "n": None}),
+    ExtractedValue(field="missing", type="text", value=None),
+]
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_response_body_matches_model(monkeypatch, fast):
+    if not fast:
+        monkeypatch.setattr(serialization, "orjson", None)
+    metadata = {"route": {"provider": "openai", "model": "m"}}
+
+    body = extract_response_body(values_json(VALUES), metadata)
+
+    expected = ExtractResponse(data=VALUES, metadata=metadata).model_dump()
+    assert json.loads(body) == expected
+    # 非 ASCII 字符不转义
+    assert "张三".encode("utf-8") in body
+    assert json.loads(extract_response_body(b"[]"))["metadata"] is None
+
+
+def test_dumps_falls_back_for_unsupported_values():
+    assert json.loads(dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+    assert json.loads(dumps({1: {"x"}})) == {"1": ["x"]}
+    assert FastJSONResponse({"a": "中"}).body == '{"a":"中"}'.encode("utf-8")
+
+
+def _service(monkeypatch):
+    service = ExtractService()
+    calls = []
+
+    async def extract(request):
+        calls.append(request.file)
+        return [ExtractedValue(field="name", type="text", value=request.file)]
+
+    monkeypatch.setattr(service, "_extract_with_budget", extract)
+    return service, calls
+
+
+def _request(text):
+    return ExtractRequest(source="file", file=text, schema=[SchemaField(name="人名", field="name", type="text")])
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+@pytest.mark.asyncio
+async def test_result_cache_returns_serialized_bytes(monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RESULT_CACHE_TTL", 60.0)
+    # 进程内缓存直接返回缓存的字节对象
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    service, calls = _service(monkeypatch)
+
+    first = await service.extract_json(_request("张三"))
+    with collect_metadata() as metadata:
+        second = await service.extract_json(_request("张三"))
+    await service.extract_json(_request("李四"))
+
+    assert first is second
+    assert json.loads(first) == [{"field": "name", "type": "text", "value": "张三"}]
+    assert calls == ["张三", "李四"]
+    assert metadata == {"cached": True}
+    assert metrics.get("result_cache_hits_total") == 1
+    assert metrics.get("result_cache_misses_total") == 2
+
+
+@pytest.mark.asyncio
+async def test_file_result_cache_is_shared_between_workers(monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RESULT_CACHE_TTL", 60.0)
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "file")
+    first, first_calls = _service(monkeypatch)
+    second, second_calls = _service(monkeypatch)
+
+    body = await first.extract_json(_request("张三"))
+    assert await second.extract_json(_request("张三")) == body
+    assert first_calls == ["张三"] and second_calls == []
+    assert metrics.get("result_cache_hits_total") == 1
+
+
+@pytest.mark.parametrize("backend", ["memory", "file"])
+@pytest.mark.asyncio
+async def test_result_cache_expiry_and_disabled(monkeypatch, backend):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", backend)
+    service, calls = _service(monkeypatch)
+
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    await service.extract_json(_request("张三"))
+    await service.extract_json(_request("张三"))
+    assert len(calls) == 2
+
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "RESULT_CACHE_TTL", 0.0)
+    await service.extract_json(_request("张三"))
+    await service.extract_json(_request("张三"))
+    assert len(calls) == 4
+    assert metrics.get("result_cache_hits_total") == 0
+
+
+@pytest.mark.asyncio
+async def test_file_cache_store_evicts_least_recently_used(tmp_path):
+    store = FileCacheStore(str(tmp_path), 2, serialize=lambda v: v, deserialize=lambda v: v)
+    await store.put("a", "1", 60)
+    await store.put("b", "2", 60)
+    # 读取 a 后 b 成为最久未访问的条目
+    os.utime(tmp_path / "a.json", (0, 0))
+    os.utime(tmp_path / "b.json", (0, 0))
+    assert await store.get("a") == "1"
+    await store.put("c", "3", 60)
+    assert [await store.get(key) for key in "abc"] == ["1", None, "3"]
+
+    await store.put("d", "4", 0)
+    assert await store.get("d") is None
@@ -0,0 +1,172 @@
+"""
+相同请求合并测试
+"""
+import asyncio
+import multiprocessing
+import os
+
+import pytest
+
+from app.core import settings
+from app.core.metrics import metrics
+from app.core.response_metadata import collect_metadata, set_metadata
+from app.core.singleflight import FileCoordinator, SingleFlight
+from app.models import ExtractRequest, ExtractedValue, SchemaField
+from app.services.extract_service import ExtractService
+
+
+def _counting(calls, delay=0.05, result="done", error=None):
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    metrics.reset()
+    flight = SingleFlight("test")
+    calls = []
+    results = await asyncio.gather(*[flight.do("k", _counting(calls)) for _ in range(4)])
+    assert len(calls) == 1
+    assert [value for value, _ in results] == ["done"] * 4
+    assert sum(coalesced for _, coalesced in results) == 3
+    assert metrics.get("singleflight_coalesced_total", flight="test", scope="local") == 3
+    assert flight.inflight() == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_work():
+    flight = SingleFlight("test")
+    calls = []
+    first = asyncio.ensure_future(flight.do("k", _counting(calls, delay=0.1)))
+    await asyncio.sleep(0.01)
+    second = asyncio.ensure_future(flight.do("k", _counting(calls)))
+    await asyncio.sleep(0.01)
+
+    # 发起方被取消，合并进来的等待方仍拿到结果
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert await second == ("done", True)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_all_waiters():
+    flight = SingleFlight("test")
+    calls = []
+    results = await asyncio.gather(
+        *[flight.do("k", _counting(calls, error=ValueError("boom"))) for _ in range(3)],
+        return_exceptions=True,
+    )
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    # 失败后不再合并，下一次调用重新执行
+    assert await flight.do("k", _counting(calls)) == ("done", False)
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+    calls = []
+    await asyncio.gather(flight.do("a", _counting(calls)), flight.do("b", _counting(calls)))
+    assert len(calls) == 2
+
+
+def _worker(directory, marker, queue):
+    async def compute():
+        with open(marker, "a") as f:
+            f.write("x")
+        await asyncio.sleep(0.5)
+        return {"value": 42}
+
+    coordinator = FileCoordinator(directory, serialize=lambda v: v, deserialize=lambda v: v)
+    queue.put(asyncio.run(coordinator.run("key", compute)))
+
+
+def test_file_coordinator_across_processes(tmp_path):
+    marker = str(tmp_path / "marker")
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(str(tmp_path), marker, queue)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join(30)
+
+    with open(marker) as f:
+        assert f.read() == "x"
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert all(value == {"value": 42} for value, _ in results)
+    assert not os.path.exists(tmp_path / "key.claim")
+
+
+@pytest.mark.asyncio
+async def test_stale_claim_is_taken_over(tmp_path):
+    # 不存在的进程留下的认领文件
+    (tmp_path / "key.claim").write_text("999999999 0")
+    coordinator = FileCoordinator(str(tmp_path), serialize=lambda v: v, deserialize=lambda v: v)
+    calls = []
+    assert await coordinator.run("key", _counting(calls)) == ("done", False)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_extract_service_coalesces_duplicates(monkeypatch):
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", True)
+    service = ExtractService()
+    calls = []
+
+    async def fake_extract(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return [ExtractedValue(field="name", type="text", value="张三")]
+
+    monkeypatch.setattr(service, "_extract", fake_extract)
+    schema = [SchemaField(name="人名", field="name", type="text")]
+
+    async def call(content):
+        with collect_metadata() as metadata:
+            values = await service.extract(ExtractRequest(source="file", file=content, schema=schema))
+        return values, metadata
+
+    results = await asyncio.gather(call("文档"), call("文档"), call("另一份文档"))
+    assert len(calls) == 2
+    assert results[0][0] == results[1][0]
+    assert [bool(metadata.get("coalesced")) for _, metadata in results] == [False, True, False]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cross_worker", [False, True])
+async def test_coalesced_requests_receive_metadata(monkeypatch, tmp_path, cross_worker):
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", True)
+    monkeypatch.setattr(settings, "COALESCE_CROSS_WORKER", cross_worker)
+    monkeypatch.setattr(settings, "COALESCE_DIR", str(tmp_path))
+
+    async def fake_extract(request):
+        set_metadata("route", {"provider": "openai", "model": "gpt-4o-mini"})
+        set_metadata("batch_size", 3)
+        await asyncio.sleep(0.05)
+        return [ExtractedValue(field="name", type="text", value="张三")]
+
+    # 跨 worker 时由两个服务实例（各自的进程内合并表）模拟两个 worker
+    services = [ExtractService() for _ in range(2 if cross_worker else 1)]
+    for service in services:
+        monkeypatch.setattr(service, "_extract", fake_extract)
+    schema = [SchemaField(name="人名", field="name", type="text")]
+
+    async def call(service):
+        with collect_metadata() as metadata:
+            await service.extract(ExtractRequest(source="file", file="文档", schema=schema))
+        return metadata
+
+    results = await asyncio.gather(*(call(services[i % len(services)]) for i in range(3)))
+    assert sum(bool(metadata.get("coalesced")) for metadata in results) == 2
+    for metadata in results:
+        assert metadata["route"] == {"provider": "openai", "model": "gpt-4o-mini"}
+        assert metadata["batch_size"] == 3
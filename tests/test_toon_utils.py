@@ -0,0 +1,90 @@
+"""
+TOON 表格解码器测试
+"""
+import pytest
+from toon import decode
+
+from app.utils.toon_utils import (
+    ToonDecodeError,
+    ToonTableDecoder,
+    decode_schema_table,
+    decode_table,
+    decode_values_table,
+    extract_toon_block,
+    extract_values_list,
+    iter_table_rows,
+)
+
+RESPONSE = (
+    "以下是提取结果：\n"
+    "```toon\n"
+    "values[5]{field,type,value}:\n"
+    '  name,text,"张三, 李四"\n'
+    "  age,int,32\n"
+    '  note,text,"他说 \\"你好\\"\\n换行"\n'
+    "  code,text,007\n"
+    "  missing,text,null\n"
+    "```\n"
+    "如有疑问请告知。"
+)
+
+
+def test_matches_generic_decoder():
+    """与 python-toon 的解码结果一致"""
+    expected = extract_values_list(decode(extract_toon_block(RESPONSE)))
+    assert decode_values_table(RESPONSE) == expected
+    assert expected[0]["value"] == "张三, 李四"
+    assert expected[2]["value"] == '他说 "你好"\n换行'
+    assert expected[3]["value"] == "007"
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64])
+def test_streaming_yields_rows_as_they_complete(size):
+    """任意切分的输入流得到相同结果，且每行在其换行到达时即产出"""
+    chunks = [RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size)]
+    assert list(iter_table_rows(chunks)) == decode_table(RESPONSE)
+
+    decoder = ToonTableDecoder()
+    assert decoder.feed("values[2]{field,type,value}:\n  a,int,1") == []
+    assert decoder.feed("\n  b,in") == [{"field": "a", "type": "int", "value": 1}]
+    assert decoder.feed("t,2\n") == [{"field": "b", "type": "int", "value": 2}]
+    assert decoder.complete
+    decoder.close()
+
+
+def test_alternate_delimiter():
+    """表格头声明的分隔符"""
+    rows = decode_table("values[1|]{field|type|value}:\n  a|text|x,y")
+    assert rows == [{"field": "a", "type": "text", "value": "x,y"}]
+    assert decode_table('values[1,]{field,type,value}:\n  a,text,"x,y"') == rows
+
+
+@pytest.mark.parametrize("text", [
+    "values[2]{field,type,value}:\n  a,int,1",
+    "values[1]{field,type,value}:\n  a,int,1\n  b,int,2",
+    "values[1]{field,type,value}:\n  a,int,1,2",
+    'values[1]{field,type,value}:\n  a,text,"unterminated',
+    "no table here",
+])
+def test_strict_validation(text):
+    """行数、列数、引号不符时报错"""
+    with pytest.raises(ToonDecodeError):
+        decode_table(text)
+
+
+def test_non_strict_keeps_partial_rows():
+    """非 strict 模式保留已完成的行"""
+    rows = decode_table("values[3]{field,type,value}:\n  a,int,1\n  b,int,2,3\n  c,int,3", strict=False)
+    assert [r["field"] for r in rows] == ["a", "c"]
+
+
+def test_fallback_to_generic_decoder():
+    """非表格写法退回 python-toon"""
+    text = "values[1]:\n  - field: a\n    type: int\n    value: 1"
+    assert decode_values_table(text) == [{"field": "a", "type": "int", "value": 1}]
+
+
+def test_schema_table():
+    """schema 表格"""
+    rows = decode_schema_table("```toon\nvalues[1]{name,field,type,required}:\n  人名,name,text,true\n```")
+    assert rows == [{"name": "人名", "field": "name", "type": "text", "required": True}]
@@ -0,0 +1,60 @@
+"""
+预热与 fork 安全测试
+"""
+import os
+
+import pytest
+
+from app.core import warmup
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 fork 支持")
+def test_after_fork_callbacks_run_in_child():
+    """fork 后子进程执行注册的回调并重置就绪状态"""
+    calls = []
+    warmup.register_after_fork(lambda: calls.append("reset"))
+    warmup.mark_ready()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        ok = calls == ["reset"] and not warmup.is_ready()
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+
+    os.close(write_fd)
+    result = os.read(read_fd, 1)
+    os.waitpid(pid, 0)
+    os.close(read_fd)
+    warmup._after_fork_callbacks.pop()
+
+    assert result == b"1"
+    assert calls == []
+    assert warmup.is_ready()
+
+
+def test_minio_services_are_not_kept_alive_by_fork_hook():
+    """fork 后回调只持有 MinIOService 的弱引用"""
+    import gc
+    import weakref
+    from app.services import minio_service
+
+    callbacks = len(warmup._after_fork_callbacks)
+    service = minio_service.MinIOService()
+    service._client = object()
+    minio_service._reset_clients()
+    assert service._client is None
+    assert len(warmup._after_fork_callbacks) == callbacks
+
+    ref = weakref.ref(service)
+    del service
+    gc.collect()
+    assert ref() is None
+
+
+def test_memory_usage_keys():
+    """内存统计包含 PSS（仅 Linux）"""
+    usage = warmup.memory_usage()
+    if os.path.exists("/proc/self/smaps_rollup"):
+        assert usage["pss_kb"] > 0